@@ -1,4 +1,5 @@
 import cmd
+import json
 import requests
 import yaml
 import traceback
@@ -464,11 +465,12 @@ class StageRunClient(cmd.Cmd):
     def do_install_app(self, arg):
         """
         Install a previously uploaded app.
-        Usage: install_app -t <tag> -v <version>
+        Usage: install_app -t <tag> -v <version> [-p greedy|list|dual|bnb[:<budget_ms>]|portfolio[:<budget_ms>]]
         """
         parser = argparse.ArgumentParser()
         parser.add_argument("-t", "--tag", dest="tag", type=str, required=True, help="App tag")
         parser.add_argument("-v", "--version", dest="version", type=str, required=True, help="App version")
+        parser.add_argument("-p", "--planner", dest="planner", type=str, default=None, help="Planner strategy (default: the manifest's, else greedy)")
 
         try:
             args = parser.parse_args(arg.split())
@@ -479,12 +481,110 @@ class StageRunClient(cmd.Cmd):
             
             timer.start()
 
-            response = requests.get(f"{self.base_url}/install_app", params={"tag": args.tag, "version": args.version})
+            params = {"tag": args.tag, "version": args.version}
+            if args.planner:
+                params["planner"] = args.planner
+            response = requests.get(f"{self.base_url}/install_app", params=params)
 
             timer.finish()
             timer.calc(f"install_app -t {args.tag} -v {args.version}")
 
 
+            if response.status_code == 200:
+                data = response.json()
+                if "status" in data and "error" in data["status"]:
+                    print(f"Installation failed:")
+                    print(data.get("message"))
+
+                else:
+                    print(data.get("message"))
+            else:
+                print(f"Server returned status {response.status_code}: {response.text}")
+
+        except Exception as e:
+            print("Error:", e)
+
+        except SystemExit:
+            pass
+            
+        except Exception:
+            traceback.print_exc()
+
+    def do_dry_run_app(self, arg):
+        """
+        Deploy a previously uploaded app on an in-memory table backend (nothing
+        is written to the switch) and show the resulting table operations.
+        Usage: dry_run_app -t <tag> -v <version> [-p greedy|list|dual|bnb[:<budget_ms>]|portfolio[:<budget_ms>]] [-o <report.json>]
+        """
+        parser = argparse.ArgumentParser()
+        parser.add_argument("-t", "--tag", dest="tag", type=str, required=True, help="App tag")
+        parser.add_argument("-v", "--version", dest="version", type=str, required=True, help="App version")
+        parser.add_argument("-p", "--planner", dest="planner", type=str, default=None, help="Planner strategy (default: the manifest's, else greedy)")
+        parser.add_argument("-o", "--output", dest="output", type=str, default=None, help="Write the full report (JSON) to this file")
+
+        try:
+            args = parser.parse_args(arg.split())
+
+            if not re.fullmatch(VERSION_PATTERN, args.version):
+                print(f"Error: Version must contain only digits such as '31.01' instead of '{args.version}'")
+                return
+
+            timer.start()
+
+            params = {"tag": args.tag, "version": args.version}
+            if args.planner:
+                params["planner"] = args.planner
+            response = requests.get(f"{self.base_url}/dry_run_app", params=params)
+
+            timer.finish()
+            timer.calc(f"dry_run_app -t {args.tag} -v {args.version}")
+
+            if response.status_code == 200:
+                data = response.json()
+                if "status" in data and "error" in data["status"]:
+                    print(f"Dry run failed:")
+                print(data.get("message"))
+
+                if args.output and "report" in data:
+                    with open(args.output, "w") as f:
+                        json.dump(data["report"], f, indent=2)
+                    print(f"Report written to {args.output}")
+            else:
+                print(f"Server returned status {response.status_code}: {response.text}")
+
+        except Exception as e:
+            print("Error:", e)
+
+        except SystemExit:
+            pass
+            
+        except Exception:
+            traceback.print_exc()
+
+    def do_install_apps(self, arg):
+        """
+        Install several previously uploaded apps together (joint planning).
+        Usage: install_apps -a <tag>:<version> <tag>:<version> ...
+        """
+        parser = argparse.ArgumentParser()
+        parser.add_argument("-a", "--apps", dest="apps", nargs="+", required=True, help="Apps as tag:version")
+
+        try:
+            args = parser.parse_args(arg.split())
+
+            for item in args.apps:
+                tag, _, version = item.partition(":")
+                if not tag or not re.fullmatch(VERSION_PATTERN, version):
+                    print(f"Error: Apps must be given as tag:version with a version such as '31.01' instead of '{item}'")
+                    return
+
+            timer.start()
+
+            response = requests.get(f"{self.base_url}/install_apps", params={"apps": ",".join(args.apps)})
+
+            timer.finish()
+            timer.calc(f"install_apps -a {' '.join(args.apps)}")
+
             if response.status_code == 200:
                 data = response.json()
                 if "status" in data and "error" in data["status"]:
@@ -548,6 +648,50 @@ class StageRunClient(cmd.Cmd):
         except Exception:
             traceback.print_exc()
 
+    def do_switch_epoch(self, arg):
+        """
+        Switch a multi-epoch app to another of its installed epochs.
+        Usage: switch_epoch -t <tag> -v <version> -e <epoch>
+        """
+        parser = argparse.ArgumentParser()
+        parser.add_argument("-t", "--tag", dest="tag", type=str, required=True, help="App tag")
+        parser.add_argument("-v", "--version", dest="version", type=str, required=True, help="App version")
+        parser.add_argument("-e", "--epoch", dest="epoch", type=str, required=True, help="Epoch name")
+
+        try:
+            args = parser.parse_args(arg.split())
+
+            if not re.fullmatch(VERSION_PATTERN, args.version):
+                print(f"Error: Version must contain only digits such as '31.01' instead of '{args.version}'")
+                return
+
+            timer.start()
+
+            response = requests.get(f"{self.base_url}/switch_epoch", params={"tag": args.tag, "version": args.version, "epoch": args.epoch})
+
+            timer.finish()
+            timer.calc(f"switch_epoch -t {args.tag} -v {args.version} -e {args.epoch}")
+
+            if response.status_code == 200:
+                data = response.json()
+                if "status" in data and "error" in data["status"]:
+                    print(f"Switch failed:")
+                    print(data.get("message"))
+
+                else:
+                    print(data.get("message"))
+            else:
+                print(f"Server returned status {response.status_code}: {response.text}")
+
+        except Exception as e:
+            print("Error:", e)
+
+        except SystemExit:
+            pass
+            
+        except Exception:
+            traceback.print_exc()
+
     def do_uninstall_app(self, arg):
         """
         Install a previously uploaded app.
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+StageRun Joint Planner (offline)
+- Lowers and plans several compiled programs together for one engine ISA,
+  as the controller's install_apps does, without a running engine
+- Manifests (optional) bind the endpoints to front ports, so prefilters of
+  different apps on the same port are detected; without one, ports stay symbolic
+- Prints the per-app resource accounting and optionally writes the combined plan
+"""
+
+from __future__ import annotations
+import sys
+import json
+import argparse
+import contextlib
+import io
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from Compiler.py.target import CONTROLLER_DIR, load_isa, TargetError
+from Core.stagerun_graph.epochs import is_multi_epoch, union_view
+from Core.stagerun_graph.binary_ir import BinaryIR, is_binary_ir
+
+
+def _controller_modules():
+    """co_planner + helpers from the controller (needs the controller environment, e.g. bfrt_grpc)."""
+    if str(CONTROLLER_DIR) not in sys.path:
+        sys.path.insert(0, str(CONTROLLER_DIR))
+    try:
+        from lib.controller.deployer import co_planner, target
+        from lib.utils.manifest_parser import parse_manifest, get_pnum_from_endpoints
+    except Exception as e:
+        raise TargetError(f"Joint planning needs the controller environment ({e!r})")
+    return co_planner, target, parse_manifest, get_pnum_from_endpoints
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun Joint Planner")
+    ap.add_argument("apps", nargs="+", metavar="APP[:MANIFEST]",
+                    help="Compiled program (.out/.json), optionally with its manifest (.yaml)")
+    ap.add_argument("--isa", required=True, metavar="ISA_JSON", help="Engine ISA to plan for")
+    ap.add_argument("--table-capacity", type=int, default=None,
+                    help="Maximum entries per (stage, flow, table)")
+    ap.add_argument("-o", "--out", default=None, help="Write the combined plan (accounting + micro-graphs) as JSON")
+    args = ap.parse_args()
+
+    try:
+        isa = load_isa(args.isa)
+        co_planner, target, parse_manifest, get_pnum_from_endpoints = _controller_modules()
+    except TargetError as e:
+        print(f"Joint Plan Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    co_apps = []
+    for item in args.apps:
+        app_path, _, manifest_path = item.partition(":")
+        try:
+            if is_binary_ir(app_path):
+                compiled_app = BinaryIR(app_path)
+            else:
+                compiled_app = json.loads(Path(app_path).read_text(encoding="utf-8"))
+            manifest = parse_manifest(manifest_path) if manifest_path else None
+        except Exception as e:
+            print(f"Error reading {item}: {e}", file=sys.stderr)
+            return 2
+
+        if manifest is None:
+            port_resolver = target.symbolic_port
+        else:
+            port_resolver = lambda endpoint, m=manifest: get_pnum_from_endpoints(m, endpoint)
+
+        # One program id per program (multi-epoch images: their union view), in input order
+        view = union_view(compiled_app) if is_multi_epoch(compiled_app) else compiled_app
+        co_apps.append(co_planner.CoApp(view["program"], view, len(co_apps) + 1, port_resolver))
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            co_plan = co_planner.CoPlanner(isa, table_capacity=args.table_capacity).plan(co_apps)
+    except co_planner.CoPlanError as e:
+        print(f"Joint Plan Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.out:
+        out = {
+            "isa": Path(args.isa).name,
+            **co_plan.to_dict(),
+            "plans": {k: target.plan_to_dict(co_plan.plans[k]) for k in co_plan.order},
+        }
+        Path(args.out).write_text(json.dumps(out, indent=2), encoding="utf-8")
+
+    print(co_plan.format())
+    if args.out:
+        print(f"   → wrote: {Path(args.out).resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+modules.py
+- Resolves `include "<path>"` / `import "<path>"` statements of a .srun program
+- Precompiles every module once: parsed + checked AST and serialized handler graphs
+- Caches precompiled modules (.srunm, JSON) keyed by their content hash, so a
+  program that includes N modules only parses/checks/lowers its own statements
+"""
+
+from __future__ import annotations
+import dataclasses
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from Compiler.py.parser import parse_stagerun_program
+from Compiler.py.semantic import semantic_check, SemanticError
+from Core.ast_nodes import *
+from Core.stagerun_graph.exporter import _serialize_handlers
+from Core.stagerun_graph.transitive_reduction import EdgeReductionStats
+
+MODULE_FORMAT_VERSION = 2
+MODULE_SUFFIX = ".srunm"
+
+# Dependencies are found without parsing (to compute the cache key)
+_INCLUDE_RE = re.compile(r'^[ \t]*(?:include|import)[ \t]+"([^"]*)"', re.MULTILINE)
+
+# Sources whose changes invalidate every precompiled module
+_ROOT_DIR = Path(__file__).resolve().parents[2]
+_FINGERPRINT_SOURCES = [
+    _ROOT_DIR / "Compiler" / "py" / "grammar" / "stagerun_grammar.lark",
+    _ROOT_DIR / "Compiler" / "py" / "parser.py",
+    _ROOT_DIR / "Compiler" / "py" / "semantic.py",
+    _ROOT_DIR / "Core" / "ast_nodes.py",
+    _ROOT_DIR / "Core" / "stagerun_isa.py",
+    *sorted((_ROOT_DIR / "Core" / "stagerun_graph").glob("*.py")),
+]
+_fingerprint: Optional[str] = None
+
+
+class ModuleError(SemanticError):
+    pass
+
+
+@dataclass
+class CompiledModule:
+    """Precompiled module, as stored in a .srunm file."""
+    path: str
+    key: str                                  # content hash (source + includes + compiler)
+    program: ProgramNode                      # AST with its own includes merged
+    checked: bool                             # passed semantic_check on its own
+    handlers: Dict[str, Dict[str, Any]]       # handler name -> serialized graph fragment
+    format_version: int = MODULE_FORMAT_VERSION
+
+
+@dataclass
+class ModuleResolution:
+    """A program with all its includes merged in."""
+    program: ProgramNode
+    fragments: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    checked_handlers: Set[str] = field(default_factory=set)
+    loaded: List[str] = field(default_factory=list)     # module paths, in include order
+    cached: List[str] = field(default_factory=list)     # subset reused from the cache
+
+
+def _compiler_fingerprint() -> str:
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256(f"srunm:{MODULE_FORMAT_VERSION}".encode())
+        for src in _FINGERPRINT_SOURCES:
+            h.update(src.name.encode())
+            h.update(src.read_bytes())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+
+def _include_path(base_dir: Path, include: str) -> Path:
+    return (base_dir / include).resolve()
+
+
+def module_key(path: Path, reduce_edges: bool, _stack: tuple = ()) -> str:
+    """Content hash of a module: its source, its includes (recursively) and the compiler."""
+    if path in _stack:
+        raise ModuleError(f"Circular include: {' -> '.join(p.name for p in (*_stack, path))}")
+
+    try:
+        source = path.read_bytes()
+    except OSError as e:
+        raise ModuleError(f"Cannot read module {path}: {e}")
+
+    h = hashlib.sha256(_compiler_fingerprint().encode())
+    h.update(b"reduced" if reduce_edges else b"full")
+    h.update(source)
+    for dep in _INCLUDE_RE.findall(source.decode("utf-8")):
+        h.update(module_key(_include_path(path.parent, dep), reduce_edges, (*_stack, path)).encode())
+    return h.hexdigest()
+
+
+def _node_classes(cls: type = ASTNode) -> Dict[str, type]:
+    classes = {}
+    for sub in cls.__subclasses__():
+        classes[sub.__name__] = sub
+        classes.update(_node_classes(sub))
+    return classes
+
+
+# AST node classes a .srunm file may name (nothing else is ever built from one)
+_NODE_CLASSES = {"ASTNode": ASTNode, **_node_classes()}
+
+
+def _encode(v: Any) -> Any:
+    """JSON value of an AST / handler fragment value; tagged objects keep the Python types."""
+    if v is None or type(v) in (bool, int, float, str):
+        return v
+    if isinstance(v, TypedRef):
+        return {"__ref__": str(v), "kind": v.ref_kind}
+    if isinstance(v, str):
+        # a lark Token left in the AST by the parser is a plain name
+        return str(v)
+    if dataclasses.is_dataclass(v) and type(v).__name__ in _NODE_CLASSES:
+        return {"__node__": type(v).__name__, **{f.name: _encode(getattr(v, f.name)) for f in dataclasses.fields(v)}}
+    if isinstance(v, list):
+        return [_encode(x) for x in v]
+    if isinstance(v, tuple):
+        return {"__tuple__": [_encode(x) for x in v]}
+    if isinstance(v, dict):
+        if all(type(k) is str and not k.startswith("__") for k in v):
+            return {k: _encode(x) for k, x in v.items()}
+        return {"__dict__": [[_encode(k), _encode(x)] for k, x in v.items()]}
+    raise TypeError(f"Cannot store {type(v).__name__} in a precompiled module")
+
+
+def _decode(v: Any) -> Any:
+    if isinstance(v, list):
+        return [_decode(x) for x in v]
+    if not isinstance(v, dict):
+        return v
+    if "__node__" in v:
+        cls = _NODE_CLASSES[v["__node__"]]
+        return cls(**{k: _decode(x) for k, x in v.items() if k != "__node__"})
+    if "__ref__" in v:
+        return TypedRef(v["__ref__"], v["kind"])
+    if "__tuple__" in v:
+        return tuple(_decode(x) for x in v["__tuple__"])
+    if "__dict__" in v:
+        return {_decode(k): _decode(x) for k, x in v["__dict__"]}
+    return {k: _decode(x) for k, x in v.items()}
+
+
+class ModuleCache:
+    """
+    Precompiled modules by content hash: in memory for the current run and,
+    when `cache_dir` is set, as .srunm (JSON) files shared between runs. A
+    file is only used if it parses and names the same key, compiler and
+    format; anything else is a miss and the module is compiled again.
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memo: Dict[str, CompiledModule] = {}
+
+    def _file(self, path: str | Path, key: str) -> Path:
+        return self.cache_dir / f"{Path(path).stem}-{key[:16]}{MODULE_SUFFIX}"
+
+    def load(self, path: Path, key: str) -> Optional[CompiledModule]:
+        module = self._memo.get(key)
+        if module is not None or self.cache_dir is None:
+            return module
+
+        cache_file = self._file(path, key)
+        if not cache_file.is_file():
+            return None
+        try:
+            with cache_file.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (
+                data["format_version"] != MODULE_FORMAT_VERSION
+                or data["compiler"] != _compiler_fingerprint()
+                or data["key"] != key
+            ):
+                return None
+            module = CompiledModule(
+                path=data["path"],
+                key=key,
+                program=_decode(data["program"]),
+                checked=bool(data["checked"]),
+                handlers=_decode(data["handlers"]),
+            )
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        if not isinstance(module.program, ProgramNode):
+            return None
+
+        self._memo[key] = module
+        return module
+
+    def store(self, module: CompiledModule) -> None:
+        self._memo[module.key] = module
+        if self.cache_dir is None:
+            return
+        data = {
+            "format_version": MODULE_FORMAT_VERSION,
+            "compiler": _compiler_fingerprint(),
+            "key": module.key,
+            "path": module.path,
+            "checked": module.checked,
+            "program": _encode(module.program),
+            "handlers": _encode(module.handlers),
+        }
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_file = self._file(module.path, module.key)
+        tmp = cache_file.with_suffix(cache_file.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f)
+        tmp.replace(cache_file)
+
+
+_DECL_LISTS = ("ports_in", "ports_out", "queues", "vars", "regs", "hashes")
+
+
+def _merge_into(dst: ProgramNode, src: ProgramNode, origin: str) -> None:
+    """
+    Appends the statements of `src` to `dst`. Identical re-declarations (the
+    same module included twice) are skipped; conflicting ones are errors.
+    """
+    for attr in _DECL_LISTS:
+        existing = {d.name: d for d in getattr(dst, attr)}
+        for decl in getattr(src, attr):
+            prev = existing.get(decl.name)
+            if prev is None:
+                getattr(dst, attr).append(decl)
+                existing[decl.name] = decl
+            elif prev != decl:
+                raise ModuleError(f"Conflicting declaration of '{decl.name}' in {origin}")
+
+    for setup in src.setups:
+        if setup not in dst.setups:
+            dst.setups.append(setup)
+
+    handlers = {h.name: h for h in dst.handlers}
+    for h in src.handlers:
+        prev = handlers.get(h.name)
+        if prev is None:
+            dst.handlers.append(h)
+            handlers[h.name] = h
+        elif prev != h:
+            raise ModuleError(f"HANDLER '{h.name}' from {origin} is already defined")
+
+
+def load_module(
+    path: Path,
+    cache: ModuleCache,
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    _stack: tuple = (),
+) -> tuple[CompiledModule, bool]:
+    """
+    Returns the precompiled module at `path` (and whether it came from the cache),
+    compiling and storing it if needed. Only freshly built handlers count in `edge_stats`.
+    """
+    path = path.resolve()
+    key = module_key(path, reduce_edges, _stack)
+
+    module = cache.load(path, key)
+    if module is not None:
+        return module, True
+
+    program = parse_stagerun_program(path.read_text(encoding="utf-8"))
+    res = resolve_includes(program, path.parent, cache, reduce_edges, edge_stats, (*_stack, path))
+
+    # Modules may rely on declarations of the including program; those are
+    # checked as part of the final program instead.
+    try:
+        semantic_check(res.program, path.stem, skip_handlers=res.checked_handlers)
+        checked = True
+    except SemanticError:
+        checked = False
+
+    fragments = _serialize_handlers(res.program, reduce_edges, edge_stats, prebuilt=res.fragments)
+    module = CompiledModule(
+        path=str(path),
+        key=key,
+        program=res.program,
+        checked=checked,
+        handlers={h.name: frag for h, frag in zip(res.program.handlers, fragments)},
+    )
+    cache.store(module)
+    return module, False
+
+
+def resolve_includes(
+    program: ProgramNode,
+    base_dir: str | Path,
+    cache: ModuleCache,
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    _stack: tuple = (),
+) -> ModuleResolution:
+    """
+    Merges the modules included by `program` (relative to `base_dir`) into a new
+    ProgramNode: module statements first, in include order, then the program's own.
+    """
+    if not program.includes:
+        return ModuleResolution(program=program)
+
+    merged = ProgramNode()
+    res = ModuleResolution(program=merged)
+
+    for inc in program.includes:
+        path = _include_path(Path(base_dir), inc.path)
+        module, from_cache = load_module(path, cache, reduce_edges, edge_stats, _stack)
+
+        _merge_into(merged, module.program, path.name)
+        res.fragments.update(module.handlers)
+        if module.checked:
+            res.checked_handlers.update(module.handlers)
+        res.loaded.append(str(path))
+        if from_cache:
+            res.cached.append(str(path))
+
+    own = ProgramNode(**{k: v for k, v in vars(program).items() if k != "includes"})
+    _merge_into(merged, own, "program")
+
+    return res
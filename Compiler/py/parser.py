@@ -50,8 +50,11 @@ class StageRunTransformer(Transformer):
     # --- Top-level program assembly ----------------------------------------
     def start(self, *statements):
         ports_in, ports_out, qsets, setups, program_vars, regs, handlers, hashes = [], [], [], [], [], [], [], []
+        includes = []
         for s in statements:
-            if isinstance(s, PortDecl):
+            if isinstance(s, IncludeDecl):
+                includes.append(s)
+            elif isinstance(s, PortDecl):
                 (ports_in if s.direction == "IN" else ports_out).append(s)
             elif isinstance(s, QueueSetDecl):
                 qsets.append(s)
@@ -74,9 +77,14 @@ class StageRunTransformer(Transformer):
             regs=regs,
             hashes=hashes,
             handlers=handlers,
+            includes=includes,
         )
 
     # --- Declarations -------------------------------------------------------
+    def include_decl(self, path):
+        # "include" STRING
+        return IncludeDecl(path=str(path))
+
     def port_in_decl(self, name):
         # "PIN" NAME
         return PortDecl(direction="IN", name=str(name), qset="")
@@ -7,10 +7,12 @@ semantic.py
 
 from __future__ import annotations
 from dataclasses import dataclass
+from functools import partial
 from typing import Any, Dict, List, Set
 
 # Import AST types
 from Core.ast_nodes import *
+from Core.stagerun_graph.parallel import map_handlers, resolve_jobs
 
 # -------------------------
 # Errors
@@ -215,10 +217,23 @@ def _validate_handler(program: ProgramNode, handler: HandlerNode, ports_in: Set[
                     pass
 
 
-def semantic_check(program: ProgramNode, program_name: str) -> Dict[str, Any]:
+def _check_handler(ports_in: List[str], ports_out: List[str], program: ProgramNode, handler: HandlerNode) -> str | None:
+    """_validate_handler on the worker pool: errors come back as messages."""
+    try:
+        _validate_handler(program, handler, ports_in, ports_out)
+    except SemanticError as e:
+        return str(e)
+    return None
+
+
+def semantic_check(program: ProgramNode, program_name: str, skip_handlers: Set[str] | None = None,
+                   jobs: int | None = 1) -> Dict[str, Any]:
     """
     Validate ProgramNode. Return a dict containing 'resources' for the exporter.
     Raise SemanticError on failures.
+    Handlers named in `skip_handlers` (already checked in a precompiled module) are not re-validated.
+    With `jobs` > 1 (0: one per CPU) handlers are validated on a process pool,
+    after the declarations; the first failing handler is reported, as in order.
     """
     ports_in_set, ports_out_set = _validate_ports(program)
     _validate_qsets(program, set(ports_out_set))
@@ -226,10 +241,26 @@ def semantic_check(program: ProgramNode, program_name: str) -> Dict[str, Any]:
     #TODO: implement functions for queues, hashes, registers, clones
 
     # validate HANDLERs independently
-    for pf in program.handlers or []:
+    if resolve_jobs(jobs) <= 1:
+        for pf in program.handlers or []:
+            if not isinstance(pf, HandlerNode):
+                raise SemanticError("Invalid HANDLER node in AST")
+            if skip_handlers and pf.name in skip_handlers:
+                continue
+            _validate_handler(program, pf, ports_in_set, ports_out_set)
+        return
+
+    todo = []
+    for i, pf in enumerate(program.handlers or []):
         if not isinstance(pf, HandlerNode):
             raise SemanticError("Invalid HANDLER node in AST")
-        _validate_handler(program, pf, ports_in_set, ports_out_set)
+        if not (skip_handlers and pf.name in skip_handlers):
+            todo.append(i)
+
+    check = partial(_check_handler, ports_in_set, ports_out_set)
+    for error in map_handlers(check, program, todo, jobs):
+        if error:
+            raise SemanticError(error)
 
 # TODO LIST:
 # 1. Copy Instructions
@@ -5,10 +5,18 @@ StageRun Compiler Driver
 - Semantic validation
 - Build StageRunGraph(s) per PREFILTER body
 - Export JSON (+ SHA-256 header) for the controller
+- Several inputs: export one multi-epoch image (one variant per epoch)
+- include/import: modules are precompiled once and reused from the module cache
+- --target <ISA>.json: embed the lowered + planned micro-graphs (relocatable by pid)
+- --estimate <ISA>.json: cost estimate (stages, recirculations, entries, latency)
+- --jobs N: validate and build the handlers on N processes (same output)
+- --format bin: compact binary IR (mmap-loaded lazily by the controller); --debug-json keeps a JSON copy
 """
 
 from __future__ import annotations
+import os
 import sys
+import json
 import argparse
 from pathlib import Path
 
@@ -20,7 +28,14 @@ if str(ROOT_DIR) not in sys.path:
 # Imports from codebase
 from Compiler.py.parser import parse_stagerun_program
 from Compiler.py.semantic import semantic_check, SemanticError
-from Core.stagerun_graph.exporter import export_stage_run_graphs
+from Core.stagerun_graph.exporter import _build_payload, _write_payload
+from Core.stagerun_graph.binary_ir import write_binary_ir
+from Core.stagerun_graph.epochs import build_multi_epoch_payload, EpochError
+from Compiler.py.modules import ModuleCache, resolve_includes
+from Compiler.py.target import build_target, load_isa, TargetError
+from Core.stagerun_graph.cost_model import estimate_cost, PASS_LATENCY_NS
+from Core.stagerun_graph.epochs import is_multi_epoch, select_epoch
+from Core.stagerun_graph.transitive_reduction import EdgeReductionStats
 
 # Types
 from Core.ast_nodes import ProgramNode  # only for type hints
@@ -28,49 +43,168 @@ from Core.ast_nodes import ProgramNode  # only for type hints
 
 def main():
     ap = argparse.ArgumentParser(description="StageRun Compiler")
-    ap.add_argument("input", help=".srun source file")
+    ap.add_argument("input", nargs="+",
+                    help=".srun source file (several files: one multi-epoch image, one epoch per file)")
     ap.add_argument("-o", "--out", required=True,
                     help="Output JSON path for StageRunGraph (with checksum header)")
     ap.add_argument("--program-name", default=None, help="Program name override (defaults to input stem)")
     ap.add_argument("--schema-version", type=int, default=1.0, help="IR schema version")
+    ap.add_argument("--no-edge-reduction", action="store_true",
+                    help="Keep transitively implied dependency edges in the exported graphs")
+    ap.add_argument("--epoch-names", default=None,
+                    help="Comma-separated epoch names for multi-epoch builds (defaults to the input stems without their common prefix)")
+    ap.add_argument("--module-cache", default=None,
+                    help="Directory for precompiled modules (.srunm); defaults to .srun_cache next to the first input")
+    ap.add_argument("--no-module-cache", action="store_true",
+                    help="Do not read or write precompiled modules on disk")
+    ap.add_argument("--target", default=None, metavar="ISA_JSON",
+                    help="Engine ISA (e.g. StageRunEngine_v2.01_ISA.json) to lower and plan for ahead of install")
+    ap.add_argument("--estimate", default=None, metavar="ISA_JSON",
+                    help="Print a cost estimate of the program on this engine ISA (its plan, or a lower bound without the controller environment)")
+    ap.add_argument("--estimate-report", default=None, metavar="PATH",
+                    help="Also write the cost estimate as JSON")
+    ap.add_argument("--pass-latency-ns", type=float, default=PASS_LATENCY_NS,
+                    help="Assumed latency of one pipeline pass for --estimate")
+    ap.add_argument("-j", "--jobs", type=int, default=1,
+                    help="Worker processes for per-handler validation/graph building (0: one per CPU)")
+    ap.add_argument("--format", choices=("json", "bin"), default="json",
+                    help="Output format: JSON (default) or binary IR (same content and checksum)")
+    ap.add_argument("--debug-json", default=None, metavar="PATH",
+                    help="Also write the JSON export (e.g. alongside a binary IR output)")
     args = ap.parse_args()
 
-    src_path = Path(args.input).resolve()
+    src_paths = [Path(p).resolve() for p in args.input]
     out_path = Path(args.out).resolve()
-    program_name = args.program_name or src_path.stem
-
-    try:
-        with open(src_path, "r", encoding="utf-8") as f:
-            srun_program = f.read()
-    except Exception as e:
-        print(f"Error reading {src_path}: {e}", file=sys.stderr)
-        return 2
-
-    # 1) Parse
-    program: ProgramNode = parse_stagerun_program(srun_program)
-    # print("program", program)
-
-    # 2) Semantic validation (returns resources for controller)
-    try:
-        semantic_check(program, program_name)
-    except SemanticError as e:
-        print(f"Semantic Error: {e}", file=sys.stderr)
-        sys.exit(1)
-
-    print("Program", program)
-
-    # 3) Export JSON (+ checksum header)
-    checksum = export_stage_run_graphs(
-        program=program,
-        program_name=program_name,
-        output_path=out_path,
-        schema_version=args.schema_version
-    )
-
-    print(f"✔ Compiled {src_path.name}")
+    multi_epoch = len(src_paths) > 1
+
+    stems = [p.stem for p in src_paths]
+    prefix = os.path.commonprefix(stems) if multi_epoch else ""
+    # cut back to the last separator: netshuffle_epoch1/2 -> "netshuffle_"
+    prefix = prefix[:max(prefix.rfind(c) for c in "_-.") + 1]
+    program_name = args.program_name or (prefix.rstrip("_-.") if multi_epoch and prefix.rstrip("_-.") else stems[0])
+
+    if args.epoch_names:
+        epoch_names = [n.strip() for n in args.epoch_names.split(",")]
+        if len(epoch_names) != len(src_paths):
+            print(f"Expected {len(src_paths)} epoch names, got {len(epoch_names)}", file=sys.stderr)
+            return 2
+    else:
+        epoch_names = [s[len(prefix):] or s for s in stems]
+
+    reduce_edges = not args.no_edge_reduction
+    edge_stats = EdgeReductionStats()
+    if args.no_module_cache:
+        module_cache = ModuleCache()
+    else:
+        module_cache = ModuleCache(args.module_cache or src_paths[0].parent / ".srun_cache")
+
+    programs: list[ProgramNode] = []
+    prebuilt: list[dict] = []
+    modules_loaded, modules_cached = set(), set()
+    for src_path in src_paths:
+        try:
+            with open(src_path, "r", encoding="utf-8") as f:
+                srun_program = f.read()
+        except Exception as e:
+            print(f"Error reading {src_path}: {e}", file=sys.stderr)
+            return 2
+
+        # 1) Parse (+ merge included modules)
+        try:
+            program: ProgramNode = parse_stagerun_program(srun_program)
+            res = resolve_includes(program, src_path.parent, module_cache, reduce_edges, edge_stats, (src_path,))
+        except SemanticError as e:
+            print(f"Module Error ({src_path.name}): {e}", file=sys.stderr)
+            sys.exit(1)
+        program = res.program
+        modules_loaded.update(res.loaded)
+        modules_cached.update(res.cached)
+        # print("program", program)
+
+        # 2) Semantic validation (returns resources for controller)
+        try:
+            semantic_check(program, program_name, skip_handlers=res.checked_handlers, jobs=args.jobs)
+        except SemanticError as e:
+            print(f"Semantic Error ({src_path.name}): {e}", file=sys.stderr)
+            sys.exit(1)
+
+        print("Program", program)
+        programs.append(program)
+        prebuilt.append(res.fragments)
+
+    # 3) Build the export payload
+    if multi_epoch:
+        try:
+            payload = build_multi_epoch_payload(
+                variants=list(zip(epoch_names, programs)),
+                program_name=program_name,
+                schema_version=args.schema_version,
+                reduce_edges=reduce_edges,
+                edge_stats=edge_stats,
+                prebuilt=prebuilt,
+                jobs=args.jobs,
+            )
+        except EpochError as e:
+            print(f"Epoch Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        payload = _build_payload(
+            program=programs[0],
+            program_name=program_name,
+            schema_version=args.schema_version,
+            reduce_edges=reduce_edges,
+            edge_stats=edge_stats,
+            prebuilt=prebuilt[0],
+            jobs=args.jobs,
+        )
+
+    # 4) Lower + plan for the target engine
+    if args.target:
+        try:
+            payload["target"] = build_target(payload, args.target)
+        except TargetError as e:
+            print(f"Target Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    # 5) Export JSON / binary IR (+ checksum header)
+    if args.format == "bin":
+        checksum = write_binary_ir(payload, out_path)
+    else:
+        checksum = _write_payload(payload, out_path)
+    if args.debug_json:
+        _write_payload(payload, Path(args.debug_json).resolve())
+
+    # 6) Cost estimate
+    estimates = []
+    if args.estimate:
+        try:
+            isa = load_isa(args.estimate)
+        except TargetError as e:
+            print(f"Estimate Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        views = [select_epoch(payload, e) for e in payload["epochs"]] if is_multi_epoch(payload) else [payload]
+        estimates = [estimate_cost(v, isa, Path(args.estimate).name, args.pass_latency_ns) for v in views]
+        if args.estimate_report:
+            report = [e.to_dict() for e in estimates]
+            Path(args.estimate_report).write_text(json.dumps(report if multi_epoch else report[0], indent=2), encoding="utf-8")
+
+    print(f"✔ Compiled {', '.join(p.name for p in src_paths)}")
+    if multi_epoch:
+        print(f"   → epochs: {', '.join(epoch_names)}")
     # print(f"   → graphs: {len(graphs)} prefilter(s)")
     print(f"   → wrote: {out_path}")
+    if args.debug_json:
+        print(f"   → wrote: {Path(args.debug_json).resolve()} (JSON)")
     print(f"   → checksum: {checksum}")
+    if args.target:
+        print(f"   → target: {payload['target']['isa']} (pre-planned)")
+    if modules_loaded:
+        print(f"   → modules: {len(modules_loaded)} ({len(modules_cached)} precompiled)")
+    if not args.no_edge_reduction:
+        print(f"   → edges: {edge_stats.edges_before} → {edge_stats.edges_after} "
+              f"(removed {edge_stats.removed}, duplicates {edge_stats.duplicates}, by kind {edge_stats.removed_by_kind})")
+    for est in estimates:
+        print(est.format())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""
+target.py
+- `--target <ISA>.json`: lowers and plans the exported program ahead of time
+  with the controller's MicroInstructionParser/Planner
+- The relocatable plan is embedded in the output ("target"), so installing the
+  program only binds the program id / dev_ports and writes the table entries
+"""
+
+from __future__ import annotations
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+
+
+class TargetError(Exception):
+    pass
+
+
+def _controller_target():
+    """The controller's target module (needs the controller environment, e.g. bfrt_grpc)."""
+    if str(CONTROLLER_DIR) not in sys.path:
+        sys.path.insert(0, str(CONTROLLER_DIR))
+    try:
+        from lib.controller.deployer import target
+    except Exception as e:
+        raise TargetError(f"--target needs the controller environment ({e!r})")
+    return target
+
+
+def load_isa(isa_path: str | Path) -> Dict[str, Any]:
+    try:
+        with open(isa_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise TargetError(f"Cannot read ISA {isa_path}: {e}")
+
+
+def build_target(payload: Dict[str, Any], isa_path: str | Path) -> Dict[str, Any]:
+    """
+    "target" section of `payload` (export payload, single or multi-epoch).
+    Multi-epoch images are planned as their union view, since all their
+    epochs are installed under one program id.
+    """
+    from Core.stagerun_graph.epochs import is_multi_epoch, union_view
+
+    isa = load_isa(isa_path)
+    target = _controller_target()
+    isa_name = Path(isa_path).name
+
+    try:
+        return target.build_target(union_view(payload) if is_multi_epoch(payload) else payload, isa, isa_name)
+    except target.TargetError as e:
+        raise TargetError(str(e))
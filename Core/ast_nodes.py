@@ -103,6 +103,12 @@ class HashDecl(ASTNode):
     args: List
 
 
+@dataclass
+class IncludeDecl(ASTNode):
+    """include "<path>" (module path relative to the including file)"""
+    path: str
+
+
 # ======================
 # Instructions
 # ======================
@@ -358,3 +364,4 @@ class ProgramNode(ASTNode):
     regs: List[RegDecl] = field(default_factory=list)
     hashes: List[HashDecl] = field(default_factory=list)
     handlers: List[HandlerNode] = field(default_factory=list)
+    includes: List[IncludeDecl] = field(default_factory=list)
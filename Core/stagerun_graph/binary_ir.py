@@ -0,0 +1,495 @@
+# Core/stagerun_graph/binary_ir.py
+"""
+Binary IR
+---------
+
+Compact binary form of the export payload (same content and checksum as the
+JSON output), read through mmap with the handlers decoded on demand: opening
+a file reads the header, the string offsets and the payload metadata, and a
+handler record is only decoded (and its crc checked) when it is accessed.
+
+The checksum is verified as a Merkle tree (see merkle.py), following the
+lazy decoding: on open, the stored section hashes against the checksum and
+the metadata sections; on first access, each handler against its stored
+leaf hash.
+
+File layout (little endian):
+    header    MAGIC, format version, counts, section offsets, crc32 of the
+              strings + meta sections, sha256 checksum of the payload
+    strings   u32 offsets[n + 1] + utf-8 blob: every identifier (ops, arg and
+              effect names, labels, handler ids, ...) is stored once
+    meta      tagged value: payload without "checksum" ("handlers" -> null,
+              to keep the key order), with the "merkle" hashes
+    index     per handler: u32 id, u64 offset, u32 size, u32 crc32
+    handlers  per handler:
+                u32 n_labels, n_nodes, n_edges, flags, heap_size
+                labels  n_labels x (u32 label, u32 n_nodes)
+                nodes   n_nodes  x (u32 id, u32 op, u32 args, u32 effect,
+                                    u16 n_reads, u16 n_writes, u16 n_uses, u16 flags)
+                edges   n_edges  x (u32 src, u32 dst, u32 dep)
+                heap    tagged values (keys, default_action, pos, other handler
+                        fields, node args) and the effect string ids
+
+Tagged values: u8 tag + data (null, false, true, i64, f64, string id,
+list, dict, big int as decimal string id).
+"""
+
+from __future__ import annotations
+import json
+import mmap
+import struct
+import zlib
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from Core.stagerun_graph.merkle import (
+    UNHASHED_KEYS,
+    MerkleTree,
+    merkle_tree,
+    handler_hash,
+    section_hash,
+    handlers_section_hash,
+)
+
+MAGIC = b"SRIR"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIQQQQI32s")
+_INDEX = struct.Struct("<IQII")
+_HANDLER = struct.Struct("<5I")
+_LABEL = struct.Struct("<2I")
+_NODE = struct.Struct("<4I4H")
+_EDGE = struct.Struct("<3I")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+NO_STRING = 0xFFFFFFFF
+
+# handler / node flags
+GENERIC = 1             # stored as one tagged value
+EDGES_GENERIC = 2       # edges stored as a tagged value in the heap
+
+_T_NULL, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, _T_STR, _T_LIST, _T_DICT, _T_BIGINT = range(9)
+
+_HANDLER_FIELDS = ["id", "keys", "default_action", "pos", "labels", "edges"]
+_NODE_FIELDS = ["id", "op", "args", "effect"]
+_EFFECT_FIELDS = ["reads", "writes", "uses"]
+_EDGE_FIELDS = ["src", "dst", "dep"]
+
+
+class BinaryIRError(Exception):
+    pass
+
+
+def is_binary_ir(path: str | Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# ============================================================
+# Writer
+# ============================================================
+
+def _u32_fits(v: Any) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool) and 0 <= v < NO_STRING
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+
+    def sid(self, s: str) -> int:
+        sid = self.strings.get(s)
+        if sid is None:
+            sid = self.strings[s] = len(self.strings)
+        return sid
+
+    def value(self, buf: bytearray, v: Any) -> None:
+        if v is None:
+            buf.append(_T_NULL)
+        elif v is False:
+            buf.append(_T_FALSE)
+        elif v is True:
+            buf.append(_T_TRUE)
+        elif isinstance(v, int):
+            if -(1 << 63) <= v < (1 << 63):
+                buf.append(_T_INT)
+                buf += _I64.pack(v)
+            else:
+                buf.append(_T_BIGINT)
+                buf += _U32.pack(self.sid(str(v)))
+        elif isinstance(v, float):
+            buf.append(_T_FLOAT)
+            buf += _F64.pack(v)
+        elif isinstance(v, str):
+            buf.append(_T_STR)
+            buf += _U32.pack(self.sid(v))
+        elif isinstance(v, (list, tuple)):
+            buf.append(_T_LIST)
+            buf += _U32.pack(len(v))
+            for item in v:
+                self.value(buf, item)
+        elif isinstance(v, dict):
+            buf.append(_T_DICT)
+            buf += _U32.pack(len(v))
+            for k, item in v.items():
+                # same key conversion as json.dumps
+                buf += _U32.pack(self.sid(k if isinstance(k, str) else json.dumps(k)))
+                self.value(buf, item)
+        else:
+            raise BinaryIRError(f"Cannot encode {type(v).__name__} value {v!r}")
+
+    def _compact_node(self, n: Any) -> bool:
+        if not isinstance(n, dict) or list(n) != _NODE_FIELDS or not _u32_fits(n["id"]):
+            return False
+        if n["op"] is not None and not isinstance(n["op"], str):
+            return False
+        eff = n["effect"]
+        return isinstance(eff, dict) and list(eff) == _EFFECT_FIELDS and all(
+            isinstance(eff[k], list) and len(eff[k]) < 0xFFFF and all(isinstance(s, str) for s in eff[k])
+            for k in _EFFECT_FIELDS
+        )
+
+    def handler(self, h: Dict[str, Any]) -> bytes:
+        heap = bytearray()
+
+        labels = h.get("labels")
+        compact = (
+            isinstance(h, dict) and list(h)[:len(_HANDLER_FIELDS)] == _HANDLER_FIELDS
+            and isinstance(labels, dict) and all(isinstance(ns, list) for ns in labels.values())
+        )
+        if not compact:
+            self.value(heap, h)
+            return _HANDLER.pack(0, 0, 0, GENERIC, len(heap)) + heap
+
+        edges = h["edges"]
+        compact_edges = isinstance(edges, list) and all(
+            isinstance(e, dict) and list(e) == _EDGE_FIELDS
+            and _u32_fits(e["src"]) and _u32_fits(e["dst"]) and isinstance(e["dep"], str)
+            for e in edges
+        )
+        flags = 0 if compact_edges else EDGES_GENERIC
+
+        self.value(heap, h["keys"])
+        self.value(heap, h["default_action"])
+        self.value(heap, h["pos"])
+        self.value(heap, {k: v for k, v in h.items() if k not in _HANDLER_FIELDS})
+        if not compact_edges:
+            self.value(heap, edges)
+
+        label_recs = bytearray()
+        node_recs = bytearray()
+        n_nodes = 0
+        for label, nodes in labels.items():
+            label_recs += _LABEL.pack(self.sid(label), len(nodes))
+            for n in nodes:
+                n_nodes += 1
+                if not self._compact_node(n):
+                    args = len(heap)
+                    self.value(heap, n)
+                    node_recs += _NODE.pack(0, NO_STRING, args, 0, 0, 0, 0, GENERIC)
+                    continue
+
+                args = len(heap)
+                self.value(heap, n["args"])
+                eff = n["effect"]
+                effect = len(heap)
+                for k in _EFFECT_FIELDS:
+                    for s in eff[k]:
+                        heap += _U32.pack(self.sid(s))
+                op = NO_STRING if n["op"] is None else self.sid(n["op"])
+                node_recs += _NODE.pack(n["id"], op, args, effect,
+                                        len(eff["reads"]), len(eff["writes"]), len(eff["uses"]), 0)
+
+        edge_recs = bytearray()
+        if compact_edges:
+            for e in edges:
+                edge_recs += _EDGE.pack(e["src"], e["dst"], self.sid(e["dep"]))
+
+        return b"".join((
+            _HANDLER.pack(len(labels), n_nodes, len(edges) if compact_edges else 0, flags, len(heap)),
+            label_recs, node_recs, edge_recs, heap,
+        ))
+
+
+def encode_binary_ir(payload: Dict[str, Any], checksum: str) -> bytes:
+    """Binary IR of `payload` (export payload without checksum)."""
+    enc = _Encoder()
+    handlers = payload.get("handlers") or []
+
+    records = [enc.handler(h) for h in handlers]
+    ids = [enc.sid(h["id"]) if isinstance(h, dict) and isinstance(h.get("id"), str) else NO_STRING for h in handlers]
+
+    meta = bytearray()
+    enc.value(meta, {k: (None if k == "handlers" else v) for k, v in payload.items() if k != "checksum"})
+
+    blobs = [s.encode("utf-8") for s in enc.strings]
+    offsets, pos = [], 0
+    for b in blobs:
+        offsets.append(pos)
+        pos += len(b)
+    offsets.append(pos)
+    strings = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(blobs)
+
+    strings_off = _HEADER.size
+    meta_off = strings_off + len(strings)
+    index_off = meta_off + len(meta)
+    handlers_off = index_off + _INDEX.size * len(records)
+
+    index = bytearray()
+    pos = handlers_off
+    for sid, rec in zip(ids, records):
+        index += _INDEX.pack(sid, pos, len(rec), zlib.crc32(rec))
+        pos += len(rec)
+
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, len(blobs), len(records),
+        strings_off, meta_off, index_off, handlers_off,
+        zlib.crc32(meta, zlib.crc32(strings)), bytes.fromhex(checksum),
+    )
+    return b"".join((header, strings, meta, index, *records))
+
+
+def write_binary_ir(payload: Dict[str, Any], output_path: str | Path) -> str:
+    """
+    Writes `payload` as binary IR and returns its checksum (the same one the
+    JSON export of `payload` would carry).
+    """
+    payload = {k: v for k, v in payload.items() if k not in UNHASHED_KEYS}
+    tree = merkle_tree(payload)
+    checksum = tree.root
+    out_path = Path(output_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(encode_binary_ir({**payload, "merkle": tree.to_dict()}, checksum))
+    return checksum
+
+
+# ============================================================
+# Loader
+# ============================================================
+
+class _Handlers(Sequence):
+    """Handlers of a BinaryIR, decoded on first access."""
+
+    def __init__(self, ir: "BinaryIR"):
+        self._ir = ir
+        self._cache: Dict[int, Dict[str, Any]] = {}
+        self._by_id: Dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return self._ir.n_handlers
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        h = self._cache.get(i)
+        if h is None:
+            h = self._cache[i] = self._ir._decode_handler(i)
+        return h
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def by_id(self, handler_id: str) -> Dict[str, Any]:
+        if self._by_id is None:
+            self._by_id = {self._ir.handler_id(i): i for i in range(len(self))}
+        return self[self._by_id[handler_id]]
+
+
+class BinaryIR(Mapping):
+    """
+    Read-only view of a binary IR file with the same keys as the JSON payload
+    (including "checksum"); "handlers" is a lazily decoded sequence.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < _HEADER.size:
+            raise BinaryIRError(f"{self.path.name}: truncated binary IR")
+        (magic, version, _, self.n_strings, self.n_handlers,
+         strings_off, meta_off, index_off, self._handlers_off, crc, checksum) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise BinaryIRError(f"{self.path.name}: not a binary IR file")
+        if version != FORMAT_VERSION:
+            raise BinaryIRError(f"{self.path.name}: unsupported binary IR version {version}")
+        if zlib.crc32(self._mm[strings_off:index_off]) != crc:
+            raise BinaryIRError(f"{self.path.name}: corrupted string table/metadata")
+
+        self.checksum = checksum.hex()
+        self._index_off = index_off
+        self._str_offsets = struct.unpack_from(f"<{self.n_strings + 1}I", self._mm, strings_off)
+        self._str_base = strings_off + 4 * (self.n_strings + 1)
+        self._strings: List[str | None] = [None] * self.n_strings
+
+        meta, _ = self._value(meta_off)
+        self._tree = self._verify_meta(meta)
+        self.handlers = _Handlers(self)
+        self._payload = {"checksum": self.checksum, **meta, "handlers": self.handlers}
+
+    # --- Mapping ---
+    def __getitem__(self, key: str) -> Any:
+        return self._payload[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._payload)
+
+    def __len__(self) -> int:
+        return len(self._payload)
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self) -> "BinaryIR":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Fully decoded payload, equal to the JSON export."""
+        return {k: (list(v) if k == "handlers" else v) for k, v in self._payload.items()}
+
+    def handler_id(self, i: int) -> str | None:
+        sid, _, _, _ = _INDEX.unpack_from(self._mm, self._index_off + i * _INDEX.size)
+        return None if sid == NO_STRING else self._string(sid)
+
+    # --- verification ---
+    def _verify_meta(self, meta: Dict[str, Any]) -> MerkleTree:
+        """Stored Merkle hashes, checked against the checksum and the metadata sections."""
+        if not isinstance(meta.get("merkle"), dict):
+            raise BinaryIRError(f"{self.path.name}: missing Merkle hashes")
+        tree = MerkleTree.from_dict(meta["merkle"])
+        keys = [k for k in meta if k not in UNHASHED_KEYS]
+        if (
+            tree.root != self.checksum
+            or list(tree.sections) != keys
+            or len(tree.handlers) != self.n_handlers
+            or tree.sections["handlers"] != handlers_section_hash(tree.handlers)
+        ):
+            raise BinaryIRError(f"{self.path.name}: checksum mismatch (stored hashes modified)")
+        bad = [k for k in keys if k != "handlers" and tree.sections[k] != section_hash(k, meta[k])]
+        if bad:
+            raise BinaryIRError(f"{self.path.name}: checksum mismatch (modified: {', '.join(bad)})")
+        return tree
+
+    def _decode_handler(self, i: int) -> Dict[str, Any]:
+        handler = self._decode_record(i)
+        if handler_hash(handler) != self._tree.handlers[i]:
+            raise BinaryIRError(f"{self.path.name}: checksum mismatch (modified handler {i})")
+        return handler
+
+    # --- decoding ---
+    def _string(self, sid: int) -> str:
+        s = self._strings[sid]
+        if s is None:
+            start, end = self._str_offsets[sid], self._str_offsets[sid + 1]
+            s = self._strings[sid] = self._mm[self._str_base + start:self._str_base + end].decode("utf-8")
+        return s
+
+    def _value(self, pos: int) -> Tuple[Any, int]:
+        mm = self._mm
+        tag = mm[pos]
+        pos += 1
+        if tag == _T_NULL:
+            return None, pos
+        if tag == _T_FALSE:
+            return False, pos
+        if tag == _T_TRUE:
+            return True, pos
+        if tag == _T_INT:
+            return _I64.unpack_from(mm, pos)[0], pos + 8
+        if tag == _T_FLOAT:
+            return _F64.unpack_from(mm, pos)[0], pos + 8
+        if tag == _T_STR:
+            return self._string(_U32.unpack_from(mm, pos)[0]), pos + 4
+        if tag == _T_BIGINT:
+            return int(self._string(_U32.unpack_from(mm, pos)[0])), pos + 4
+        if tag == _T_LIST:
+            n = _U32.unpack_from(mm, pos)[0]
+            pos += 4
+            out = []
+            for _ in range(n):
+                v, pos = self._value(pos)
+                out.append(v)
+            return out, pos
+        if tag == _T_DICT:
+            n = _U32.unpack_from(mm, pos)[0]
+            pos += 4
+            out = {}
+            for _ in range(n):
+                k = self._string(_U32.unpack_from(mm, pos)[0])
+                out[k], pos = self._value(pos + 4)
+            return out, pos
+        raise BinaryIRError(f"{self.path.name}: bad value tag {tag} at {pos - 1}")
+
+    def _decode_record(self, i: int) -> Dict[str, Any]:
+        mm = self._mm
+        _, base, size, crc = _INDEX.unpack_from(mm, self._index_off + i * _INDEX.size)
+        if zlib.crc32(mm[base:base + size]) != crc:
+            raise BinaryIRError(f"{self.path.name}: corrupted handler record {i}")
+
+        n_labels, n_nodes, n_edges, flags, _ = _HANDLER.unpack_from(mm, base)
+        pos = base + _HANDLER.size
+        labels = [_LABEL.unpack_from(mm, pos + j * _LABEL.size) for j in range(n_labels)]
+        nodes_off = pos + n_labels * _LABEL.size
+        edges_off = nodes_off + n_nodes * _NODE.size
+        heap = edges_off + n_edges * _EDGE.size
+
+        if flags & GENERIC:
+            return self._value(heap)[0]
+
+        keys, p = self._value(heap)
+        default_action, p = self._value(p)
+        pos_clauses, p = self._value(p)
+        extra, p = self._value(p)
+        if flags & EDGES_GENERIC:
+            edges, p = self._value(p)
+        else:
+            edges = [
+                {"src": src, "dst": dst, "dep": self._string(dep)}
+                for src, dst, dep in _EDGE.iter_unpack(mm[edges_off:heap])
+            ]
+
+        out_labels: Dict[str, List[Dict[str, Any]]] = {}
+        k = 0
+        for label_sid, count in labels:
+            nodes = []
+            for _ in range(count):
+                nid, op, args, effect, nr, nw, nu, nflags = _NODE.unpack_from(mm, nodes_off + k * _NODE.size)
+                k += 1
+                if nflags & GENERIC:
+                    nodes.append(self._value(heap + args)[0])
+                    continue
+                sids = struct.unpack_from(f"<{nr + nw + nu}I", mm, heap + effect)
+                names = [self._string(s) for s in sids]
+                nodes.append({
+                    "id": nid,
+                    "op": None if op == NO_STRING else self._string(op),
+                    "args": self._value(heap + args)[0],
+                    "effect": {"reads": names[:nr], "writes": names[nr:nr + nw], "uses": names[nr + nw:]},
+                })
+            out_labels[self._string(label_sid)] = nodes
+
+        return {
+            "id": self.handler_id(i),
+            "keys": keys,
+            "default_action": default_action,
+            "pos": pos_clauses,
+            "labels": out_labels,
+            "edges": edges,
+            **extra,
+        }
+
+
+def load_binary_ir(path: str | Path) -> BinaryIR:
+    return BinaryIR(path)
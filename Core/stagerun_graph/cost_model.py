@@ -0,0 +1,424 @@
+# Core/stagerun_graph/cost_model.py
+"""
+Static Cost Model
+-----------------
+
+Estimates, offline, what a compiled program will consume on the engine
+described by a `Runtime/Engine/*_ISA.json` file:
+
+  - worst-case path length in stages (recirculated passes included)
+  - recirculations per handler
+  - table entries per stage/flow/table and per mechanism table
+  - write phases and the estimated per-packet latency
+
+The program is lowered by the controller's lowering rules and planned by its
+(greedy) Planner, write phases and the recirculations they cost included: the
+estimate is the plan the controller installs for the program on its own.
+
+Without the controller environment, a static model is used instead: every
+StageRun op is expanded into micro steps, each one a list of candidate micro
+instructions (primary first, then alternatives), placed greedily on the
+earliest later stage offering a candidate, recirculating to the head of the
+pipeline when none is left, and never on the write-phase stage. It ignores
+write→read hazards, so its recirculations, passes and stages are lower bounds
+(`CostEstimate.lower_bound`).
+"""
+
+from __future__ import annotations
+import bisect
+import math
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from Core.stagerun_isa import ISA
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+
+# Stage the Planner reserves for the final write phase (static model)
+WRITE_PHASE_STAGE = 10
+
+# Assumed latency of one pass through the pipeline (override per estimate)
+PASS_LATENCY_NS = 500.0
+
+Step = Tuple[str, ...]
+
+# ============================================================
+# StageRun op -> micro steps (static model)
+# ============================================================
+
+_FETCHERS = {
+    "IPV4.TTL": ("ipv4_ttl",),
+    "IPV4.LEN": ("ipv4_total_len",),
+    "IPV4.IHL": ("ipv4_ihl",),
+    "IPV4.DST": ("ipv4_dst",),
+    "IPV4.SRC": ("ipv4_src",),
+    "IPV4.PROTO": ("ipv4_protocol",),
+    "IPV4.ID": ("ipv4_identification",),
+    "TCP.ACKNO": ("tcp_ack", "tcp_ack_no"),
+    "TCP.ACK_NO": ("tcp_ack", "tcp_ack_no"),
+    "TCP.SEQNO": ("tcp_seq", "tcp_seq_no"),
+    "TCP.SEQ_NO": ("tcp_seq", "tcp_seq_no"),
+    "TCP.FLAGS": ("tcp_flags",),
+    "TCP.DATAOFFSET": ("tcp_data_offset",),
+}
+
+_FWD: Step = ("fwd", "fwd_ni")
+_SUM: Step = ("sum_ni", "sum")
+_ARITH: Step = ("sum", "arith_between_vars_v1_v2", "sum_ni")
+_FETCH_VAR: Step = ("fetch_v1", "fetch_v2", "speculative_fetch_v1", "speculative_fetch_v2")
+_FETCH_HASH: Step = ("fetch_hash_1", "speculative_fetch_hash_1")
+_COND: Step = (
+    "conditional_v1_v2", "conditional_v3_v4", "conditional_between_vars",
+    "speculative_conditional_v1_v2", "speculative_conditional_v3_v4", "speculative_conditional_between_vars",
+)
+_INDEX: Step = tuple(
+    f"{prefix}set_index_{src}_w_{val}"
+    for prefix in ("", "speculative_")
+    for src in ("hash_1", "hash_2", "ingress_port")
+    for val in ("const_val", "global_var_pkt_size")
+) + ("speculative_set_index_hash_1_w_var",)
+
+
+def _fetch(header: str) -> Step:
+    names = _FETCHERS.get(str(header).upper(), ())
+    return tuple(f"fetch_{n}" for n in names) + tuple(f"speculative_fetch_{n}" for n in names)
+
+
+def _reg_access(args: Dict[str, Any]) -> Step:
+    return ("reg_new_value",) if str(args.get("acess_type", "OLD")).upper() == "NEW" else ("reg_old_value",)
+
+
+def _comparisons(cond: Any) -> int:
+    if isinstance(cond, dict) and str(cond.get("op")) in ("&&", "||", "AND", "OR"):
+        return _comparisons(cond.get("left")) + _comparisons(cond.get("right"))
+    return 1
+
+
+def _cond_steps(cond: Any) -> List[Step]:
+    # each conditional micro instruction compares up to two operand pairs
+    return [_COND] * math.ceil(_comparisons(cond) / 2)
+
+
+def micro_steps(op: str, args: Dict[str, Any]) -> Optional[List[Step]]:
+    """Micro steps of one StageRun instruction (None if the op is not modeled)."""
+    args = args or {}
+
+    if op in (ISA.FWD.value, ISA.FWD_AND_ENQUEUE.value, ISA.DROP.value, ISA.RTS.value, ISA.JMP.value):
+        return [_FWD]
+    if op in (ISA.HINC.value, ISA.HTOVAR.value):
+        return [_fetch(args.get("header") or args.get("target")), _SUM]
+    if op in (ISA.HASSIGN.value, ISA.INC.value):
+        return [_SUM]
+    if op == ISA.VTOHEADER.value:
+        return [_FETCH_VAR, _SUM]
+    if op == ISA.HASHTOVAR.value:
+        return [_FETCH_HASH, _SUM]
+    if op in (ISA.MGET.value, ISA.MINC.value):
+        return [_INDEX, _reg_access(args)]
+    if op == ISA.MSET.value:
+        return [_INDEX, ("reg_new_value",)]
+    if op == ISA.SUM.value:
+        return [_ARITH]
+    if op == ISA.SUB.value:
+        return [("negate",), _ARITH]
+    if op == ISA.MUL.value:
+        return [("mul_4x",)]
+    if op == ISA.PADTTERN.value:
+        return [("init_pad", "initialize_pad_ni")]
+    if op in (ISA.CLONE.value, ISA.ACTIVATE.value):
+        return [("init_activate", "initialize_activate_ni")]
+    if op == ISA.BRCOND.value:
+        return _cond_steps(args.get("cond"))
+    if op == ISA.IF.value:
+        # worst case: every condition, then every branch body
+        steps: List[Step] = []
+        for br in args.get("branches") or []:
+            steps.extend(_cond_steps(br.get("condition")))
+        for body in [br.get("body") or [] for br in args.get("branches") or []] + [args.get("else_body") or []]:
+            for instr in body:
+                steps.extend(micro_steps(instr.get("op"), instr.get("args")) or [])
+        return steps
+    return None
+
+
+# ============================================================
+# ISA index
+# ============================================================
+
+class IsaIndex:
+    """Micro instruction -> slots (stage, flow, table) offering it, by stage (static model)."""
+
+    def __init__(self, isa: Dict[str, Any]):
+        self.stages: List[int] = []
+        self._slots: Dict[str, List[Tuple[int, str, str]]] = {}
+
+        for stage_name, flows in (isa.get("pipeline") or {}).items():
+            s_idx = int(stage_name.lstrip("s"))
+            self.stages.append(s_idx)
+            if any(isinstance(v, list) for v in flows.values()):
+                flows = {"f1": flows}       # single-flow ISAs (v1.6): stage -> tables
+            for flow_name, tables in flows.items():
+                for table_name, instr_list in tables.items():
+                    if not isinstance(instr_list, list):
+                        continue
+                    for instr in instr_list:
+                        self._slots.setdefault(instr, []).append((s_idx, flow_name, table_name))
+
+        self.stages.sort()
+        self._slot_stages: Dict[str, List[int]] = {}
+        for instr, slots in self._slots.items():
+            slots.sort()
+            self._slot_stages[instr] = [s for s, _, _ in slots]
+
+    @property
+    def num_stages(self) -> int:
+        return self.stages[-1] if self.stages else 0
+
+    def supports(self, step: Step) -> bool:
+        return any(c in self._slots for c in step)
+
+    def first_slot(self, step: Step, start_stage: int, skip_stage: int | None = None) -> Optional[Tuple[int, str, str, str]]:
+        """Earliest (stage, flow, table, instr) >= start_stage offering a candidate of `step`."""
+        best = None
+        for cand in step:
+            stages = self._slot_stages.get(cand)
+            if not stages:
+                continue
+            i = bisect.bisect_left(stages, start_stage)
+            while i < len(stages) and stages[i] == skip_stage:
+                i += 1
+            if i < len(stages) and (best is None or stages[i] < best[0]):
+                best = (*self._slots[cand][i], cand)
+        return best
+
+
+# ============================================================
+# Costs
+# ============================================================
+
+@dataclass
+class HandlerCost:
+    handler: str
+    micro_instrs: int = 0
+    stages: int = 0                 # worst-case path length, all passes
+    passes: int = 1
+    recirculations: int = 0
+    latency_ns: float = 0.0
+    unsupported: List[str] = field(default_factory=list)    # no candidate in the ISA
+    unmodeled: List[str] = field(default_factory=list)      # ops without a micro mapping
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+@dataclass
+class CostEstimate:
+    program: str
+    isa: str
+    pass_latency_ns: float
+    handlers: List[HandlerCost] = field(default_factory=list)
+    table_entries: Dict[str, int] = field(default_factory=dict)       # "s<N>.<flow>.<table>" -> entries
+    mechanism_entries: Dict[str, int] = field(default_factory=dict)   # pre_filter, generic_fwd, pos_filter, ...
+    write_phases: List[int] = field(default_factory=list)
+    # static model: recirculations, passes and stages may be higher once planned
+    lower_bound: bool = False
+
+    @property
+    def fits(self) -> bool:
+        return not any(h.unsupported for h in self.handlers)
+
+    @property
+    def worst(self) -> Optional[HandlerCost]:
+        return max(self.handlers, key=lambda h: (h.stages, h.passes), default=None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        worst = self.worst
+        return {
+            "program": self.program,
+            "isa": self.isa,
+            "fits": self.fits,
+            "lower_bound": self.lower_bound,
+            "pass_latency_ns": self.pass_latency_ns,
+            "worst_case_stages": worst.stages if worst else 0,
+            "worst_case_latency_ns": worst.latency_ns if worst else 0.0,
+            "recirculations": sum(h.recirculations for h in self.handlers),
+            "write_phases": self.write_phases,
+            "handlers": [h.to_dict() for h in self.handlers],
+            "table_entries": self.table_entries,
+            "mechanism_entries": self.mechanism_entries,
+        }
+
+    def format(self) -> str:
+        lines = [f"Estimate for '{self.program}' on {self.isa} (pass latency {self.pass_latency_ns:g} ns)"]
+        if self.lower_bound:
+            lines.append("  lower bound: static model (no controller environment), write phases not planned")
+        lines.append(f"  {'handler':<28}{'micro':>7}{'stages':>8}{'passes':>8}{'recirc':>8}{'latency_ns':>12}")
+        for h in self.handlers:
+            lines.append(f"  {h.handler:<28}{h.micro_instrs:>7}{h.stages:>8}{h.passes:>8}{h.recirculations:>8}{h.latency_ns:>12g}")
+        worst = self.worst
+        if worst:
+            lines.append(f"  worst case: {worst.handler} ({worst.stages} stages, {worst.passes} pass(es), {worst.latency_ns:g} ns)")
+        lines.append(f"  write phases: {', '.join(f's{s}' for s in self.write_phases) or '-'}")
+        lines.append("  table entries: " + (", ".join(f"{k}={v}" for k, v in self.table_entries.items()) or "-"))
+        lines.append("  mechanism entries: " + ", ".join(f"{k}={v}" for k, v in self.mechanism_entries.items()))
+        for h in self.handlers:
+            if h.unsupported:
+                lines.append(f"  UNSUPPORTED in {h.handler}: {', '.join(h.unsupported)}")
+            if h.unmodeled:
+                lines.append(f"  not modeled in {h.handler}: {', '.join(h.unmodeled)}")
+        lines.append(f"  fits: {'yes' if self.fits else 'no'}")
+        return "\n".join(lines)
+
+
+# ============================================================
+# Estimate
+# ============================================================
+
+def _controller():
+    """The controller's deployer modules, None outside its environment."""
+    if str(CONTROLLER_DIR) not in sys.path:
+        sys.path.insert(0, str(CONTROLLER_DIR))
+    try:
+        from lib.controller.deployer import hash_units, micro_instruction, planner, target
+    except Exception:
+        return None
+    return hash_units, micro_instruction, planner, target
+
+
+def _planned_handlers(compiled_app: Dict[str, Any], isa: Dict[str, Any], controller,
+                      entries: Dict[Tuple[int, str, str], int], pass_latency_ns: float) -> Tuple[List[HandlerCost], List[int]]:
+    """Handler costs and write-phase stages of the controller's plan of `compiled_app`."""
+    hash_units, micro_instruction, planner, target = controller
+    graphs = target.stage_run_graphs(compiled_app)
+    costs = {g["graph_id"]: HandlerCost(handler=g["graph_id"], latency_ns=pass_latency_ns) for g in graphs}
+    num_stages = max((int(s.lstrip("s")) for s in isa.get("pipeline") or {}), default=0)
+
+    try:
+        units = hash_units.program_hash_units(compiled_app).of("")
+    except hash_units.HashUnitError as e:
+        for cost in costs.values():
+            cost.unsupported.append(str(e))
+        return list(costs.values()), []
+
+    # handlers the lowering rules reject are left out of the plan
+    mip = micro_instruction.MicroInstructionParser(isa=isa, manifest={}, port_resolver=target.symbolic_port,
+                                                   hash_units=units)
+    micro_graphs = []
+    for g in graphs:
+        try:
+            micro_graphs.extend(mip.to_micro([g]))
+        except micro_instruction.MicroInstructionError as e:
+            costs[g["graph_id"]].unsupported.append(str(e))
+    try:
+        plan = planner.Planner(isa=isa).plan(micro_graphs, pid=target.PID_PLACEHOLDER)
+    except Exception as e:
+        for g in micro_graphs:
+            costs[g.graph_id].unsupported.append(f"not placed: {e}")
+        return list(costs.values()), []
+
+    for g in plan.graphs:
+        cost = costs[g.graph_id]
+        recircs = [n for n in g.nodes.values() if n.instr.name == planner.RECIRC_INSTR]
+        # the last pass runs the flow the last recirculation moves to
+        last_flow = max((n.instr.kwargs["next_flow_id"] for n in recircs), default=0)
+        last_stage = 0
+        for n in g.nodes.values():
+            if n.instr.name == planner.RECIRC_INSTR or n.allocated_table == "write_phase_t":
+                continue
+            cost.micro_instrs += 1
+            if n.allocated_stage is None or n.allocated_flow is None or n.allocated_table is None:
+                continue
+            slot = (n.allocated_stage, n.allocated_flow, n.allocated_table)
+            entries[slot] = entries.get(slot, 0) + 1
+            if (n.flow_id or 0) >= last_flow:
+                last_stage = max(last_stage, n.allocated_stage)
+        cost.recirculations = len(recircs)
+        cost.passes = len(recircs) + 1
+        cost.stages = len(recircs) * num_stages + last_stage
+        cost.latency_ns = cost.passes * pass_latency_ns
+    return list(costs.values()), sorted(plan.stats.wp_reserved)
+
+
+def _estimate_handler(handler: Dict[str, Any], index: IsaIndex, entries: Dict[Tuple[int, str, str], int],
+                      pass_latency_ns: float) -> HandlerCost:
+    cost = HandlerCost(handler=handler["id"])
+    first_stage = index.stages[0] if index.stages else 1
+    stage = first_stage
+    last_stage = first_stage - 1
+
+    for nodes in (handler.get("labels") or {}).values():
+        for node in nodes:
+            op = node.get("op")
+            steps = micro_steps(op, node.get("args"))
+            if steps is None:
+                cost.unmodeled.append(str(op))
+                continue
+
+            for step in steps:
+                if not index.supports(step):
+                    cost.unsupported.append(f"{op}({'|'.join(step) or node.get('args')})")
+                    continue
+
+                slot = index.first_slot(step, stage, WRITE_PHASE_STAGE)
+                if slot is None:
+                    # recirculate: next pass starts at the head of the pipeline
+                    cost.recirculations += 1
+                    cost.passes += 1
+                    slot = index.first_slot(step, first_stage, WRITE_PHASE_STAGE)
+                    if slot is None:
+                        cost.unsupported.append(f"{op}({'|'.join(step)} only on s{WRITE_PHASE_STAGE})")
+                        continue
+
+                s_idx, flow, table, _ = slot
+                entries[(s_idx, flow, table)] = entries.get((s_idx, flow, table), 0) + 1
+                cost.micro_instrs += 1
+                stage = last_stage = s_idx
+                stage += 1
+
+    cost.stages = (cost.passes - 1) * index.num_stages + max(last_stage, 0)
+    cost.latency_ns = cost.passes * pass_latency_ns
+    return cost
+
+
+def estimate_cost(
+    compiled_app: Dict[str, Any],
+    isa: Dict[str, Any],
+    isa_name: str = "ISA",
+    pass_latency_ns: float = PASS_LATENCY_NS,
+) -> CostEstimate:
+    """
+    Estimate for a compiled program (single program view) on `isa`: its plan,
+    or the static model's lower bound without the controller environment.
+    """
+    est = CostEstimate(program=compiled_app.get("program", ""), isa=isa_name, pass_latency_ns=pass_latency_ns)
+    entries: Dict[Tuple[int, str, str], int] = {}
+
+    controller = _controller()
+    if controller is not None:
+        est.handlers, est.write_phases = _planned_handlers(compiled_app, isa, controller, entries, pass_latency_ns)
+    else:
+        index = IsaIndex(isa)
+        for handler in compiled_app.get("handlers", []):
+            est.handlers.append(_estimate_handler(handler, index, entries, pass_latency_ns))
+        est.write_phases = [WRITE_PHASE_STAGE] if compiled_app.get("handlers") else []
+        est.lower_bound = True
+
+    est.table_entries = {f"s{s}.{f}.{t}": n for (s, f, t), n in sorted(entries.items())}
+
+    handlers = compiled_app.get("handlers", [])
+    patterns = sum(
+        len((n.get("args") or {}).get("pattern") or [])
+        for h in handlers for nodes in (h.get("labels") or {}).values() for n in nodes
+        if n.get("op") == ISA.PADTTERN.value
+    )
+    est.mechanism_entries = {
+        "pre_filter": len(handlers),
+        "generic_fwd": sum(1 for h in handlers if h.get("default_action")),
+        "pos_filter": sum(len(h.get("pos") or []) for h in handlers) + sum(h.recirculations for h in est.handlers),
+        "pattern": patterns,
+        "write_phase": 1 if est.write_phases else 0,
+    }
+    return est
@@ -1,7 +1,22 @@
 # Compiler/py/stagerun_graph/effect_registry.py
+from typing import Any, Callable, Dict
+
 from .graph_core import StageRunEffect
 from Core.ast_nodes import *
 
+EffectFn = Callable[[Any], StageRunEffect]
+
+# Dispatch table: instruction type -> effect function (one dict lookup
+# instead of walking an isinstance chain for every instruction).
+_EFFECT_FNS: Dict[type, EffectFn] = {}
+
+def _effect(*types):
+    def register(fn: EffectFn) -> EffectFn:
+        for t in types:
+            _EFFECT_FNS[t] = fn
+        return fn
+    return register
+
 def _operand_reads(operand) -> set[str]:
     if not isinstance(operand, str):
         return set()
@@ -46,191 +61,153 @@ def _memory_index_reads(index) -> set[str]:
         return {f"hdr:{index}"}
     return {f"hash:{index}"}
 
-def effect_of_instr(instr) -> StageRunEffect:
+# --- PADTTERN ---
+@_effect(PadToPatternInstr)
+def _padttern(instr) -> StageRunEffect:
+    # altera o comprimento → len do header
+    return StageRunEffect(writes={"hdr:IPV4.LEN"})#, uses={"pattern"})
+
+# --- HTOVAR ---
+@_effect(CopyHeaderToVarInstr)
+def _htovar(instr) -> StageRunEffect:
+    return StageRunEffect(
+        reads={f"hdr:{instr.header}"},
+        writes={f"var:{instr.var}"}
+    )
+
+# --- VARTOH ---
+@_effect(CopyVarToHeaderInstr)
+def _vartoh(instr) -> StageRunEffect:
+    return StageRunEffect(
+        reads={f"var:{instr.var}"},
+        writes={f"hdr:{instr.header}"}
+    )
+
+# --- FWD / FWD_AND_ENQUEUE / DROP / CLONE ---
+@_effect(FwdInstr)
+def _fwd(instr) -> StageRunEffect:
+    return StageRunEffect(uses={f"port:{instr.port}"})
+
+@_effect(FwdAndEnqueueInstr, DropInstr, RtsInstr, CloneInstr)
+def _no_effect(instr) -> StageRunEffect:
+    # FWD_AND_ENQUEUE: uses={f"port:{instr.target}", f"queue:{instr.target}:{instr.qid}"}
+    # CLONE: uses={f"port:{dest}"}
+    return StageRunEffect()
 
-    # --- PADTTERN ---
-    if isinstance(instr, PadToPatternInstr):
-        # altera o comprimento → len do header
-        return StageRunEffect(writes={"hdr:IPV4.LEN"})#, uses={"pattern"})
-
-    # --- HTOVAR ---
-    if isinstance(instr, CopyHeaderToVarInstr):
-        return StageRunEffect(
-            reads={f"hdr:{instr.header}"},
-            writes={f"var:{instr.var}"}
-        )
-    
-    # --- HTOVAR ---
-    if isinstance(instr, CopyVarToHeaderInstr):
-        return StageRunEffect(
-            reads={f"var:{instr.var}"},
-            writes={f"hdr:{instr.header}"}
-        )
-
-    # --- FWD / FWD_AND_ENQUEUE / DROP / CLONE ---
-    if isinstance(instr, FwdInstr):
-        return StageRunEffect(uses={f"port:{instr.port}"})
-
-    if isinstance(instr, FwdAndEnqueueInstr):
-        return StageRunEffect()
-        # return StageRunEffect(uses={f"port:{instr.target}", f"queue:{instr.target}:{instr.qid}"})
-
-    if isinstance(instr, DropInstr):
-        return StageRunEffect()
-    
-    if isinstance(instr, RtsInstr):
-        return StageRunEffect()
-
-    if isinstance(instr, CloneInstr):
-        return StageRunEffect()
-        # dest = getattr(instr, "target", None) or getattr(instr, "dest", None)
-        # uses = {f"port:{dest}"} if dest else set()
-        # return StageRunEffect(uses=uses)
-
-    if isinstance(instr, ActivateInstr):
-        return StageRunEffect(uses={f"program:{instr.program}"})
-
-    # --- ASSIGN / HINC ---
-    if isinstance(instr, HeaderAssignInstr):
-        return StageRunEffect(writes={f"hdr:{instr.header}"})
-
-    if isinstance(instr, HeaderIncrementInstr):
-        return StageRunEffect(reads={f"hdr:{instr.header}"}, writes={f"hdr:{instr.reshdr}"})
-
-    # --- HASH / RANDOM ---
-    if isinstance(instr, CopyHashToVarInstr):
-        return StageRunEffect(writes={f"var:{instr.var}"}, uses={f"hash:{instr.hash}"})
-
-    if isinstance(instr, RandomInstr):
-        return StageRunEffect(writes={f"var:{instr.var}"})
-    
-    if isinstance(instr, TimeInstr):
-        return StageRunEffect(writes={f"var:{instr.resvar}"})
-
-    # --- MEMORY ---
-    if isinstance(instr, MemoryGetInstr):
-        return StageRunEffect(
-            reads=_memory_index_reads(instr.index),
-            writes={f"var:{instr.var}"},
-            uses={f"{instr.acess_type}"}
-        )
-
-    if isinstance(instr, MemorySetInstr):
-        return StageRunEffect(
-            # reads=_operand_reads(instr.index) | _operand_reads(instr.value),
-            reads=_memory_index_reads(instr.index),
-            writes={f"reg:{instr.reg}"},
-            # uses={f"mem_set:{instr.reg}"}
-        )
-
-    if isinstance(instr, MemoryIncInstr):
-        return StageRunEffect(
-            reads=_memory_index_reads(instr.index),
-            # reads=_operand_reads(instr.index) | _operand_reads(instr.increment) | {f"reg:{instr.reg}"},
-            writes={f"reg:{instr.reg}", f"var:{instr.var}"},
-            uses={f"{instr.acess_type}"}
-        )
-
-    # --- ARITHMETIC ---
-    if isinstance(instr, SubInstr):
-        return StageRunEffect(
-            reads={f"var:{instr.lvar}", f"var:{instr.rvar}"},
-            writes={f"var:{instr.resvar}"}
-        )
-
-    if isinstance(instr, SumInstr):
-        return StageRunEffect(
-            reads={f"var:{instr.lvar}", f"var:{instr.rvar}"},
-            writes={f"var:{instr.resvar}"}
-        )
-
-    if isinstance(instr, MulInstr):
-        return StageRunEffect(
-            reads={f"var:{instr.lvar}"},
-            writes={f"var:{instr.resvar}"}
-        )
-
-    if isinstance(instr, IncInstr):
-        return StageRunEffect(
-            reads={f"var:{instr.lvar}"},
-            writes={f"var:{instr.resvar}"}
-        )
-
-    # --- CONDITIONALS ---
-    if isinstance(instr, BrCondInstr):
-        return StageRunEffect(reads=_collect_bool_expr_reads(instr.cond), uses={f"label:{instr.label}"})
-
-    if isinstance(instr, JmpInstr):
-        return StageRunEffect(uses={f"label:{instr.label}"})
-
-    if isinstance(instr, IfNode):
-        reads = set()
-        writes = set()
-        uses = set()
-
-        for br in instr.branches:
-            reads |= _collect_bool_expr_reads(br.condition)
-            for inner in br.body:
-                inner_eff = effect_of_instr(inner)
-                reads |= inner_eff.reads
-                writes |= inner_eff.writes
-                uses |= inner_eff.uses
-
-        if instr.else_body:
-            for inner in instr.else_body:
-                inner_eff = effect_of_instr(inner)
-                reads |= inner_eff.reads
-                writes |= inner_eff.writes
-                uses |= inner_eff.uses
-
-        return StageRunEffect(reads=reads, writes=writes, uses=uses)
-
-    # # --- IF ---
-    # if isinstance(instr, IfNode):
-    #     def collect_vars(expr: BooleanExpression) -> set[str]:
-    #         """Recursively collect variable names used in a BooleanExpression."""
-    #         if expr is None:
-    #             return set()
-    #         vars = set()
-    #         # Caso base: left/right são strings
-    #         if isinstance(expr.left, str) and not expr.left.isdigit():
-    #             vars.add(expr.left)
-    #         if isinstance(expr.right, str) and not expr.right.isdigit():
-    #             vars.add(expr.right)
-    #         # Caso recursivo: sub-expressões
-    #         if isinstance(expr.left, BooleanExpression):
-    #             vars |= collect_vars(expr.left)
-    #         if isinstance(expr.right, BooleanExpression):
-    #             vars |= collect_vars(expr.right)
-    #         return vars
-        
-    #     reads = set()
-    #     writes = set()
-    #     uses = set()
-
-    #     # As variáveis lidas nas condições
-    #     for br in instr.branches:
-    #         if br.condition:
-    #             vars = collect_vars(br.condition)
-    #             reads |= {f"var:{v}" for v in vars}
-
-    #         # Efeitos das instruções dentro do corpo
-    #         for inner in br.body:
-    #             inner_eff = effect_of_instr(inner)
-    #             reads |= inner_eff.reads
-    #             writes |= inner_eff.writes
-    #             uses |= inner_eff.uses
-
-    #     # ELSE body
-    #     if instr.else_body:
-    #         for inner in instr.else_body:
-    #             inner_eff = effect_of_instr(inner)
-    #             reads |= inner_eff.reads
-    #             writes |= inner_eff.writes
-    #             uses |= inner_eff.uses
-
-    #     return StageRunEffect(reads=reads, writes=writes, uses=uses)
+@_effect(ActivateInstr)
+def _activate(instr) -> StageRunEffect:
+    return StageRunEffect(uses={f"program:{instr.program}"})
+
+# --- ASSIGN / HINC ---
+@_effect(HeaderAssignInstr)
+def _hassign(instr) -> StageRunEffect:
+    return StageRunEffect(writes={f"hdr:{instr.header}"})
+
+@_effect(HeaderIncrementInstr)
+def _hinc(instr) -> StageRunEffect:
+    return StageRunEffect(reads={f"hdr:{instr.header}"}, writes={f"hdr:{instr.reshdr}"})
+
+# --- HASH / RANDOM ---
+@_effect(CopyHashToVarInstr)
+def _hashtovar(instr) -> StageRunEffect:
+    return StageRunEffect(writes={f"var:{instr.var}"}, uses={f"hash:{instr.hash}"})
+
+@_effect(RandomInstr)
+def _random(instr) -> StageRunEffect:
+    return StageRunEffect(writes={f"var:{instr.var}"})
+
+@_effect(TimeInstr)
+def _time(instr) -> StageRunEffect:
+    return StageRunEffect(writes={f"var:{instr.resvar}"})
+
+# --- MEMORY ---
+@_effect(MemoryGetInstr)
+def _mem_get(instr) -> StageRunEffect:
+    return StageRunEffect(
+        reads=_memory_index_reads(instr.index),
+        writes={f"var:{instr.var}"},
+        uses={f"{instr.acess_type}"}
+    )
+
+@_effect(MemorySetInstr)
+def _mem_set(instr) -> StageRunEffect:
+    return StageRunEffect(
+        # reads=_operand_reads(instr.index) | _operand_reads(instr.value),
+        reads=_memory_index_reads(instr.index),
+        writes={f"reg:{instr.reg}"},
+        # uses={f"mem_set:{instr.reg}"}
+    )
+
+@_effect(MemoryIncInstr)
+def _mem_inc(instr) -> StageRunEffect:
+    return StageRunEffect(
+        reads=_memory_index_reads(instr.index),
+        # reads=_operand_reads(instr.index) | _operand_reads(instr.increment) | {f"reg:{instr.reg}"},
+        writes={f"reg:{instr.reg}", f"var:{instr.var}"},
+        uses={f"{instr.acess_type}"}
+    )
+
+# --- ARITHMETIC ---
+@_effect(SubInstr, SumInstr)
+def _binary_arith(instr) -> StageRunEffect:
+    return StageRunEffect(
+        reads={f"var:{instr.lvar}", f"var:{instr.rvar}"},
+        writes={f"var:{instr.resvar}"}
+    )
+
+@_effect(MulInstr, IncInstr)
+def _unary_arith(instr) -> StageRunEffect:
+    return StageRunEffect(
+        reads={f"var:{instr.lvar}"},
+        writes={f"var:{instr.resvar}"}
+    )
+
+# --- CONDITIONALS ---
+@_effect(BrCondInstr)
+def _br_cond(instr) -> StageRunEffect:
+    return StageRunEffect(reads=_collect_bool_expr_reads(instr.cond), uses={f"label:{instr.label}"})
+
+@_effect(JmpInstr)
+def _jmp(instr) -> StageRunEffect:
+    return StageRunEffect(uses={f"label:{instr.label}"})
+
+@_effect(IfNode)
+def _if(instr) -> StageRunEffect:
+    reads = set()
+    writes = set()
+    uses = set()
+
+    for br in instr.branches:
+        reads |= _collect_bool_expr_reads(br.condition)
+        for inner in br.body:
+            inner_eff = effect_of_instr(inner)
+            reads |= inner_eff.reads
+            writes |= inner_eff.writes
+            uses |= inner_eff.uses
+
+    if instr.else_body:
+        for inner in instr.else_body:
+            inner_eff = effect_of_instr(inner)
+            reads |= inner_eff.reads
+            writes |= inner_eff.writes
+            uses |= inner_eff.uses
+
+    return StageRunEffect(reads=reads, writes=writes, uses=uses)
+
+
+def _resolve_effect_fn(t: type) -> EffectFn | None:
+    """Subclasses fall back to the closest registered base class."""
+    for base in t.__mro__[1:]:
+        fn = _EFFECT_FNS.get(base)
+        if fn is not None:
+            _EFFECT_FNS[t] = fn
+            return fn
+    return None
 
+def effect_of_instr(instr) -> StageRunEffect:
+    fn = _EFFECT_FNS.get(type(instr)) or _resolve_effect_fn(type(instr))
+    if fn is not None:
+        return fn(instr)
 
     print("NONE Instruction Detected")
     print(type(instr))
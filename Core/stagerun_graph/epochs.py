@@ -0,0 +1,185 @@
+# Core/stagerun_graph/epochs.py
+"""
+Multi-Epoch Export
+------------------
+
+Compiles N variants (epochs) of the same program into a single image. Every
+variant must declare the same resources (ports, queues, vars, regs, hashes,
+setup); handlers that are identical in all variants are stored once.
+
+The controller plans the handlers of every epoch together (union_view) and
+installs them under one program id: the handlers shared by all epochs are
+installed once, and switching epochs only swaps the entries of the handlers
+of the old and new epoch instead of uninstalling/installing the whole
+program.
+
+Image layout (on top of the single-program schema):
+{
+    "checksum": str,
+    "program": str,
+    "isa_version": str,
+    "schema_version": int,
+    "epochs": [str, ...],                    # install order, first is the default
+    "handlers": [{..., "epochs": [str]}],    # handler + epochs it belongs to
+    "resources": {...},                      # shared by all epochs
+    "target": {...},                         # optional (--target), plan of the union view
+    "merkle": {...}                          # per-section/handler hashes (see merkle.py)
+}
+"""
+
+from __future__ import annotations
+import copy
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from Core.ast_nodes import ProgramNode
+from Core.stagerun_graph.exporter import _build_payload, _write_payload
+from Core.stagerun_graph.transitive_reduction import EdgeReductionStats
+from Core.stagerun_graph.merkle import stored_tree, handler_key
+
+
+class EpochError(Exception):
+    pass
+
+
+def _handler_key(handler: Dict[str, Any]) -> str:
+    return json.dumps(handler, sort_keys=True)
+
+
+def build_multi_epoch_payload(
+    variants: List[Tuple[str, ProgramNode]],
+    program_name: str,
+    schema_version: int = 1.0,
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    prebuilt: List[Dict[str, Dict[str, Any]]] | None = None,
+    jobs: int | None = 1,
+) -> Dict[str, Any]:
+    """
+    Merges the payloads of `variants` ((epoch_name, program) pairs) into a
+    single multi-epoch payload (without checksum). `prebuilt` optionally holds,
+    per variant, the handler fragments of its precompiled modules.
+    """
+    if not variants:
+        raise EpochError("At least one epoch is required")
+
+    names = [name for name, _ in variants]
+    if len(set(names)) != len(names):
+        raise EpochError(f"Duplicated epoch names: {names}")
+
+    resources = None
+    handlers: List[Dict[str, Any]] = []
+    index: Dict[str, Dict[str, Any]] = {}      # handler content -> merged handler
+
+    for i, (name, program) in enumerate(variants):
+        payload = _build_payload(program, program_name, schema_version, reduce_edges, edge_stats,
+                                 prebuilt[i] if prebuilt else None, jobs)
+
+        if resources is None:
+            resources = payload["resources"]
+        elif payload["resources"] != resources:
+            raise EpochError(f"Epoch '{name}' declares different resources than epoch '{names[0]}'")
+
+        for h in payload["handlers"]:
+            key = _handler_key(h)
+            merged = index.get(key)
+            if merged is None:
+                merged = index[key] = {**h, "epochs": []}
+                handlers.append(merged)
+            merged["epochs"].append(name)
+
+    # Handler ids must stay unique inside each epoch
+    for name in names:
+        ids = [h["id"] for h in handlers if name in h["epochs"]]
+        if len(ids) != len(set(ids)):
+            raise EpochError(f"Epoch '{name}' has duplicated handler ids")
+
+    return {
+        "program": program_name,
+        "isa_version": payload["isa_version"],
+        "schema_version": schema_version,
+        "epochs": names,
+        "handlers": handlers,
+        "resources": resources,
+    }
+
+
+def export_multi_epoch_graphs(
+    variants: List[Tuple[str, ProgramNode]],
+    program_name: str,
+    output_path: str | Path,
+    schema_version: int = 1.0,
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    prebuilt: List[Dict[str, Dict[str, Any]]] | None = None,
+    jobs: int | None = 1,
+) -> str:
+    """
+    Export N program variants as one multi-epoch image with a checksum field.
+    """
+    payload = build_multi_epoch_payload(variants, program_name, schema_version, reduce_edges, edge_stats, prebuilt, jobs)
+    return _write_payload(payload, output_path)
+
+
+def is_multi_epoch(compiled_app: Dict[str, Any]) -> bool:
+    return bool(compiled_app.get("epochs"))
+
+
+def shared_handlers(compiled_app: Dict[str, Any]) -> List[str]:
+    """Ids of the handlers present in every epoch."""
+    epochs = compiled_app.get("epochs") or []
+    return [h["id"] for h in compiled_app["handlers"] if len(h.get("epochs", [])) == len(epochs)]
+
+
+def select_epoch(compiled_app: Dict[str, Any], epoch: str) -> Dict[str, Any]:
+    """
+    Returns the single-program view of one epoch of a multi-epoch image
+    (same layout as a regular export, without checksum; "merkle" only holds
+    the hashes of its handlers).
+    """
+    if epoch not in (compiled_app.get("epochs") or []):
+        raise EpochError(f"Epoch '{epoch}' not present in program '{compiled_app.get('program')}'")
+
+    view = {k: copy.deepcopy(v) for k, v in compiled_app.items() if k not in ("checksum", "epochs", "handlers", "target", "merkle")}
+    view["program"] = f"{compiled_app['program']}@{epoch}"
+    selected = [i for i, h in enumerate(compiled_app["handlers"]) if epoch in h["epochs"]]
+    view["handlers"] = [
+        {k: v for k, v in compiled_app["handlers"][i].items() if k != "epochs"}
+        for i in selected
+    ]
+
+    # Hashes of the selected handlers (as stored in the image)
+    tree = stored_tree(compiled_app)
+    if tree is not None:
+        view["merkle"] = {"sections": {}, "handlers": [tree.handlers[i] for i in selected]}
+
+    return view
+
+
+def union_view(compiled_app: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the single-program view of every handler of a multi-epoch image,
+    as it is planned and installed (under one program id). The handlers of
+    only some epochs get their epochs in their id (merkle.handler_key), so
+    the ids stay unique; "handler_epochs" maps every handler id to its
+    epochs and "epoch_names" holds the epochs in install order. Without
+    checksum and "merkle" (the stored hashes are of the original ids).
+    """
+    epochs = compiled_app.get("epochs") or []
+    if not epochs:
+        raise EpochError(f"Program '{compiled_app.get('program')}' is not a multi-epoch image")
+
+    view = {k: copy.deepcopy(v) for k, v in compiled_app.items() if k not in ("checksum", "epochs", "handlers", "merkle")}
+    view["handlers"] = []
+    view["handler_epochs"] = {}
+    for h in compiled_app["handlers"]:
+        handler_id = h["id"] if len(h["epochs"]) == len(epochs) else handler_key(h)
+        view["handlers"].append({**{k: v for k, v in h.items() if k != "epochs"}, "id": handler_id})
+        view["handler_epochs"][handler_id] = list(h["epochs"])
+    view["epoch_names"] = list(epochs)
+
+    # Pre-planned image (--target): planned on this view
+    if "epochs" in (view.get("target") or {}):
+        del view["target"]
+    return view
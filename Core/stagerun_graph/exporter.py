@@ -24,10 +24,20 @@ import hashlib
 from pathlib import Path
 from typing import Any, Dict
 import dataclasses
+from functools import partial
 
 from Core.stagerun_graph.graph_builder import StageRunGraphBuilder
 from Core.stagerun_graph.graph_core import StageRunGraph, StageRunNode, StageRunEdge
-from Core.ast_nodes import IfNode, BooleanExpression, ProgramNode, LoopSetupDecl, PatternSetupDecl, PgenSetupDecl
+from Core.stagerun_graph.transitive_reduction import EdgeReductionStats, transitive_reduction
+from Core.stagerun_graph.parallel import map_handlers
+from Core.stagerun_graph.merkle import (
+    UNHASHED_KEYS,
+    MerkleTree,
+    iter_canonical,
+    leaf_hasher,
+    handlers_section_hash,
+)
+from Core.ast_nodes import TypedRef, IfNode, BooleanExpression, ProgramNode, LoopSetupDecl, PatternSetupDecl, PgenSetupDecl
 from Core.stagerun_isa import ISA
 
 # ============================================================
@@ -148,10 +158,60 @@ _instructions_dict = {
     "OutInstr": ISA.OUT,
 }
 
+# Per-class extractors (dataclasses.asdict looks the fields up and deep-copies
+# every value on each call)
+_NOT_A_DATACLASS = object()
+_fields_by_class: Dict[type, Any] = {}
+_instr_extractors: Dict[type, tuple[str | None, tuple[str, ...]]] = {}
+_SCALARS = (str, int, float, bool, type(None), TypedRef)
+
+
+def _fields_of(cls: type):
+    names = _fields_by_class.get(cls)
+    if names is None:
+        if dataclasses.is_dataclass(cls):
+            names = tuple(f.name for f in dataclasses.fields(cls))
+        else:
+            names = _NOT_A_DATACLASS
+        _fields_by_class[cls] = names
+    return names
+
+
+def _instr_extractor(cls: type) -> tuple[str | None, tuple[str, ...]]:
+    """(op, arg field names) of an instruction class; op is None if it has no ISA op."""
+    entry = _instr_extractors.get(cls)
+    if entry is None:
+        isa_op = _instructions_dict.get(cls.__name__)
+        names = _fields_of(cls)
+        if isa_op is None or names is _NOT_A_DATACLASS:
+            entry = (None, ())
+        else:
+            entry = (isa_op.value, names)
+        _instr_extractors[cls] = entry
+    return entry
+
+
+def _to_json_value(v: Any) -> Any:
+    """Same result as dataclasses.asdict for nested values (scalars are not copied)."""
+    cls = type(v)
+    if cls in _SCALARS:
+        return v
+    names = _fields_of(cls)
+    if names is not _NOT_A_DATACLASS:
+        return {name: _to_json_value(getattr(v, name)) for name in names}
+    if isinstance(v, list):
+        return [_to_json_value(x) for x in v]
+    if isinstance(v, tuple):
+        return tuple(_to_json_value(x) for x in v)
+    if isinstance(v, dict):
+        return {_to_json_value(k): _to_json_value(x) for k, x in v.items()}
+    return v
+
+
 def _serialize_instr(instr: Any) -> Dict[str, Any]:
     """
     Serialize any instruction object.
-    Automatically extracts dataclass fields as args.
+    Extracts dataclass fields as args (cached per class).
     Special cases (like IF) handled separately.
     """
 
@@ -175,23 +235,12 @@ def _serialize_instr(instr: Any) -> Dict[str, Any]:
             },
         }
 
-    # Generic path for dataclasses or objects with attributes
-    try:
-        op = _instructions_dict[type(instr).__name__].value
-        args = dataclasses.asdict(instr)
-    except:
-        op = None
-        args = None
-    # try:
-    # except TypeError:
-    #     # Fallback: generic attribute extraction
-    #     args = {
-    #         k: v
-    #         for k, v in vars(instr).items()
-    #         if not k.startswith("_") and not callable(v)
-    #     }
-
-    return {"op": op, "args": args or {}}
+    # Generic path: dataclass fields as args (classes outside the ISA map: no op)
+    op, names = _instr_extractor(type(instr))
+    if op is None:
+        return {"op": None, "args": {}}
+    args = {name: _to_json_value(getattr(instr, name)) for name in names}
+    return {"op": op, "args": args}
 
 
 
@@ -286,28 +335,40 @@ def _serialize_resources(program: ProgramNode):
 
     return resources
 
-def _build_stagerun_graphs(program: ProgramNode):
+def _build_handler_graph(h) -> tuple[StageRunGraph, list[tuple[str, int]], list[Any]]:
+    keys = h.keys or []
+    default_action = h.default_action if h.default_action else None
+
+    flat_body = []
+    label_sizes = []
+
+    if h.body and getattr(h.body, "blocks", None) is not None:
+        flat_body, label_sizes = _flatten_blocks(h.body)
+
+    g = StageRunGraphBuilder(graph_id=h.name).build(keys, default_action, flat_body)
+    return g, label_sizes, h.pos_clauses or []
+
+def _build_stagerun_graphs(program: ProgramNode, skip: set[str] | None = None):
     graphs = []
     label_sizes_by_handler = {}
     pos_clauses_by_handler = {}
 
     for h in program.handlers:
-        keys = h.keys or []
-        default_action = h.default_action if h.default_action else None
-
-        flat_body = []
-        label_sizes = []
-
-        if h.body and getattr(h.body, "blocks", None) is not None:
-            flat_body, label_sizes = _flatten_blocks(h.body)
-
-        g = StageRunGraphBuilder(graph_id=h.name).build(keys, default_action, flat_body)
+        if skip and h.name in skip:
+            continue
+        g, label_sizes, pos_clauses = _build_handler_graph(h)
         graphs.append(g)
         label_sizes_by_handler[h.name] = label_sizes
-        pos_clauses_by_handler[h.name] = h.pos_clauses or []
+        pos_clauses_by_handler[h.name] = pos_clauses
 
     return graphs, label_sizes_by_handler, pos_clauses_by_handler
 
+def _compile_handler(reduce_edges: bool, program: ProgramNode, h) -> tuple[Dict[str, Any], EdgeReductionStats | None]:
+    """Builds, reduces and serializes one handler (runs on the worker pool)."""
+    g, label_sizes, pos_clauses = _build_handler_graph(h)
+    stats = transitive_reduction(g) if reduce_edges else None
+    return _serialize_handler(g, label_sizes, pos_clauses), stats
+
 def _build_stagerun_resources(program: ProgramNode):
     # Build a resources summary for the controller/exporter
     resources = {
@@ -325,47 +386,129 @@ def _build_stagerun_resources(program: ProgramNode):
 # Main Export Function
 # ============================================================
 
-def export_stage_run_graphs(
+def _serialize_handlers(
     program: ProgramNode,
-    program_name: str,
-    output_path: str | Path,
-    schema_version: int = 1.0
-) -> str:
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    prebuilt: Dict[str, Dict[str, Any]] | None = None,
+    jobs: int | None = 1,
+) -> list[Dict[str, Any]]:
     """
-    Export program graphs and resources into a JSON file with a checksum field.
-    The checksum is computed over the JSON payload with the 'checksum' field removed.
+    Builds and serializes the handler graphs of `program`, in handler order.
+    Handlers found in `prebuilt` (name -> serialized handler, e.g. from a
+    precompiled module) are reused as-is. With `jobs` > 1 (0: one per CPU)
+    handlers are compiled on a process pool; the result is the same.
     """
+    prebuilt = prebuilt or {}
 
-    # 1) Build handler graphs
-    graphs, label_sizes_by_handler, pos_clauses_by_handler = _build_stagerun_graphs(program)
+    # 1) Build handler graphs, drop edges already implied by other dependency paths, serialize
+    todo = [i for i, h in enumerate(program.handlers) if h.name not in prebuilt]
+    results = map_handlers(partial(_compile_handler, reduce_edges), program, todo, jobs)
+
+    built = {}
+    for i, (handler, stats) in zip(todo, results):
+        built[program.handlers[i].name] = handler
+        if stats is not None and edge_stats is not None:
+            edge_stats.merge(stats)
+
+    return [prebuilt[h.name] if h.name in prebuilt else built[h.name] for h in program.handlers]
+
+
+def _build_payload(
+    program: ProgramNode,
+    program_name: str,
+    schema_version: int = 1.0,
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    prebuilt: Dict[str, Dict[str, Any]] | None = None,
+    jobs: int | None = 1,
+) -> Dict[str, Any]:
+    """Builds the export payload (without checksum) of a single program."""
 
     # 2) Build payload WITHOUT checksum first
-    payload = {
+    return {
         "program": program_name,
         "isa_version": ISA.VERSION.value,
         "schema_version": schema_version,
-        "handlers": [
-            _serialize_handler(
-                g,
-                label_sizes_by_handler.get(g.graph_id, []),
-                pos_clauses_by_handler.get(g.graph_id, []),
-            )
-            for g in graphs
-        ],
+        "handlers": _serialize_handlers(program, reduce_edges, edge_stats, prebuilt, jobs),
         "resources": _serialize_resources(program),
     }
 
-    # 3) Compute checksum over canonical JSON of payload WITHOUT checksum
-    json_bytes_no_checksum = json.dumps(payload, indent=2, sort_keys=False).encode("utf-8")
-    checksum = _compute_checksum_bytes(json_bytes_no_checksum)
 
-    # 4) Insert checksum into payload and serialize final JSON
-    payload_with_checksum = {"checksum": checksum, **payload}
-    json_bytes = json.dumps(payload_with_checksum, indent=2, sort_keys=False).encode("utf-8")
+_CHECKSUM_SLOT = b'{\n  "checksum": "'
+
+
+def _indent(chunk: bytes, level: int) -> bytes:
+    """Canonical (top-level) JSON bytes re-indented for `level` (newlines only come from indentation)."""
+    return chunk.replace(b"\n", b"\n" + b"  " * level)
+
+
+def _stream_value(f, value: Any, hasher, level: int) -> None:
+    for chunk in iter_canonical(value):
+        hasher.update(chunk)
+        f.write(_indent(chunk, level))
 
-    # 5) Write output: force name out.json if output_path is a directory
+
+def _write_payload(payload: Dict[str, Any], output_path: str | Path) -> str:
+    """
+    Writes `payload` with a leading checksum field and returns the checksum
+    (Merkle root of the payload, see merkle.py). The per-section and
+    per-handler hashes are written in a trailing "merkle" field.
+
+    Single pass: every section (and every handler) is streamed to the file
+    in its canonical form while being hashed; the root is then written into
+    the slot reserved for it at the top of the file.
+    """
+    payload = {k: v for k, v in payload.items() if k not in UNHASHED_KEYS}
     out_path = Path(output_path)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_bytes(json_bytes)
+
+    tree = MerkleTree()
+    with out_path.open("wb") as f:
+        f.write(_CHECKSUM_SLOT + b"0" * 64 + b'"')
+        for key, value in payload.items():
+            f.write(b',\n  ' + json.dumps(key).encode("utf-8") + b': ')
+            if key != "handlers":
+                h = leaf_hasher(key)
+                _stream_value(f, value, h, 1)
+                tree.sections[key] = h.hexdigest()
+                continue
+
+            # handlers: one leaf per handler
+            for i, handler in enumerate(value):
+                f.write(b'[\n    ' if i == 0 else b',\n    ')
+                h = leaf_hasher()
+                _stream_value(f, handler, h, 2)
+                tree.handlers.append(h.hexdigest())
+            f.write(b'\n  ]' if value else b'[]')
+            tree.sections[key] = handlers_section_hash(tree.handlers)
+
+        f.write(b',\n  "merkle": ' + _indent(json.dumps(tree.to_dict(), indent=2).encode("utf-8"), 1) + b'\n}')
+        checksum = tree.root
+        f.seek(len(_CHECKSUM_SLOT))
+        f.write(checksum.encode("ascii"))
 
     return checksum
+
+
+def export_stage_run_graphs(
+    program: ProgramNode,
+    program_name: str,
+    output_path: str | Path,
+    schema_version: int = 1.0,
+    reduce_edges: bool = True,
+    edge_stats: EdgeReductionStats | None = None,
+    prebuilt: Dict[str, Dict[str, Any]] | None = None,
+    jobs: int | None = 1,
+) -> str:
+    """
+    Export program graphs and resources into a JSON file with a checksum field
+    (Merkle root over the sections and handlers of the payload).
+
+    When `reduce_edges` is set, transitively implied edges are removed before
+    serialization; the edge counts are accumulated into `edge_stats` if given.
+    Handlers in `prebuilt` (serialized fragments of precompiled modules) are not rebuilt.
+    `jobs` > 1 compiles the handlers on that many processes (same output).
+    """
+    payload = _build_payload(program, program_name, schema_version, reduce_edges, edge_stats, prebuilt, jobs)
+    return _write_payload(payload, output_path)
@@ -1,5 +1,5 @@
 # Compiler/py/stagerun_graph/graph_builder.py
-from .graph_core import StageRunGraph, StageRunNode
+from .graph_core import StageRunGraph, StageRunNode, SymbolTable, iter_bits
 from .effect_registry import effect_of_instr
 from Core.ast_nodes import *
 from Core.stagerun_isa import ISA
@@ -10,8 +10,10 @@ class StageRunGraphBuilder:
         self._next_id = 1
         self.nodes = {}
         self.edges = []
-        self.last_writer = {}        # mapa de última escrita por variável
+        self.symbols = SymbolTable() # recurso ("var:x", "hdr:...") -> id
+        self.last_writer = {}        # mapa de última escrita por símbolo
         self.resource_tail = {}      # última instrução que usou recurso
+        self._written = 0            # bitset dos símbolos com escritor conhecido
 
         # Necessary for PreFilter 
         self.keys = []
@@ -28,7 +30,7 @@ class StageRunGraphBuilder:
         self.edges.append((src, dst, dep))
 
     def _finalize(self) -> StageRunGraph:
-        g = StageRunGraph(graph_id=self.graph_id)
+        g = StageRunGraph(graph_id=self.graph_id, symbols=self.symbols)
         
         # 1. Add Keys
         g.keys = self.keys
@@ -45,27 +47,31 @@ class StageRunGraphBuilder:
     def _build_instructions(self, instructions: list):
         # prev_nodes = []
         for instr in instructions:
-            eff = effect_of_instr(instr)
+            eff = effect_of_instr(instr).bind(self.symbols)
             node = self._new_node(instr, eff)
 
             # 1. ligar sequencialmente (fallthrough)
             # for p in prev_nodes:
             #     self._add_edge(p, node.id, "FALLTHROUGH")
 
-            # 2. dependências de dados
-            for read in eff.reads:
-                if read in self.last_writer:
-                    self._add_edge(self.last_writer[read], node.id, "DATA")
+            # 2. dependências de dados (só leituras com escritor anterior)
+            if eff.read_mask & self._written:
+                for sid in iter_bits(eff.read_mask & self._written):
+                    self._add_edge(self.last_writer[sid], node.id, "DATA")
 
             # 3. dependências de recursos (port, queue, pattern, etc.)
-            for res in eff.uses:
-                if res in self.resource_tail:
-                    self._add_edge(self.resource_tail[res], node.id, "RESOURCE")
-                self.resource_tail[res] = node.id
+            if eff.use_mask:
+                for sid in iter_bits(eff.use_mask):
+                    tail = self.resource_tail.get(sid)
+                    if tail is not None:
+                        self._add_edge(tail, node.id, "RESOURCE")
+                    self.resource_tail[sid] = node.id
 
             # atualizar escritores
-            for w in eff.writes:
-                self.last_writer[w] = node.id
+            if eff.write_mask:
+                for sid in iter_bits(eff.write_mask):
+                    self.last_writer[sid] = node.id
+                self._written |= eff.write_mask
 
             # prev_nodes = [node.id]
 
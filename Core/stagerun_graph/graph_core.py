@@ -1,9 +1,59 @@
 # Compiler/py/stagerun_graph/graph_core.py
 from dataclasses import dataclass, field
-from typing import Dict, List, Set, Optional, Literal, Any
+from typing import Dict, Iterable, List, Set, Optional, Literal, Any
 
 DepType = Literal["DATA", "CONTROL", "RESOURCE", "FALLTHROUGH"]
 
+
+class SymbolTable:
+    """
+    Interns resource names ("var:x", "hdr:IPV4.SRC", "reg:r", ...) into small
+    integer ids, so that a set of resources becomes an int bitset and
+    set intersection becomes a single AND.
+    """
+    __slots__ = ("_ids", "_names")
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, name: str) -> int:
+        sid = self._ids.get(name)
+        if sid is None:
+            sid = len(self._names)
+            self._ids[name] = sid
+            self._names.append(name)
+        return sid
+
+    def mask(self, names: Iterable[str]) -> int:
+        ids = self._ids
+        m = 0
+        for name in names:
+            sid = ids.get(name)
+            if sid is None:
+                sid = self.intern(name)
+            m |= 1 << sid
+        return m
+
+    def name(self, sid: int) -> str:
+        return self._names[sid]
+
+    def names(self, mask: int) -> List[str]:
+        """Resource names of a bitset, sorted (export order)."""
+        return sorted(self._names[sid] for sid in iter_bits(mask))
+
+
+def iter_bits(mask: int):
+    """Yields the set bit positions of `mask`, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
 @dataclass
 class StageRunEffect:
     """Effect (lê, escreve, usa) de uma instrução StageRun."""
@@ -11,6 +61,18 @@ class StageRunEffect:
     writes: Set[str] = field(default_factory=set)
     uses: Set[str] = field(default_factory=set)
 
+    # Bitsets over a SymbolTable (filled by `bind`)
+    read_mask: int = field(default=0, repr=False, compare=False)
+    write_mask: int = field(default=0, repr=False, compare=False)
+    use_mask: int = field(default=0, repr=False, compare=False)
+
+    def bind(self, symbols: SymbolTable) -> "StageRunEffect":
+        """Interns the resource names and fills the bitsets."""
+        self.read_mask = symbols.mask(self.reads)
+        self.write_mask = symbols.mask(self.writes)
+        self.use_mask = symbols.mask(self.uses)
+        return self
+
 @dataclass
 class StageRunNode:
     id: int
@@ -30,6 +92,7 @@ class StageRunGraph:
     edges: List[StageRunEdge] = field(default_factory=list)
     keys: List[Dict] = field(default_factory=list)
     default_action: Dict | None = None
+    symbols: SymbolTable = field(default_factory=SymbolTable, repr=False)
 
 
     def add_node(self, node: StageRunNode):
@@ -1,27 +1,53 @@
 # Runtime/Controller/py/importer.py
 import json
-import hashlib
 from pathlib import Path
 from Core.stagerun_graph.graph_core import StageRunGraph, StageRunNode, StageRunEdge
+from Core.stagerun_graph.binary_ir import BinaryIR, is_binary_ir
+from Core.stagerun_graph.merkle import MerkleTree, merkle_tree, legacy_checksum, stored_tree, handler_key
+
+
+def _mismatch_details(data: dict) -> str:
+    """Sections/handlers whose content no longer matches the hashes stored in the export."""
+    stored = stored_tree(data)
+    if stored is None:
+        return ""
+    actual = merkle_tree(data)
+    bad = [k for k in stored.sections if k != "handlers" and stored.sections[k] != actual.sections.get(k)]
+    bad += [handler_key(h) for h, x, y in zip(data["handlers"], stored.handlers, actual.handlers) if x != y]
+    return f" (modified: {', '.join(bad)})" if bad else " (stored hashes modified)"
 
-def _compute_checksum_bytes(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
 
 def load_stage_run_graphs(input_path: str | Path) -> dict:
     """
     Reads a StageRunGraph JSON with SHA-256 checksum header.
-    Returns a dictionary { program, schema_version, graphs[], resources{} }.
+    Returns a dictionary { checksum, program, schema_version, handlers[], resources{}, merkle{} }.
+    Binary IR files are mmap-ed instead: the returned mapping decodes the
+    handlers on access.
+
+    The checksum is verified against the Merkle root of the payload (or the
+    flat sha256 of exports written before the Merkle layout), and the stored
+    "merkle" hashes against the recomputed ones: the per-handler hashes are
+    used as cache keys by the controller (deployer/lowering_cache.py).
     """
     input_path = Path(input_path)
+    if is_binary_ir(input_path):
+        return BinaryIR(input_path)
+
     with input_path.open("rb") as f:
-        checksum = f.readline().strip().decode("utf-8")
-        blob = f.read()
+        data = json.load(f)
 
-    actual = _compute_checksum_bytes(blob)
+    checksum = data.get("checksum")
+    if "merkle" in data:
+        tree = merkle_tree(data)
+        actual = tree.root
+    else:
+        tree, actual = None, legacy_checksum(data)
     if actual != checksum:
-        raise ValueError(f"Checksum mismatch in {input_path.name}")
+        raise ValueError(f"Checksum mismatch in {input_path.name}{_mismatch_details(data)}")
+    if tree is not None and MerkleTree.from_dict(data["merkle"] or {}) != tree:
+        raise ValueError(f"Stale Merkle hashes in {input_path.name}{_mismatch_details(data)}")
 
-    return json.loads(blob.decode("utf-8"))
+    return data
 
 def load_graph_objects(input_path: str | Path) -> list[StageRunGraph]:
     """
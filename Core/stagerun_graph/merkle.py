@@ -0,0 +1,193 @@
+# Core/stagerun_graph/merkle.py
+"""
+Merkle Checksums
+----------------
+
+The checksum of an export is the root of a Merkle tree over its top-level
+sections, where the "handlers" section is itself a tree over the handlers:
+
+    handler leaf        = H(0x00 || canonical(handler))
+    section(k, v)       = H(0x00 || json(k) || ":" || canonical(v))
+    section("handlers") = H(0x00 || '"handlers":' || hex(tree(handler leaves)))
+    checksum            = tree(sections, in payload key order)
+
+    tree([])  = H("")
+    tree([x]) = x
+    tree(xs)  = tree([H(0x01 || a || b) for consecutive pairs] + odd last)
+
+with H = SHA-256 and canonical() the UTF-8 JSON of a value with indent=2,
+default separators, ASCII escapes and keys in insertion order (the layout
+of the exported file). "checksum" and "merkle" are not covered.
+
+Exports carry the intermediate hashes next to the checksum:
+    "merkle": {"sections": {key: hex}, "handlers": [hex, ...]}   # aligned with "handlers"
+so a reader can tell which handlers changed between two versions of a
+program, or which ones do not match the checksum, without rehashing.
+"""
+
+from __future__ import annotations
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List
+
+LEAF = b"\x00"
+NODE = b"\x01"
+
+# Not covered by the checksum
+UNHASHED_KEYS = ("checksum", "merkle")
+
+_CANONICAL_ENCODER = json.JSONEncoder(indent=2)
+_STREAM_CHUNK = 1 << 16
+
+
+def iter_canonical(value: Any) -> Iterator[bytes]:
+    """Canonical bytes of `value`, in chunks of about _STREAM_CHUNK bytes."""
+    buf, size = [], 0
+    for piece in _CANONICAL_ENCODER.iterencode(value):
+        buf.append(piece)
+        size += len(piece)
+        if size >= _STREAM_CHUNK:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def leaf_hasher(key: str | None = None):
+    """sha256 object primed for a handler leaf (key None) or a section."""
+    h = hashlib.sha256(LEAF)
+    if key is not None:
+        h.update(json.dumps(key).encode("utf-8") + b":")
+    return h
+
+
+def tree_root(hashes: Iterable[str]) -> str:
+    level = [bytes.fromhex(x) for x in hashes]
+    if not level:
+        return hashlib.sha256(b"").hexdigest()
+    while len(level) > 1:
+        nxt = [hashlib.sha256(NODE + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0].hex()
+
+
+def handler_hash(handler: Dict[str, Any]) -> str:
+    h = leaf_hasher()
+    for chunk in iter_canonical(handler):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def section_hash(key: str, value: Any) -> str:
+    h = leaf_hasher(key)
+    for chunk in iter_canonical(value):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def handlers_section_hash(handler_hashes: List[str]) -> str:
+    h = leaf_hasher("handlers")
+    h.update(tree_root(handler_hashes).encode("ascii"))
+    return h.hexdigest()
+
+
+@dataclass
+class MerkleTree:
+    sections: Dict[str, str] = field(default_factory=dict)
+    handlers: List[str] = field(default_factory=list)
+
+    @property
+    def root(self) -> str:
+        return tree_root(self.sections.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sections": self.sections, "handlers": self.handlers}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "MerkleTree":
+        return cls(sections=dict(d.get("sections") or {}), handlers=list(d.get("handlers") or []))
+
+
+def merkle_tree(payload: Dict[str, Any]) -> MerkleTree:
+    """Merkle tree of an export payload ("checksum"/"merkle" are ignored)."""
+    tree = MerkleTree()
+    for key, value in payload.items():
+        if key in UNHASHED_KEYS:
+            continue
+        if key == "handlers":
+            tree.handlers = [handler_hash(h) for h in value]
+            tree.sections[key] = handlers_section_hash(tree.handlers)
+        else:
+            tree.sections[key] = section_hash(key, value)
+    return tree
+
+
+def legacy_checksum(payload: Dict[str, Any]) -> str:
+    """Flat checksum of exports written before the Merkle layout (sha256 of the whole canonical form)."""
+    h = hashlib.sha256()
+    for chunk in iter_canonical({k: v for k, v in payload.items() if k not in UNHASHED_KEYS}):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+# ============================================================
+# Comparison
+# ============================================================
+
+def handler_key(handler: Dict[str, Any]) -> str:
+    """Identity of a handler across versions (id, plus its epochs in multi-epoch images)."""
+    epochs = handler.get("epochs")
+    return handler["id"] if epochs is None else f"{handler['id']}@{'+'.join(epochs)}"
+
+
+@dataclass
+class HandlerDiff:
+    unchanged: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    sections: List[str] = field(default_factory=list)     # changed top-level sections (other than handlers)
+
+    def format(self) -> str:
+        return (f"{len(self.unchanged)} unchanged, {len(self.changed)} changed, "
+                f"{len(self.added)} added, {len(self.removed)} removed handler(s)"
+                + (f"; changed sections: {', '.join(self.sections)}" if self.sections else ""))
+
+
+def stored_tree(compiled_app: Dict[str, Any]) -> MerkleTree | None:
+    """Merkle hashes carried by a loaded export, if it has them."""
+    merkle = compiled_app.get("merkle")
+    if not merkle or len(merkle.get("handlers") or []) != len(compiled_app.get("handlers") or []):
+        return None
+    return MerkleTree.from_dict(merkle)
+
+
+def diff_handlers(old: Dict[str, Any], new: Dict[str, Any]) -> HandlerDiff:
+    """
+    Handlers of `new` that are unchanged/changed/added with respect to `old`
+    (and the ones removed), from the stored hashes when both exports carry them.
+    """
+    old_tree = stored_tree(old) or merkle_tree(old)
+    new_tree = stored_tree(new) or merkle_tree(new)
+    old_hashes = {handler_key(h): x for h, x in zip(old.get("handlers") or [], old_tree.handlers)}
+
+    diff = HandlerDiff()
+    seen = set()
+    for h, x in zip(new.get("handlers") or [], new_tree.handlers):
+        key = handler_key(h)
+        seen.add(key)
+        if key not in old_hashes:
+            diff.added.append(key)
+        elif old_hashes[key] == x:
+            diff.unchanged.append(key)
+        else:
+            diff.changed.append(key)
+    diff.removed = [k for k in old_hashes if k not in seen]
+    diff.sections = [
+        k for k in dict.fromkeys([*old_tree.sections, *new_tree.sections])
+        if k != "handlers" and old_tree.sections.get(k) != new_tree.sections.get(k)
+    ]
+    return diff
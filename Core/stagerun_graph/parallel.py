@@ -0,0 +1,75 @@
+# Core/stagerun_graph/parallel.py
+"""
+Per-Handler Parallelism
+-----------------------
+
+Handlers are independent once the declarations are validated, so their
+validation and graph building/serialization can run on a process pool.
+
+The program is handed to every worker once, when the pool starts (inherited
+without copying where the 'fork' start method exists); tasks only carry
+handler indexes. Results are gathered back in handler order, so the output
+is the same for any number of workers.
+"""
+
+from __future__ import annotations
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+from Core.ast_nodes import ProgramNode
+
+# Program of the current worker process (read-only)
+_program: ProgramNode | None = None
+
+
+def resolve_jobs(jobs: int | None) -> int:
+    """Number of worker processes: None/1 -> in-process, 0 -> one per CPU."""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _init_worker(program: ProgramNode) -> None:
+    global _program
+    _program = program
+
+
+def _run(fn: Callable[[ProgramNode, Any], Any], index: int) -> Any:
+    return fn(_program, _program.handlers[index])
+
+
+def _run_chunk(fn: Callable[[ProgramNode, Any], Any], indexes: Sequence[int]) -> List[Any]:
+    return [_run(fn, i) for i in indexes]
+
+
+def map_handlers(
+    fn: Callable[[ProgramNode, Any], Any],
+    program: ProgramNode,
+    indexes: Sequence[int],
+    jobs: int | None = 1,
+) -> List[Any]:
+    """
+    fn(program, program.handlers[i]) for every i in `indexes`, in that order.
+    `fn` must be picklable (module level function or functools.partial of one).
+    Exceptions raised by `fn` must be picklable as well; the first one in
+    `indexes` order is re-raised.
+    """
+    workers = min(resolve_jobs(jobs), len(indexes))
+    if workers <= 1:
+        return [fn(program, program.handlers[i]) for i in indexes]
+
+    # A few chunks per worker: keeps the pool busy with uneven handlers
+    # without paying one round-trip per handler
+    n_chunks = min(len(indexes), workers * 4)
+    size = -(-len(indexes) // n_chunks)
+    chunks = [indexes[i:i + size] for i in range(0, len(indexes), size)]
+
+    ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(program,)) as pool:
+        futures = [pool.submit(_run_chunk, fn, chunk) for chunk in chunks]
+        return [r for f in futures for r in f.result()]
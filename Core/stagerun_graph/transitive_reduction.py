@@ -0,0 +1,137 @@
+# Core/stagerun_graph/transitive_reduction.py
+"""
+StageRunGraph Transitive Reduction
+----------------------------------
+
+The graph builder links every reader to the last writer of each resource,
+so many edges are already implied by a longer dependency path. Those edges
+are multiplied into a srcs x dsts cross product by the controller lowering
+and re-scanned by the planner.
+
+An edge (u, v, kind) is only removed when another path from u to v made of
+edges of the *same* kind exists. The per-kind reachability (e.g. the DATA-only
+topological order used by the planner) is therefore preserved. Surviving
+edges are kept as the original objects, in their original order.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .graph_core import StageRunGraph, StageRunEdge
+
+
+@dataclass
+class EdgeReductionStats:
+    """Edge counts before/after the reduction (accumulated over graphs)."""
+    graphs: int = 0
+    edges_before: int = 0
+    edges_after: int = 0
+    duplicates: int = 0
+    removed_by_kind: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def removed(self) -> int:
+        return self.edges_before - self.edges_after
+
+    def merge(self, other: "EdgeReductionStats") -> None:
+        self.graphs += other.graphs
+        self.edges_before += other.edges_before
+        self.edges_after += other.edges_after
+        self.duplicates += other.duplicates
+        for kind, n in other.removed_by_kind.items():
+            self.removed_by_kind[kind] = self.removed_by_kind.get(kind, 0) + n
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "graphs": self.graphs,
+            "edges_before": self.edges_before,
+            "edges_after": self.edges_after,
+            "removed": self.removed,
+            "duplicates": self.duplicates,
+            "removed_by_kind": dict(sorted(self.removed_by_kind.items())),
+        }
+
+
+def _redundant_pairs(edges: Iterable[StageRunEdge]) -> Set[Tuple[int, int]]:
+    """
+    Returns the (src, dst) pairs implied by a longer path within `edges`.
+    Reachability is kept as int bitsets indexed by topological position.
+    """
+    succ: Dict[int, List[int]] = {}
+    indeg: Dict[int, int] = {}
+    for e in edges:
+        succ.setdefault(e.src, []).append(e.dst)
+        succ.setdefault(e.dst, [])
+        indeg[e.dst] = indeg.get(e.dst, 0) + 1
+        indeg.setdefault(e.src, 0)
+
+    # Kahn (any topological order works for the reduction)
+    ready = [nid for nid, d in indeg.items() if d == 0]
+    order: List[int] = []
+    while ready:
+        nid = ready.pop()
+        order.append(nid)
+        for nxt in succ[nid]:
+            indeg[nxt] -= 1
+            if indeg[nxt] == 0:
+                ready.append(nxt)
+
+    if len(order) != len(succ):
+        # Cycle: leave this dependency kind untouched
+        return set()
+
+    pos = {nid: i for i, nid in enumerate(order)}
+    reach: Dict[int, int] = {}
+    redundant: Set[Tuple[int, int]] = set()
+
+    for nid in reversed(order):
+        acc = 0
+        # Closest successors first: anything reachable through them is implied
+        for nxt in sorted(succ[nid], key=pos.__getitem__):
+            bit = 1 << pos[nxt]
+            if acc & bit:
+                redundant.add((nid, nxt))
+            else:
+                acc |= reach[nxt] | bit
+        reach[nid] = acc
+
+    return redundant
+
+
+def transitive_reduction(graph: StageRunGraph) -> EdgeReductionStats:
+    """
+    Removes duplicate and transitively implied edges from `graph` in place.
+    """
+    stats = EdgeReductionStats(graphs=1, edges_before=len(graph.edges))
+
+    seen: Set[Tuple[int, int, str]] = set()
+    unique: List[StageRunEdge] = []
+    by_kind: Dict[str, List[StageRunEdge]] = {}
+    for e in graph.edges:
+        key = (e.src, e.dst, e.dep)
+        if key in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(key)
+        unique.append(e)
+        by_kind.setdefault(e.dep, []).append(e)
+
+    redundant: Set[Tuple[int, int, str]] = set()
+    for kind, edges in by_kind.items():
+        pairs = _redundant_pairs(edges)
+        if pairs:
+            stats.removed_by_kind[kind] = len(pairs)
+        redundant |= {(src, dst, kind) for (src, dst) in pairs}
+
+    graph.edges = [e for e in unique if (e.src, e.dst, e.dep) not in redundant]
+    stats.edges_after = len(graph.edges)
+    return stats
+
+
+def reduce_graphs(graphs: Iterable[StageRunGraph]) -> EdgeReductionStats:
+    """Applies `transitive_reduction` to every graph and sums the stats."""
+    total = EdgeReductionStats()
+    for g in graphs:
+        total.merge(transitive_reduction(g))
+    return total
@@ -69,8 +69,11 @@ app.delete("/remove_engine")(remove_engine)
 app.post("/upload_app")(upload_app)
 app.get("/list_apps")(list_apps)
 app.get("/install_app")(install_app)
+app.get("/install_apps")(install_apps)
+app.get("/dry_run_app")(dry_run_app)
 app.get("/run_app")(run_app)
 app.get("/uninstall_app")(uninstall_app)
+app.get("/switch_epoch")(switch_epoch)
 # app.post("/compile_engine")(compile_engine)
 app.delete("/remove_app")(remove_app)
 
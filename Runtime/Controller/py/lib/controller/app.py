@@ -5,6 +5,7 @@ from datetime import datetime
 from fastapi import UploadFile, Form, HTTPException, File
 from pathlib import Path
 import traceback
+from typing import Optional
 
 # Import StageRun libs
 from lib.controller.types import App
@@ -14,11 +15,17 @@ from lib.utils.status import *
 from lib.utils.manifest_parser import *
 from lib.utils.utils import *
 from lib.tofino.tofino_controller import *
-from lib.controller.deployer.deployer import deploy_program
+from lib.controller.deployer.deployer import deploy_program, deploy_programs
+from lib.controller.deployer.dry_run import dry_run_program
+from lib.controller.deployer.strategies import strategy_for
+from lib.controller.deployer.lowering_rules import lowering_registry
 from Core.stagerun_isa import ISA
 
 from Core.ast_nodes import ProgramNode
-from Core.stagerun_graph.importer import load_stage_run_graphs
+from lib.controller.artifact_cache import artifact_cache
+from lib.controller.deployer.target import stage_run_graphs
+from Core.stagerun_graph.epochs import is_multi_epoch, union_view
+from Core.stagerun_graph.merkle import diff_handlers
 
 logger = logging.getLogger("controller")
 
@@ -182,28 +189,39 @@ def assign_program_to_category(app_key: str, new_ports: dict):
 def validate_compiled_app(compiled_app_file_path, manifest_file_path, app_key, engine_key):
     try:
 
-        compiled_app = load_stage_run_graphs(compiled_app_file_path)
-        manifest = parse_manifest(manifest_file_path)
+        # Parsed artifacts and successful validations are cached (artifact_cache):
+        # re-installing the same files does not parse or check them again
+        compiled_app = artifact_cache.compiled_app(compiled_app_file_path)
+        manifest = artifact_cache.manifest(manifest_file_path)
+
+        recirc_ports = sm.get_engine_recirc_ports(engine_key)
+        validation_key = artifact_cache.validation_key(compiled_app, manifest_file_path, engine_key, recirc_ports)
+        if artifact_cache.is_validated(validation_key):
+            return True, "", compiled_app, manifest
 
         # 0. controller.config.compiler_version == app.compiler_version
         isa_version = compiled_app["isa_version"]
 
         if isa_version != ISA.VERSION.value:
-            return False, f"Application ISA Version {isa_version} not supported for by current controller with ISA {ISA.VERSION.value}"
+            return False, f"Application ISA Version {isa_version} not supported for by current controller with ISA {ISA.VERSION.value}", None, None
 
         # 1. ISA must be known by controller
-        # 1. engine ISA must support instr
+        # 1. the controller must be able to lower instr for the engine
+        #    (lowering_registry; the "ISA" lists of the engine ISA files
+        #    predate most ops and are not used)
         isa_list = ISA.get_ISA_values()
-        engine_isa = sm.get_engine_ISA(engine_key)
         # TODO: do POSFILTERS
-        for graph in compiled_app['graphs']:
+        view = union_view(compiled_app) if is_multi_epoch(compiled_app) else compiled_app
+        for graph in stage_run_graphs(view):
             for instr in graph['nodes']:
                 opcode = instr["op"]
                 if opcode not in isa_list:
                     return False, f"Instruction {opcode} is not supported by the controller.", None, None
 
-                if opcode not in engine_isa['ISA']:
-                    return False, f"Instruction {opcode} is not supported by the running engine.", None, None
+                rule = lowering_registry.spec.get(opcode)
+                if rule is None or rule.unsupported:
+                    reason = f": {rule.unsupported}" if rule is not None else ""
+                    return False, f"Instruction {opcode} is not supported by the running engine{reason}.", None, None
 
         # 2. Validate Manifest structure
         if not 'switch' in manifest or not 'ports' in manifest['switch']:
@@ -211,8 +229,7 @@ def validate_compiled_app(compiled_app_file_path, manifest_file_path, app_key, e
             return False, {"status": "error", "message": f"Bad Manifest File. Missing 'switch' or 'ports' in switch"}, None, None
 
         endpoints = manifest['program']['Endpoints']
-        ports = compiled_app['resources']['ingress_ports']
-        ports.extend(compiled_app['resources']['egress_ports'])
+        ports = compiled_app['resources']['ingress_ports'] + compiled_app['resources']['egress_ports']
         for port_name in ports:
             # 2.1 Validate Manifest has the necessary ports names for the apps
             if port_name not in endpoints:
@@ -224,9 +241,10 @@ def validate_compiled_app(compiled_app_file_path, manifest_file_path, app_key, e
                 return False, f"Manifest Error: All Endpoints must be specified in the setup", None, None
             
         # 3. engine recirc ports must be compatible with the current testbed
-        if sm.check_port_compatibility(manifest['switch']['ports'], sm.get_engine_recirc_ports(engine_key)) not in ['extend', 'compatible']:
+        if sm.check_port_compatibility(manifest['switch']['ports'], recirc_ports) not in ['extend', 'compatible']:
             return False, "Ports are incompatible with existing engine", None, None
 
+        artifact_cache.set_validated(validation_key)
         return True, "", compiled_app, manifest
     
     except Exception as e:
@@ -235,7 +253,70 @@ def validate_compiled_app(compiled_app_file_path, manifest_file_path, app_key, e
 
 
 
-async def install_app(tag: str, version: str):
+def _check_installable(app_key):
+    """Error response if the app cannot be installed (status), None otherwise."""
+    app = sm.get_app(app_key)
+
+    if app.status == STATUS_INSTALLED:
+        return {"status": "error", "message": f"App {app_key} already installed."}
+    
+    if app.status == STATUS_RUNNING:
+        return {"status": "error", "message": f"App {app_key} is already installed and running."}
+
+    if app.status == STATUS_BAD_MANIFEST:
+        return {"status": "error", "message": f"App {app_key} has a bad manifest format. You need to remove, re-upload, and install again with the correct format."}
+    
+    if app.status == STATUS_BAD_APP:
+        return {"status": "error", "message": f"App {app_key} has a bad app format. You need to remove, re-upload, and install again with the correct format."}
+
+    return None
+
+
+def _upgrade_summary(app_key, compiled_app):
+    """
+    Handler changes with respect to the installed/running versions of the same
+    app (same tag), from the Merkle hashes of the exports. Unchanged handlers
+    are not lowered again (deployer.lowering_cache).
+    """
+    tag = sm.get_app(app_key).tag
+    lines = []
+    for other in sm.get_apps():
+        if other.app_key == app_key or other.tag != tag or other.status not in (STATUS_INSTALLED, STATUS_RUNNING):
+            continue
+        try:
+            diff = diff_handlers(artifact_cache.compiled_app(other.app_path), compiled_app)
+        except Exception as e:
+            logger.warning(f"Could not compare {app_key} with {other.app_key}: {e!r}")
+            continue
+        lines.append(f"Upgrade from v{other.version}: {diff.format()}")
+    return lines
+
+
+def _register_installed(app_key, manifest, engine_key, program_id):
+    sm.set_app_status(app_key, STATUS_INSTALLED)
+
+    # Update App ports with the Engine recirc ports
+    ports = manifest['switch']['ports']
+    recirc_ports = sm.get_engine_recirc_ports(engine_key)
+    for r_port in recirc_ports:
+        pnum = recirc_ports[r_port]
+        ports[pnum] = {
+            "speed": 100,
+            "loopback": True
+        }
+    assign_program_to_category(app_key, ports)
+    sm.save_port_sets()
+
+    sm.connect_tofino()
+    sm.engine_controller._final_configs_(program_id)
+
+
+async def install_app(tag: str, version: str, planner: Optional[str] = None):
+    """
+    Installs an uploaded app. `planner` selects the planner strategy
+    ("greedy", "list", "dual", "bnb[:<budget_ms>]" or "portfolio[:<budget_ms>]"); without it, the manifest's
+    program.planner is used (greedy if absent).
+    """
 
     logger.debug(f"Installing app {tag} v{version}")
 
@@ -249,19 +330,11 @@ async def install_app(tag: str, version: str):
     if not sm.exists_app(app_key):
         return {"status": "error", "message": f"App {app_key} not found."}
 
-    app = sm.get_app(app_key)
-
-    if app.status == STATUS_INSTALLED:
-        return {"status": "error", "message": f"App {app_key} already installed."}
-    
-    if app.status == STATUS_RUNNING:
-        return {"status": "error", "message": f"App {app_key} is already installed and running."}
+    error = _check_installable(app_key)
+    if error:
+        return error
 
-    if app.status == STATUS_BAD_MANIFEST:
-        return {"status": "error", "message": f"App {app_key} has a bad manifest format. You need to remove, re-upload, and install again with the correct format."}
-    
-    if app.status == STATUS_BAD_APP:
-        return {"status": "error", "message": f"App {app_key} has a bad app format. You need to remove, re-upload, and install again with the correct format."}
+    app = sm.get_app(app_key)
 
     # app_file_path = sm.apps[app_key]["app_path"]
     compiled_app_file_path = app.app_path
@@ -274,9 +347,19 @@ async def install_app(tag: str, version: str):
     if not valid_app:
         return {"status": "error", "message": msg}
 
+    try:
+        strategy = strategy_for(manifest, planner)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    upgrade = _upgrade_summary(app_key, compiled_app)
+    for line in upgrade:
+        logger.info(f"{app_key}: {line}")
+
+    # Multi-epoch apps too: all their epochs are installed under one pid (see deploy_program)
     program_id = sm.allocate_pid()
 
-    isInstalled, message = deploy_program(compiled_app, manifest, app_key, engine_key, program_id)
+    isInstalled, message = deploy_program(compiled_app, manifest, app_key, engine_key, program_id, planner=strategy)
 
     #
     #  TODO: test the set_app_status not working
@@ -288,29 +371,115 @@ async def install_app(tag: str, version: str):
         return {"status": "error", "message": f"App {app_key} is not supported. {message}"}
 
     sm.set_pid(program_id, app_key)
-    sm.set_app_status(app_key, STATUS_INSTALLED)
-
-    # Update App ports with the Engine recirc ports
-    ports = manifest['switch']['ports']
-    recirc_ports = sm.get_engine_recirc_ports(engine_key)
-    for r_port in recirc_ports:
-        pnum = recirc_ports[r_port]
-        ports[pnum] = {
-            "speed": 100,
-            "loopback": True
-        }
-    assign_program_to_category(app_key, ports)
-    sm.save_port_sets()
 
-    sm.connect_tofino()
-    sm.engine_controller._final_configs_(program_id)
+    _register_installed(app_key, manifest, engine_key, program_id)
 
-    return {"status": "ok", "message": f"App {app_key} Installed successfully."}
+    return {"status": "ok", "message": "\n".join([f"App {app_key} Installed successfully.", *upgrade])}
 
     # TODO: assuming a unique StageRunEngine format for now
     # The Controller knows how to install all the instructions in all stages. It needs to know which instructions are available in each stage. If needs to know which instructions that runtime has and which instructions are available in each stage.
 
 
+async def dry_run_app(tag: str, version: str, planner: Optional[str] = None):
+    """
+    Deploys an uploaded app on a recording, in-memory table backend instead of
+    the switch (deployer/dry_run.py): returns the table operations, entries
+    per table, recirculation/write-phase decisions and phase timings. Neither
+    the switch nor the controller state (pids, status, port sets) is changed.
+    `planner` selects the planner strategy, as for install_app.
+    """
+
+    logger.debug(f"Dry run of app {tag} v{version}")
+
+    app_key = sm.get_app_key(tag, version)
+
+    if not sm.is_an_engine_running():
+        return {"status": "error", "message": f"Please install an engine before installing an app"}
+
+    engine_key = sm.get_running_engine_key()
+
+    if not sm.exists_app(app_key):
+        return {"status": "error", "message": f"App {app_key} not found."}
+
+    app = sm.get_app(app_key)
+    valid_app, msg, compiled_app, manifest = validate_compiled_app(app.app_path, app.manifest_path, app_key, engine_key)
+    if not valid_app:
+        return {"status": "error", "message": msg}
+
+    try:
+        strategy = strategy_for(manifest, planner)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    report = dry_run_program(compiled_app, manifest, sm.get_engine_ISA(engine_key), sm.next_pid(), planner=strategy,
+                             installed_hash_units=sm.get_hash_units())
+    message = "\n".join([f"App {app_key}", report.format(), *_upgrade_summary(app_key, compiled_app)])
+
+    return {"status": "ok" if report.ok else "error", "message": message, "report": report.to_dict()}
+
+
+async def install_apps(apps: str):
+    """
+    Joint install of several uploaded apps that are hosted together
+    (apps = "tag:version,tag:version,..."): their stages/tables, hash units
+    and prefilters are planned together instead of one app at a time.
+    """
+
+    logger.debug(f"Installing apps {apps}")
+
+    if not sm.is_an_engine_running():
+        return {"status": "error", "message": f"Please install an engine before installing an app"}
+
+    engine_key = sm.get_running_engine_key()
+
+    app_keys = []
+    for item in apps.split(","):
+        tag, _, version = item.strip().partition(":")
+        if not tag or not version:
+            return {"status": "error", "message": f"Bad app '{item}'. Expected tag:version"}
+        app_keys.append(sm.get_app_key(tag, version))
+
+    if len(set(app_keys)) != len(app_keys):
+        return {"status": "error", "message": f"Duplicated apps in {apps}"}
+
+    validated = {}
+    for app_key in app_keys:
+        if not sm.exists_app(app_key):
+            return {"status": "error", "message": f"App {app_key} not found."}
+
+        error = _check_installable(app_key)
+        if error:
+            return error
+
+        app = sm.get_app(app_key)
+        valid_app, msg, compiled_app, manifest = validate_compiled_app(app.app_path, app.manifest_path, app_key, engine_key)
+        if not valid_app:
+            return {"status": "error", "message": f"App {app_key}: {msg}"}
+        validated[app_key] = (compiled_app, manifest)
+
+    # One pid per program (multi-epoch apps included), reserved before planning
+    programs = []
+    program_ids = {}
+    for app_key, (compiled_app, manifest) in validated.items():
+        program_id = sm.allocate_pid()
+        sm.set_pid(program_id, app_key)
+        programs.append((app_key, compiled_app, manifest, program_id))
+        program_ids[app_key] = program_id
+
+    isInstalled, message = deploy_programs(programs)
+
+    if not isInstalled:
+        for app_key in app_keys:
+            sm.remove_program_id(app_key, force=True, program_id=program_ids[app_key])
+            sm.set_app_status(app_key, STATUS_UNSUPPORTED)
+        return {"status": "error", "message": f"Apps {', '.join(app_keys)} are not supported together. {message}"}
+
+    for app_key, (compiled_app, manifest) in validated.items():
+        _register_installed(app_key, manifest, engine_key, program_ids[app_key])
+
+    return {"status": "ok", "message": f"Apps {', '.join(app_keys)} Installed successfully.\n{message}"}
+
+
 async def run_app(tag: str, version: str):
 
     logger.debug(f"run_app {tag} v{version}")
@@ -384,4 +553,35 @@ async def uninstall_app(tag: str, version: str):
 
     else:
         return {"status": "error", "message": f"App {app_key} does not follow one of the internal status, so uninstalling is not possible."}
-    
\ No newline at end of file
+    
+
+
+async def switch_epoch(tag: str, version: str, epoch: str):
+
+    logger.debug(f"switch_epoch {tag} v{version} -> {epoch}")
+
+    app_key = sm.get_app_key(tag, version)
+
+    if not sm.is_an_engine_running():
+        return {"status": "error", "message": f"Please install an engine before switching epochs"}
+
+    if not sm.exists_app(app_key):
+        return {"status": "error", "message": f"App {app_key} not found."}
+
+    app = sm.get_app(app_key)
+    epochs = sm.get_epochs(app_key)
+
+    if not epochs:
+        return {"status": "error", "message": f"App {app_key} is not a multi-epoch app."}
+
+    if epoch not in epochs:
+        return {"status": "error", "message": f"Epoch '{epoch}' not found in App {app_key}. Available epochs: {', '.join(epochs)}"}
+
+    if app.status not in (STATUS_INSTALLED, STATUS_RUNNING):
+        return {"status": "error", "message": f"App {app_key} must be installed to switch epochs."}
+
+    if sm.get_active_epoch(app_key) == epoch:
+        return {"status": "ok", "message": f"App {app_key} already on epoch {epoch}"}
+
+    sm.switch_epoch(app_key, epoch)
+    return {"status": "ok", "message": f"App {app_key} switched to epoch {epoch}"}
@@ -0,0 +1,121 @@
+"""
+Artifact Cache
+--------------
+
+In-memory cache of what installing an app reads and checks, so that
+repeated installs of the same artifacts (uninstall/install churn) do not
+parse or validate anything again:
+
+- compiled apps (JSON or binary IR), manifests and engine ISAs, keyed by
+  file (path, mtime, size): a file that changed on disk is read again;
+- successful validations, keyed by the artifact checksum, the manifest file,
+  the engine and its current recirculation ports. Failed validations are
+  not cached (they also update the app status).
+
+Every kind is a bounded LRU. Compiled apps and ISAs are shared and must be
+treated as read-only; manifests are returned as copies, since the install
+path adds the engine recirculation ports to them.
+"""
+
+from __future__ import annotations
+import os
+import copy
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from Core.stagerun_graph.importer import load_stage_run_graphs
+from lib.utils.manifest_parser import parse_manifest
+from lib.utils.utils import parse_json
+
+FileKey = Tuple[str, int, int]      # (path, mtime_ns, size)
+
+
+def file_key(path: str) -> FileKey:
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = load()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class ArtifactCache:
+    def __init__(self, max_entries: int = 32):
+        self._apps = _LRU(max_entries)
+        self._manifests = _LRU(max_entries)
+        self._isas = _LRU(max_entries)
+        self._validated = _LRU(max_entries * 4)
+
+    # ============================================================
+    # Parsed artifacts
+    # ============================================================
+
+    def compiled_app(self, path: str) -> Dict[str, Any]:
+        """load_stage_run_graphs(path), verified once per file version."""
+        return self._apps.get(file_key(path), lambda: load_stage_run_graphs(path))
+
+    def manifest(self, path: str) -> Dict[str, Any]:
+        return copy.deepcopy(self._manifests.get(file_key(path), lambda: parse_manifest(path)))
+
+    def engine_isa(self, isa_path: str) -> Dict[str, Any]:
+        return self._isas.get(file_key(isa_path), lambda: parse_json(isa_path))
+
+    # ============================================================
+    # Validation results
+    # ============================================================
+
+    def validation_key(
+        self, compiled_app: Dict[str, Any], manifest_path: str, engine_key: str, recirc_ports: Dict[str, Any],
+    ) -> Hashable:
+        return (compiled_app.get("checksum"), file_key(manifest_path), engine_key, frozenset(recirc_ports.items()))
+
+    def is_validated(self, key: Hashable) -> bool:
+        if key in self._validated.entries:
+            self._validated.hits += 1
+            self._validated.entries.move_to_end(key)
+            return True
+        self._validated.misses += 1
+        return False
+
+    def set_validated(self, key: Hashable) -> None:
+        self._validated.put(key, True)
+
+    # ============================================================
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "compiled_apps": self._apps.stats(),
+            "manifests": self._manifests.stats(),
+            "isas": self._isas.stats(),
+            "validations": self._validated.stats(),
+        }
+
+    def clear(self) -> None:
+        for lru in (self._apps, self._manifests, self._isas, self._validated):
+            lru.entries.clear()
+
+
+artifact_cache = ArtifactCache()
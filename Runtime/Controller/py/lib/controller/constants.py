@@ -1,3 +1,4 @@
 P1_TABLE = "instructions_p1"
 P2_TABLE = "instructions_p2"
-SPEC_TABLE = "instructions_speculative"
\ No newline at end of file
+SPEC_TABLE = "instructions_speculative"
+MULTI_TABLE = "multi_instr_speculative"
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+Joint Planning
+--------------
+
+Plans a set of programs that are installed together on one engine, instead
+of planning each of them in isolation (where the first app always grabs the
+first free tables of every stage).
+
+Every app is still lowered and planned under its own program id, but:
+- apps are planned largest first, on a shared (stage, flow, table) entry count,
+  and each instruction goes to the least loaded flow/table of the earliest
+  stage that can hold it, optionally bounded by a per-table entry capacity;
+- the hashes of all apps are assigned to the engine's global hash units
+  together (hash_units.py): the same field list shares a unit, and every app
+  is lowered to the units of its hashes;
+- prefilter entries are keyed by program id, so they cannot be shared between
+  apps: identical matches are reported instead, as they compete for the same
+  traffic.
+
+The result holds one PlanningResult per app (installed as usual) plus the
+combined table load, the hash unit configuration and per-app accounting.
+"""
+
+from __future__ import annotations
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .types import MicroGraph
+from .micro_instruction import MicroInstructionParser
+from .planner import Planner, PlanningResult, RECIRC_INSTR
+from .target import stage_run_graphs
+from .hash_units import HashUnits, HashUnitError, assign_hash_units
+
+# set_pkt_id action data (per program), not part of the prefilter match
+PREFILTER_ACTION_ARGS = ("program_id", "pkt_id", "ni_f1", "ni_f2")
+
+Slot = Tuple[int, str, str]     # (stage, flow, table)
+
+
+class CoPlanError(Exception):
+    pass
+
+
+@dataclass
+class CoApp:
+    """One program of a joint plan (single program view, see epochs.select_epoch)."""
+    app_key: str
+    compiled_app: Dict[str, Any]
+    pid: int
+    port_resolver: Callable[[str], Any]
+
+
+@dataclass
+class AppResources:
+    app_key: str
+    pid: int
+    micro_instructions: int = 0
+    stages: List[int] = field(default_factory=list)
+    flows: List[str] = field(default_factory=list)
+    table_entries: Dict[str, int] = field(default_factory=dict)    # "s<stage>/<flow>/<table>" -> entries
+    recirculations: int = 0
+    write_phases: List[int] = field(default_factory=list)
+    prefilter_entries: int = 0
+    duplicated_prefilters: int = 0
+    hash_units: Dict[str, int] = field(default_factory=dict)       # hash name -> unit (1-based)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "app": self.app_key,
+            "pid": self.pid,
+            "micro_instructions": self.micro_instructions,
+            "stages": self.stages,
+            "flows": self.flows,
+            "table_entries": self.table_entries,
+            "recirculations": self.recirculations,
+            "write_phases": self.write_phases,
+            "prefilter_entries": self.prefilter_entries,
+            "duplicated_prefilters": self.duplicated_prefilters,
+            "hash_units": self.hash_units,
+        }
+
+
+@dataclass
+class CoPlan:
+    plans: Dict[str, PlanningResult]
+    resources: Dict[str, AppResources]
+    order: List[str]                                   # planning order (largest first)
+    table_load: Dict[Slot, int] = field(default_factory=dict)
+    hash_units: HashUnits = field(default_factory=HashUnits)
+    shared_prefilters: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "order": self.order,
+            "apps": [self.resources[k].to_dict() for k in self.order],
+            "table_load": {_slot_name(s): n for s, n in sorted(self.table_load.items())},
+            "hash_units": self.hash_units.to_dict(),
+            "shared_prefilters": self.shared_prefilters,
+        }
+
+    def format(self) -> str:
+        lines = [f"Joint plan ({len(self.order)} apps, {len(self.table_load)} tables used)"]
+        for k in self.order:
+            r = self.resources[k]
+            lines.append(
+                f"   {k} (pid {r.pid}): {r.micro_instructions} instr, stages {r.stages}, "
+                f"{sum(r.table_entries.values())} entries, {r.recirculations} recirc, "
+                f"{r.prefilter_entries} prefilters"
+                + (f", hash units {r.hash_units}" if r.hash_units else "")
+            )
+        for unit, fields in sorted(self.hash_units.units.items()):
+            lines.append(f"   hash_{unit}: {', '.join(fields)}")
+        for shared in self.shared_prefilters:
+            lines.append(f"   ⚠ same prefilter in {', '.join(shared['apps'])}: {shared['match']}")
+        return "\n".join(lines)
+
+
+def _slot_name(slot: Slot) -> str:
+    return f"s{slot[0]}/{slot[1]}/{slot[2]}"
+
+
+class _JointPlanner(Planner):
+    """Planner that balances entries over the flows/tables of each stage."""
+
+    def __init__(self, isa: Dict[str, Any], load: Dict[Slot, int], table_capacity: Optional[int] = None):
+        super().__init__(isa)
+        self.load = dict(load)      # placements of this app are only committed by CoPlanner
+        self.table_capacity = table_capacity
+        # bitmap (isa_index slots) of the tables at capacity
+        self.full = 0
+        if table_capacity is not None:
+            for slot, used in self.load.items():
+                if used >= table_capacity and slot in self.index.positions:
+                    self.full |= self.index.slot_bit(slot)
+
+    def _find_slot(self, candidate_ops: List[str], current_stage: int) -> Optional[Slot]:
+        # least loaded table of the first stage with room for one of the candidates
+        slots = self.index.first_stage(candidate_ops, current_stage, occupied=self.full)
+        if not slots:
+            return None
+
+        slot = min(slots, key=lambda s: self.load.get(s, 0))
+        self.load[slot] = self.load.get(slot, 0) + 1
+        if self.table_capacity is not None and self.load[slot] >= self.table_capacity:
+            self.full |= self.index.slot_bit(slot)
+        return slot
+
+
+class CoPlanner:
+    def __init__(self, isa: Dict[str, Any], table_capacity: Optional[int] = None):
+        self.isa = isa
+        self.table_capacity = table_capacity
+
+    # ============================================================
+    # PUBLIC
+    # ============================================================
+
+    def plan(self, apps: List[CoApp], installed_hash_units: Optional[Dict[int, List[str]]] = None) -> CoPlan:
+        """
+        Joint plan of `apps`, on an engine whose `installed_hash_units`
+        (unit -> engine hash fields) are configured for other programs.
+        """
+        keys = [a.app_key for a in apps]
+        if len(set(keys)) != len(keys):
+            raise CoPlanError(f"Duplicated apps in joint plan: {keys}")
+
+        # 1) Shared hash units, StageRun -> Micro (per app, own ports)
+        try:
+            hash_units = assign_hash_units([(a.app_key, a.compiled_app) for a in apps], installed_hash_units)
+        except HashUnitError as e:
+            raise CoPlanError(f"Could not assign hash units: {e}") from e
+
+        lowered: Dict[str, List[MicroGraph]] = {}
+        for app in apps:
+            try:
+                mip = MicroInstructionParser(isa=self.isa, manifest={}, port_resolver=app.port_resolver,
+                                             hash_units=hash_units.of(app.app_key))
+                lowered[app.app_key] = mip.to_micro(stage_run_graphs(app.compiled_app))
+            except Exception as e:
+                raise CoPlanError(f"Could not lower '{app.app_key}': {e!r}") from e
+
+        # 2) Largest first: the apps with most instructions get the first pick of the stages
+        size = {k: sum(len(g.nodes) for g in graphs) for k, graphs in lowered.items()}
+        ordered = sorted(apps, key=lambda a: -size[a.app_key])
+
+        # 3) Plan on the shared table load
+        table_load: Dict[Slot, int] = {}
+        plans: Dict[str, PlanningResult] = {}
+        resources: Dict[str, AppResources] = {}
+        for app in ordered:
+            planner = _JointPlanner(self.isa, table_load, self.table_capacity)
+            try:
+                plan = planner.plan(lowered[app.app_key], pid=app.pid)
+            except Exception as e:
+                raise CoPlanError(f"Could not plan '{app.app_key}': {e!r}") from e
+
+            res, load = self._account(app, plan)
+            res.hash_units = dict(hash_units.of(app.app_key))
+            for slot, n in load.items():
+                table_load[slot] = table_load.get(slot, 0) + n
+            plans[app.app_key] = plan
+            resources[app.app_key] = res
+
+        if self.table_capacity is not None:
+            over = {_slot_name(s): n for s, n in table_load.items() if n > self.table_capacity}
+            if over:
+                raise CoPlanError(f"Tables over capacity ({self.table_capacity} entries): {over}")
+
+        # 4) Shared prefilters
+        shared_prefilters = self._shared_prefilters(ordered, plans, resources)
+
+        return CoPlan(
+            plans=plans,
+            resources=resources,
+            order=[a.app_key for a in ordered],
+            table_load=table_load,
+            hash_units=hash_units,
+            shared_prefilters=shared_prefilters,
+        )
+
+    # ============================================================
+    # HELPERS
+    # ============================================================
+
+    def _account(self, app: CoApp, plan: PlanningResult) -> Tuple[AppResources, Dict[Slot, int]]:
+        res = AppResources(app_key=app.app_key, pid=app.pid)
+        load: Dict[Slot, int] = {}
+        for g in plan.graphs:
+            for n in g.nodes.values():
+                res.micro_instructions += 1
+                if n.instr.name == RECIRC_INSTR:
+                    res.recirculations += 1
+                if n.allocated_stage is None or n.allocated_flow is None:
+                    continue
+                slot = (n.allocated_stage, n.allocated_flow, n.allocated_table)
+                load[slot] = load.get(slot, 0) + 1
+
+        res.stages = sorted({s for s, _, _ in load})
+        res.flows = sorted({f for _, f, _ in load})
+        res.table_entries = {_slot_name(s): n for s, n in sorted(load.items())}
+        res.write_phases = sorted((plan.stats.wp_reserved if plan.stats else {}).keys())
+        return res, load
+
+    def _shared_prefilters(self, apps: List[CoApp], plans: Dict[str, PlanningResult],
+                           resources: Dict[str, AppResources]) -> List[Dict[str, Any]]:
+        owners: Dict[str, List[str]] = {}
+        for app in apps:
+            matches = [_prefilter_match(g) for g in plans[app.app_key].graphs if g.keys]
+            res = resources[app.app_key]
+            res.prefilter_entries = len(set(matches))
+            res.duplicated_prefilters = len(matches) - len(set(matches))
+            for m in dict.fromkeys(matches):
+                owners.setdefault(m, []).append(app.app_key)
+
+        return [{"match": json.loads(m), "apps": keys} for m, keys in owners.items() if len(keys) > 1]
+
+
+def _prefilter_match(g: MicroGraph) -> str:
+    kwargs = g.keys.get("kwargs", {}) if isinstance(g.keys, dict) else {}
+    return json.dumps({k: v for k, v in kwargs.items() if k not in PREFILTER_ACTION_ARGS}, sort_keys=True)
@@ -1,19 +1,28 @@
 from __future__ import annotations
 import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import traceback
 import os
+import time
+from functools import partial
 # Custom Imports
 from lib.controller.deployer.types import *
 from lib.controller.deployer.micro_instruction import *
 from lib.utils.utils import Timer
 
 from Core.stagerun_graph.importer import load_stage_run_graphs  # lê JSON do compilador (com checksum)
-from .micro_instruction import MicroInstructionParser
+from Core.stagerun_graph.binary_ir import BinaryIR, is_binary_ir
+from Core.stagerun_graph.epochs import is_multi_epoch, union_view
+from .micro_instruction import MicroInstructionParser, resolve_dev_port, running_dev_ports
 from .planner import Planner, PlanningResult
+from .strategies import PlannerStrategy, GreedyStrategy, strategy_for
 from .installer import Installer
+from .target import target_matches, load_target_plan, stage_run_graphs as stage_run_graphs_of
+from .co_planner import CoPlanner, CoApp
+from .hash_units import program_hash_units
+from .lowering_cache import LoweringCache
 # from .resources import apply_resources, cleanup_resources
 
 
@@ -83,6 +92,10 @@ def install_micro_instr(micro_instr, current_stage):
 
 
 
+# Handlers já traduzidos para micro-instruções (por hash Merkle + ISA), reutilizados entre versões/apps
+lowering_cache = LoweringCache()
+
+
 # ---------------------------------------------------------------------------
 # Utils de IO
 # ---------------------------------------------------------------------------
@@ -94,7 +107,10 @@ def load_compiled_program(compiled_path: str | Path) -> Dict[str, Any]:
     """
     Lê o JSON produzido pelo compilador (exporter), contendo os StageRunGraphs.
     Espera um dicionário com pelo menos: {"graphs": [...], ...}
+    IR binário (--format bin) é mapeado em memória e os handlers descodificados a pedido.
     """
+    if is_binary_ir(compiled_path):
+        return BinaryIR(compiled_path)
     payload = load_json(compiled_path)
     # Se tiveres um importer dedicado, poderias usar:
     # graphs = import_stage_run_graphs_from_json(payload)
@@ -146,13 +162,82 @@ def plan_result_to_dict(plan_result: PlanningResult) -> Dict[str, Any]:
         "stages_used": getattr(stats, "stages_used", None),
         "total_nodes": getattr(stats, "total_nodes", None),
         "total_flows": getattr(stats, "total_flows", None),
+        "recirculations": getattr(stats, "recirculations", None),
+        "strategy": getattr(stats, "strategy", None),
         # "write_phases_inserted": list(getattr(stats, "write_phases_inserted", None)),
         "write_phases": getattr(stats, "wp_reserved", None),
+        "write_hazards": getattr(stats, "write_hazards", None),
+        "wp_stages_saved": getattr(stats, "wp_stages_saved", None),
     } if stats else None
 
     return {"graphs": graphs_out, "stats": stats_out}
 
 
+# ------------------------------------------------------
+def plan_program(
+    compiled_app: Dict[str, Any],
+    isa: Dict[str, Any],
+    program_id: int,
+    resolve_port,
+    *,
+    hash_units: Dict[str, int],
+    cache: LoweringCache | None = None,
+    strategy: PlannerStrategy | None = None,
+    timings: Dict[str, float] | None = None,
+    debug_logs: bool = __debug__,
+) -> PlanningResult:
+    """
+    Steps 2-3 of deploy_program (no switch access): StageRun -> Micro and
+    planning with `strategy` (see strategies.py), or, when no strategy is
+    given, only binding pid and ports of an embedded target (if it was
+    lowered to the same hash units; else greedy).
+    `resolve_port` maps endpoint names to dev_ports and `hash_units` hash
+    names to the engine hash units the program is installed with (the units
+    configured for it, see hash_units.py); when given, `timings` gets the
+    seconds spent in each phase ("lower", "plan", "bind_target").
+    """
+    cache = cache if cache is not None else lowering_cache
+    timings = timings if timings is not None else {}
+
+    target = compiled_app.get("target")
+    if strategy is None and target_matches(target, isa, hash_units):
+        # 2-3) Pre-planned by the compiler (--target): only bind pid and ports
+        t0 = time.perf_counter()
+        plan_result = load_target_plan(target, program_id, resolve_port)
+        timings["bind_target"] = time.perf_counter() - t0
+        return plan_result
+
+    stage_run_graphs = stage_run_graphs_of(compiled_app)
+    if not stage_run_graphs:
+        raise ValueError("Compiled program JSON has no 'graphs'/'handlers' entry.")
+
+    # 2) StageRun → Micro (handlers inalterados vêm da cache)
+    t0 = time.perf_counter()
+    micro_graphs, reused = cache.lower(compiled_app, isa, resolve_port, hash_units)
+    timings["lower"] = time.perf_counter() - t0
+    if reused:
+        print(f"[deployer] {reused}/{len(micro_graphs)} handlers reused from the lowering cache")
+
+    if debug_logs:
+        with open("MicroGraphs.log", "w") as f:
+            pass
+        with open("MicroGraphsPlanned.log", "w") as f:
+            pass
+        for mg in micro_graphs:
+            mg.debug_print()
+
+    # 3) Planner
+    t0 = time.perf_counter()
+    strategy = strategy if strategy is not None else GreedyStrategy()
+    plan_result = strategy.plan(isa, micro_graphs, program_id)
+    timings["plan"] = time.perf_counter() - t0
+
+    if debug_logs:
+        for mg in plan_result.graphs:
+            mg.debug_print(show_effects=True, filepath="MicroGraphsPlanned.log")
+    return plan_result
+
+
 # ------------------------------------------------------
 def deploy_program(
     compiled_app: str,
@@ -164,12 +249,21 @@ def deploy_program(
     deploy_hw: bool = True,
     return_dict: bool = False,
     pretty_print: bool = True,
+    planner: Any = None,
 ) -> Dict[str, Any] | None:
     """
     1) Lê o JSON do compilador (StageRun graphs)
     2) Constrói MicroGraphs via MicroInstructionParser.to_micro()
-    3) Corre o Planner para obter plan_result
+    3) Corre o Planner para obter plan_result (estratégia `planner` do pedido,
+       senão program.planner do manifest; ver strategies.py)
     4) Devolve (ou imprime) um dicionário com o plano (sem instalar nada)
+    5) Configura as hash units usadas pelo programa (atribuídas face às
+       unidades dos programas já instalados, ver hash_units.py), instala o
+       plano e regista as unidades do programa no state manager
+    Apps multi-epoch são planeadas e instaladas como um só programa (a
+    union_view das suas épocas, ver epochs.py): os handlers partilhados
+    ficam instalados uma vez e só as entradas da primeira época são
+    escritas; as de cada época ficam no state manager (sm.set_epochs).
     """
 
     # try: 
@@ -181,29 +275,13 @@ def deploy_program(
         # manifest = load_json(manifest_path)
         isa = sm.get_engine_ISA(sm.get_running_engine_key())
 
-        stage_run_graphs = compiled_app.get("graphs", [])
-        if not stage_run_graphs:
-            raise ValueError("Compiled program JSON has no 'graphs' entry.")
-
-        # 2) StageRun → Micro
-        mip = MicroInstructionParser(isa=isa, manifest=manifest)
-        micro_graphs: List[MicroGraph] = mip.to_micro(stage_run_graphs)
-
-        if __debug__:
-            with open("MicroGraphs.log", "w") as f:
-                pass
-            with open("MicroGraphsPlanned.log", "w") as f:
-                pass
-            for mg in micro_graphs:
-                mg.debug_print()
-
-        # 3) Planner
-        planner = Planner(isa=isa)
-        plan_result = planner.plan(micro_graphs, pid=program_id)
-
-        if __debug__:
-            for mg in plan_result.graphs:
-                mg.debug_print(show_effects=True, filepath="MicroGraphsPlanned.log")
+        resolve_port = partial(resolve_dev_port, manifest, dev_ports=running_dev_ports())
+        strategy = strategy_for(manifest, planner)
+        if is_multi_epoch(compiled_app):
+            compiled_app = union_view(compiled_app)
+        hash_units = program_hash_units(compiled_app, installed=sm.get_hash_units())
+        plan_result = plan_program(compiled_app, isa, program_id, resolve_port, strategy=strategy,
+                                   hash_units=hash_units.of(""))
 
         # 4) Serializar para debug / output
         plan_dict = plan_result_to_dict(plan_result)
@@ -213,9 +291,11 @@ def deploy_program(
                 f.write(json.dumps(plan_dict, indent=2, ensure_ascii=False))
 
 
-        Installer().install(plan_result, program_id)
+        hash_units.configure(sm.engine_controller)
+        _install(Installer(), plan_result, program_id, app_key, compiled_app)
+        sm.add_hash_units(program_id, hash_units.units_of(""))
 
-        # 5. Configure resources
+        # 6. Configure resources
         resources = compiled_app["resources"]
         # TOO: save state regarding queues so that when the program runs it installs the necessary queues 
         # "resources" : {
@@ -246,4 +326,61 @@ def deploy_program(
         return False, f"Failed to deploy application. {repr(e)}"
 
 
-    # return plan_dict if return_dict else None
\ No newline at end of file
+    # return plan_dict if return_dict else None
+
+
+def _install(installer: Installer, plan: PlanningResult, pid: int, app_key: str, compiled_app: Dict[str, Any]) -> None:
+    """Installs the plan of a program (of the union_view of a multi-epoch app, see Installer.install_epochs)."""
+    if "handler_epochs" not in compiled_app:
+        installer.install(plan, pid)
+        return
+
+    sm.set_epochs(app_key, installer.install_epochs(plan, pid, compiled_app["handler_epochs"], compiled_app["epoch_names"]))
+
+
+# ------------------------------------------------------
+def deploy_programs(
+    apps: List[Tuple[str, Dict[str, Any], Dict[str, Any], int]],
+    *,
+    pretty_print: bool = True,
+) -> Tuple[bool, str]:
+    """
+    Joint install of programs hosted together: apps = [(app_key, compiled_app, manifest, program_id)]
+    1) Lowers and plans all of them together (CoPlanner), on the hash units
+       left by the programs already installed
+    2) Configures the shared hash units
+    3) Installs the plan of every app under its program_id
+    Multi-epoch apps are planned as their union_view, as in deploy_program.
+    Embedded targets (--target) are ignored, since they were planned in isolation.
+    """
+    sm.connect_tofino()
+
+    try:
+        isa = sm.get_engine_ISA(sm.get_running_engine_key())
+        dev_ports = running_dev_ports()
+
+        co_apps = [
+            CoApp(app_key=app_key, compiled_app=union_view(compiled_app) if is_multi_epoch(compiled_app) else compiled_app,
+                  pid=program_id, port_resolver=partial(resolve_dev_port, manifest, dev_ports=dev_ports))
+            for app_key, compiled_app, manifest, program_id in apps
+        ]
+        co_plan = CoPlanner(isa=isa).plan(co_apps, installed_hash_units=sm.get_hash_units())
+
+        if pretty_print:
+            with open("deployer.co_plan.json", "w") as f:
+                f.write(json.dumps(co_plan.to_dict(), indent=2, ensure_ascii=False))
+
+        co_plan.hash_units.configure(sm.engine_controller)
+
+        installer = Installer()
+        co_apps = {co_app.app_key: co_app for co_app in co_apps}
+        for app_key in co_plan.order:
+            pid = co_plan.resources[app_key].pid
+            _install(installer, co_plan.plans[app_key], pid, app_key, co_apps[app_key].compiled_app)
+            sm.add_hash_units(pid, co_plan.hash_units.units_of(app_key))
+
+        return True, co_plan.format()
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return False, f"Failed to deploy applications. {repr(e)}"
@@ -0,0 +1,223 @@
+"""
+Dry-run Deploys
+---------------
+
+Runs the whole deploy path of a program (lowering -> planning -> install ->
+final configs) against the recording runtime (lib/tofino/recording_runtime.py)
+instead of the switch: nothing is written to the device and the controller
+state (pids, app status, port sets) is not touched.
+
+The report holds:
+- the table operations, in the order the installer issues them (reads of the
+  mechanisms themselves, e.g. print_entries_for_pid, are only counted);
+- the entries per table after the install;
+- the recirculation and write-phase decisions of the planner, and the planner
+  strategy that produced them (strategies.py);
+- the op forms and slots the placement cost model chose over the first fit,
+  and why (placement_costs.py);
+- the time spent in each phase (lower, plan or bind_target, install, finalize).
+
+A deploy that would fail (lowering, planning, an entry the device would
+reject) stops the dry run there: the report holds the error and the
+operations issued up to it.
+"""
+
+from __future__ import annotations
+import io
+import time
+import contextlib
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from lib.tofino.recording_runtime import RecordingRuntime
+from lib.engine.engine_controller import EngineController
+from Core.stagerun_graph.epochs import is_multi_epoch, union_view
+
+from .deployer import plan_program
+from .micro_instruction import resolve_dev_port
+from .planner import PlanningResult
+from .installer import Installer
+from .lowering_cache import LoweringCache
+from .co_planner import RECIRC_INSTR
+from .strategies import strategy_for
+from .hash_units import program_hash_units
+
+WRITE_OPS = ("add", "mod", "del", "set_default", "reset", "clear")
+PHASES = ("lower", "plan", "bind_target", "install", "finalize")
+
+
+@dataclass
+class DryRunReport:
+    program_ids: Dict[str, int] = field(default_factory=dict)        # "" -> pid (multi-epoch apps have one too)
+    planner: Dict[str, str] = field(default_factory=dict)            # "" -> strategy
+    epochs: Dict[str, int] = field(default_factory=dict)             # epoch -> entries of its own handlers
+    ops: List[Dict[str, Any]] = field(default_factory=list)
+    reads: int = 0
+    entries: Dict[str, int] = field(default_factory=dict)
+    recirculations: List[Dict[str, Any]] = field(default_factory=list)
+    write_phases: List[Dict[str, Any]] = field(default_factory=list)
+    choices: List[Dict[str, Any]] = field(default_factory=list)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "program_ids": self.program_ids,
+            "planner": self.planner,
+            "epochs": self.epochs,
+            "ops": self.ops,
+            "reads": self.reads,
+            "entries": self.entries,
+            "recirculations": self.recirculations,
+            "write_phases": self.write_phases,
+            "choices": self.choices,
+            "timings_ms": self.timings_ms,
+            "error": self.error,
+        }
+
+    def format(self) -> str:
+        pids = ", ".join(f"{e}: {pid}" if e else str(pid) for e, pid in self.program_ids.items())
+        per_op = Counter(op["op"] for op in self.ops)
+        lines = [
+            f"Dry run (pid {pids}): {len(self.ops)} table operations "
+            f"({', '.join(f'{n} {op}' for op, n in per_op.items())}), {self.reads} reads",
+        ]
+        if self.planner:
+            lines.append(f"   planner: {', '.join(sorted(set(self.planner.values())))}")
+        if self.epochs:
+            lines.append("   epochs (entries of their own handlers, first installed): "
+                         + ", ".join(f"{e} {n}" for e, n in self.epochs.items()))
+        for table, n in self.entries.items():
+            lines.append(f"   {table}: {n} entries")
+        for r in self.recirculations:
+            lines.append(
+                f"   recirculation in {r['graph']} (node {r['node']}, stage {r['stage']}): "
+                f"flow {r['flow_id']} -> {r['next_flow_id']}"
+            )
+        for wp in self.write_phases:
+            lines.append(
+                f"   write phase pid {wp['pid']}: stages {wp['stages']} "
+                f"({wp['hazards']} hazards, {wp['saved']} stages saved by coalescing)"
+            )
+        for c in self.choices:
+            lines.append(f"   {c['form']} op in {c['graph']} (node {c['node']}): {c['reason']}")
+        lines.append("   " + ", ".join(f"{phase} {ms:.2f} ms" for phase, ms in self.timings_ms.items()))
+        if self.error:
+            lines.append(f"   ✗ failed: {self.error}")
+        return "\n".join(lines)
+
+
+def _decisions(plan: PlanningResult, pid: int):
+    recirculations = [
+        {
+            "pid": pid,
+            "graph": g.graph_id,
+            "node": n.id,
+            "stage": n.allocated_stage,
+            "flow_id": n.flow_id,
+            "next_flow_id": n.instr.kwargs.get("next_flow_id"),
+        }
+        for g in plan.graphs
+        for n in g.nodes.values()
+        if n.instr.name == RECIRC_INSTR
+    ]
+    write_phases = {
+        "pid": pid,
+        "stages": sorted((plan.stats.wp_reserved if plan.stats else {}).keys()),
+        "hazards": plan.stats.write_hazards if plan.stats else 0,
+        "saved": plan.stats.wp_stages_saved if plan.stats else 0,
+        "nodes": [
+            {"graph": g.graph_id, "node": n.id, "stage": n.allocated_stage}
+            for g in plan.graphs
+            for n in g.nodes.values()
+            if n.instr.name == "configure_write_phase"
+        ],
+    }
+    return recirculations, write_phases
+
+
+@contextlib.contextmanager
+def _timed(timings: Dict[str, float], phase: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - t0
+
+
+def _dry_run(program, isa, pid, resolve_port, cache, strategy, hash_units, engine, installer, report, seconds):
+    timings: Dict[str, float] = {}
+    try:
+        plan = plan_program(
+            program, isa, pid, resolve_port, cache=cache, strategy=strategy, hash_units=hash_units.of(""),
+            timings=timings, debug_logs=False,
+        )
+        report.planner[""] = plan.stats.strategy
+        recirculations, write_phases = _decisions(plan, pid)
+        report.recirculations += recirculations
+        report.write_phases.append(write_phases)
+        report.choices += [dict(choice.to_dict(), pid=pid) for choice in plan.stats.choices]
+
+        with _timed(timings, "install"):
+            if "handler_epochs" in program:
+                epochs = installer.install_epochs(plan, pid, program["handler_epochs"], program["epoch_names"])
+                report.epochs = {epoch: len(entries) for epoch, entries in epochs.items()}
+            else:
+                installer.install(plan, pid)
+        with _timed(timings, "finalize"):
+            engine._final_configs_(pid)
+    finally:
+        for phase, s in timings.items():
+            seconds[phase] = seconds.get(phase, 0.0) + s
+
+
+def dry_run_program(
+    compiled_app: Dict[str, Any],
+    manifest: Dict[str, Any],
+    isa: Dict[str, Any],
+    program_id: int = 1,
+    *,
+    quiet: bool = True,
+    planner: Any = None,
+    installed_hash_units: Optional[Dict[int, List[str]]] = None,
+) -> DryRunReport:
+    """
+    Deploys `compiled_app` (the union_view of a multi-epoch app, with its
+    first epoch installed) on a fresh recording runtime, planned with the
+    `planner` strategy (else the manifest's), on the hash units left by the
+    `installed_hash_units` of the running engine (unit -> engine hash
+    fields). `quiet` swallows what the mechanisms print while installing.
+    """
+    runtime = RecordingRuntime()
+    engine = EngineController(runtime)
+    installer = Installer(engine=engine)
+    resolve_port = partial(resolve_dev_port, manifest, dev_ports=runtime.dev_ports.snapshot())
+    cache = LoweringCache()
+    strategy = strategy_for(manifest, planner)
+
+    program = union_view(compiled_app) if is_multi_epoch(compiled_app) else compiled_app
+
+    report = DryRunReport()
+    seconds: Dict[str, float] = {}
+    runtime.clear_ops()
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        try:
+            hash_units = program_hash_units(program, installed_hash_units)
+            hash_units.configure(engine)
+            report.program_ids[""] = program_id
+            _dry_run(program, isa, program_id, resolve_port, cache, strategy, hash_units,
+                     engine, installer, report, seconds)
+        except Exception as e:
+            report.error = repr(e)
+
+    report.ops = [op.to_dict() for op in runtime.ops if op.op in WRITE_OPS]
+    report.reads = len(runtime.ops) - len(report.ops)
+    report.entries = runtime.entry_counts()
+    report.timings_ms = {phase: round(seconds[phase] * 1e3, 3) for phase in PHASES if phase in seconds}
+    return report
@@ -0,0 +1,157 @@
+"""
+Hash Units
+----------
+
+Assignment of the hashes of one or more programs (resources "hashes") to
+the global hash units of the engine (initblock.hash_1..3).
+
+Every hash an instruction uses needs a unit configured with its field list
+(in order; the seed is set per program id, so it is not part of the unit
+configuration), and the unit decides the micro instructions the hash is
+lowered into (set_index_hash_<n>_w_*, fetch_hash_<n>). Not every unit has
+every micro instruction, so a hash can only go to the units of its uses
+(lowering_rules.HASH_UNIT_USES): register indexes on hash_1 or hash_2,
+variable-valued indexes and HASHTOVAR on hash_1 only. A header field used
+directly as a register index (r[IPV4.SRC]) has no micro instruction of its
+own either, so it is hashed on a unit configured with just that field.
+
+Hashes are assigned most constrained first; hashes with the same field list
+(of any program) share a unit that suits all of them. Declared hashes that
+no instruction uses get no unit.
+
+The same assignment is used to lower the programs (the unit of each hash
+name) and to configure the engine (the fields of each unit), so programs
+installed together (co-hosted apps) are assigned together; a multi-epoch
+app is one program (its epochs.union_view). Programs installed later are
+assigned against the units of the programs already on the engine
+(`installed`, see state_manager): a hash reuses an installed unit with its
+field list, never reconfigures one, and the install is rejected when no
+unit is left.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from lib.tofino.constants import (
+    HASH_ETH_SRC_ADDR,
+    HASH_IPV4_SRC_ADDR,
+    HASH_IPV4_DST_ADDR,
+    HASH_IPV4_PROTO,
+    HASH_L4_SPORT,
+    HASH_L4_DPORT,
+)
+from .lowering_rules import HASH_UNIT_USES, hash_uses
+from .target import stage_run_graphs
+
+# Global hash units of the engine (initblock.hash_1..3)
+HASH_UNITS = 3
+
+# StageRun header field -> engine hash field
+HASH_FIELDS = {
+    "ETH.SRC": HASH_ETH_SRC_ADDR,
+    "IPV4.SRC": HASH_IPV4_SRC_ADDR,
+    "IPV4.DST": HASH_IPV4_DST_ADDR,
+    "IPV4.PROTO": HASH_IPV4_PROTO,
+    "L4.SPORT": HASH_L4_SPORT,
+    "L4.DPORT": HASH_L4_DPORT,
+}
+
+
+class HashUnitError(Exception):
+    pass
+
+
+@dataclass
+class HashUnits:
+    units: Dict[int, List[str]] = field(default_factory=dict)          # unit (1-based) -> engine hash fields
+    by_program: Dict[str, Dict[str, int]] = field(default_factory=dict)  # program key -> hash name -> unit
+    installed: Dict[int, List[str]] = field(default_factory=dict)      # units already configured on the engine
+
+    def of(self, key: str) -> Dict[str, int]:
+        return self.by_program.get(key, {})
+
+    def units_of(self, key: str) -> Dict[int, List[str]]:
+        """Unit -> engine hash fields of the units program `key` is lowered to."""
+        return {unit: self.units[unit] for unit in sorted(set(self.of(key).values()))}
+
+    def configure(self, engine_controller, key: Optional[str] = None) -> None:
+        """
+        Sets the field list of the units of program `key` (of every assigned
+        unit by default) on the engine. Installed units are left as they are;
+        the configured ones become installed.
+        """
+        units = self.units if key is None else self.units_of(key)
+        for unit, fields in sorted(units.items()):
+            if unit in self.installed:
+                continue
+            engine_controller.hash_mechanism[unit - 1].set_hash_mechanism(list(fields))
+            self.installed[unit] = list(fields)
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        return [{"unit": unit, "fields": fields} for unit, fields in sorted(self.units.items())]
+
+
+def _engine_fields(key: str, name: str, args: List[Any]) -> Tuple[str, ...]:
+    fields = []
+    for f in args:
+        if isinstance(f, int):
+            continue    # seed
+        if f not in HASH_FIELDS:
+            raise HashUnitError(f"'{key}': field {f} of hash '{name}' is not supported by the engine hash units")
+        fields.append(HASH_FIELDS[f])
+    return tuple(fields)
+
+
+def _hash_needs(key: str, compiled_app: Dict[str, Any]) -> List[Tuple[str, str, Tuple[str, ...], Tuple[int, ...]]]:
+    """(key, hash name, engine fields, allowed units) of every hash used by a program, in first-use order."""
+    hashes = (compiled_app.get("resources") or {}).get("hashes") or {}
+    allowed: Dict[str, Tuple[int, ...]] = {}
+    for graph in stage_run_graphs(compiled_app):
+        for node in graph.get("nodes", []):
+            for name, use in hash_uses(node.get("op"), node.get("args")):
+                if name not in hashes and name.upper() not in HASH_FIELDS:
+                    raise HashUnitError(f"'{key}': '{name}' is used as a hash but is not declared")
+                units = allowed.get(name, HASH_UNIT_USES[use])
+                allowed[name] = tuple(u for u in units if u in HASH_UNIT_USES[use])
+                if not allowed[name]:
+                    raise HashUnitError(f"'{key}': no engine hash unit supports every use of hash '{name}'")
+    # a header field used directly as an index is hashed on its own
+    return [(key, name, _engine_fields(key, name, hashes.get(name, [name.upper()])), units)
+            for name, units in allowed.items()]
+
+
+def assign_hash_units(programs: List[Tuple[str, Dict[str, Any]]],
+                      installed: Optional[Dict[int, List[str]]] = None) -> HashUnits:
+    """
+    Hash units of `programs` ([(key, single program view)]) installed
+    together, on an engine whose `installed` units (unit -> engine hash
+    fields) are configured for other programs.
+    """
+    needs = [need for key, app in programs for need in _hash_needs(key, app)]
+    needs.sort(key=lambda need: len(need[3]))     # most constrained first (stable)
+
+    installed = {int(u): list(f) for u, f in (installed or {}).items()}
+    result = HashUnits(by_program={key: {} for key, _ in programs}, installed=installed)
+    units: Dict[int, Tuple[str, ...]] = {u: tuple(f) for u, f in installed.items()}
+    used = set()
+    for key, name, fields, allowed in needs:
+        unit: Optional[int] = next((u for u in allowed if units.get(u) == fields), None)
+        if unit is None:
+            unit = next((u for u in allowed if u not in units), None)
+        if unit is None:
+            raise HashUnitError(
+                f"'{key}': hash '{name}' needs one of {', '.join(f'hash_{u}' for u in allowed)}, "
+                f"but they are taken by {[list(units[u]) for u in allowed]}"
+            )
+        units[unit] = fields
+        used.add(unit)
+        result.by_program[key][name] = unit
+
+    result.units = {u: list(units[u]) for u in sorted(used)}
+    return result
+
+
+def program_hash_units(compiled_app: Dict[str, Any], installed: Optional[Dict[int, List[str]]] = None) -> HashUnits:
+    """Hash units of one program installed on its own (its key is "")."""
+    return assign_hash_units([("", compiled_app)], installed)
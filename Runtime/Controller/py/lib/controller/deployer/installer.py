@@ -2,10 +2,13 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Literal, Any
 from .planner import PlanningResult
-from .types import MicroNode
 import lib.controller.state_manager as sm
-from lib.controller.constants import P1_TABLE, P2_TABLE, SPEC_TABLE
+from lib.controller.constants import P1_TABLE, P2_TABLE, SPEC_TABLE, MULTI_TABLE
+from .lowering_rules import install_call
+from .types import MicroNode, MicroInstructionError
 from lib.tofino.constants import *
+from lib.tofino.recording_runtime import EntryRecorder
+from lib.engine.engine_controller import EngineController
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,9 +16,15 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class Installer:
+    # EngineController to install on (default: the one of the running engine);
+    # dry-run deploys pass one built on a RecordingRuntime
+    engine: Any = None
 
-    @staticmethod
-    def install_prefilter_keys(keys:dict = {}):
+    @property
+    def engine_controller(self):
+        return self.engine if self.engine is not None else sm.engine_controller
+
+    def install_prefilter_keys(self, keys:dict = {}):
         """
         Install the prefilter key in hardware.
         """
@@ -25,7 +34,7 @@ class Installer:
             kwargs = keys["kwargs"]
 
             # Choose table
-            table_to_install_rule = sm.engine_controller.pre_filter_mechanism
+            table_to_install_rule = self.engine_controller.pre_filter_mechanism
 
             func = getattr(table_to_install_rule, instr, None)
             if func is None:
@@ -37,8 +46,7 @@ class Installer:
         if kwargs:
             func(**kwargs)
 
-    @staticmethod
-    def install_default_action(default_action:dict = {}):
+    def install_default_action(self, default_action:dict = {}):
         """
         Installs the default action for the prefilter (drop, fwd, fwd_and_enqueue).
         """
@@ -48,7 +56,7 @@ class Installer:
             instr = default_action["instr"]
             kwargs = default_action["kwargs"]
 
-            func = getattr(sm.engine_controller.generic_fwd, instr, None)
+            func = getattr(self.engine_controller.generic_fwd, instr, None)
             if func is None:
                 raise RuntimeError(f"Instruction {instr} does not exist in PreFilter Mechanism (key installation).")
         if __debug__:
@@ -58,8 +66,7 @@ class Installer:
         if kwargs:
             func(**kwargs)
 
-    @staticmethod
-    def install_node(node: MicroNode):
+    def install_node(self, node: MicroNode):
         
         table = node.allocated_table
         table_to_install_rule = None
@@ -69,17 +76,17 @@ class Installer:
             return
 
         elif node.instr.name == "pos_filter_recirc_same_pipe" or table == "recirculation_t":
-            func = getattr(sm.engine_controller.pos_filter_mechansim, "pos_filter_recirc_same_pipe", None)
+            func = getattr(self.engine_controller.pos_filter_mechansim, "pos_filter_recirc_same_pipe", None)
 
             kwargs = {
                 "program_id": [node.instr.kwargs["program_id"], MASK_PROGRAM_ID], 
-                "f1_next_instr": [node.instr.kwargs["flow_id"], MASK_FLOW], 
-                "next_flow_id": node.instr.kwargs["next_flow"]}
+                "f1_next_instr": [node.flow_id, MASK_FLOW], 
+                "next_flow_id": node.instr.kwargs["next_flow_id"]}
 
         elif node.instr.name == "configure_write_phase" or table == "write_phase_t":
             return
 
-            func = getattr(sm.engine_controller.write_phase_mechanism, "set_write_phases", None)
+            func = getattr(self.engine_controller.write_phase_mechanism, "set_write_phases", None)
 
             kwargs = {
                 "program_id" : getattr(node.instr.kwargs, "program_id", 1),
@@ -94,21 +101,27 @@ class Installer:
             }
 
         elif table in P1_TABLE:
-            table_to_install_rule = sm.engine_controller.p1_table
+            table_to_install_rule = self.engine_controller.p1_table
         elif table in P2_TABLE:
-            table_to_install_rule = sm.engine_controller.p2_table
+            table_to_install_rule = self.engine_controller.p2_table
         elif table in SPEC_TABLE:
-            table_to_install_rule = sm.engine_controller.spec_table
+            table_to_install_rule = self.engine_controller.spec_table
+        elif table == MULTI_TABLE:
+            table_to_install_rule = self.engine_controller.multi_table
+        else:
+            raise RuntimeError(f"Instrução {node.instr.name} alocada numa tabela desconhecida: {table}")
 
         if table_to_install_rule:
             table_to_install_rule._set_location_(f"SwitchIngress.{node.allocated_flow}_i{node.allocated_stage}")
-            
-            # call method by name
-            func = getattr(table_to_install_rule, node.instr.name, None)
-            kwargs = node.instr.kwargs
-            kwargs["ni"] = node.flow_id
-            if func is None:
-                raise RuntimeError(f"Instrução {node.micro_instr.instr_name} não existe no objeto {table_to_install_rule}")
+
+            # call the method of the form the planner placed (speculative, ISA name, ...) with its kwargs
+            op = node.selected_op or node.instr.name
+            try:
+                method, kwargs = install_call(type(table_to_install_rule), op, node.instr.name,
+                                              {**node.instr.kwargs, "ni": node.flow_id})
+            except MicroInstructionError as e:
+                raise RuntimeError(f"Instrução {op} não pode ser instalada em {table_to_install_rule.table_name}: {e}") from e
+            func = getattr(table_to_install_rule, method)
         # Execute with the arguments
         if __debug__:
             logger.debug("install_node:")
@@ -117,12 +130,11 @@ class Installer:
         if kwargs:
             func(**kwargs)
 
-        if table_to_install_rule:
+        if table_to_install_rule and hasattr(table_to_install_rule, "print_entries_for_pid"):
             table_to_install_rule.print_entries_for_pid(kwargs['program_id'])
         
-    @classmethod
     def install_write_phases(self, wp_reserved: Dict[int, int], pid:int):
-        func = getattr(sm.engine_controller.write_phase_mechanism, "set_write_phases", None)
+        func = getattr(self.engine_controller.write_phase_mechanism, "set_write_phases", None)
 
         kwargs = {
             "program_id" : pid,
@@ -144,15 +156,14 @@ class Installer:
         func(**kwargs)
         
 
-    @classmethod
-    def install(self, plan: PlanningResult, pid: int):
+    def install_graphs(self, graphs: List[Any]):
         """
         Install the program graphs onto the switch.
 
         Each ControlFlowGraph corresponds to a PreFilter in the micro_program.
         The association is made via matching names (cfg.name == prefilter.name).
         """
-        for g in plan.graphs:
+        for g in graphs:
             # 1. Keys
             self.install_prefilter_keys(g.keys)
             #2. Default Action
@@ -161,5 +172,46 @@ class Installer:
             for node in g.nodes.values():
                 self.install_node(node)
 
+    def install(self, plan: PlanningResult, pid: int, graphs: Optional[List[Any]] = None):
+        """
+        Install the graphs of the plan (`graphs`, all by default) and its write phases.
+        """
+        self.install_graphs(plan.graphs if graphs is None else graphs)
+
         # 4. Install WP
-        self.install_write_phases(plan.stats.wp_reserved, pid)
\ No newline at end of file
+        self.install_write_phases(plan.stats.wp_reserved, pid)
+
+    def record_entries(self, graphs: List[Any]) -> List[list]:
+        """
+        Entries the graphs install ([table, key_list, data_list, annotation]),
+        recorded on an empty recording runtime instead of being written.
+        """
+        runtime = EntryRecorder()
+        Installer(engine=EngineController(runtime)).install_graphs(graphs)
+
+        writes = {op.op for op in runtime.ops} - {"add", "get", "get_all"}
+        if writes:
+            raise RuntimeError(f"Epoch graphs can only add entries, got: {', '.join(sorted(writes))}")
+        return runtime.entries
+
+    def install_epochs(self, plan: PlanningResult, pid: int, handler_epochs: Dict[str, List[str]],
+                       epochs: List[str]) -> Dict[str, List[list]]:
+        """
+        Install the plan of a multi-epoch app (of its epochs.union_view): the
+        graphs shared by every epoch and the write phases once, then the
+        graphs of the first epoch only. Returns the entries of the graphs of
+        each epoch ({epoch: entries}), which is all switching epochs changes
+        (EngineController.switch_entries).
+        """
+        shared = [g for g in plan.graphs if len(handler_epochs[g.graph_id]) == len(epochs)]
+        self.install(plan, pid, shared)
+
+        entries = {
+            epoch: self.record_entries([
+                g for g in plan.graphs
+                if epoch in handler_epochs[g.graph_id] and len(handler_epochs[g.graph_id]) < len(epochs)
+            ])
+            for epoch in epochs
+        }
+        self.engine_controller.add_entries(entries[epochs[0]])
+        return entries
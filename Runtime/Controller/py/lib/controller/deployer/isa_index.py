@@ -0,0 +1,155 @@
+"""
+ISA Index
+---------
+
+Inverted index of an engine ISA pipeline for the planner: instead of walking
+isa["pipeline"] (stages -> flows -> tables -> op lists) for every micro-node,
+the (stage, flow, table) slots are numbered once, in pipeline order, and
+every op name maps to a bitmap of the slots that hold it.
+
+A placement query is then a few integer operations:
+
+    candidates = op_mask(op) | op_mask(alternative)
+    free       = candidates & from_stage(current_stage) & ~occupied
+    slot       = lowest set bit of free
+
+where `occupied` is a bitmap kept by the caller (stages reserved for a write
+phase, tables at capacity, ...). Bit order is pipeline order, so the lowest
+bit is the first slot the previous scan would have found.
+
+Indexes are built once per ISA (keyed by its version and checksum) and
+shared by all planners.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Slot = Tuple[int, str, str]      # (stage, flow, table)
+
+
+def isa_checksum(isa: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(isa, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _lowest_bit(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Positions of the set bits of `mask`, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class IsaIndex:
+    def __init__(self, isa: Dict[str, Any]):
+        self.version = isa.get("version")
+        self.slots: List[Slot] = []
+        self.slot_ops: List[frozenset] = []
+        self.op_masks: Dict[str, int] = {}
+        self.stage_masks: Dict[int, int] = {}
+        self.flow_masks: Dict[str, int] = {}
+
+        for stage_name, flows in isa.get("pipeline", {}).items():
+            stage = int(stage_name.lstrip("s"))
+            for flow_name, tables in flows.items():
+                for table_name, instr_list in tables.items():
+                    if not isinstance(instr_list, list):
+                        continue
+                    bit = 1 << len(self.slots)
+                    self.slots.append((stage, flow_name, table_name))
+                    self.slot_ops.append(frozenset(instr_list))
+                    self.stage_masks[stage] = self.stage_masks.get(stage, 0) | bit
+                    self.flow_masks[flow_name] = self.flow_masks.get(flow_name, 0) | bit
+                    for op in instr_list:
+                        self.op_masks[op] = self.op_masks.get(op, 0) | bit
+
+        self.positions: Dict[Slot, int] = {slot: i for i, slot in enumerate(self.slots)}
+        self.stages: List[int] = sorted(self.stage_masks)
+
+        # slots of stage >= s, for every stage of the pipeline (pipeline order
+        # is stage order in the engine ISAs, but do not rely on it)
+        self._from_stage: Dict[int, int] = {}
+        acc = 0
+        for stage in reversed(self.stages):
+            acc |= self.stage_masks[stage]
+            self._from_stage[stage] = acc
+        self._candidates: Dict[Tuple[str, ...], int] = {}
+
+    # ------------------------------------------------------------
+    # Bitmaps
+    # ------------------------------------------------------------
+
+    def op_mask(self, op: str) -> int:
+        return self.op_masks.get(op, 0)
+
+    def candidates_mask(self, ops: Sequence[str]) -> int:
+        """Slots holding any of `ops` (memoized per candidate list)."""
+        key = tuple(ops)
+        mask = self._candidates.get(key)
+        if mask is None:
+            mask = 0
+            for op in key:
+                mask |= self.op_masks.get(op, 0)
+            self._candidates[key] = mask
+        return mask
+
+    def stage_mask(self, stage: Optional[int]) -> int:
+        return self.stage_masks.get(stage, 0) if stage is not None else 0
+
+    def flow_mask(self, flow: Optional[str]) -> int:
+        """Slots of flow `flow` (f1, f2) in every stage."""
+        return self.flow_masks.get(flow, 0) if flow is not None else 0
+
+    def from_stage(self, stage: int) -> int:
+        """Slots of stage `stage` onwards."""
+        for s in self.stages:
+            if s >= stage:
+                return self._from_stage[s]
+        return 0
+
+    # ------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------
+
+    def first(self, ops: Sequence[str], start_stage: int, occupied: int = 0) -> Optional[Slot]:
+        """First free slot from `start_stage` onwards holding one of `ops`."""
+        free = self.candidates_mask(ops) & self.from_stage(start_stage) & ~occupied
+        if not free:
+            return None
+        return self.slots[_lowest_bit(free)]
+
+    def first_stage(self, ops: Sequence[str], start_stage: int, occupied: int = 0) -> List[Slot]:
+        """All free slots of the first stage (from `start_stage`) that has one for `ops`."""
+        free = self.candidates_mask(ops) & self.from_stage(start_stage) & ~occupied
+        if not free:
+            return []
+        stage = self.slots[_lowest_bit(free)][0]
+        return [self.slots[i] for i in iter_bits(free & self.stage_masks[stage])]
+
+    def op_at(self, slot: Slot, ops: Sequence[str]) -> Optional[str]:
+        """First of `ops` (in order) that `slot` holds."""
+        slot_ops = self.slot_ops[self.positions[slot]]
+        for op in ops:
+            if op in slot_ops:
+                return op
+        return None
+
+    def slot_bit(self, slot: Slot) -> int:
+        return 1 << self.positions[slot]
+
+
+_indexes: Dict[Tuple[Any, str], IsaIndex] = {}
+
+
+def isa_index(isa: Dict[str, Any]) -> IsaIndex:
+    """Shared index of `isa`, built on first use."""
+    key = (isa.get("version"), isa_checksum(isa))
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = IsaIndex(isa)
+    return index
@@ -0,0 +1,87 @@
+"""
+Lowered Handler Cache
+---------------------
+
+Micro-graphs of lowered handlers, keyed by the handler's Merkle hash (as
+carried by the export, see Core/stagerun_graph/merkle.py; the importer
+rejects exports whose stored hashes do not match their content), the
+checksum of the engine ISA and the hash units of the program (hash_units.py).
+
+Handlers are lowered with symbolic ports, as for pre-planned targets, and
+bound to the dev_ports of the app being installed on every use: a handler
+that did not change between two versions of an app (or is shared by several
+apps) is lowered once. Planning still runs on the whole program.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from Core.stagerun_graph.merkle import stored_tree
+from .types import MicroGraph
+from .hash_units import program_hash_units
+from .micro_instruction import MicroInstructionParser
+from .target import (
+    PID_PLACEHOLDER,
+    isa_checksum,
+    symbolic_port,
+    stage_run_graphs,
+    graph_to_dict,
+    graph_from_dict,
+    memo_ports,
+    _relocate,
+)
+
+
+class LoweringCache:
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, Tuple[Tuple[str, int], ...]], Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def lower(
+        self,
+        compiled_app: Dict[str, Any],
+        isa: Dict[str, Any],
+        resolve_port: Callable[[str], Any],
+        hash_units: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[MicroGraph], int]:
+        """
+        Micro-graphs of the handlers of `compiled_app` (single program view)
+        bound to `resolve_port` and `hash_units` (hash name -> engine unit,
+        the program's own assignment if not given), and how many of them
+        came from the cache. Exports without per-handler hashes are lowered
+        as a whole.
+        """
+        if hash_units is None:
+            hash_units = program_hash_units(compiled_app).of("")
+        graphs = stage_run_graphs(compiled_app)
+        tree = None if compiled_app.get("graphs") else stored_tree(compiled_app)
+        if tree is None:
+            mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=resolve_port, hash_units=hash_units)
+            return mip.to_micro(graphs), 0
+
+        isa_sum = isa_checksum(isa)
+        units_key = tuple(sorted(hash_units.items()))
+        port_of = memo_ports(resolve_port)
+        out: List[MicroGraph] = []
+        reused = 0
+        for graph, handler_hash in zip(graphs, tree.handlers):
+            key = (handler_hash, isa_sum, units_key)
+            entry = self._entries.get(key)
+            if entry is None:
+                mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=symbolic_port, hash_units=hash_units)
+                entry = graph_to_dict(mip.to_micro([graph])[0])
+                self._entries[key] = entry
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+                reused += 1
+            out.append(graph_from_dict(_relocate(entry, PID_PLACEHOLDER, port_of)))
+        return out, reused
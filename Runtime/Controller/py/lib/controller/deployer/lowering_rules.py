@@ -0,0 +1,888 @@
+"""
+Lowering Rules
+--------------
+
+Declarative lowering of StageRun instructions into engine micro instructions,
+used by MicroInstructionParser.
+
+LOWERING_SPEC maps every StageRun op (Core/stagerun_isa.py) to a rule with:
+  - its operands: the arg keys they are read from (the exporter's AST field
+    names first, then the keys of older exports) and their kind. The kind is
+    the operand constraint: it validates the value and converts it to what
+    the templates use (ports are resolved to dev_ports, headers to their
+    fetcher and header id, hashes to the engine hash unit assigned to them,
+    see hash_units.py, ...);
+  - the micro instruction templates it expands into, in order: the engine
+    table method, its alternative (the speculative variant, or the name the
+    ISA pipeline lists when it differs from the method), kwargs and the
+    read/write effects. "{operand.attr}" in names and Ref("operand.attr") in
+    kwargs/effects stand for converted operand values; kwargs whose value is
+    None are left out (the table default applies).
+Ops the engine cannot execute have an `unsupported` rule and are rejected
+with an explicit error.
+
+LoweringRegistry compiles the spec once into one closure per op, so lowering
+an instruction is a dict lookup plus the operand conversions.
+check_conformance() lowers sample instances of every rule and checks them
+against the engine tables and an ISA (Tools/benchmarks/bench_lowering.py).
+"""
+
+from __future__ import annotations
+import copy
+import inspect
+import ipaddress
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from Core.stagerun_isa import ISA
+from lib.tofino.constants import (
+    HEADER_IPV4_TTL,
+    HEADER_IPV4_DST,
+    HEADER_IPV4_SRC,
+    HEADER_IPV4_IDENTIFICATION,
+    HEADER_TCP_ACK_NO,
+    HEADER_TCP_SEQ_NO,
+    HEADER_TCP_FLAGS,
+    MODE_PADTTERN,
+    REG_OP_MODE_GET,
+    REG_OP_MODE_PUT,
+    REG_OP_MODE_INCREMENT,
+)
+from .types import MicroInstruction, MicroEffect, MicroInstructionError
+
+PortResolver = Callable[[str], Any]
+HashResolver = Callable[[str], int]     # hash name -> engine hash unit (initblock.hash_<n>)
+
+
+class Resolvers(NamedTuple):
+    """What operand kinds resolve against the program being installed."""
+    port: PortResolver
+    hash_unit: HashResolver
+
+
+def no_hash_units(name: str) -> int:
+    raise MicroInstructionError(f"no hash unit assigned to hash '{name}'")
+
+# Micro instructions placed by the Planner itself (on the conditional tables)
+PLANNER_OPS = {"decide"}
+
+# Engine hash units with micro instructions, per use of a hash
+# (the tables have no set_index/fetch for hash_3)
+HASH_UNIT_USES: Dict[str, Tuple[int, ...]] = {
+    "index": (1, 2),        # set_index_hash_<n>_w_const_val / _w_global_var_pkt_size
+    "index_var": (1,),      # speculative_set_index_hash_1_w_var
+    "fetch": (1,),          # fetch_hash_1
+}
+
+
+# ============================================================
+# Headers
+# ============================================================
+
+class HeaderField(NamedTuple):
+    name: str
+    fetch: Optional[str]        # fetcher, None if the engine cannot read the header
+    id: Optional[int]           # header_id of sum_ni writes, None if it cannot write it
+
+
+def _headers(*fields: HeaderField, aliases: Dict[str, str]) -> Dict[str, HeaderField]:
+    table = {f.name: f for f in fields}
+    table.update({alias: table[name] for alias, name in aliases.items()})
+    return table
+
+
+HEADERS = _headers(
+    HeaderField("IPV4.TTL", "fetch_ipv4_ttl", HEADER_IPV4_TTL),
+    HeaderField("IPV4.LEN", "fetch_ipv4_total_len", None),
+    HeaderField("IPV4.IHL", "fetch_ipv4_ihl", None),
+    HeaderField("IPV4.DST", None, HEADER_IPV4_DST),
+    HeaderField("IPV4.SRC", None, HEADER_IPV4_SRC),
+    HeaderField("IPV4.ID", None, HEADER_IPV4_IDENTIFICATION),
+    HeaderField("IPV4.PROTO", None, None),
+    HeaderField("TCP.ACKNO", "fetch_tcp_ack", HEADER_TCP_ACK_NO),
+    HeaderField("TCP.SEQNO", "fetch_tcp_seq", HEADER_TCP_SEQ_NO),
+    HeaderField("TCP.FLAGS", None, HEADER_TCP_FLAGS),
+    HeaderField("TCP.DATAOFFSET", "fetch_tcp_data_offset", None),
+    aliases={"TCP.ACK_NO": "TCP.ACKNO", "TCP.SEQ_NO": "TCP.SEQNO"},
+)
+
+
+# ============================================================
+# Operand kinds (constraint + conversion)
+# ============================================================
+
+class CondOperand(NamedTuple):
+    reads: Tuple[str, ...]      # variables/headers compared by the condition
+
+
+class IndexSource(NamedTuple):
+    unit: str                   # set_index_<unit>_w_*: ingress_port | hash_<n>
+    name: str
+
+
+class HashSource(NamedTuple):
+    unit: str                   # fetch_<unit>: hash_<n>
+    name: str
+
+
+class MemValue(NamedTuple):
+    source: str                 # set_index_*_w_<source>: const_val | global_var_pkt_size | var
+    value: Optional[int]
+    var: Optional[str] = None
+    prefix: str = ""            # var indexes only exist as speculative_set_index_*_w_var
+
+
+def _name(value: Any, env: Resolvers) -> str:
+    if not isinstance(value, str) or not value:
+        raise MicroInstructionError(f"expected a name, got {value!r}")
+    return value
+
+
+def _port(value: Any, env: Resolvers) -> Any:
+    return env.port(_name(value, env))
+
+
+def _const(value: Any, env: Resolvers) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise MicroInstructionError(f"expected an integer constant, got {value!r}")
+    if isinstance(value, int):
+        return value
+    if value[:1].isdigit() or value[:1] in ("-", "+"):
+        try:
+            return int(value, 0)
+        except ValueError:
+            pass
+        try:
+            return int(ipaddress.IPv4Address(value))
+        except ValueError:
+            pass
+    raise MicroInstructionError(f"expected an integer constant, got {value!r}")
+
+
+def _header(value: Any, env: Resolvers) -> HeaderField:
+    header = HEADERS.get(str(value).upper())
+    if header is None:
+        raise MicroInstructionError(f"unknown header {value!r}")
+    return header
+
+
+def _readable_header(value: Any, env: Resolvers) -> HeaderField:
+    header = _header(value, env)
+    if header.fetch is None:
+        raise MicroInstructionError(f"header '{header.name}' cannot be read by the engine")
+    return header
+
+
+def _writable_header(value: Any, env: Resolvers) -> HeaderField:
+    header = _header(value, env)
+    if header.id is None:
+        raise MicroInstructionError(f"header '{header.name}' cannot be written by the engine")
+    return header
+
+
+def _cond_reads(node: Any, out: List[str]) -> None:
+    if not isinstance(node, dict):
+        return
+    if str(node.get("op")).upper() in ("&&", "||", "AND", "OR"):
+        _cond_reads(node.get("left"), out)
+        _cond_reads(node.get("right"), out)
+        return
+    for side in (node.get("left"), node.get("right")):
+        if isinstance(side, str) and side not in out:
+            try:
+                _const(side, None)
+            except MicroInstructionError:
+                out.append(side)
+
+
+def _cond(value: Any, env: Resolvers) -> CondOperand:
+    if not isinstance(value, dict):
+        raise MicroInstructionError(f"expected a condition, got {value!r}")
+    reads: List[str] = []
+    _cond_reads(value, reads)
+    return CondOperand(tuple(reads))
+
+
+def _pattern(value: Any, env: Resolvers) -> List[int]:
+    if not isinstance(value, (list, tuple)) or not value:
+        raise MicroInstructionError(f"expected a non-empty size pattern, got {value!r}")
+    return [_const(v, env) for v in value]
+
+
+def _hash_unit(name: str, use: str, env: Resolvers) -> str:
+    unit = env.hash_unit(name)
+    if unit not in HASH_UNIT_USES[use]:
+        raise MicroInstructionError(
+            f"hash '{name}' is on hash_{unit}, the engine has no {use} micro instruction for it "
+            f"(only for {', '.join(f'hash_{u}' for u in HASH_UNIT_USES[use])})"
+        )
+    return f"hash_{unit}"
+
+
+def _mem_index(value: Any, env: Resolvers) -> IndexSource:
+    name = _name(value, env)
+    if name.upper() == "PKT.PORT":
+        return IndexSource("ingress_port", name)
+    return IndexSource(_hash_unit(name, "index", env), name)
+
+
+def _fetch_hash(value: Any, env: Resolvers) -> HashSource:
+    name = _name(value, env)
+    return HashSource(_hash_unit(name, "fetch", env), name)
+
+
+def _mem_value(value: Any, env: Resolvers) -> MemValue:
+    if isinstance(value, str) and value.upper() == "PKT.SIZE":
+        return MemValue("global_var_pkt_size", None)
+    try:
+        return MemValue("const_val", _const(value, env))
+    except MicroInstructionError:
+        return MemValue("var", None, _name(value, env), "speculative_")
+
+
+def _access(value: Any, env: Resolvers) -> str:
+    access = str(value).upper()
+    if access not in ("OLD", "NEW"):
+        raise MicroInstructionError(f"expected OLD or NEW register access, got {value!r}")
+    return access.lower()
+
+
+def _mul_factor(value: Any, env: Resolvers) -> int:
+    factor = _const(value, env)
+    if factor != 4:
+        raise MicroInstructionError(f"the engine only multiplies by 4 (mul_4x), got {factor}")
+    return factor
+
+
+OPERAND_KINDS: Dict[str, Callable[[Any, PortResolver], Any]] = {
+    "name": _name,
+    "port": _port,
+    "const": _const,
+    "header": _header,
+    "readable_header": _readable_header,
+    "writable_header": _writable_header,
+    "cond": _cond,
+    "pattern": _pattern,
+    "mem_index": _mem_index,
+    "fetch_hash": _fetch_hash,
+    "mem_value": _mem_value,
+    "access": _access,
+    "mul_factor": _mul_factor,
+}
+
+
+# ============================================================
+# Spec
+# ============================================================
+
+@dataclass(frozen=True)
+class Operand:
+    name: str
+    kind: str
+    keys: Tuple[str, ...] = ()          # arg keys, first present one wins (default: (name,))
+    required: bool = True
+    default: Any = None                 # raw value of a missing optional operand
+    same_as: Optional[str] = None       # missing -> raw value of this (earlier) operand
+
+
+@dataclass(frozen=True)
+class Ref:
+    path: str                           # "operand" or "operand.attr"
+
+
+@dataclass(frozen=True)
+class MicroTemplate:
+    name: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    alternative: Optional[str] = None
+    reads: Tuple[str, ...] = ()         # operand paths
+    writes: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class LoweringRule:
+    operands: Tuple[Operand, ...] = ()
+    templates: Tuple[MicroTemplate, ...] = ()
+    unsupported: Optional[str] = None   # why the engine cannot execute the op
+    checks: Tuple[Callable[[Dict[str, Any]], None], ...] = ()   # constraints between converted operands
+
+
+def _fetch_header(path: str, **kwargs) -> MicroTemplate:
+    return MicroTemplate(
+        f"{{{path}.fetch}}", kwargs, alternative=f"speculative_{{{path}.fetch}}", reads=(f"{path}.name",),
+    )
+
+
+def _set_index(mode: int, value: Optional[str] = None) -> MicroTemplate:
+    source = f"{{{value}.source}}" if value else "const_val"
+    prefix = f"{{{value}.prefix}}" if value else ""
+    return MicroTemplate(
+        f"{prefix}set_index_{{index.unit}}_w_{source}",
+        {"mode": mode, "mem_const_val": Ref(f"{value}.value") if value else None},
+        alternative=f"speculative_set_index_{{index.unit}}_w_{source}",
+        reads=("index.name", f"{value}.var") if value else ("index.name",),
+    )
+
+
+def _var_index(value: str) -> Callable[[Dict[str, Any]], None]:
+    """Register indexes set from a variable only exist on the HASH_UNIT_USES["index_var"] units."""
+    units = {f"hash_{u}" for u in HASH_UNIT_USES["index_var"]}
+
+    def check(bound: Dict[str, Any]) -> None:
+        index, mem = bound["index"], bound[value]
+        if mem.source == "var" and index.unit not in units:
+            raise MicroInstructionError(
+                f"index '{index.name}' ({index.unit}) cannot be set from variable '{mem.var}' "
+                f"(only {', '.join(sorted(units))} has speculative_set_index_*_w_var)"
+            )
+    return check
+
+
+_PORT = Operand("port", "port", keys=("port", "dest"))
+_LVAR, _RVAR, _RESVAR = Operand("lvar", "name"), Operand("rvar", "name"), Operand("resvar", "name")
+_REG_INDEX = (Operand("reg", "name"), Operand("index", "mem_index"))
+_ACCESS = Operand("access", "access", keys=("acess_type", "access_type"), required=False, default="OLD")
+_ARITH = MicroTemplate("arith_between_vars_v1_v2", {"var_update": 1}, alternative="sum", reads=("lvar", "rvar"), writes=("resvar",))
+_REG_TO_VAR = dict(kwargs={"var_update": 1}, alternative="reg_{access}_value", reads=("reg",))
+
+
+LOWERING_SPEC: Dict[str, LoweringRule] = {
+    # --- forwarding ---
+    ISA.FWD.value: LoweringRule(
+        operands=(_PORT,),
+        templates=(MicroTemplate("fwd_ni", {"port": Ref("port")}, alternative="fwd"),),
+    ),
+    ISA.FWD_AND_ENQUEUE.value: LoweringRule(
+        operands=(_PORT, Operand("qid", "const")),
+        templates=(MicroTemplate("fwd_ni", {"port": Ref("port"), "qid": Ref("qid")}, alternative="fwd"),),
+    ),
+    ISA.DROP.value: LoweringRule(
+        templates=(MicroTemplate("fwd_ni", {"mark_to_drop": 1}, alternative="fwd"),),
+    ),
+    ISA.RTS.value: LoweringRule(
+        templates=(MicroTemplate("fwd_ni", {"rts": 1}, alternative="fwd"),),
+    ),
+    ISA.JMP.value: LoweringRule(
+        operands=(Operand("label", "name"),),
+        templates=(MicroTemplate("fwd_ni", {"enabled": 0}, alternative="fwd"),),
+    ),
+
+    # --- headers ---
+    ISA.HINC.value: LoweringRule(
+        operands=(
+            Operand("header", "readable_header", keys=("header", "target")),
+            Operand("value", "const"),
+            Operand("reshdr", "writable_header", required=False, same_as="header"),
+        ),
+        templates=(
+            _fetch_header("header"),
+            MicroTemplate("sum_ni", {"header_update": 1, "header_id": Ref("reshdr.id"), "const_val": Ref("value")},
+                          writes=("reshdr.name",)),
+        ),
+    ),
+    ISA.HASSIGN.value: LoweringRule(
+        operands=(Operand("header", "writable_header", keys=("header", "target")), Operand("value", "const")),
+        templates=(
+            MicroTemplate("sum_ni", {"header_update": 1, "header_id": Ref("header.id"), "const_val": Ref("value")},
+                          writes=("header.name",)),
+        ),
+    ),
+    ISA.HTOVAR.value: LoweringRule(
+        operands=(
+            Operand("header", "readable_header", keys=("header", "target")),
+            Operand("var", "name", keys=("var", "var_name")),
+        ),
+        templates=(
+            _fetch_header("header", header_to_var=1),
+            MicroTemplate("sum_ni", {"var_update": 1}, writes=("var",)),
+        ),
+    ),
+    ISA.HASHTOVAR.value: LoweringRule(
+        operands=(Operand("hash", "fetch_hash"), Operand("var", "name", keys=("var", "var_name"))),
+        templates=(
+            MicroTemplate("fetch_{hash.unit}", {"header_to_var": 1}, alternative="speculative_fetch_{hash.unit}", reads=("hash.name",)),
+            MicroTemplate("sum_ni", {"var_update": 1}, writes=("var",)),
+        ),
+    ),
+    ISA.VTOHEADER.value: LoweringRule(
+        operands=(Operand("var", "name", keys=("var", "var_name")), Operand("header", "writable_header", keys=("header", "target"))),
+        templates=(
+            MicroTemplate("fetch_v1", {"var_to_header": 1}, alternative="speculative_fetch_v1", reads=("var",)),
+            MicroTemplate("sum_ni", {"header_update": 1, "header_id": Ref("header.id")}, writes=("header.name",)),
+        ),
+    ),
+
+    # --- registers ---
+    ISA.MGET.value: LoweringRule(
+        operands=(*_REG_INDEX, Operand("var", "name"), _ACCESS),
+        templates=(_set_index(REG_OP_MODE_GET), MicroTemplate("reg1_{access}_value_ni", writes=("var",), **_REG_TO_VAR)),
+    ),
+    ISA.MSET.value: LoweringRule(
+        operands=(*_REG_INDEX, Operand("value", "mem_value")),
+        checks=(_var_index("value"),),
+        templates=(_set_index(REG_OP_MODE_PUT, "value"), MicroTemplate("reg1_new_value_ni", alternative="reg_new_value", writes=("reg",))),
+    ),
+    ISA.MINC.value: LoweringRule(
+        operands=(*_REG_INDEX, Operand("increment", "mem_value"), Operand("var", "name"), _ACCESS),
+        checks=(_var_index("increment"),),
+        templates=(
+            _set_index(REG_OP_MODE_INCREMENT, "increment"),
+            MicroTemplate("reg1_{access}_value_ni", writes=("reg", "var"), **_REG_TO_VAR),
+        ),
+    ),
+
+    # --- arithmetic ---
+    ISA.SUM.value: LoweringRule(operands=(_LVAR, _RVAR, _RESVAR), templates=(_ARITH,)),
+    ISA.SUB.value: LoweringRule(
+        operands=(_LVAR, _RVAR, _RESVAR),
+        templates=(MicroTemplate("complement_ni", {"var_update": 1}, alternative="negate", reads=("rvar",)), _ARITH),
+    ),
+    ISA.MUL.value: LoweringRule(
+        operands=(_LVAR, Operand("value", "mul_factor"), _RESVAR),
+        templates=(MicroTemplate("mul_4x_ni", {"var_update": 1}, alternative="mul_4x", reads=("lvar",), writes=("resvar",)),),
+    ),
+    ISA.INC.value: LoweringRule(
+        operands=(_LVAR, Operand("value", "const"), _RESVAR),
+        templates=(MicroTemplate("sum_ni", {"var_update": 1, "const_val": Ref("value")}, reads=("lvar",), writes=("resvar",)),),
+    ),
+
+    # --- mechanisms ---
+    ISA.PADTTERN.value: LoweringRule(
+        operands=(Operand("pattern", "pattern"),),
+        templates=(MicroTemplate("initialize_pad_ni", {"mode": MODE_PADTTERN}, alternative="init_pad"),),
+    ),
+    ISA.CLONE.value: LoweringRule(
+        operands=(Operand("port", "port"),),
+        templates=(MicroTemplate("initialize_activate_ni", alternative="init_activate"),),
+    ),
+    ISA.ACTIVATE.value: LoweringRule(
+        operands=(Operand("program", "name"),),
+        templates=(MicroTemplate("initialize_activate_ni", alternative="init_activate"),),
+    ),
+
+    # --- control flow (decide nodes are placed by the Planner) ---
+    ISA.BRCOND.value: LoweringRule(
+        operands=(Operand("cond", "cond"), Operand("label", "name")),
+        templates=(MicroTemplate("decide", {"cond_ir": {}, "reads": Ref("cond.reads")}, reads=("cond.reads",)),),
+    ),
+    ISA.IF.value: LoweringRule(
+        templates=(
+            MicroTemplate("decide", {"cond_ir": {}, "reads": Ref("effect.reads")},
+                          reads=("effect.reads",), writes=("effect.writes",)),
+        ),
+    ),
+
+    # --- no engine mechanism ---
+    ISA.RAND.value: LoweringRule(unsupported="the engine has no random number unit"),
+    ISA.TIME.value: LoweringRule(unsupported="the engine does not expose the ingress timestamp"),
+    ISA.IN.value: LoweringRule(unsupported="the engine has no IN/OUT label channel"),
+    ISA.OUT.value: LoweringRule(unsupported="the engine has no IN/OUT label channel"),
+}
+
+# Prefilter default actions (installed on the generic forwarding mechanism)
+DEFAULT_ACTION_SPEC: Dict[str, LoweringRule] = {
+    ISA.DROP.value: LoweringRule(templates=(MicroTemplate("drop", {"pkt_id": 0}),)),
+    ISA.FWD.value: LoweringRule(
+        operands=(_PORT,),
+        templates=(MicroTemplate("fwd", {"pkt_id": 0, "port": Ref("port")}),),
+    ),
+    ISA.FWD_AND_ENQUEUE.value: LoweringRule(
+        operands=(_PORT, Operand("qid", "const")),
+        templates=(MicroTemplate("fwd_and_enqueue", {"pkt_id": 0, "port": Ref("port"), "qid": Ref("qid")}),),
+    ),
+}
+
+
+# ============================================================
+# Compilation
+# ============================================================
+
+class CompilerEffect(NamedTuple):
+    reads: Tuple[str, ...]
+    writes: Tuple[str, ...]
+
+
+def _resource_name(resource: str) -> str:
+    # exporter effects are "<kind>:<name>" (var:x, hdr:IPV4.TTL, ...)
+    return resource.partition(":")[2] or resource
+
+
+def _compiler_effect(effect: Optional[Dict[str, Any]]) -> CompilerEffect:
+    effect = effect or {}
+    return CompilerEffect(
+        tuple(_resource_name(r) for r in effect.get("reads") or ()),
+        tuple(_resource_name(r) for r in effect.get("writes") or ()),
+    )
+
+
+def _getter(path: str) -> Callable[[Dict[str, Any]], Any]:
+    name, _, attr = path.partition(".")
+    if not attr:
+        return lambda bound: bound[name]
+    get_attr = attrgetter(attr)
+    return lambda bound: None if bound[name] is None else get_attr(bound[name])
+
+
+def _formatter(template: Optional[str]) -> Callable[[Dict[str, Any]], Optional[str]]:
+    if template is None or "{" not in template:
+        return lambda bound: template
+    return template.format_map
+
+
+def _effect_getter(paths: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Set[str]]:
+    getters = [_getter(p) for p in paths]
+
+    def get(bound: Dict[str, Any]) -> Set[str]:
+        out: Set[str] = set()
+        for g in getters:
+            value = g(bound)
+            if isinstance(value, str):
+                out.add(value)
+            elif value is not None:
+                out.update(value)
+        return out
+    return get
+
+
+LoweredOp = Callable[[Dict[str, Any], Optional[Dict[str, Any]], Resolvers], Tuple[List[MicroInstruction], List[MicroEffect]]]
+
+
+def _compile_rule(op: str, rule: LoweringRule) -> LoweredOp:
+    if rule.unsupported:
+        def unsupported(args, compiler_effect, env):
+            raise MicroInstructionError(f"{op} cannot be lowered: {rule.unsupported}")
+        return unsupported
+
+    binders = [
+        (o.name, o.keys or (o.name,), OPERAND_KINDS[o.kind], o.required, o.default, o.same_as)
+        for o in rule.operands
+    ]
+    uses_effect = any(
+        p.split(".")[0] == "effect"
+        for t in rule.templates
+        for p in (*t.reads, *t.writes, *(v.path for v in t.kwargs.values() if isinstance(v, Ref)))
+    )
+    builders = []
+    for t in rule.templates:
+        static = {k: v for k, v in t.kwargs.items() if not isinstance(v, Ref) and v is not None}
+        mutable = [k for k, v in static.items() if isinstance(v, (dict, list))]
+        refs = [(k, _getter(v.path)) for k, v in t.kwargs.items() if isinstance(v, Ref)]
+        builders.append((
+            _formatter(t.name), _formatter(t.alternative), static, mutable, refs,
+            _effect_getter(t.reads), _effect_getter(t.writes),
+        ))
+
+    def lower(args, compiler_effect, env):
+        bound: Dict[str, Any] = {"effect": _compiler_effect(compiler_effect) if uses_effect else None}
+        raws: Dict[str, Any] = {}
+        for name, keys, convert, required, default, same_as in binders:
+            raw = next((args[k] for k in keys if args.get(k) is not None), None)
+            if raw is None and same_as is not None:
+                raw = raws.get(same_as)
+            if raw is None:
+                if required:
+                    raise MicroInstructionError(f"{op}: missing operand '{name}' (args: {sorted(args)})")
+                raw = default
+            try:
+                bound[name] = None if raw is None else convert(raw, env)
+                raws[name] = raw
+            except MicroInstructionError as e:
+                raise MicroInstructionError(f"{op}: operand '{name}': {e}") from None
+        for check in rule.checks:
+            try:
+                check(bound)
+            except MicroInstructionError as e:
+                raise MicroInstructionError(f"{op}: {e}") from None
+
+        instrs: List[MicroInstruction] = []
+        effects: List[MicroEffect] = []
+        for name, alternative, static, mutable, refs, reads, writes in builders:
+            kwargs = dict(static)
+            for k in mutable:
+                kwargs[k] = copy.deepcopy(kwargs[k])
+            for k, get in refs:
+                value = get(bound)
+                if value is not None:
+                    kwargs[k] = list(value) if isinstance(value, tuple) else value
+            instrs.append(MicroInstruction(name=name(bound), kwargs=kwargs, alternative=alternative(bound)))
+            effects.append(MicroEffect(reads=reads(bound), writes=writes(bound)))
+        return instrs, effects
+
+    return lower
+
+
+class LoweringRegistry:
+    """StageRun op -> compiled lowering (see LOWERING_SPEC)."""
+
+    def __init__(
+        self,
+        spec: Dict[str, LoweringRule] = LOWERING_SPEC,
+        default_actions: Dict[str, LoweringRule] = DEFAULT_ACTION_SPEC,
+    ):
+        self.spec = spec
+        self.default_actions = default_actions
+        self._lower: Dict[str, LoweredOp] = {op: _compile_rule(op, r) for op, r in spec.items()}
+        self._default: Dict[str, LoweredOp] = {op: _compile_rule(op, r) for op, r in default_actions.items()}
+
+    def lower(
+        self,
+        op: str,
+        args: Dict[str, Any],
+        compiler_effect: Optional[Dict[str, Any]],
+        env: Resolvers,
+    ) -> Tuple[List[MicroInstruction], List[MicroEffect]]:
+        """Micro instructions and effects of one StageRun instruction."""
+        lowered = self._lower.get(op)
+        if lowered is None:
+            raise MicroInstructionError(f"Unknown instruction '{op}' cannot be translated.")
+        return lowered(args or {}, compiler_effect, env)
+
+    def default_action(self, action: Optional[Dict[str, Any]], env: Resolvers) -> Optional[Dict[str, Any]]:
+        """{"instr", "kwargs"} of a handler default action (None if it has none)."""
+        if not action or "op" not in action or "args" not in action:
+            return None
+        lowered = self._default.get(action["op"])
+        if lowered is None:
+            raise MicroInstructionError(f"Error Parsing MicroInstruction DefaultAction {action}")
+        (instr,), _ = lowered(action["args"] or {}, None, env)
+        return {"instr": instr.name, "kwargs": instr.kwargs}
+
+
+lowering_registry = LoweringRegistry()
+
+
+def hash_uses(op: str, args: Dict[str, Any], spec: Dict[str, LoweringRule] = LOWERING_SPEC) -> List[Tuple[str, str]]:
+    """(hash name, use) of the hashes one StageRun instruction uses (uses as in HASH_UNIT_USES)."""
+    rule = spec.get(op)
+    if rule is None or rule.unsupported:
+        return []
+    args = args or {}
+    raws = {o.name: next((args[k] for k in o.keys or (o.name,) if args.get(k) is not None), None) for o in rule.operands}
+
+    def is_var(raw: Any) -> bool:
+        try:
+            return raw is not None and _mem_value(raw, None).source == "var"
+        except MicroInstructionError:
+            return False
+
+    var_value = any(o.kind == "mem_value" and is_var(raws[o.name]) for o in rule.operands)
+    out: List[Tuple[str, str]] = []
+    for o in rule.operands:
+        name = raws[o.name]
+        if not isinstance(name, str):
+            continue
+        if o.kind == "fetch_hash":
+            out.append((name, "fetch"))
+        elif o.kind == "mem_index" and name.upper() != "PKT.PORT":
+            out.append((name, "index_var" if var_value else "index"))
+    return out
+
+
+# ============================================================
+# Engine tables
+# ============================================================
+
+# ISA pipeline table -> engine table class (lib/engine/instructions/instruction_tables.py)
+ENGINE_TABLE_CLASSES = {
+    "instructions_p1": "P1Table",
+    "instructions_p2": "P2Table",
+    "instructions_speculative": "Speculative",
+    "multi_instr_speculative": "MultiInstructionLastStage",
+}
+
+# Arguments the Planner and the Installer add to every micro instruction
+# (instr_id: next flow id, only taken by the tables that chain flows)
+INSTALL_ARGS = ("program_id", "ni", "instr_id")
+
+# Disabled form (enabled=0) of a micro instruction, a plain jump to the next
+# instruction, on the tables whose method cannot be disabled (last stage fwd)
+_JUMP_METHOD = "exec_instr"
+
+
+def engine_table_class(table: str) -> Optional[type]:
+    """Engine table class that installs the entries of an ISA pipeline table (None if unknown)."""
+    from lib.engine.instructions import instruction_tables
+    name = ENGINE_TABLE_CLASSES.get(table)
+    return getattr(instruction_tables, name) if name else None
+
+
+def table_method(table_cls: type, op: str, name: str) -> Optional[str]:
+    """
+    Method of `table_cls` that installs `op`, the form of a micro instruction
+    (lowered as `name`) the Planner placed on it: the op itself, or `name`
+    when `op` is the ISA pipeline name of that same action (fwd for fwd_ni).
+    """
+    for method in (op, name):
+        if callable(getattr(table_cls, method, None)):
+            return method
+    return None
+
+
+def install_call(table_cls: type, op: str, name: str, kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Method of `table_cls` and its kwargs that install a micro instruction
+    (lowered as `name`, with `kwargs`) placed on it as `op`. instr_id is left
+    out on the tables that do not chain flows (P1); any other argument the
+    method does not take raises MicroInstructionError.
+    """
+    method = table_method(table_cls, op, name)
+    if method is None:
+        raise MicroInstructionError(f"{table_cls.__name__} has no method for '{op}'")
+    params = inspect.signature(getattr(table_cls, method)).parameters
+    if kwargs.get("enabled") == 0 and "enabled" not in params and callable(getattr(table_cls, _JUMP_METHOD, None)):
+        method = _JUMP_METHOD
+        kwargs = {k: v for k, v in kwargs.items() if k in INSTALL_ARGS}
+        params = inspect.signature(getattr(table_cls, method)).parameters
+
+    unknown = sorted(k for k in kwargs if k not in params and k != "instr_id")
+    if unknown:
+        raise MicroInstructionError(f"{table_cls.__name__}.{method}() does not take {', '.join(unknown)}")
+    return method, {k: v for k, v in kwargs.items() if k in params}
+
+
+# ============================================================
+# Conformance
+# ============================================================
+
+# Sample operand values per kind (the first one is used when another operand varies)
+_SAMPLES: Dict[str, List[Any]] = {
+    "name": ["x"],
+    "port": ["P_OUT"],
+    "const": [1, "0x10", "192.168.1.1"],
+    "header": sorted({h.name for h in HEADERS.values()}),
+    "readable_header": sorted({h.name for h in HEADERS.values() if h.fetch}),
+    "writable_header": sorted({h.name for h in HEADERS.values() if h.id is not None}),
+    "cond": [
+        {"left": "a", "op": "EQ", "right": 0},
+        {"left": {"left": "a", "op": "GT", "right": "b"}, "op": "&&", "right": {"left": "c", "op": "EQ", "right": 1}},
+    ],
+    "pattern": [[1500, 1600]],
+    "mem_index": ["five_t", "PKT.PORT", "flow_2"],
+    "fetch_hash": ["five_t"],
+    "mem_value": [1, "PKT.SIZE", "x"],
+    "access": ["OLD", "NEW"],
+    "mul_factor": [4],
+}
+
+
+# Hash units of the sample hash names
+_SAMPLE_HASH_UNITS = {"five_t": 1, "flow_2": 2}
+
+
+def _sample_cases(rule: LoweringRule) -> Iterable[Dict[str, Any]]:
+    base = {o.name: _SAMPLES[o.kind][0] for o in rule.operands}
+    yield base
+    for o in rule.operands:
+        for value in _SAMPLES[o.kind][1:]:
+            yield {**base, o.name: value}
+
+
+def _isa_ops(isa: Dict[str, Any]) -> Dict[str, Set[str]]:
+    """ISA pipeline op -> tables that list it."""
+    ops: Dict[str, Set[str]] = {}
+    for flows in isa.get("pipeline", {}).values():
+        for tables in flows.values():
+            for table, instrs in tables.items():
+                if isinstance(instrs, list):
+                    for name in instrs:
+                        ops.setdefault(name, set()).add(table)
+    return ops
+
+
+def _install_problems(mi: MicroInstruction, op: str, table: str) -> List[str]:
+    """Why `mi`, placed as `op` on `table`, cannot be installed (empty if it can)."""
+    table_cls = engine_table_class(table)
+    if table_cls is None:
+        return [f"'{op}' is on '{table}', which has no engine table class"]
+    try:
+        method, kwargs = install_call(table_cls, op, mi.name, {**mi.kwargs, **{k: 1 for k in INSTALL_ARGS}})
+        inspect.signature(getattr(table_cls, method)).bind(None, **kwargs)
+    except (MicroInstructionError, TypeError) as e:
+        return [f"'{op}' on '{table}': {e}"]
+    return []
+
+
+def engine_table_ops() -> Set[str]:
+    """Micro instructions the engine tables can install (method names)."""
+    from lib.engine.instructions.instruction_tables import P1Table, P2Table, Speculative, MultiInstructionLastStage
+    return {
+        name
+        for cls in (P1Table, P2Table, Speculative, MultiInstructionLastStage)
+        for name in dir(cls) if not name.startswith("_")
+    }
+
+
+def check_conformance(
+    registry: LoweringRegistry = lowering_registry,
+    isa: Optional[Dict[str, Any]] = None,
+    table_ops: Optional[Set[str]] = None,
+) -> List[str]:
+    """
+    Problems found by lowering sample instances of every rule (empty if none):
+    - every op of Core/stagerun_isa.py has a rule, and every rule is an op;
+    - missing required operands are rejected, unsupported ops raise;
+    - every case lowers into one micro instruction and one effect per template;
+    - every micro instruction can be installed (`table_ops`) and, with an
+      `isa`, placed on its pipeline (under its name or its alternative);
+    - with an `isa`, every form placeable on a table can be installed there
+      as the Installer does it (install_call): the table's engine class has a
+      method for the form that takes its kwargs plus INSTALL_ARGS.
+    """
+    problems: List[str] = []
+    ops = set(ISA.get_ISA_values())
+    problems += [f"{op}: no lowering rule" for op in sorted(ops - set(registry.spec))]
+    problems += [f"{op}: rule for an op that is not in the StageRun ISA" for op in sorted(set(registry.spec) - ops)]
+    placeable = _isa_ops(isa) if isa is not None else None
+
+    def check(op: str, instrs: List[MicroInstruction], effects: List[MicroEffect], n_templates: int, case) -> None:
+        if len(instrs) != n_templates or len(effects) != n_templates:
+            problems.append(f"{op}{case}: {len(instrs)} instrs/{len(effects)} effects for {n_templates} templates")
+        for mi in instrs:
+            if mi.name in PLANNER_OPS:
+                continue
+            if table_ops is not None and mi.name not in table_ops:
+                problems.append(f"{op}{case}: '{mi.name}' is not an engine table instruction")
+            if placeable is None:
+                continue
+            if mi.name not in placeable and mi.alternative not in placeable:
+                problems.append(f"{op}{case}: neither '{mi.name}' nor '{mi.alternative}' is in the ISA pipeline")
+            for form in dict.fromkeys((mi.name, mi.alternative)):
+                for table in sorted(placeable.get(form, ())):
+                    problems.extend(f"{op}{case}: {p}" for p in _install_problems(mi, form, table))
+
+    env = Resolvers(port=lambda endpoint: 1, hash_unit=_SAMPLE_HASH_UNITS.__getitem__)
+    for op, rule in sorted(registry.spec.items()):
+        if rule.unsupported:
+            try:
+                registry.lower(op, {}, None, env)
+                problems.append(f"{op}: unsupported op was lowered")
+            except MicroInstructionError:
+                pass
+            continue
+
+        for o in rule.operands:
+            if o.required and o.same_as is None:
+                args = {p.name: _SAMPLES[p.kind][0] for p in rule.operands if p is not o}
+                try:
+                    registry.lower(op, args, None, env)
+                    problems.append(f"{op}: lowered without its operand '{o.name}'")
+                except MicroInstructionError:
+                    pass
+
+        for case in _sample_cases(rule):
+            effect = {"reads": ["var:a", "hdr:IPV4.TTL"], "writes": ["var:b"]}
+            try:
+                instrs, effects = registry.lower(op, case, effect, env)
+            except MicroInstructionError as e:
+                problems.append(f"{op}{case}: {e}")
+                continue
+            check(op, instrs, effects, len(rule.templates), case)
+
+    for op, rule in sorted(registry.default_actions.items()):
+        for case in _sample_cases(rule):
+            try:
+                registry.default_action({"op": op, "args": case}, env)
+            except MicroInstructionError as e:
+                problems.append(f"default action {op}{case}: {e}")
+    return problems
@@ -10,37 +10,17 @@ All logic is encapsulated in the MicroInstructionParser class.
 
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 from .types import MicroGraph, MicroNode, MicroEdge, MicroInstruction, MicroInstructionError, MicroEffect
 from lib.utils.manifest_parser import get_pnum_from_endpoints
 import lib.controller.state_manager as sm
+from lib.tofino.dev_ports import DevPortMap, dev_port_of
 from lib.tofino.constants import *
 from Core.stagerun_isa import ISA
+from .lowering_rules import LoweringRegistry, Resolvers, lowering_registry, no_hash_units
 import re 
 import ipaddress
 
-tofino_headers = {
-    'IPV4.TTL': HEADER_IPV4_TTL,
-    'IPV4.DST': HEADER_IPV4_DST,
-    'IPV4.SRC': HEADER_IPV4_SRC,
-    # 'IPV4.PROTO': HEADER_IPV4_PROTO,
-    'TCP.ACK_NO': HEADER_TCP_ACK_NO,
-    'TCP.SEQ_NO': HEADER_TCP_SEQ_NO,
-    'TCP.FLAGS': HEADER_TCP_FLAGS,
-    'IPV4.ID': HEADER_IPV4_IDENTIFICATION,
-}
-headers_to_fetch = {
-    'IPV4.TTL': "fetch_ipv4_ttl",
-    'IPV4.DST': "fetch_ipv4_dst",
-    'IPV4.SRC': "fetch_ipv4_src",
-    'IPV4.LEN': "fetch_ipv4_total_len",
-    'IPV4.PROTO': "fetch_ipv4_protocol",
-    'TCP.ACK_NO': "fetch_tcp_ack_no",
-    'TCP.SEQ_NO': "fetch_tcp_seq_no",
-    'TCP.FLAGS': "fetch_tcp_flags",
-    'IPV4.ID': "fetch_ipv4_identification",
-}
-
 _OP_MAP = {"==": "EQ", "!=": "NE", "<": "LT", "<=": "LE", ">": "GT", ">=": "GE"}
 
 # ============================================================
@@ -57,6 +37,23 @@ class IdAlloc:
         return i
 
 
+def resolve_dev_port(manifest: Dict[str, Any], endpoint: str, dev_ports: Optional[DevPortMap] = None) -> int:
+    """
+    Endpoint name (manifest) -> dev_port of the running engine. With a
+    `dev_ports` snapshot (see running_dev_ports) the lookup is pure, without
+    one it goes through the dev_port cache of the runtime.
+    """
+    front_port = get_pnum_from_endpoints(manifest, endpoint)
+    if dev_ports is None:
+        return sm.engine_controller.runtime.dev_ports.lookup(front_port, 0)
+    return dev_port_of(dev_ports, front_port, 0)
+
+
+def running_dev_ports() -> Optional[DevPortMap]:
+    """Snapshot of the dev_port cache of the running engine (None without a bulk read)."""
+    return sm.engine_controller.runtime.dev_ports.snapshot()
+
+
 # ============================================================
 # Parser class
 # ============================================================
@@ -67,11 +64,30 @@ class MicroInstructionParser:
     Converts StageRunGraph → MicroGraph.
     """
 
-    def __init__(self, isa: Dict[str, Any], manifest: Dict[str, Any], id_alloc: Optional[IdAlloc] = None):
+    def __init__(
+        self,
+        isa: Dict[str, Any],
+        manifest: Dict[str, Any],
+        id_alloc: Optional[IdAlloc] = None,
+        port_resolver: Optional[Callable[[str], Any]] = None,
+        rules: Optional[LoweringRegistry] = None,
+        hash_units: Optional[Dict[str, int]] = None,
+    ):
         self.isa = isa
         self.manifest = manifest
         self.id_alloc = id_alloc or IdAlloc()
         self.graphs: List[MicroGraph] = []
+        # endpoint name -> dev_port (defaults to manifest + running engine)
+        self.port_resolver = port_resolver or (lambda endpoint: resolve_dev_port(self.manifest, endpoint))
+        # StageRun op -> micro instructions (lowering_rules.LOWERING_SPEC)
+        self.rules = rules or lowering_registry
+        # hash name -> engine hash unit (hash_units.py)
+        self.hash_units = hash_units or {}
+        self.env = Resolvers(port=lambda endpoint: self.port_resolver(endpoint), hash_unit=self._hash_unit)
+
+    def _hash_unit(self, name: str) -> int:
+        unit = self.hash_units.get(name)
+        return unit if unit is not None else no_hash_units(name)
 
     # ------------------------------------------------------------
     # Public entrypoint
@@ -122,18 +138,32 @@ class MicroInstructionParser:
                     mg.nodes[node.id] = node
                     expand_map.setdefault(srun_id, []).append(node.id)
 
-            # ligações (mesma lógica)
-            for e in graph.get("edges", []):
-                srcs = expand_map.get(e["src"], [])
-                dsts = expand_map.get(e["dst"], [])
-                for src_id in srcs:
-                    for dst_id in dsts:
-                        mg.edges.append(MicroEdge(src=src_id, dst=dst_id, dep=e.get("dep", "DATA")))
-
+            mg.edges = self._lower_edges(graph.get("edges", []), expand_map)
             out_graphs.append(mg)
 
         return out_graphs
 
+    def _lower_edges(self, edges: List[Dict[str, Any]], expand_map: Dict[int, List[int]]) -> List[MicroEdge]:
+        """
+        The micro-ops of one StageRun node run in sequence (fetch before the
+        op that uses it, set_index before the register access), so they are
+        chained, and every StageRun edge links the exit (last) micro-op of
+        its source to the entry (first) micro-op of its destination: one
+        MicroEdge per StageRun edge plus one per extra micro-op, instead of
+        the cross product of both expansions.
+        """
+        out: List[MicroEdge] = []
+        for ids in expand_map.values():
+            for src_id, dst_id in zip(ids, ids[1:]):
+                out.append(MicroEdge(src=src_id, dst=dst_id, dep="DATA"))
+
+        for e in edges:
+            srcs = expand_map.get(e["src"])
+            dsts = expand_map.get(e["dst"])
+            if srcs and dsts:
+                out.append(MicroEdge(src=srcs[-1], dst=dsts[0], dep=e.get("dep", "DATA")))
+        return out
+
 
     # ------------------------------------------------------------
     # Node lowering
@@ -235,8 +265,7 @@ class MicroInstructionParser:
 
             if operand == "EQ":
                 if field == "PKT.PORT":
-                    port = get_pnum_from_endpoints(self.manifest, value)
-                    dev_port = sm.engine_controller.port_mechanism.port_hdl.get_dev_port(port, 0)
+                    dev_port = self.port_resolver(value)
                     args["ig_port"] = [dev_port, MASK_PORT]
 
                 elif field == "IPV4.DST":
@@ -255,197 +284,14 @@ class MicroInstructionParser:
 
 
     def _translate_default_action_to_micro(self, default_action:Dict):
-        if default_action and 'op' in default_action and 'args' in default_action:
-            instr_name = default_action['op']
-            args = default_action['args']
-
-            instr = {}
-            kwargs = {}
-
-            if instr_name == ISA.DROP.value:
-                # Drop action
-                instr = "drop"
-                kwargs = {
-                        "pkt_id": 0,
-                        # "port": 0,  # or None if not used by drop()
-                        # "program_id": pid
-                    }
-                return {"instr": instr, "kwargs": kwargs}
-
-            elif instr_name == ISA.FWD.value:
-                # Forward to a specific port
-                dest = args["dest"]
-                front_port = get_pnum_from_endpoints(self.manifest, dest)
-                dev_port = sm.engine_controller.port_mechanism.port_hdl.get_dev_port(front_port, 0)
-
-                instr = "fwd"
-                kwargs = {
-                        "pkt_id": 0,
-                        "port": dev_port,
-                    }
-                return {"instr": instr, "kwargs": kwargs}
-            
-            elif instr_name == ISA.FWD_AND_ENQUEUE.value:
-                # Forward and enqueue to queue
-                dest = args["dest"]
-                qid = args["qid"]
-                front_port = get_pnum_from_endpoints(self.manifest, dest)
-                dev_port = sm.engine_controller.port_mechanism.port_hdl.get_dev_port(front_port, 0)
-
-                instr = "fwd_and_enqueue"
-                kwargs = {
-                        "pkt_id": 0,
-                        "port": dev_port,
-                        "qid": qid
-                    }
-                return {"instr": instr, "kwargs": kwargs}
-
-            else:
-                raise MicroInstructionError(f"Error Parsing MicroInstruction DefaultAction {default_action}")
-        
-        return None
+        return self.rules.default_action(default_action, self.env)
 
     def _translate_instr_to_micro(self, op: str, args: Dict[str, Any], compiler_effects) -> Tuple[List[MicroInstruction], List[MicroEffect]]:
         """
         Translates one StageRun instruction into micro instructions and effects.
         Returns a tuple (micro_instrs, micro_effects).
         """
-        instrs: List[MicroInstruction] = []
-        effects: List[MicroEffect] = []
-
-        # --- FWD ---
-        if op == ISA.FWD.value:
-            front_port = get_pnum_from_endpoints(self.manifest, args["dest"])
-            dev_port = sm.engine_controller.port_mechanism.port_hdl.get_dev_port(front_port, 0)
-            instrs = [MicroInstruction(name="fwd_ni", kwargs={"port": dev_port})]
-            effects = [MicroEffect()]  # no read/write impact
-
-        # --- FWD_AND_ENQUEUE ---
-        elif op == ISA.FWD_AND_ENQUEUE.value:
-            front_port = get_pnum_from_endpoints(self.manifest, args["dest"])
-            dev_port = sm.engine_controller.port_mechanism.port_hdl.get_dev_port(front_port, 0)
-            instrs = [MicroInstruction(name="fwd_ni", kwargs={"port": dev_port, "qid": args["qid"]})]
-            effects = [MicroEffect()]
-
-        # --- DROP ---
-        elif op == ISA.DROP.value:
-            instrs = [MicroInstruction(name="fwd_ni", kwargs={"mark_to_drop": 1})]
-            effects = [MicroEffect()]
-
-        # --- HINC ---
-        elif op == ISA.HINC.value:
-            header = args['target']
-            normal_header = self._hdr_fetch_micro(header, False)
-            spec_header = self._hdr_fetch_micro(header, True)
-
-            instrs = [
-                MicroInstruction(name=normal_header, kwargs={}, alternative=spec_header),
-                MicroInstruction(name="sum_ni", kwargs={"header_update": 1, "header_id": tofino_headers[header], "const_val": args["value"]}),
-            ]
-            effects = [MicroEffect(reads={header}), MicroEffect(writes={header})]
-
-        # --- HASSIGN ---
-        elif op == ISA.HASSIGN.value:
-            header = args['target']
-            instrs = [
-                MicroInstruction(name="sum_ni", kwargs={"header_update": 1, "header_id": tofino_headers[header], "const_val": args["value"]}),
-            ]
-            effects = [MicroEffect(writes={header})]
-
-        # --- HTOVAR ---
-        elif op == ISA.HTOVAR.value:
-            header = args['target']
-            var_name = args.get("var_name", "")
-            normal_header = self._hdr_fetch_micro(header, False)
-            spec_header = self._hdr_fetch_micro(header, True)
-            instrs = [
-                MicroInstruction(
-                    name=normal_header,
-                    kwargs={"header_to_var": 1, "var_name": var_name},
-                    alternative=spec_header,
-                ),
-                MicroInstruction(
-                    name="sum_ni",
-                    kwargs={"var_update": 1},
-                    # TODO: fix var_id in the planner automatically
-                )
-            ]
-            effects = [
-                MicroEffect(reads={header}),
-                MicroEffect(writes={var_name}),
-            ]
-
-        # --- PATTERN ---
-        elif op == ISA.PADTTERN.value:
-            instrs = [MicroInstruction(name="initialize_pad_ni", kwargs={"mode": MODE_PADTTERN})]
-            effects = [MicroEffect()]
-
-        # --- CLONE ---
-        elif op == ISA.CLONE.value:
-            front_port = get_pnum_from_endpoints(self.manifest, args["port"])
-            dev_port = sm.engine_controller.port_mechanism.port_hdl.get_dev_port(front_port, 0)
-            instrs = [MicroInstruction(name="initialize_activate_ni", kwargs={})]
-            effects = [MicroEffect()]
-
-        # --- IF ---
-        elif op == ISA.IF.value:
-            branches = args.get("branches", [])
-            cond_ir = {}
-            # cond_ir = self._cond_to_ir(branches)
-            # reads = self._cond_collect_reads_from_dnf([cl for br in cond_ir["branches"] for cl in br["dnf"]])
-            """
-            {
-                "condition": {
-                  "left": "size",
-                  "op": "EQ",
-                  "right": 1500
-                },
-                "body": [
-                  {
-                    "op": "FWD",
-                    "args": {
-                      "port": "PC2_OUT"
-                    }
-                  }
-                ]
-              },
-              {
-                "condition": {
-                  "left": "size",
-                  "op": "EQ",
-                  "right": 1600
-                },
-                "body": [
-                  {
-                    "op": "FWD",
-                    "args": {
-                      "port": "PC1_OUT"
-                    }
-                  }
-                ]
-              }
-            """
-            print(compiler_effects)
-            _reads = compiler_effects.get("reads", [])
-            _writes = compiler_effects.get("writes", [])
-
-            reads = [item.removeprefix("var.").removeprefix("hdr.") for item in _reads]
-            writes = [item.removeprefix("var.").removeprefix("hdr.") for item in _writes]
-
-            # for br in branches:
-            #     br["condition"] 
-                
-            #     for i in br["body"]:
-            #         lst_micros, lst_effects = self._translate_instr_to_micro(i["op"], i["args"])
-
-
-            instrs = [MicroInstruction(name="decide", kwargs={"cond_ir": cond_ir, "reads": reads})]
-            effects = [MicroEffect(reads=set(reads), writes=set(writes))]
-
-        else:
-            raise MicroInstructionError(f"Unknown instruction '{op}' cannot be translated.")
-
-        return instrs, effects
+        return self.rules.lower(op, args, compiler_effects, self.env)
 
     # ------------------------------------------------------------
     # Header micro helpers
@@ -548,8 +394,3 @@ class MicroInstructionParser:
         if h == "IPV4.LEN":
             return "hdr_extract_ipv4_len"
         return "hdr_extract_generic"
-
-    def _hdr_fetch_micro(self, hdr: str, speculative: bool = False) -> str:
-        h = (hdr or "").upper()
-
-        return f"speculative_{headers_to_fetch[h]}" if speculative else headers_to_fetch[h]
@@ -0,0 +1,288 @@
+"""
+Placement Costs
+---------------
+
+Cost model for the slot the Planner gives a micro-node (Planner(costs=...)).
+Without it the Planner takes the first slot that fits, in pipeline order,
+whichever form of the op the slot holds: the op itself, its speculative
+form (a speculative_* op of the instructions_speculative tables) or the
+alternative of the lowering rule (MicroInstruction.alternative, e.g. fwd
+for fwd_ni, sum for arith_between_vars_v1_v2).
+
+With it, every free slot of the first `beam` stages that hold a form of the
+op is a choice, costed as the weighted sum of:
+
+- depth:          stages skipped from the first stage the node may take;
+- occupancy:      share of the stage's tables already taken in this pass;
+- pressure:       demand of the next nodes on the slot, each weighted by
+                  how few slots it has left (a node with one slot left
+                  weighs 1);
+- recirculation:  successors on the node's longest path that no longer fit
+                  the stages after the slot, plus one if the slot is on a
+                  stage the write phases of the nodes placed so far would
+                  take (see Planner._write_phase_stages): the write-phase
+                  pass recirculates the nodes it finds there.
+
+A small lookahead then places the next `lookahead` nodes on their cheapest
+slot after each of the `beam` cheapest choices, a node left without a slot
+costing a recirculation, and the node takes the choice of the cheapest
+sequence (ties by pipeline order, so equal costs give the first fit).
+
+Every node placed with a speculative or alternative form, or on another slot
+than the first fit, is reported (PlannerStats.choices) with the cost terms
+that decided it.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .types import MicroEffect, MicroGraph, MicroNode
+from .isa_index import Slot, iter_bits
+
+if TYPE_CHECKING:
+    from .planner import Planner, _PassSlots
+
+TERMS = ("depth", "occupancy", "pressure", "recirculation")
+
+# next nodes whose demand counts in the pressure of a slot
+PRESSURE_WINDOW = 8
+
+
+@dataclass
+class PlacementCosts:
+    depth: float = 1.0
+    occupancy: float = 0.5
+    pressure: float = 1.0
+    recirculation: float = 4.0
+    lookahead: int = 2
+    beam: int = 3
+
+    @classmethod
+    def of(cls, spec: Any) -> Optional["PlacementCosts"]:
+        """PlacementCosts from a strategy option: None/False (first fit), True (defaults) or a mapping of fields."""
+        if spec is None or spec is False:
+            return None
+        if isinstance(spec, cls):
+            return spec
+        if spec is True:
+            return cls()
+        if isinstance(spec, dict):
+            return cls(**spec)
+        raise ValueError(f"Bad placement costs: {spec!r}")
+
+
+@dataclass
+class PlacementChoice:
+    graph: Any
+    node: int
+    op: str
+    form: str                       # normal, speculative or alternative
+    slot: Slot
+    first_fit: Optional[Slot]
+    cost: float
+    terms: Dict[str, float] = field(default_factory=dict)
+    reason: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "graph": self.graph,
+            "node": self.node,
+            "op": self.op,
+            "form": self.form,
+            "slot": list(self.slot),
+            "first_fit": list(self.first_fit) if self.first_fit else None,
+            "cost": round(self.cost, 3),
+            "terms": {k: round(v, 3) for k, v in self.terms.items()},
+            "reason": self.reason,
+        }
+
+
+class WriteHazards:
+    """Nodes placed so far, to foresee the write-phase stages (Planner._write_phase_stages)."""
+
+    def __init__(self, planner: "Planner"):
+        self.planner = planner
+        self.placed: List[Tuple[Any, int, Optional[MicroEffect]]] = []   # (graph, stage, effect)
+        self._memo: Dict[Tuple[Any, ...], Set[int]] = {}
+
+    def write_phases_with(self, graph: Any, effect: Optional[MicroEffect], stage: int) -> Set[int]:
+        """Stages whose nodes the write-phase pass recirculates once a node with `effect` of `graph` is on `stage`."""
+        key = (len(self.placed), graph, id(effect), stage)
+        if key not in self._memo:
+            # the graph stands for its passes: a read back on a later pass counts too
+            placed = sorted(self.placed + [(graph, stage, effect)], key=lambda p: p[1])
+            self._memo[key] = self.planner._wp_conflict_stages(placed)
+        return self._memo[key]
+
+    def add(self, graph: Any, effect: Optional[MicroEffect], stage: int) -> None:
+        self.placed.append((graph, stage, effect))
+        self._memo.clear()
+
+
+def form_of(node: MicroNode, op: str) -> str:
+    """Form of `node` that `op` is: the op itself, a speculative one or the lowering rule's alternative."""
+    if op == node.instr.name or op.startswith("conditional_"):
+        return "normal"
+    if op.startswith("speculative_"):
+        return "speculative"
+    return "alternative"
+
+
+class SlotChooser:
+    """Cost-driven slot choice for the nodes of one graph, in allocation `order`."""
+
+    def __init__(self, planner: "Planner", g: MicroGraph, order: List[MicroNode], costs: PlacementCosts):
+        self.planner = planner
+        self.index = planner.index
+        self.g = g
+        self.order = order
+        self.costs = costs
+        self.position = {n.id: i for i, n in enumerate(order)}
+        self.candidates = {n.id: planner._allocation_candidates(n) for n in order}
+        self.preds: Dict[int, List[int]] = {nid: [] for nid in g.nodes}
+        succs = planner._precedences(g)
+        for nid, targets in succs.items():
+            for s in targets:
+                self.preds[s].append(nid)
+        # nodes on the longest path from each node to a sink, itself included
+        self.height: Dict[int, int] = {}
+        for n in reversed(order):
+            self.height[n.id] = 1 + max((self.height.get(s, 1) for s in succs.get(n.id, ())), default=0)
+        self.stage_slots = {s: _popcount(m) for s, m in self.index.stage_masks.items()}
+
+    # ------------------------------------------------------------
+
+    def choose(self, node: MicroNode, candidate_ops: List[str], start: int, occupied: int = 0,
+               taken: Optional["_PassSlots"] = None) -> Optional[Slot]:
+        """Slot for `node` from `start`, or None if no slot is free (the Planner recirculates)."""
+        choices = self._choices(candidate_ops, start, occupied)
+        if not choices:
+            return None
+        first_fit = choices[0]
+        scored = sorted(
+            ((self._cost(node, bit, start, occupied), bit) for bit in choices),
+            key=lambda c: (c[0][0], c[1]),
+        )
+        best_total, best_bit, best_terms = None, None, None
+        for (cost, terms), bit in scored[:max(1, self.costs.beam)]:
+            total = cost + self._lookahead(node, bit, occupied, taken)
+            if best_total is None or total < best_total or (total == best_total and bit < best_bit):
+                best_total, best_bit, best_terms = total, bit, terms
+
+        slot = self.index.slots[best_bit]
+        self.planner._hazards.add(self.g.graph_id, node.effect, slot[0])
+        op = self.index.op_at(slot, candidate_ops)
+        form = form_of(node, op)
+        if form != "normal" or best_bit != first_fit:
+            self.planner._choices.append(PlacementChoice(
+                graph=self.g.graph_id,
+                node=node.id,
+                op=op,
+                form=form,
+                slot=slot,
+                first_fit=self.index.slots[first_fit] if best_bit != first_fit else None,
+                cost=best_total,
+                terms=best_terms,
+                reason=self._reason(node, op, form, best_bit, first_fit, start, occupied, taken),
+            ))
+        return slot
+
+    # ------------------------------------------------------------
+
+    def _choices(self, candidate_ops: Sequence[str], start: int, occupied: int) -> List[int]:
+        """Free slot bits holding one of `candidate_ops` in the first `beam` stages that have one."""
+        free = self.index.candidates_mask(candidate_ops) & self.index.from_stage(start) & ~occupied
+        bits: List[int] = []
+        stages = set()
+        for bit in iter_bits(free):
+            stage = self.index.slots[bit][0]
+            if stage not in stages:
+                if len(stages) == max(1, self.costs.beam):
+                    break
+                stages.add(stage)
+            bits.append(bit)
+        return bits
+
+    def _terms(self, node: MicroNode, bit: int, start: int, occupied: int, upcoming: List[MicroNode]) -> Dict[str, float]:
+        stage = self.index.slots[bit][0]
+        used = _popcount(occupied & self.index.stage_mask(stage))
+        pressure = 0.0
+        slot_bit = 1 << bit
+        for other in upcoming:
+            mask = self.index.candidates_mask(self.candidates[other.id])
+            if mask & slot_bit:
+                left = _popcount(mask & self.index.from_stage(start) & ~occupied)
+                pressure += 1.0 / max(1, left)
+        later = sum(1 for s in self.index.stages if s > stage)
+        on_write_phase = stage in self.planner._hazards.write_phases_with(self.g.graph_id, node.effect, stage)
+        return {
+            "depth": float(stage - start),
+            "occupancy": used / max(1, self.stage_slots.get(stage, 1)),
+            "pressure": pressure,
+            "recirculation": float(max(0, self.height.get(node.id, 1) - 1 - later) + on_write_phase),
+        }
+
+    def _weighted(self, terms: Dict[str, float]) -> float:
+        return sum(getattr(self.costs, t) * terms[t] for t in TERMS)
+
+    def _upcoming(self, node: MicroNode) -> List[MicroNode]:
+        i = self.position.get(node.id, len(self.order))
+        return self.order[i + 1:i + 1 + PRESSURE_WINDOW]
+
+    def _cost(self, node, bit, start, occupied) -> Tuple[float, Dict[str, float]]:
+        terms = self._terms(node, bit, start, occupied, self._upcoming(node))
+        return self._weighted(terms), terms
+
+    def _lookahead(self, node: MicroNode, bit: int, occupied: int, taken: Optional["_PassSlots"]) -> float:
+        """Cost of the next `lookahead` nodes, each on its cheapest slot, once `node` takes `bit`."""
+        stage_of = {node.id: self.index.slots[bit][0]}
+        occupied |= 1 << bit
+        last = stage_of[node.id]
+        total = 0.0
+        for other in self._upcoming(node)[:self.costs.lookahead]:
+            start = self._ready(other, stage_of, last, taken)
+            choices = self._choices(self.candidates[other.id], start, occupied)
+            if not choices:
+                total += self.costs.recirculation
+                continue
+            cost, chosen = min(
+                (self._weighted(self._terms(other, b, start, occupied, self._upcoming(other))), b) for b in choices
+            )
+            total += cost
+            occupied |= 1 << chosen
+            stage_of[other.id] = self.index.slots[chosen][0]
+            last = max(last, stage_of[other.id])
+        return total
+
+    def _ready(self, node: MicroNode, stage_of: Dict[int, int], last: int, taken: Optional["_PassSlots"]) -> int:
+        """First stage `node` may take in the lookahead (see _PassSlots.ready_stage)."""
+        if taken is None:
+            return last + 1                 # one node after the other
+        if node.parent_node_id in taken.chained:
+            return max([last + 1] + [s + 1 for s in taken.stage_of.values()])
+        stage = taken.start
+        for p in self.preds.get(node.id, ()):
+            s = stage_of.get(p, taken.stage_of.get(p))
+            if s is not None:
+                stage = max(stage, s + 1)
+        return stage
+
+    def _reason(self, node, op, form, best, first_fit, start, occupied, taken) -> str:
+        slot = self.index.slots[best]
+        where = f"s{slot[0]} {slot[1]}.{slot[2]}"
+        if best == first_fit:
+            return f"{form} form '{op}' is the first fit ({where})"
+        upcoming = self._upcoming(node)
+        mine = self._terms(node, best, start, occupied, upcoming)
+        theirs = self._terms(node, first_fit, start, occupied, upcoming)
+        first = self.index.slots[first_fit]
+        saved = {t: getattr(self.costs, t) * (theirs[t] - mine[t]) for t in TERMS}
+        term = max(saved, key=saved.get)
+        if saved[term] <= 0:
+            return f"'{op}' at {where} instead of s{first[0]} {first[1]}.{first[2]}: cheaper for the next nodes"
+        return f"'{op}' at {where} instead of s{first[0]} {first[1]}.{first[2]}: less {term} ({theirs[term]:g} -> {mine[term]:g})"
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
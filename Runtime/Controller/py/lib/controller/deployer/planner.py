@@ -1,6 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 import logging
 
 from lib.tofino.constants import *
@@ -16,6 +17,8 @@ from .types import (
     MicroInstruction,
     MicroEffect
 )
+from .isa_index import isa_index
+from .placement_costs import PlacementChoice, PlacementCosts, SlotChooser, WriteHazards
 
 # ----------------------------
 # Estruturas auxiliares
@@ -26,8 +29,25 @@ class PlannerStats:
     stages_used: int = 0
     total_nodes: int = 0
     total_flows: int = 0
+    recirculations: int = 0
     # write_phases_inserted: int = 0
     wp_reserved: Dict[int, int] = field(default_factory=dict)
+    strategy: str = "greedy"
+    # deepest stage of each graph (write phase aside), summed over graphs
+    depth: int = 0
+    # precedences between the f1 and f2 halves of dual-flow graphs (Planner(lanes=...))
+    merges: int = 0
+    # speculative/alternative forms and slots other than the first fit (Planner(costs=...))
+    choices: List[PlacementChoice] = field(default_factory=list)
+    # write→read hazards, the write-phase stages serving them (the final s10 aside)
+    # and the stages saved against one write-phase per hazard at its earliest stage
+    write_hazards: int = 0
+    write_phases: List[int] = field(default_factory=list)
+    wp_stages_saved: int = 0
+    # table entries the plan installs (nodes on a slot and recirculations)
+    entries: int = 0
+    # candidates of the portfolio strategy, the winner first
+    portfolio: List[Dict[str, Any]] = field(default_factory=list)
 
 
 
@@ -46,14 +66,136 @@ class PlannerError(Exception):
     pass
 
 
+RECIRC_INSTR = "pos_filter_recirc_same_pipe"
+# write phase at the end of every pass (see _insert_global_write_phases_all)
+FINAL_WP_STAGE = 10
+# micro-ops committed by the final write phase besides the writes of their effect (forwarding, mirroring)
+FINAL_WP_OPS = ("fwd_ni", "fwd", "initialize_activate_ni", "init_activate")
+
+
+class _PassSlots:
+    """
+    Slots taken by one flow_id (one pass through the pipeline) when the
+    Planner packs nodes (Planner(pack=True)): a node goes to the first free
+    slot from the stage after its DATA predecessors of the pass, so
+    independent nodes share a stage in its P1/P2/speculative tables, and:
+    - a (stage, flow, table) slot holds one entry per flow_id;
+    - nodes sharing a stage do not touch each other's variables;
+    - the micro-ops of one StageRun node hand state over through the engine
+      (fetched header, register index): they are placed after everything
+      else and no other node runs between them. Sharing their stages is
+      fine: the tables of one stage run side by side on the stage's input.
+
+    With `lanes` (node id -> f1/f2, Planner(lanes=...)) every node stays on
+    the slots of its flow, and "everything else" and "between them" are
+    per flow: f1 and f2 carry their own instruction id and engine state.
+    A chain may then start on the stage of its flow's last node, as only
+    the stages inside it must be left to the chain.
+    """
+
+    def __init__(self, index, chained: Set[Any], preds: Dict[int, List[int]], start: int,
+                 lanes: Optional[Dict[Any, str]] = None):
+        self.index = index
+        self.chained = chained              # parents lowered to more than one micro-op
+        self.preds = preds                  # see Planner._precedences
+        self.lanes = lanes or {}
+        self.start = start
+        self.used = 0                       # slot bitmap
+        self.locked = 0                     # slot bitmap of the stages inside chains
+        self.stage_of: Dict[int, int] = {}
+        self.effects: Dict[int, Tuple[Set[str], Set[str]]] = {}
+        self.last: Dict[Optional[str], int] = {}                    # lane -> stage of its last node
+        self.chain: Dict[Optional[str], Tuple[Any, int]] = {}       # lane -> (parent, first stage) of its last chain
+
+    def ready_stage(self, g: MicroGraph, node: MicroNode, frontier: int) -> int:
+        """First stage `node` can take: after its predecessors of this pass (after everything if chained)."""
+        stage = self.start
+        for p in self.preds.get(node.id, ()):
+            if p in self.stage_of:
+                stage = max(stage, self.stage_of[p] + 1)
+        if node.parent_node_id in self.chained:
+            if not self.lanes:
+                return frontier
+            stage = max(stage, self.last.get(self.lanes.get(node.id), self.start))
+        return stage
+
+    def first(self, candidate_ops: List[str], start: int, node: MicroNode) -> Optional[Tuple[int, str, str]]:
+        return self.index.first(candidate_ops, start, self.occupied(node))
+
+    def occupied(self, node: MicroNode) -> int:
+        """Slots `node` cannot take in this pass."""
+        occupied = self.used | self.locked
+        lane = self.lanes.get(node.id)
+        if lane is not None:
+            occupied |= ~self.index.flow_mask(lane)
+        eff = node.effect
+        if eff is not None:
+            for stage, (reads, writes) in self.effects.items():
+                if writes & (eff.reads | eff.writes) or reads & eff.writes:
+                    occupied |= self.index.stage_mask(stage)
+        return occupied
+
+    def take(self, slot: Tuple[int, str, str], node: MicroNode) -> None:
+        stage = slot[0]
+        lane = self.lanes.get(node.id)
+        self.used |= self.index.slot_bit(slot)
+        self.stage_of[node.id] = stage
+        self.last[lane] = max(self.last.get(lane, 0), stage)
+        if node.effect is not None:
+            reads, writes = self.effects.get(stage, (set(), set()))
+            self.effects[stage] = (reads | node.effect.reads, writes | node.effect.writes)
+        parent = node.parent_node_id
+        if parent in self.chained:
+            chain = self.chain.get(lane)
+            if chain is None or chain[0] != parent:
+                chain = self.chain[lane] = (parent, stage)
+            lane_mask = self.index.flow_mask(lane) if lane is not None else -1
+            for s in range(chain[1] + 1, stage):
+                self.locked |= self.index.stage_mask(s) & lane_mask
+
+
 class Planner:
-    def __init__(self, isa: Dict[str, Any]):
+    def __init__(
+        self,
+        isa: Dict[str, Any],
+        orders: Optional[Dict[Any, List[Any]]] = None,
+        stages: Optional[Dict[Any, Dict[Any, int]]] = None,
+        pack: bool = False,
+        lanes: Optional[Dict[Any, Dict[Any, str]]] = None,
+        costs: Optional[PlacementCosts] = None,
+    ):
         self.isa = isa
+        # Decisions of a planner strategy (strategies.py), per graph_id:
+        # - orders: allocation order (node ids), instead of _topo_sort;
+        # - stages: node id -> stage to place the node from, when the strategy
+        #   leaves earlier slots free (e.g. the write-phase stage)
+        # - pack: place every node from the stage after its predecessors
+        #   (sharing stages, see _PassSlots) instead of after the last node
+        # - lanes: node id -> "f1"/"f2" for graphs split over both flows of
+        #   the engine, each half with its own next_instruction (ni_f1/ni_f2);
+        #   implies pack and the graph must fit one pass (the recirculation
+        #   entry only matches f1's next_instruction)
+        # - costs: choose among the slots (and op forms) of a node by cost,
+        #   see placement_costs.py, instead of the first that fits
+        self.orders = orders or {}
+        self.stages = stages or {}
+        self.pack = pack
+        self.lanes = lanes or {}
+        self._lane_flows: Dict[Any, Dict[str, int]] = {}  # graph_id -> flow id of f1/f2
+        self._merges = 0
+        self.costs = costs
+        self._choices: List[PlacementChoice] = []
+        self._hazards = WriteHazards(self)
+        # op -> (stage, flow, table) slot bitmaps, shared by all planners of this ISA
+        self.index = isa_index(isa)
         self.stats = PlannerStats()
         self._flow_counter = 0  # global flow_id counter
         self._internal_node_counter = {}
         self._pkt_id = 0
         self._wp_reserved: Dict[int, int] = {}
+        self._wp_hazards = 0
+        self._wp_stages: List[int] = []
+        self._wp_saved = 0
         self._occupied_stages: Set[int] = set()
 
     def _new_flow_id(self) -> int:
@@ -129,6 +271,28 @@ class Planner:
 
         stats = PlannerStats()
         stats.wp_reserved = self._wp_reserved
+        stats.write_hazards = self._wp_hazards
+        stats.write_phases = self._wp_stages
+        stats.wp_stages_saved = self._wp_saved
+        stats.total_nodes = sum(len(g.nodes) for g in planned_graphs)
+        stats.total_flows = self._flow_counter
+        stats.recirculations = sum(
+            1 for g in planned_graphs for n in g.nodes.values() if n.instr.name == RECIRC_INSTR
+        )
+        stats.entries = stats.recirculations + sum(
+            1 for g in planned_graphs for n in g.nodes.values()
+            if n.allocated_stage is not None and n.allocated_flow is not None
+        )
+        stats.depth = sum(
+            max((n.allocated_stage for n in g.nodes.values()
+                 if n.allocated_stage is not None and n.allocated_table != "write_phase_t"), default=0)
+            for g in planned_graphs
+        )
+        stats.merges = self._merges
+        stats.choices = self._choices
+        stats.stages_used = len({
+            n.allocated_stage for g in planned_graphs for n in g.nodes.values() if n.allocated_stage is not None
+        })
         return PlanningResult(planned_graphs, stats)
     # ============================================================
     # CORE
@@ -145,7 +309,11 @@ class Planner:
         pending_writes: Dict[str, int] = {}   # var -> stage
         current_stage = 0
         flow_id = self._new_flow_id()         # flow_id inicial deste grafo
-        order = self._topo_sort(g)
+        order = self._allocation_order(g)
+        lanes = self.lanes.get(g.graph_id)
+        lane_flow = {"f1": flow_id, "f2": self._new_flow_id() if lanes else flow_id}
+        if lanes:
+            self._lane_flows[g.graph_id] = lane_flow
 
         #1. Keys
         if g.keys:
@@ -153,7 +321,7 @@ class Planner:
             g.keys['kwargs']['program_id'] = pid
             g.keys['kwargs']['pkt_id'] = pkt_id
             g.keys['kwargs']['ni_f1'] = flow_id
-            g.keys['kwargs']['ni_f2'] = flow_id
+            g.keys['kwargs']['ni_f2'] = lane_flow["f2"]
         
         # 2. Default Action
         if g.default_action:
@@ -163,6 +331,19 @@ class Planner:
         # 3. Init Node Counter
         self._internal_node_counter[g.graph_id] = len(g.nodes)
 
+        taken = None
+        if self.pack or lanes:
+            chained = self._chained_parents(g)
+            preds: Dict[int, List[int]] = {}
+            for nid, succs in self._precedences(g).items():
+                for s in succs:
+                    preds.setdefault(s, []).append(nid)
+                    # merge point: the other half waits for this node's stage
+                    if lanes and lanes.get(nid, "f1") != lanes.get(s, "f1"):
+                        self._merges += 1
+            taken = _PassSlots(self.index, chained, preds, current_stage, lanes)
+        chooser = SlotChooser(self, g, order, self.costs) if self.costs else None
+
 
         for idx, node in enumerate(order):
             # 3. Put program_id
@@ -172,104 +353,42 @@ class Planner:
             placed = False
 
             # --- 1️⃣ Determinar candidatas no ISA ---
-            candidate_ops = [op]
-            if node.instr.alternative:
-                candidate_ops.append(node.instr.alternative)
-
             # --- ⚙️ IFs (decide) — usar slots e gerar flows ---
             if self._is_decide(node):
                 # Preenche slot_map e flow_ids de branches
                 self._assign_conditional_slots(node)
                 self._assign_branch_flow_ids(g, node)
-
-                slot_map = node.instr.kwargs.get("slot_map", {})
-                reads = getattr(node.effect, "reads", set()) or set()
-
-                # Decide qual micro-instrução física usar
-                if len(reads) == 2:
-                    # Verifica se ambas as variáveis são mapeadas para slots válidos
-                    vars_mapped = all(v in slot_map for v in reads)
-                    if vars_mapped:
-                        # Ambas as variáveis estão em v1,v2,v3,v4 → between_vars
-                        candidate_ops = [
-                            "speculative_conditional_between_vars",
-                            "conditional_between_vars",
-                        ]
-                    else:
-                        # Uma variável e uma constante
-                        candidate_ops = [
-                            "speculative_conditional_v1_v2",
-                            "conditional_v1_v2",
-                            "speculative_conditional_v3_v4",
-                            "conditional_v3_v4",
-                        ]
-                elif len(reads) == 1:
-                    # Um único comparando com constante
-                    candidate_ops = [
-                        "speculative_conditional_v1_v2",
-                        "conditional_v1_v2",
-                        "speculative_conditional_v3_v4",
-                        "conditional_v3_v4",
-                    ]
-                else:
-                    # fallback — IF vazio ou inesperado
-                    candidate_ops = [
-                        "conditional_v1_v2",
-                        "speculative_conditional_v1_v2",
-                    ]
+            candidate_ops = self._allocation_candidates(node)
 
 
             # --- 2️⃣ Escolher stage / flow disponível (compatível com StageRunEngine ISA) ---
-            for stage_name, flows in self.isa["pipeline"].items():
-                # extrai o índice numérico do stage (s1→1, s2→2, ...)
-                s_idx = int(stage_name.lstrip("s"))
-                if s_idx < current_stage:
-                    continue  # nunca voltamos atrás
-
-                for flow_name, flow_data in flows.items():
-                    # junta todas as listas de instruções possíveis
-
-                    for table_name, instr_list in flow_data.items():
-                        if isinstance(instr_list, list):
-                            if any(cand in instr_list for cand in candidate_ops):
-                                node.allocated_stage = s_idx
-                                node.allocated_flow = flow_name
-                                node.allocated_table = table_name   # agora guarda o correto
-                                node.flow_id = flow_id
-                                # apenas a tabela 1 não tem next_flow_id
-                                if table_name not in P1_TABLE:
-                                    node.instr.kwargs["instr_id"] = flow_id
-                                placed = True
-                                current_stage = s_idx
-
-                                # self._mark_stage_occupied_by_instr(s_idx)
-
-                                # # --- Extra rule: PADTTERN (initialize_pad_ni) forces recirculation ---
-                                # if node.instr.name == "initialize_pad_ni":
-                                #     if __debug__:
-                                #         logger.debug(f"[Planner][Recirc] Forced recirculation after PADTTERN (node {node.id})")
-                                #     # 1️⃣ Inserir recirculação imediatamente
-                                #     new_flow = self._insert_recirc_before(g=g, node=node, pid=pid, prev_flow_id=node.flow_id)
-
-                                #     # 2️⃣ Propagar o novo flow_id para as instruções seguintes
-                                #     self._propagate_flow_id_forward(g=g, start_node=node, new_flow_id=new_flow)
-
-                                #     # 3️⃣ Reiniciar a contagem de stages (recirculação volta ao início do pipeline)
-                                #     current_stage = 0
-                                #     flow_id = new_flow
-                                break
-
-                    if placed:
-                        # if node.instr.name not in self.isa["pipeline"][f"s{node.allocated_stage}"][node.allocated_flow][node.allocated_table]:
-                        #     raise PlannerError(
-                        #         f"Inconsistent ISA allocation: {node.instr.name} not in "
-                        #         f"{node.allocated_flow}/{node.allocated_table} of stage s{node.allocated_stage}"
-                        #     )
-                        break
-                if placed:
-                    break
+            if taken is None:
+                start = self._chosen_stage(g, node, current_stage)
+                slot = self._find_slot(candidate_ops, start) if chooser is None else chooser.choose(node, candidate_ops, start)
+            else:
+                start = self._chosen_stage(g, node, taken.ready_stage(g, node, current_stage))
+                if chooser is None:
+                    slot = taken.first(candidate_ops, start, node)
+                else:
+                    slot = chooser.choose(node, candidate_ops, start, taken.occupied(node), taken)
+            if slot is not None:
+                s_idx, flow_name, table_name = slot
+                node.allocated_stage = s_idx
+                node.allocated_flow = flow_name
+                node.allocated_table = table_name   # agora guarda o correto
+                node.selected_op = self.index.op_at(slot, candidate_ops)
+                node.flow_id = lane_flow[lanes.get(node.id, "f1")] if lanes else flow_id
+                # apenas a tabela 1 não tem next_flow_id
+                if table_name not in P1_TABLE:
+                    node.instr.kwargs["instr_id"] = node.flow_id
+                placed = True
+                current_stage = s_idx
+                if taken is not None:
+                    taken.take(slot, node)
 
             # --- 3️⃣ Caso não tenha sido possível colocar (recirculação) ---
+            if not placed and lanes:
+                raise PlannerError(f"Instruction '{op}' does not fit one pass on flows f1/f2")
             if not placed:
                 # s_back = max(0, current_stage - 1)
                 # f_back = flow_id
@@ -291,27 +410,26 @@ class Planner:
 
                 # ⚙️ tentar novamente colocar o nó neste novo fluxo
                 placed = False
-                for stage_name, flows in self.isa["pipeline"].items():
-                    s_idx = int(stage_name.lstrip("s"))
-                    if s_idx < current_stage:
-                        continue
-
-                    for flow_name, flow_data in flows.items():
-                        instr_sets = []
-                        for key, instr_list in flow_data.items():
-                            if isinstance(instr_list, list):
-                                instr_sets.extend(instr_list)
-
-                        if any(cand in instr_sets for cand in candidate_ops):
-                            node.allocated_stage = s_idx
-                            node.allocated_flow = flow_name
-                            node.allocated_table = key
-                            node.flow_id = flow_id
-                            placed = True
-                            current_stage = s_idx
-                            break
-                    if placed:
-                        break
+                start = self._chosen_stage(g, node, current_stage)
+                if taken is not None:
+                    taken = _PassSlots(self.index, chained, preds, current_stage)
+                if chooser is not None:
+                    slot = chooser.choose(node, candidate_ops, start, taken.occupied(node) if taken else 0, taken)
+                elif taken is None:
+                    slot = self.index.first(candidate_ops, start)
+                else:
+                    slot = taken.first(candidate_ops, start, node)
+                if slot is not None:
+                    s_idx, flow_name, table_name = slot
+                    node.allocated_stage = s_idx
+                    node.allocated_flow = flow_name
+                    node.allocated_table = table_name
+                    node.selected_op = self.index.op_at(slot, candidate_ops)
+                    node.flow_id = flow_id
+                    placed = True
+                    current_stage = s_idx
+                    if taken is not None:
+                        taken.take(slot, node)
 
                 if not placed:
                     raise PlannerError(f"Could not re-place instruction '{op}' even after recirculation")
@@ -326,6 +444,131 @@ class Planner:
         # --- 6️⃣ Inserir write-phases globais no fim (fallback) ---
         # self._insert_global_write_phases(g=g, ordered_nodes=order, pid=pid)
 
+    def _find_slot(self, candidate_ops: List[str], current_stage: int) -> Optional[Tuple[int, str, str]]:
+        """
+        First (stage, flow, table) from `current_stage` onwards whose ISA table
+        holds one of `candidate_ops`; None if the pipeline has no room left.
+        """
+        return self.index.first(candidate_ops, current_stage)
+
+    def _allocation_order(self, g: MicroGraph) -> List[MicroNode]:
+        """Order given by the strategy for this graph, else _topo_sort."""
+        ids = self.orders.get(g.graph_id)
+        if ids is None:
+            return self._topo_sort(g)
+        return [g.nodes[nid] for nid in ids]
+
+    def _chosen_stage(self, g: MicroGraph, node: MicroNode, current_stage: int) -> int:
+        """Stage to search a slot from: the current one, or later if the strategy chose so."""
+        chosen = self.stages.get(g.graph_id, {}).get(node.id)
+        return current_stage if chosen is None else max(current_stage, chosen)
+
+    def _chained_parents(self, g: MicroGraph) -> Set[Any]:
+        """StageRun nodes of `g` lowered to more than one (chained) micro-op."""
+        seen: Set[Any] = set()
+        chained: Set[Any] = set()
+        for node in g.nodes.values():
+            parent = node.parent_node_id
+            if parent is None:
+                continue
+            if parent in seen:
+                chained.add(parent)
+            seen.add(parent)
+        return chained
+
+    def _precedences(self, g: MicroGraph) -> Dict[int, List[int]]:
+        """
+        Nodes each node of `g` must precede when a strategy reorders it: its
+        DATA and RESOURCE successors, plus the write-after-read and
+        write-after-write hazards between StageRun nodes, which the graph
+        builder leaves out (a read is only linked to its last writer).
+        StageRun node ids follow program order; a hazard links the last
+        micro-op of one node to the first micro-op of the other.
+        """
+        succs: Dict[int, List[int]] = {nid: [] for nid in g.nodes}
+        for e in g.edges:
+            if e.dep in ("DATA", "RESOURCE") and e.src in succs and e.dst in succs and e.dst not in succs[e.src]:
+                succs[e.src].append(e.dst)
+
+        groups: Dict[Any, List[int]] = {}
+        for nid in sorted(g.nodes):
+            parent = g.nodes[nid].parent_node_id
+            if parent is not None:
+                groups.setdefault(parent, []).append(nid)
+
+        last_writer: Dict[str, int] = {}
+        readers: Dict[str, Set[int]] = {}
+        for parent in sorted(groups):
+            ids = groups[parent]
+            first, last = ids[0], ids[-1]
+            reads: Set[str] = set()
+            writes: Set[str] = set()
+            for nid in ids:
+                eff = g.nodes[nid].effect
+                if eff is not None:
+                    reads |= eff.reads
+                    writes |= eff.writes
+
+            before = {last_writer[v] for v in reads | writes if v in last_writer}
+            for v in writes:
+                before |= readers.get(v, set())
+            for b in before:
+                if b != last and first not in succs[b]:
+                    succs[b].append(first)
+
+            for v in reads:
+                readers.setdefault(v, set()).add(last)
+            for v in writes:
+                last_writer[v] = last
+                readers[v] = set()
+        return succs
+
+    def _allocation_candidates(self, node: MicroNode) -> List[str]:
+        """
+        Ops that can realise `node` in _allocate_stages, in order of preference:
+        the op and its alternative, or the conditional forms for IF/decide
+        (picked from the variables it compares, see _conditional_slot_map).
+        """
+        if not self._is_decide(node):
+            candidate_ops = [node.instr.name]
+            if node.instr.alternative:
+                candidate_ops.append(node.instr.alternative)
+            return candidate_ops
+
+        slot_map = self._conditional_slot_map(node)
+        reads = getattr(node.effect, "reads", set()) or set()
+
+        # Decide qual micro-instrução física usar
+        if len(reads) == 2:
+            # Verifica se ambas as variáveis são mapeadas para slots válidos
+            vars_mapped = all(v in slot_map for v in reads)
+            if vars_mapped:
+                # Ambas as variáveis estão em v1,v2,v3,v4 → between_vars
+                return [
+                    "speculative_conditional_between_vars",
+                    "conditional_between_vars",
+                ]
+            # Uma variável e uma constante
+            return [
+                "speculative_conditional_v1_v2",
+                "conditional_v1_v2",
+                "speculative_conditional_v3_v4",
+                "conditional_v3_v4",
+            ]
+        elif len(reads) == 1:
+            # Um único comparando com constante
+            return [
+                "speculative_conditional_v1_v2",
+                "conditional_v1_v2",
+                "speculative_conditional_v3_v4",
+                "conditional_v3_v4",
+            ]
+        # fallback — IF vazio ou inesperado
+        return [
+            "conditional_v1_v2",
+            "speculative_conditional_v1_v2",
+        ]
+
     # ============================================================
     # HELPERS: ISA pick / topo / recirc / write-phase / decide
     # ============================================================
@@ -459,7 +702,8 @@ class Planner:
     #                 return s, t["name"], getattr(node.instr, "alternative")
     #     return None
     
-    def _assign_conditional_slots(self, decide_node: MicroNode) -> None:
+    def _conditional_slot_map(self, decide_node: MicroNode) -> Dict[str, str]:
+        """Variables compared by an IF/decide -> v1..v4 slots, in order of use."""
         reads = []
         if isinstance(decide_node.instr.kwargs, dict):
             reads = list(decide_node.instr.kwargs.get("reads", []))
@@ -470,8 +714,11 @@ class Planner:
             if var not in slot_map and si < len(slots):
                 slot_map[var] = slots[si]
                 si += 1
+        return slot_map
+
+    def _assign_conditional_slots(self, decide_node: MicroNode) -> None:
         if isinstance(decide_node.instr.kwargs, dict):
-            decide_node.instr.kwargs["slot_map"] = slot_map
+            decide_node.instr.kwargs["slot_map"] = self._conditional_slot_map(decide_node)
 
     def _assign_branch_flow_ids(self, g, decide_node):
         cond_ir = decide_node.instr.kwargs.get("cond_ir", {})
@@ -483,7 +730,7 @@ class Planner:
         branch_ids = {}
 
         for lbl in labels:
-            heads = [e.dst for e in g.edges if e.dep == "CONTROL" and e.src == decide_node.id and e.label == lbl]
+            heads = [e.dst for e in g.out_edges(decide_node.id) if e.dep == "CONTROL" and e.label == lbl]
             if not heads:
                 continue
             new_flow = self._new_flow_id()
@@ -493,7 +740,7 @@ class Planner:
                 head_node.flow_id = new_flow
                 # 🟢 primeira instrução do branch aponta para o novo flow_id
                 head_node.instr.kwargs["instr_id"] = new_flow
-                self._propagate_flow_id(g, start_node_id=h, new_flow_id=new_flow)
+                self._propagate_flow_id_forward(g, start_node=head_node, new_flow_id=new_flow)
 
         # guarda referência nos kwargs do decide
         decide_node.instr.kwargs["branch_instr_ids"] = branch_ids
@@ -502,30 +749,33 @@ class Planner:
         """
         Topological order only by DATA dependencies.
         CONTROL edges are ignored (they represent branches).
+        The micro-ops of one StageRun node are chained by the lowering and
+        kept contiguous: a chained successor that becomes ready is taken next.
         Returns a list of MicroNode in causal order.
         """
-        indeg = {nid: 0 for nid in g.nodes}
-        adj = {nid: [] for nid in g.nodes}
-
-        for e in g.edges:
-            if e.dep == "DATA" and e.src in g.nodes and e.dst in g.nodes:
-                adj[e.src].append(e.dst)
-                indeg[e.dst] += 1
+        nodes = g.nodes
+        indeg = {nid: g.data_indegree(nid) for nid in nodes}
 
-        Q = [nid for nid, d in indeg.items() if d == 0]
+        Q = deque(nid for nid, d in indeg.items() if d == 0)
         ordered_ids = []
         while Q:
-            nid = Q.pop(0)
+            nid = Q.popleft()
             ordered_ids.append(nid)
-            for nxt in adj[nid]:
+            parent = nodes[nid].parent_node_id
+            for nxt in g.successors(nid):
+                if nxt not in indeg:
+                    continue
                 indeg[nxt] -= 1
                 if indeg[nxt] == 0:
-                    Q.append(nxt)
+                    if parent is not None and nodes[nxt].parent_node_id == parent:
+                        Q.appendleft(nxt)
+                    else:
+                        Q.append(nxt)
 
         # fallback: nós que ficaram fora por ciclos/isolamento
-        for nid in g.nodes:
-            if nid not in ordered_ids:
-                ordered_ids.append(nid)
+        if len(ordered_ids) < len(nodes):
+            seen = set(ordered_ids)
+            ordered_ids.extend(nid for nid in nodes if nid not in seen)
 
         return [g.nodes[nid] for nid in ordered_ids]
 
@@ -552,19 +802,18 @@ class Planner:
             flow_id=prev_flow_id,
             effect=MicroEffect(),
             )
-        g.nodes[rec_id] = rec_node
+        g.add_node(rec_node)
 
         # redirect edges arriving to node
-        for e in g.edges:
-            if e.dst == node.id:
-                e.dst = rec_id
+        for e in list(g.in_edges(node.id)):
+            g.retarget_edge(e, rec_id)
                 # # update instr_id of the predecessor to point to new flow
                 # pred_node = g.nodes[e.src]
                 # pred_node.instr.kwargs["instr_id"] = new_flow_id
                 # pred_node.instr.kwargs["instr_id"] = self._new_flow_id()
 
         # link recirc → node
-        g.edges.append(MicroEdge(src=rec_id, dst=node.id, dep="DATA"))
+        g.add_edge(MicroEdge(src=rec_id, dst=node.id, dep="DATA"))
 
         # new_flow = rec_node.instr.kwargs["instr_id"]
         return new_flow_id
@@ -604,9 +853,7 @@ class Planner:
             visited.add(nid)
             node = g.nodes[nid]
             node.flow_id = new_flow_id
-            for e in g.edges:
-                if e.src == nid and e.dep == "DATA":
-                    stack.append(e.dst)
+            stack.extend(g.successors(nid))
 
 
     # ==========================================================
@@ -676,61 +923,49 @@ class Planner:
     def _insert_global_write_phases_all(self, graphs: list["MicroGraph"], pid: int) -> None:
         """
         Single global pass:
-        - detect the need for a write-phase (write→read across ALL graphs)
-        - choose ONE global wp_stage for this pid
-        - insert ONE write-phase node (attach to first graph for now)
-        - for each graph, reallocate any instruction currently at wp_stage:
+        - detect every write→read hazard within a pass of ALL graphs (see _write_hazards)
+        - coalesce them into as few write phases as possible (see _write_phase_stages)
+        - insert ONE write-phase node per write-phase stage (attach to first graph for now)
+        - for each graph, reallocate any instruction currently on a write-phase stage:
             * insert a recirculation before that node (new flow_id)
-            * re-place the node from pipeline head, skipping wp_stage
-        """
-        
-        # RESERVE S10 For WP
-        self._wp_reserve(10)
+            * re-place the node from pipeline head, skipping the write-phase stages
 
+        FINAL_WP_STAGE is the write phase at the end of every pass (it commits
+        forwarding, header writes and mirroring; every hand-written app sets
+        write_s10): reserved when a placed node has something to commit, it
+        holds no P2 instructions and serves the hazards whose window reaches it
+        without taking a stage of its own.
+        """
 
         # 0) flatten and order all nodes (by stage then id for determinism)
         all_nodes: list["MicroNode"] = []
         for g in graphs:
             all_nodes.extend([n for n in g.nodes.values() if getattr(n, "allocated_stage", None) is not None])
         ordered = sorted(all_nodes, key=lambda n: (n.allocated_stage, n.id))
+        placed = [(self._pass_of(node), node.allocated_stage, getattr(node, "effect", None)) for node in ordered]
 
-        # 1) detect needs via pending_writes (global)
-        pending_writes: dict[str, int] = {}
-        needs_wp = False
-        last_dirty_stage = None
+        if any(n.instr.name in FINAL_WP_OPS or (n.effect and n.effect.writes) for n in ordered):
+            self._wp_reserve(FINAL_WP_STAGE)
 
-        for node in ordered:
-            eff = getattr(node, "effect", None)
-            if not eff:
-                continue
-            reads, writes = eff.reads or set(), eff.writes or set()
-
-            dirty_reads = {v for v in reads if v in pending_writes}
-            if dirty_reads:
-                needs_wp = True
-                s = max(pending_writes[v] for v in dirty_reads)
-                last_dirty_stage = s if last_dirty_stage is None else max(last_dirty_stage, s)
-                # don’t clear pending yet; we only discover the global need here
-
-            for v in writes:
-                pending_writes[v] = node.allocated_stage
-
-        if not needs_wp:
+        # 1) hazards and the write phases that serve them
+        hazards = self._write_hazards(placed)
+        if not hazards:
             if __debug__:
                 logger.debug("[Planner][WP] Global pass: no write-phase needed.")
             return
 
-        # 2) choose ONE global wp_stage (stage 1 forbidden)
-        #    NOTE: _wp_next_free must be GLOBAL per pid, and should reuse an existing wp if any
-        start = (last_dirty_stage or 1) + 1
-        wp_stage = self._wp_next_free(start_stage=start)  # DO NOT pass graph_id
-        self._wp_reserve(wp_stage)                        # global reservation
-        # self._mark_occupied(wp_stage)                     # exclude for future usage
+        wp_stages = self._write_phase_stages(placed)
+        earliest = {self._wp_window(w, r)[0] for w, r in hazards}
+        self._wp_hazards = len(hazards)
+        self._wp_stages = [s for s in wp_stages if s != FINAL_WP_STAGE]
+        self._wp_saved = len(earliest - {FINAL_WP_STAGE}) - len(self._wp_stages)
+        for wp_stage in wp_stages:
+            self._wp_reserve(wp_stage)                    # global reservation
 
         if __debug__:
-            logger.debug(f"[Planner][WP] Global write-phase chosen at stage {wp_stage} for pid={pid}")
+            logger.debug(f"[Planner][WP] write-phases at stages {wp_stages} for pid={pid} ({len(hazards)} hazards)")
 
-        # 3) insert ONE write-phase node (attach to the first graph with nodes)
+        # 2) insert ONE write-phase node per stage (attach to the first graph with nodes)
         host_graph = None
         for g in graphs:
             if g.nodes:
@@ -740,55 +975,56 @@ class Planner:
             # should not happen
             return
 
-        wp_node_id = self._new_internal_id(host_graph.graph_id)
-        wp_instr = MicroInstruction(name="configure_write_phase", kwargs={"program_id": pid, f"s{wp_stage}": 1})
-        wp_node = MicroNode(
-            id=wp_node_id,
-            instr=wp_instr,
-            graph_id=host_graph.graph_id,
-            allocated_stage=wp_stage,
-            allocated_table="write_phase_t",
-            flow_id=None,   # stage-level sync; installer can read program_id & stage
-            effect=None,
-        )
-        host_graph.nodes[wp_node_id] = wp_node
-        # no edges needed; write-phase is a stage-only operation
+        for wp_stage in self._wp_stages:
+            wp_node_id = self._new_internal_id(host_graph.graph_id)
+            wp_instr = MicroInstruction(name="configure_write_phase", kwargs={"program_id": pid, f"s{wp_stage}": 1})
+            wp_node = MicroNode(
+                id=wp_node_id,
+                instr=wp_instr,
+                graph_id=host_graph.graph_id,
+                allocated_stage=wp_stage,
+                allocated_table="write_phase_t",
+                flow_id=None,   # stage-level sync; installer can read program_id & stage
+                effect=None,
+            )
+            host_graph.add_node(wp_node)
+            # no edges needed; write-phase is a stage-only operation
 
-        # 4) reallocate conflicts in EACH graph
+        # 3) reallocate conflicts in EACH graph
+        forbidden = set(self._wp_stages)
 
         for g in graphs:
             conflicts = [
                 n for n in g.nodes.values()
-                if getattr(n, "allocated_stage", None) == wp_stage
+                if getattr(n, "allocated_stage", None) in forbidden
             ]
             if not conflicts:
                 continue
 
-            topo = self._topo_sort(g)
-            topo_ids = [n.id for n in topo]
-            conflicts.sort(key=lambda n: topo_ids.index(n.id))
+            topo_pos = {n.id: i for i, n in enumerate(self._topo_sort(g))}
+            conflicts.sort(key=lambda n: topo_pos[n.id])
 
             for node in conflicts:
                 # ✅ Skip write-phase nodes themselves
                 instr_name = getattr(node.instr, "name", None)
                 if instr_name in ("write_phase_t", "configure_write_phase"):
                     if __debug__:
-                        print(f"[Planner][WP] Skip reallocation of write-phase node {node.id} at stage {wp_stage}")
+                        print(f"[Planner][WP] Skip reallocation of write-phase node {node.id} at stage {node.allocated_stage}")
                     continue
 
 
                 # insert recirc BEFORE node
                 old_flow = getattr(node, "flow_id", None)
+                lane_flow = self._lane_flows.get(g.graph_id)
+                if lane_flow and old_flow == lane_flow["f2"]:
+                    old_flow = lane_flow["f1"]      # recirculation matches f1 only
                 new_flow = self._insert_recirc_before(g, node, pid, old_flow)
                 self._propagate_flow_id_forward(g, start_node=node, new_flow_id=new_flow)
 
-                # re-place the node from pipeline head, skipping the wp_stage
-                s_idx, flow_name, table_name = self._try_place_instr(node, start_stage_idx=0, forbidden_stage=wp_stage)
+                # re-place the node from pipeline head, skipping the write-phase stages
+                s_idx, flow_name, table_name = self._try_place_instr(node, start_stage_idx=0, forbidden_stages=forbidden)
                 if s_idx is None:
-                    # last-resort: try full pipeline including alternative names again
-                    s_idx, flow_name, table_name = self._try_place_instr(node, start_stage_idx=0, forbidden_stage=wp_stage)
-                    if s_idx is None:
-                        raise PlannerError(f"Reallocation failed for node {node.id} ('{node.instr.name}') due to global write-phase at stage {wp_stage}")
+                    raise PlannerError(f"Reallocation failed for node {node.id} ('{node.instr.name}') due to write-phases at stages {sorted(forbidden)}")
 
                 node.allocated_stage = s_idx
                 node.allocated_flow  = flow_name
@@ -799,42 +1035,129 @@ class Planner:
                 # self._mark_occupied(pid, s_idx)
 
         if __debug__:
-            logger.debug(f"[Planner][WP] Global pass done. write_phase at stage {wp_stage}. Conflicts resolved.")
+            logger.debug(f"[Planner][WP] Global pass done. write_phases at stages {wp_stages}. Conflicts resolved.")
 
 
+    def _pass_of(self, node: MicroNode) -> Any:
+        """Pass of a placed node: its flow_id (f1's for the f2 half of a dual-flow graph)."""
+        lane_flow = self._lane_flows.get(node.graph_id)
+        if lane_flow and node.flow_id == lane_flow["f2"]:
+            return lane_flow["f1"]
+        return node.flow_id
+
+    def _write_hazards(self, placed: Iterable[Tuple[Any, int, Optional[MicroEffect]]]) -> List[Tuple[int, int]]:
+        """
+        (write stage, read stage) of every write→read that needs a write-phase,
+        over the (pass, stage, effect) of the placed nodes in (stage, node id)
+        order. Only a read in the pass of the write needs one: the final
+        write-phase commits the writes before a packet recirculates, and other
+        graphs are other packets.
+        """
+        pending_writes: dict[Tuple[Any, str], int] = {}
+        hazards: Set[Tuple[int, int]] = set()
+
+        for pass_id, stage, eff in placed:
+            if not eff:
+                continue
+            reads, writes = eff.reads or set(), eff.writes or set()
+
+            for v in reads:
+                if (pass_id, v) in pending_writes:
+                    hazards.add((pending_writes[(pass_id, v)], stage))
+                    # don’t clear pending; later reads see the same write
+
+            for v in writes:
+                pending_writes[(pass_id, v)] = stage
+
+        return sorted(hazards)
+
+    def _wp_window(self, write_stage: int, read_stage: int) -> Tuple[int, int]:
+        """
+        Stages a write-phase may take for a write→read hazard: from the earliest
+        legal one after the write (see _wp_next_free) to the read itself (a read
+        on the write-phase stage is recirculated and reads the flushed value on
+        the next pass). A read on the write's own stage (another table, or the
+        other flow of a dual-flow pass) leaves only the earliest one.
+        """
+        lo = min(self._wp_next_free(write_stage + 1), FINAL_WP_STAGE)
+        return lo, min(max(lo, read_stage), FINAL_WP_STAGE)
+
+    def _write_phase_stages(self, placed: Iterable[Tuple[Any, int, Optional[MicroEffect]]]) -> List[int]:
+        """
+        Fewest write-phase stages serving every hazard of `placed` ((pass,
+        stage, effect) in (stage, node id) order, see _write_hazards). Windows sorted by their end share a
+        write-phase while they overlap the first one (interval stabbing, so the
+        count is minimal); each takes the stage of the shared window with the
+        fewest placed nodes to recirculate, the earliest on ties, or
+        FINAL_WP_STAGE when the window reaches it.
+
+        The coalesced stages are only kept if they recirculate no more nodes
+        than one write-phase right after the last write read back (the single
+        global write-phase the planner used to place); else that one is used.
+        """
+        placed = list(placed)
+        load: Dict[int, int] = {}
+        for _, stage, _ in placed:
+            load[stage] = load.get(stage, 0) + 1
+
+        hazards = self._write_hazards(placed)
+        if not hazards:
+            return []
+        coalesced = self._coalesce_write_phases(hazards, load)
+        single = [min(self._wp_next_free(max(w for w, _ in hazards) + 1), FINAL_WP_STAGE)]
+
+        def recirculated(stages: List[int]) -> int:
+            return sum(load.get(s, 0) for s in stages if s != FINAL_WP_STAGE)
+
+        return single if recirculated(single) < recirculated(coalesced) else coalesced
+
+    def _coalesce_write_phases(self, hazards: List[Tuple[int, int]], load: Dict[int, int]) -> List[int]:
+        """Interval stabbing of the hazard windows (see _write_phase_stages), `load` being the placed nodes per stage."""
+        def stage_of(lo: int, hi: int) -> int:
+            if hi == FINAL_WP_STAGE:
+                return FINAL_WP_STAGE
+            return min(range(lo, hi + 1), key=lambda s: (load.get(s, 0), s))
+
+        windows = sorted({self._wp_window(w, r) for w, r in hazards}, key=lambda x: (x[1], x[0]))
+        stages: List[int] = []
+        shared: Optional[List[int]] = None
+        for lo, hi in windows:
+            if shared is not None and lo <= shared[1]:
+                shared[0] = max(shared[0], lo)
+                continue
+            if shared is not None:
+                stages.append(stage_of(*shared))
+            shared = [lo, hi]
+        if shared is not None:
+            stages.append(stage_of(*shared))
+        return stages
+
+    def _wp_conflict_stages(self, placed: Iterable[Tuple[Any, int, Optional[MicroEffect]]]) -> Set[int]:
+        """Write-phase stages of `placed` whose nodes the write-phase pass recirculates (the final one aside)."""
+        return set(self._write_phase_stages(placed)) - {FINAL_WP_STAGE}
+
     def _try_place_instr(
         self,
         node: "MicroNode",
         start_stage_idx: int,
-        forbidden_stage: int | None = None
+        forbidden_stages: Iterable[int] = ()
     ) -> tuple[int | None, str | None, str | None]:
         """
-        Try to place `node` across the pipeline from `start_stage_idx`, optionally
-        skipping a `forbidden_stage` (e.g., the global write-phase stage).
-        Tries primary op first, then the alternative if present.
+        Try to place `node` across the pipeline from `start_stage_idx`, skipping
+        the `forbidden_stages` (e.g., the write-phase stages).
+        Tries primary op first, then the alternative if present
+        (IF/decide nodes use their conditional candidates).
         """
-        primary = node.instr.name
-        alt = getattr(node.instr, "alternative", None)
+        candidates = self._candidate_ops_for_node(node)
 
-        for s_idx, (stage_name, flows) in enumerate(self.isa["pipeline"].items()):
-            if s_idx < start_stage_idx:
-                continue
-            if forbidden_stage is not None and s_idx == forbidden_stage:
-                continue
-
-            for flow_name, tables in flows.items():
-                for table_name, instr_list in tables.items():
-                    if not isinstance(instr_list, list):
-                        continue
-                    # primary
-                    if primary in instr_list:
-                        node.selected_op = primary
-                        return s_idx, flow_name, table_name
-                    # alternative
-                    if alt and (alt in instr_list):
-                        node.selected_op = alt
-                        return s_idx, flow_name, table_name
-        return None, None, None
+        forbidden = 0
+        for s in forbidden_stages:
+            forbidden |= self.index.stage_mask(s)
+        slot = self.index.first(candidates, start_stage_idx, occupied=forbidden)
+        if slot is None:
+            return None, None, None
+        node.selected_op = self.index.op_at(slot, candidates)
+        return slot
 
 
     # ==========================================================
@@ -893,15 +1216,15 @@ class Planner:
             effect=MicroEffect(),
         )
 
-        g.nodes[wp_id] = wp_node
+        g.add_node(wp_node)
 
         # redirect edges (node → wp → next)
         new_edges = []
-        for e in g.edges:
-            if e.src == node.id:
-                new_edges.append(MicroEdge(src=wp_id, dst=e.dst, dep=e.dep))
-                e.dst = wp_id
-        g.edges.extend(new_edges)
+        for e in list(g.out_edges(node.id)):
+            new_edges.append(MicroEdge(src=wp_id, dst=e.dst, dep=e.dep))
+            g.retarget_edge(e, wp_id)
+        for e in new_edges:
+            g.add_edge(e)
 
         if __debug__:
             logger.debug(f"[Planner][Graph] write-phase nid:{wp_id} inserted after nid:{node.id}")
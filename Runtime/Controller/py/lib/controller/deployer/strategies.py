@@ -0,0 +1,970 @@
+"""
+Planner Strategies
+------------------
+
+How the micro-graphs of a program are placed on the engine pipeline:
+
+- greedy: the Planner as is (topological order, first slot that fits, or
+          the cheapest one with `costs`, see below);
+- bnb:    branch and bound over the Planner's decisions, after
+          Tools/Paper/bnb_multigraph_module.py but on the engine ISA: the
+          order in which ready nodes are placed and the stage each one takes
+          (any stage holding its op, not only the first), minimizing
+          recirculations, including those the write-phase pass adds for the
+          nodes left on the write-phase stages. The greedy plan is the
+          incumbent: the search runs under a wall-clock budget, or a number
+          of expansions (`expansions`, the same plan on every run), and, when
+          it runs out or finds nothing better, the greedy plan is returned;
+- list:   critical-path list scheduling: nodes by slack (ALAP - ASAP stage
+          over the ISA) and longest remaining path, each from the stage
+          after its predecessors, independent nodes sharing a stage in its
+          P1/P2/speculative tables (Planner(pack=True)), on the slot the
+          placement cost model picks. Falls back to the greedy plan when it
+          fails or does worse;
+- dual:   list scheduling with each handler split in two halves, one per
+          flow of the engine (f1/f2, each with its own next_instruction):
+          StageRun nodes are balanced over the two flows cutting as few
+          dependencies as possible, and a dependency left between the halves
+          is a merge point (the node of the later half goes to a stage
+          after the one of the earlier half). A StageRun node lowered to
+          several micro-ops then only holds back its own flow, so the
+          handler ends in an earlier stage. A handler is split only when that makes it shorter and its
+          nodes fit one pass; falls back to the list plan when it does worse.
+- portfolio: the greedy plan and several other strategies (by default
+          list, dual, bnb and list with seeded tie-breaks) planned in
+          parallel on a process pool; the plan with the lowest weighted sum
+          of recirculations, stages, write phases and table entries wins,
+          ties going by strategy (greedy, list, dual, bnb) and then by
+          candidate order, and PlannerStats.portfolio reports every
+          candidate, the winner first. The time budget is shared out as
+          deterministic budgets (bnb gets a number of expansions) and every
+          candidate is waited for, each bounded by its own budget, so the
+          same program gets the same plan on every run (a loaded host only
+          makes it slower).
+
+The plan itself is always built by the Planner, replaying the decisions
+(Planner(orders=..., stages=...)), so flow ids, recirculations, conditionals
+and write phases come out the same way for every strategy. Like _topo_sort,
+the search keeps the micro-ops of one StageRun node together.
+
+`costs` (greedy, list, dual) chooses each node's slot, and with it the
+normal, speculative or alternative form of its op, by the cost model of
+placement_costs.py instead of taking the first that fits: true for the
+default weights, a mapping to change them, false for the first fit (list
+and dual use the cost model unless told otherwise).
+`seed` (list, dual) breaks the ties between ready nodes of equal slack and
+height by a seeded shuffle of _topo_sort's order, for other plans of the
+same program (the portfolio's seeded candidates).
+
+The strategy is chosen per app, by the install request or else by the
+`planner` entry of the manifest's program section:
+
+    program:
+        planner: bnb                        # or {strategy: bnb, budget_ms: 500}
+        planner: {strategy: bnb, expansions: 20000}
+        planner: {strategy: list, costs: {recirculation: 8, lookahead: 3}}
+        planner: {strategy: portfolio, budget_ms: 2000, seeds: 4, weights: {stages: 50}}
+
+    install_app?tag=...&version=...&planner=bnb:500
+
+An app that names no strategy installs the plan embedded by the compiler
+(--target) when it matches the engine, else the greedy plan; a named
+strategy always plans, since the embedded plan is a greedy one.
+"""
+
+from __future__ import annotations
+import os
+import atexit
+import copy
+import time
+import heapq
+import random
+import logging
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .types import MicroGraph
+from .planner import Planner, PlannerStats, PlanningResult, PlannerError
+from .isa_index import iter_bits
+from .placement_costs import PlacementCosts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_MS = 200.0
+
+# expansions between two checks of the deadline
+_CLOCK_EVERY = 256
+
+# bnb expansions per ms of budget (the slowest of the example programs), for
+# the deterministic budget of the portfolio's bnb candidate
+_EXPANSIONS_PER_MS = 25
+
+DEFAULT_PORTFOLIO_BUDGET_MS = 1000.0
+
+# share of the portfolio budget given to the default bnb candidate, the rest
+# covering the pool's round trip
+_BNB_SHARE = 0.6
+
+# portfolio process pools by number of workers, started on first use
+_POOLS: Dict[int, ProcessPoolExecutor] = {}
+
+# tie-breaks between portfolio candidates of the same score
+_TIE_ORDER = ("greedy", "list", "dual", "bnb")
+
+
+class PlannerStrategy:
+    name = ""
+
+    def plan(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int) -> PlanningResult:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+class GreedyStrategy(PlannerStrategy):
+    name = "greedy"
+
+    def __init__(self, costs: Any = None):
+        self.costs = PlacementCosts.of(costs)
+
+    def plan(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int) -> PlanningResult:
+        result = Planner(isa=isa, costs=self.costs).plan(micro_graphs, pid=pid)
+        result.stats.strategy = self.name
+        return result
+
+
+def _score(result: PlanningResult) -> Tuple[int, int]:
+    return result.stats.recirculations, result.stats.stages_used
+
+
+def _topological(succs: Dict[Any, List[Any]], rank: Dict[Any, int]) -> List[Any]:
+    """Node ids in an order that follows `succs` (Planner._precedences), ties by `rank`."""
+    indeg = {nid: 0 for nid in succs}
+    for nid in succs:
+        for s in succs[nid]:
+            indeg[s] += 1
+    ready = [(rank[nid], nid) for nid, d in indeg.items() if d == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        _, nid = heapq.heappop(ready)
+        order.append(nid)
+        for s in succs[nid]:
+            indeg[s] -= 1
+            if indeg[s] == 0:
+                heapq.heappush(ready, (rank[s], s))
+    # nodes left out by cycles keep their rank
+    seen = set(order)
+    order.extend(sorted((nid for nid in succs if nid not in seen), key=rank.get))
+    return order
+
+
+class _PlacementSearch:
+    """
+    Branch and bound over the Planner's allocation decisions for all graphs
+    of a program: which ready node is placed next (a DATA topological order,
+    chained micro-ops of a StageRun node kept together) and in which of the
+    stages holding one of its ops, from the current stage on. Choosing a
+    stage, not a slot, breaks the symmetry between the flows and equivalent
+    tables of a stage: the Planner takes the first free one.
+
+    The cost of a complete plan is its number of recirculations: those of
+    the allocation plus the nodes the write-phase pass moves out of the
+    write-phase stages. The search keeps one state, changed in place and
+    restored on backtrack, and cuts a partial plan when:
+    - its recirculations plus a lower bound of those still to come reach the
+      best complete plan. The Planner advances the current stage after
+      every node, so the remaining nodes of a graph are one chain through
+      the pipeline, at most one per stage and pass. The bound is the larger
+      of: the recirculations of the longest dependency chain from a ready
+      node, each node on the first stage it fits (precomputed per node and
+      current stage), and, for every stage interval [a, b] spanned by the
+      ops of some remaining nodes, (count - free stages of the current
+      pass) / (stages per pass) for the nodes that only fit in it (counts
+      per span kept as nodes are placed). Graphs not started yet add their
+      bound from a fresh pass;
+    - the same placement (the same nodes on the same stages, current stage
+      included) was already reached with as few recirculations, by another
+      order of independent nodes (transposition table on a Zobrist hash of
+      the placement).
+    """
+
+    MEMO_LIMIT = 1 << 20
+
+    def __init__(self, planner: Planner, graphs: List[MicroGraph]):
+        self.planner = planner
+        self.graphs = [g for g in graphs if g.nodes]
+        index = planner.index
+        self.restart = restart = planner._retrieve_next_free_stage(1)
+        self.last = max(index.stages, default=0) + 1
+
+        def stages_from(mask: int, start: int) -> List[int]:
+            return sorted({index.slots[i][0] for i in iter_bits(mask & index.from_stage(start))})
+
+        rand = random.Random(0)
+        self.succs: List[Dict[Any, List[Any]]] = []
+        self.indeg: List[Dict[Any, int]] = []
+        self.parent: List[Dict[Any, Any]] = []
+        self.chained: List[Dict[Any, List[Any]]] = []
+        self.rank: List[Dict[Any, int]] = []
+        self.chain: List[Dict[Any, List[int]]] = []
+        # options[gi][nid][cur]: (stage, recirculated) the node can take from stage cur
+        self.options: List[Dict[Any, List[List[Tuple[int, int]]]]] = []
+        # (lowest, highest) stage of the ops of every node, and the intervals
+        # of the bound with the spans nested in each
+        self.span: List[Dict[Any, Tuple[int, int]]] = []
+        self.intervals: List[List[Tuple[int, int, List[Tuple[int, int]]]]] = []
+        self.zobrist: List[Dict[Any, List[int]]] = []
+        for g in self.graphs:
+            succs = planner._precedences(g)
+            indeg = {nid: 0 for nid in g.nodes}
+            for nid in g.nodes:
+                for s in succs[nid]:
+                    indeg[s] += 1
+            options, span = {}, {}
+            for nid, node in g.nodes.items():
+                mask = index.candidates_mask(planner._allocation_candidates(node))
+                row = []
+                for cur in range(self.last + 1):
+                    here = stages_from(mask, cur)
+                    row.append([(s, 0) for s in here] if here else [(s, 1) for s in stages_from(mask, restart)])
+                options[nid] = row
+                stages = stages_from(mask, 0)
+                span[nid] = (stages[0], stages[-1]) if stages else (self.last, -1)
+            spans = set(span.values())
+            bounds = spans | {(min(a for a, _ in spans), max(b for _, b in spans))}
+            self.succs.append(succs)
+            self.indeg.append(indeg)
+            parent = {nid: n.parent_node_id for nid, n in g.nodes.items()}
+            self.parent.append(parent)
+            self.chained.append({
+                nid: [s for s in succs[nid] if parent[nid] is not None and parent[s] == parent[nid]] for nid in g.nodes
+            })
+            rank = {n.id: i for i, n in enumerate(planner._topo_sort(g))}
+            self.rank.append(rank)
+            # chain[nid][cur]: recirculations of the longest dependency chain from nid,
+            # each node on the first stage it fits (placed alone, the fewest possible)
+            chain: Dict[Any, List[int]] = {}
+            for nid in reversed(_topological(succs, rank)):
+                row = []
+                for cur in range(self.last + 1):
+                    stage, r = options[nid][cur][0] if options[nid][cur] else (self.last, 1)
+                    nxt = min(stage + 1, self.last)
+                    row.append(r + max((chain[s][nxt] for s in succs[nid]), default=0))
+                chain[nid] = row
+            self.chain.append(chain)
+            self.options.append(options)
+            self.span.append(span)
+            self.intervals.append([
+                (a, b, [sp for sp in spans if a <= sp[0] and sp[1] <= b]) for a, b in sorted(bounds)
+            ])
+            self.zobrist.append({nid: [rand.getrandbits(64) for _ in range(self.last + 1)] for nid in g.nodes})
+
+        # spans of the nodes not placed yet, per graph
+        self.left: List[Dict[Tuple[int, int], int]] = []
+        for span in self.span:
+            left: Dict[Tuple[int, int], int] = {}
+            for sp in span.values():
+                left[sp] = left.get(sp, 0) + 1
+            self.left.append(left)
+        # bound of the graphs after gi, each from a fresh pass
+        fresh = [
+            self._bound(gi, 0, [nid for nid, d in self.indeg[gi].items() if d == 0])
+            for gi in range(len(self.graphs))
+        ]
+        self.tail = [sum(fresh[gi + 1:]) for gi in range(len(self.graphs))]
+
+        self.memo: Dict[Tuple, int] = {}
+        self.expansions = 0
+        self.cuts = 0
+        self.memo_hits = 0
+
+    def _bound(self, gi: int, cur: int, ready) -> float:
+        """Recirculations still needed by the nodes of graph gi not placed yet, from stage cur."""
+        chain = self.chain[gi]
+        passes = max((chain[nid][cur] for nid in ready), default=0)
+        left = self.left[gi]
+        for a, b, nested in self.intervals[gi]:
+            count = 0
+            for sp in nested:
+                count += left[sp]
+            now = b - max(a, cur) + 1
+            if count <= now:
+                continue
+            per = b - max(a, self.restart) + 1
+            if per <= 0:
+                return float("inf")
+            passes = max(passes, -(-(count - max(now, 0)) // per))
+        return passes
+
+    def wp_conflicts(self, stage_of: List[Dict[Any, int]]) -> int:
+        """Nodes the write-phase pass would recirculate (see _insert_global_write_phases_all)."""
+        placed = [
+            (stage_of[gi][nid], gi, nid, node.effect)
+            for gi, g in enumerate(self.graphs)
+            for nid, node in g.nodes.items()
+        ]
+        placed.sort(key=lambda p: (p[0], p[2]))
+        # the graph stands for its passes here: a read back on a later pass counts too
+        wp_stages = self.planner._wp_conflict_stages((gi, stage, eff) for stage, gi, _, eff in placed)
+        return sum(1 for stage, _, _, _ in placed if stage in wp_stages)
+
+    def _choices(self, gi: int, ready, cur: int, prev: Any) -> List[Tuple[Any, int, int]]:
+        nodes = ready
+        # chained micro-ops of the StageRun node just placed go first, alone
+        parent = self.parent[gi].get(prev)
+        if parent is not None:
+            chained = [s for s in self.chained[gi][prev] if s in ready]
+            if chained:
+                nodes = chained
+        row = min(cur, self.last)
+        rank = self.rank[gi]
+        choices = [(nid, stage, r) for nid in nodes for stage, r in self.options[gi][nid][row]]
+        choices.sort(key=lambda c: (c[2], rank[c[0]], c[1]))
+        return choices
+
+    def search(self, bound: int, deadline: Optional[float], expansions: Optional[int] = None):
+        """
+        Best decisions with fewer than `bound` recirculations:
+        (orders, stages, recirculations, finished before `deadline` and
+        within `expansions`), with orders/stages per graph_id (None if
+        nothing beats `bound`).
+        """
+        limit = None if expansions is None else self.expansions + int(expansions)
+        if not self.graphs:
+            return None, None, bound, True
+        indeg = [dict(d) for d in self.indeg]
+        ready = [{nid for nid, d in dg.items() if d == 0} for dg in indeg]
+        order: List[List[Any]] = [[] for _ in self.graphs]
+        stage_of: List[Dict[Any, int]] = [{} for _ in self.graphs]
+        moves: List[int] = []       # graph of every placed node, for undo
+        best, best_decisions = bound, None
+        key = 0                     # Zobrist hash of the placement
+
+        def apply(gi, nid, stage):
+            nonlocal key
+            moves.append(gi)
+            order[gi].append(nid)
+            stage_of[gi][nid] = stage
+            self.left[gi][self.span[gi][nid]] -= 1
+            key ^= self.zobrist[gi][nid][stage]
+            ready[gi].discard(nid)
+            for s in self.succs[gi][nid]:
+                indeg[gi][s] -= 1
+                if indeg[gi][s] == 0:
+                    ready[gi].add(s)
+
+        def undo():
+            nonlocal key
+            gi = moves.pop()
+            nid = order[gi].pop()
+            stage = stage_of[gi].pop(nid)
+            self.left[gi][self.span[gi][nid]] += 1
+            key ^= self.zobrist[gi][nid][stage]
+            for s in self.succs[gi][nid]:
+                if indeg[gi][s] == 0:
+                    ready[gi].discard(s)
+                indeg[gi][s] += 1
+            ready[gi].add(nid)
+
+        if self._bound(0, 0, ready[0]) + self.tail[0] >= best:
+            return None, None, best, True
+
+        # frame: [choices, next choice, graph, current stage, recirculations]
+        frames = [[self._choices(0, ready[0], 0, None), 0, 0, 0, 0]]
+        try:
+            while frames:
+                frame = frames[-1]
+                choices, i, gi, cur, recircs = frame
+                if i == len(choices) or best == 0:
+                    frames.pop()
+                    if moves:
+                        undo()
+                    continue
+                frame[1] = i + 1
+
+                self.expansions += 1
+                if self.expansions == limit or (
+                    deadline is not None and self.expansions % _CLOCK_EVERY == 0 and time.perf_counter() >= deadline
+                ):
+                    return (*self._decisions(best_decisions), best, False)
+
+                nid, stage, r = choices[i]
+                recircs += r
+                if recircs >= best:
+                    continue
+                apply(gi, nid, stage)
+
+                if len(order[gi]) == len(self.graphs[gi].nodes):
+                    if gi + 1 == len(self.graphs):
+                        cost = recircs + self.wp_conflicts(stage_of)
+                        if cost < best:
+                            best = cost
+                            best_decisions = ([list(o) for o in order], [dict(s) for s in stage_of])
+                        undo()
+                        continue
+                    gi, cur = gi + 1, 0
+                else:
+                    cur = stage + 1
+
+                if recircs + self._bound(gi, cur, ready[gi]) + self.tail[gi] >= best:
+                    self.cuts += 1
+                    undo()
+                    continue
+                prev = nid if cur else None
+                choices = self._choices(gi, ready[gi], cur, prev)
+                # the node just placed matters only while it forces its chained micro-ops
+                forcing = prev if choices and choices[0][0] in self.chained[gi].get(prev, ()) else None
+                if not self._memo((key, gi, cur, forcing), recircs):
+                    undo()
+                    continue
+                frames.append([choices, 0, gi, cur, recircs])
+        finally:
+            # leave the span counts as they were, for another search
+            while moves:
+                undo()
+
+        return (*self._decisions(best_decisions), best, True)
+
+    def _memo(self, state: Tuple, recircs: int) -> bool:
+        """False if this placement was already reached with as few recirculations."""
+        seen = self.memo.get(state)
+        if seen is not None and seen <= recircs:
+            self.memo_hits += 1
+            return False
+        if seen is not None or len(self.memo) < self.MEMO_LIMIT:
+            self.memo[state] = recircs
+        return True
+
+    def _decisions(self, decisions):
+        if decisions is None:
+            return None, None
+        orders, stages = decisions
+        ids = [g.graph_id for g in self.graphs]
+        return dict(zip(ids, orders)), dict(zip(ids, stages))
+
+
+class BranchAndBoundStrategy(PlannerStrategy):
+    name = "bnb"
+
+    def __init__(self, budget_ms: float = DEFAULT_BUDGET_MS, expansions: Optional[int] = None):
+        self.budget_ms = float(budget_ms)
+        self.expansions = None if expansions is None else int(expansions)
+
+    def __repr__(self) -> str:
+        if self.expansions is not None:
+            return f"{self.name} ({self.expansions} expansions)"
+        return f"{self.name}:{self.budget_ms:g}"
+
+    def plan(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int) -> PlanningResult:
+        # a number of expansions replaces the wall-clock budget
+        deadline = time.perf_counter() + self.budget_ms / 1e3 if self.expansions is None else None
+        pristine = copy.deepcopy(micro_graphs)
+
+        incumbent = Planner(isa=isa).plan(micro_graphs, pid=pid)
+        incumbent.stats.strategy = f"{self.name} (greedy incumbent)"
+        if incumbent.stats.recirculations == 0:
+            return incumbent
+
+        search = _PlacementSearch(Planner(isa=isa), pristine)
+        orders, stages, cost, done = search.search(incumbent.stats.recirculations, deadline, self.expansions)
+        logger.debug(
+            f"[Planner][bnb] pid {pid}: {incumbent.stats.recirculations} -> {cost} recirculations "
+            f"({search.expansions} expansions{'' if done else ', budget exhausted'})"
+        )
+        if orders is None:
+            return incumbent
+
+        try:
+            result = Planner(isa=isa, orders=orders, stages=stages).plan(pristine, pid=pid)
+        except PlannerError as e:
+            logger.warning(f"[Planner][bnb] keeping the greedy plan: {e}")
+            return incumbent
+        if _score(result) >= _score(incumbent):
+            return incumbent
+
+        result.stats.strategy = self.name
+        logger.info(
+            f"[Planner][bnb] pid {pid}: {incumbent.stats.recirculations} -> {result.stats.recirculations} "
+            f"recirculations{'' if done else ' (budget exhausted)'}"
+        )
+        return result
+
+
+def _depth_key(result: PlanningResult) -> Tuple[int, int, int]:
+    return result.stats.recirculations, result.stats.depth, result.stats.stages_used
+
+
+class ListSchedulingStrategy(PlannerStrategy):
+    name = "list"
+
+    def __init__(self, costs: Any = True, seed: Optional[int] = None):
+        self.costs = PlacementCosts.of(costs)
+        self.seed = None if seed is None else int(seed)
+
+    def __repr__(self) -> str:
+        return self.name if self.seed is None else f"{self.name} (seed {self.seed})"
+
+    def plan(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int) -> PlanningResult:
+        pristine = copy.deepcopy(micro_graphs)
+        incumbent = Planner(isa=isa).plan(micro_graphs, pid=pid)
+        incumbent.stats.strategy = f"{self.name} (greedy fallback)"
+
+        planner = Planner(isa=isa)
+        orders = {g.graph_id: self.order(planner, g) for g in pristine}
+        try:
+            result = Planner(isa=isa, orders=orders, pack=True, costs=self.costs).plan(pristine, pid=pid)
+        except PlannerError as e:
+            logger.warning(f"[Planner][list] keeping the greedy plan: {e}")
+            return incumbent
+        if _score(result) > _score(incumbent):
+            return incumbent
+
+        result.stats.strategy = self.name
+        logger.debug(
+            f"[Planner][list] pid {pid}: recirculations {incumbent.stats.recirculations} -> "
+            f"{result.stats.recirculations}, stages {incumbent.stats.stages_used} -> {result.stats.stages_used}"
+        )
+        return result
+
+    def order(self, planner: Planner, g: MicroGraph) -> List[Any]:
+        """
+        Allocation order of `g`: among the ready nodes, the least slack first,
+        then the longest path to a sink, then _topo_sort's order (a shuffle
+        of it with `seed`); the chained micro-ops of a StageRun node stay
+        together.
+        """
+        succs = planner._precedences(g)
+        rank = {n.id: i for i, n in enumerate(planner._topo_sort(g))}
+        asap, alap, height = self.priorities(planner, g, succs, rank)
+        tie = rank
+        if self.seed is not None:
+            shuffled = sorted(rank, key=rank.get)
+            random.Random(f"{self.seed}:{g.graph_id}").shuffle(shuffled)
+            tie = {nid: i for i, nid in enumerate(shuffled)}
+        key = lambda nid: (alap[nid] - asap[nid], -height[nid], tie[nid])
+
+        indeg = {nid: 0 for nid in succs}
+        for nid in succs:
+            for s in succs[nid]:
+                indeg[s] += 1
+        ready = [nid for nid, d in indeg.items() if d == 0]
+        order: List[Any] = []
+        while ready:
+            parent = g.nodes[order[-1]].parent_node_id if order else None
+            chained = [nid for nid in ready if parent is not None and g.nodes[nid].parent_node_id == parent]
+            nid = min(chained or ready, key=key)
+            ready.remove(nid)
+            order.append(nid)
+            for s in succs[nid]:
+                indeg[s] -= 1
+                if indeg[s] == 0:
+                    ready.append(s)
+        # nodes left out by cycles keep _topo_sort's order
+        seen = set(order)
+        order.extend(sorted((nid for nid in succs if nid not in seen), key=rank.get))
+        return order
+
+    def priorities(self, planner: Planner, g: MicroGraph, succs: Dict[Any, List[Any]], rank: Dict[Any, int]):
+        """
+        ASAP and ALAP position of every node (pass * positions per pass +
+        stage, a node after its predecessors on a stage holding one of its
+        ops) and its height (nodes on the longest path to a sink).
+        """
+        index = planner.index
+        width = max(index.stages, default=0) + 1
+        restart = planner._retrieve_next_free_stage(1)
+        stages = {
+            nid: sorted({index.slots[i][0] for i in iter_bits(index.candidates_mask(planner._allocation_candidates(n)))})
+            for nid, n in g.nodes.items()
+        }
+        ordered = _topological(succs, rank)
+        preds: Dict[Any, List[Any]] = {nid: [] for nid in succs}
+        for nid in succs:
+            for s in succs[nid]:
+                preds[s].append(nid)
+
+        def earliest(nid, t):
+            for s in stages[nid]:
+                if s >= t % width:
+                    return t - t % width + s
+            later = [s for s in stages[nid] if s >= restart]
+            return t - t % width + width + (later[0] if later else restart)
+
+        def latest(nid, t):
+            for s in reversed(stages[nid]):
+                if s <= t % width:
+                    return t - t % width + s
+            return t - t % width - width + (stages[nid][-1] if stages[nid] else 0)
+
+        asap: Dict[Any, int] = {}
+        for nid in ordered:
+            asap[nid] = earliest(nid, max((asap[p] + 1 for p in preds[nid]), default=0))
+        horizon = max(asap.values(), default=0)
+        alap: Dict[Any, int] = {}
+        height: Dict[Any, int] = {}
+        for nid in reversed(ordered):
+            alap[nid] = latest(nid, min((alap[s] - 1 for s in succs[nid]), default=horizon))
+            height[nid] = 1 + max((height[s] for s in succs[nid]), default=0)
+        return asap, alap, height
+
+
+class DualFlowStrategy(ListSchedulingStrategy):
+    name = "dual"
+
+    def plan(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int) -> PlanningResult:
+        pristine = copy.deepcopy(micro_graphs)
+        incumbent = super().plan(isa, micro_graphs, pid)
+        fallback = "list" if incumbent.stats.strategy == ListSchedulingStrategy.name else "greedy"
+        incumbent.stats.strategy = f"{self.name} ({fallback} fallback)"
+
+        planner = Planner(isa=isa)
+        orders = {g.graph_id: self.order(planner, g) for g in pristine}
+        lanes: Dict[Any, Dict[Any, str]] = {}
+        for g in pristine:
+            split = self.partition(planner, g)
+            if split is not None and self.shorter(isa, g, orders, split, pid):
+                lanes[g.graph_id] = split
+        if not lanes:
+            return incumbent
+
+        try:
+            result = Planner(isa=isa, orders=orders, pack=True, lanes=lanes, costs=self.costs).plan(pristine, pid=pid)
+        except PlannerError as e:
+            logger.warning(f"[Planner][dual] keeping the list plan: {e}")
+            return incumbent
+        if _depth_key(result) > _depth_key(incumbent):
+            return incumbent
+        result.stats.strategy = self.name
+        logger.debug(
+            f"[Planner][dual] pid {pid}: {len(lanes)} handlers on f1/f2 with {result.stats.merges} merge points, "
+            f"depth {incumbent.stats.depth} -> {result.stats.depth}"
+        )
+        return result
+
+    def shorter(self, isa: Dict[str, Any], g: MicroGraph, orders, split: Dict[Any, str], pid: int) -> bool:
+        """Whether `g` alone recirculates less or ends in an earlier stage on two flows than on one."""
+        gid = g.graph_id
+        try:
+            dual = Planner(isa=isa, orders=orders, lanes={gid: split}, costs=self.costs).plan([copy.deepcopy(g)], pid=pid)
+        except PlannerError:
+            return False
+        single = Planner(isa=isa, orders=orders, pack=True, costs=self.costs).plan([copy.deepcopy(g)], pid=pid)
+        return _depth_key(dual) < _depth_key(single)
+
+    def partition(self, planner: Planner, g: MicroGraph) -> Optional[Dict[Any, str]]:
+        """
+        Node id -> f1/f2 for `g`, or None when it cannot be split.
+
+        The units are StageRun nodes (all micro-ops of one node share a flow:
+        they hand state over through it), weighted by their micro-ops.
+        Connected units go to the lighter flow by decreasing weight, then
+        single units move (each once, Fiduccia-Mattheyses style) while a
+        move lowers the heavier flow, or keeps it and cuts fewer
+        dependencies. Units with an op that f2 holds in fewer stages than f1
+        stay on f1.
+        Conditionals are not split (their branches get flow ids of their own).
+        """
+        if any(planner._is_decide(n) for n in g.nodes.values()):
+            return None
+        index = planner.index
+
+        def on_f2(node) -> bool:
+            # every stage holding the op on f1 holds it on f2 too
+            mask = index.candidates_mask(planner._allocation_candidates(node))
+            stages = lambda flow: {index.slots[i][0] for i in iter_bits(mask & index.flow_mask(flow))}
+            return stages("f1") <= stages("f2")
+
+        unit_of: Dict[Any, Any] = {}
+        units: Dict[Any, List[Any]] = {}
+        for nid in sorted(g.nodes):
+            parent = g.nodes[nid].parent_node_id
+            unit = ("node", parent) if parent is not None else ("micro", nid)
+            unit_of[nid] = unit
+            units.setdefault(unit, []).append(nid)
+        if len(units) < 2:
+            return None
+        movable = {u for u, ids in units.items() if all(on_f2(g.nodes[nid]) for nid in ids)}
+        if not movable:
+            return None
+
+        links: Dict[Any, Dict[Any, int]] = {u: {} for u in units}
+        for nid, succs in planner._precedences(g).items():
+            for s in succs:
+                a, b = unit_of[nid], unit_of[s]
+                if a != b:
+                    links[a][b] = links[a].get(b, 0) + 1
+                    links[b][a] = links[b].get(a, 0) + 1
+
+        order = sorted(units, key=lambda u: units[u][0])
+        weight = {u: len(units[u]) for u in units}
+        lane: Dict[Any, str] = {}
+        load = {"f1": 0, "f2": 0}
+
+        # 1. connected units, heaviest first, to the lighter flow
+        components: List[List[Any]] = []
+        seen = set()
+        for u in order:
+            if u in seen:
+                continue
+            comp, stack = [], [u]
+            seen.add(u)
+            while stack:
+                x = stack.pop()
+                comp.append(x)
+                for y in links[x]:
+                    if y not in seen:
+                        seen.add(y)
+                        stack.append(y)
+            components.append(comp)
+        components.sort(key=lambda c: -sum(weight[u] for u in c))
+        for comp in components:
+            side = "f2" if load["f2"] < load["f1"] and all(u in movable for u in comp) else "f1"
+            for u in comp:
+                lane[u] = side
+            load[side] += sum(weight[u] for u in comp)
+
+        # 2. single moves, best first, each unit once
+        def cut_change(u: Any) -> int:
+            return sum(c if lane[v] == lane[u] else -c for v, c in links[u].items())
+
+        locked = set()
+        while True:
+            best = None
+            for u in order:
+                if u in locked or (lane[u] == "f1" and u not in movable):
+                    continue
+                src, dst = lane[u], "f1" if lane[u] == "f2" else "f2"
+                heavy = max(load[src] - weight[u], load[dst] + weight[u])
+                key = (heavy, cut_change(u))
+                if key < (max(load.values()), 0) and (best is None or key < best[0]):
+                    best = (key, u)
+            if best is None:
+                break
+            u = best[1]
+            src = lane[u]
+            lane[u] = "f1" if src == "f2" else "f2"
+            load[src] -= weight[u]
+            load[lane[u]] += weight[u]
+            locked.add(u)
+
+        if not load["f2"]:
+            return None
+        return {nid: lane[unit_of[nid]] for nid in g.nodes}
+
+
+@dataclass
+class PortfolioWeights:
+    recirculations: float = 1000.0
+    stages: float = 10.0
+    write_phases: float = 10.0
+    entries: float = 1.0
+
+    @classmethod
+    def of(cls, spec: Any) -> "PortfolioWeights":
+        """PortfolioWeights from a strategy option: None (defaults), an instance or a mapping of fields."""
+        if spec is None:
+            return cls()
+        if isinstance(spec, cls):
+            return spec
+        if isinstance(spec, dict):
+            return cls(**spec)
+        raise ValueError(f"Bad portfolio weights: {spec!r}")
+
+    def score(self, stats: PlannerStats) -> float:
+        return (
+            self.recirculations * stats.recirculations
+            + self.stages * stats.stages_used
+            + self.write_phases * len(stats.write_phases)
+            + self.entries * stats.entries
+        )
+
+
+def _plan_candidate(spec: Any, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int):
+    """(plan or None, error, ms) of one portfolio candidate; runs in a pool worker."""
+    t0 = time.perf_counter()
+    try:
+        result, error = planner_strategy(spec).plan(isa, micro_graphs, pid), None
+    except Exception as e:
+        # a failing candidate only leaves the race
+        result, error = None, f"{type(e).__name__}: {e}"
+    return result, error, (time.perf_counter() - t0) * 1e3
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    pool = _POOLS.get(workers)
+    if pool is None:
+        pool = _POOLS[workers] = ProcessPoolExecutor(max_workers=workers)
+    return pool
+
+
+def _recycle_pool(workers: int) -> None:
+    """Drops the pool of `workers` (broken or unusable); the next _pool() starts a new one."""
+    pool = _POOLS.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_pools() -> None:
+    for workers in list(_POOLS):
+        _recycle_pool(workers)
+
+
+def _tie_rank(strategy: PlannerStrategy) -> int:
+    return _TIE_ORDER.index(strategy.name) if strategy.name in _TIE_ORDER else len(_TIE_ORDER)
+
+
+class PortfolioStrategy(PlannerStrategy):
+    name = "portfolio"
+
+    def __init__(
+        self,
+        budget_ms: float = DEFAULT_PORTFOLIO_BUDGET_MS,
+        candidates: Optional[List[Any]] = None,
+        seeds: int = 2,
+        workers: Optional[int] = None,
+        weights: Any = None,
+    ):
+        self.budget_ms = float(budget_ms)
+        if candidates is None:
+            expansions = int(self.budget_ms * _BNB_SHARE * _EXPANSIONS_PER_MS)
+            candidates = ["list", "dual", {"strategy": "bnb", "expansions": expansions}]
+            candidates += [{"strategy": "list", "seed": seed} for seed in range(1, int(seeds) + 1)]
+        # the greedy plan is always a candidate, planned here
+        self.candidates = [planner_strategy(c) for c in candidates]
+        self.candidates = [
+            c for c in self.candidates
+            if not isinstance(c, PortfolioStrategy) and not (type(c) is GreedyStrategy and c.costs is None)
+        ]
+        self.workers = min(len(self.candidates), os.cpu_count() or 1) if workers is None else int(workers)
+        self.weights = PortfolioWeights.of(weights)
+
+    def __repr__(self) -> str:
+        return f"{self.name}:{self.budget_ms:g}"
+
+    def plan(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int) -> PlanningResult:
+        pristine = copy.deepcopy(micro_graphs)
+        t0 = time.perf_counter()
+        greedy = GreedyStrategy().plan(isa, micro_graphs, pid)
+        outcomes = [(GreedyStrategy(), (greedy, None, (time.perf_counter() - t0) * 1e3))]
+        outcomes += zip(self.candidates, self._run(isa, pristine, pid))
+
+        rows = []
+        best = None
+        for i, (strategy, (result, error, ms)) in enumerate(outcomes):
+            row: Dict[str, Any] = {"strategy": repr(strategy), "ms": round(ms, 3)}
+            if result is None:
+                row["error"] = error
+            else:
+                score = self.weights.score(result.stats)
+                row.update(
+                    plan=result.stats.strategy,
+                    score=score,
+                    recirculations=result.stats.recirculations,
+                    stages=result.stats.stages_used,
+                    write_phases=len(result.stats.write_phases),
+                    entries=result.stats.entries,
+                )
+                # lowest score, ties by strategy and then candidate order: the same plans always give the same winner
+                key = (score, _tie_rank(strategy), i)
+                if best is None or key < best[0]:
+                    best = (key, i, result)
+            rows.append(row)
+
+        _, winner, result = best
+        rows.insert(0, rows.pop(winner))
+        result.stats.portfolio = rows
+        result.stats.strategy = f"{self.name} ({rows[0]['strategy']})"
+        logger.debug(
+            f"[Planner][portfolio] pid {pid}: {rows[0]['strategy']} wins with score {rows[0]['score']:g} "
+            f"({sum(1 for r in rows if 'error' not in r)}/{len(rows)} candidates planned)"
+        )
+        return result
+
+    def _run(self, isa: Dict[str, Any], micro_graphs: List[MicroGraph], pid: int):
+        """
+        Outcome of every candidate (see _plan_candidate), on the pool or one
+        after the other without one. There is no wall-clock cut: each
+        candidate is bounded by its own budget, and dropping the ones a
+        loaded host delays would change the winner from run to run.
+        """
+        if self.workers > 1:
+            try:
+                pool = _pool(self.workers)
+                futures = [pool.submit(_plan_candidate, c, isa, micro_graphs, pid) for c in self.candidates]
+            except (OSError, RuntimeError, AssertionError) as e:
+                # no pool here (e.g. inside a daemon process): plan in this process
+                logger.warning(f"[Planner][portfolio] no process pool ({e!r}), planning candidates in turn")
+                _recycle_pool(self.workers)
+            else:
+                wait(futures)
+                outcomes = []
+                broken = False
+                for future in futures:
+                    try:
+                        outcomes.append(future.result())
+                    except BrokenProcessPool as e:
+                        outcomes.append((None, repr(e), 0.0))
+                        broken = True
+                if broken:
+                    logger.warning(f"[Planner][portfolio] pid {pid}: restarting the process pool")
+                    _recycle_pool(self.workers)
+                return outcomes
+
+        return [_plan_candidate(c, isa, copy.deepcopy(micro_graphs), pid) for c in self.candidates]
+
+
+STRATEGIES = {
+    GreedyStrategy.name: GreedyStrategy,
+    BranchAndBoundStrategy.name: BranchAndBoundStrategy,
+    ListSchedulingStrategy.name: ListSchedulingStrategy,
+    DualFlowStrategy.name: DualFlowStrategy,
+    PortfolioStrategy.name: PortfolioStrategy,
+}
+
+
+def planner_strategy(spec: Any = None) -> PlannerStrategy:
+    """
+    Strategy for `spec`: None (greedy), a name with an optional budget in ms
+    ("bnb", "bnb:500") or a manifest mapping ({"strategy": "bnb", "budget_ms": 500}).
+    """
+    if spec is None or spec == "":
+        return GreedyStrategy()
+    if isinstance(spec, PlannerStrategy):
+        return spec
+
+    options: Dict[str, Any] = {}
+    if isinstance(spec, dict):
+        options = dict(spec)
+        name = options.pop("strategy", options.pop("name", None))
+    else:
+        name, _, budget = str(spec).partition(":")
+        if budget:
+            options["budget_ms"] = budget
+
+    cls = STRATEGIES.get(str(name).strip().lower())
+    if cls is None:
+        raise ValueError(f"Unknown planner strategy '{name}' (available: {', '.join(STRATEGIES)})")
+    try:
+        if "budget_ms" in options:
+            options["budget_ms"] = float(options["budget_ms"])
+        return cls(**options)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Bad options for planner strategy '{name}': {options}") from e
+
+
+def strategy_for(manifest: Optional[Dict[str, Any]], requested: Any = None) -> Optional[PlannerStrategy]:
+    """
+    Strategy of an app: the one of the install request, else the manifest's
+    program.planner, else None (embedded target or greedy, see plan_program).
+    """
+    if requested not in (None, ""):
+        return planner_strategy(requested)
+    program = (manifest or {}).get("program") or {}
+    if program.get("planner") in (None, ""):
+        return None
+    return planner_strategy(program["planner"])
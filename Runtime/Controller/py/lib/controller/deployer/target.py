@@ -0,0 +1,278 @@
+"""
+Pre-Planned Targets
+-------------------
+
+Ahead-of-time lowering and planning of a compiled program for one engine ISA
+(`stagerun_compiler.py --target <ISA>.json`), and the reverse step done by
+the controller at install time.
+
+The embedded plan is relocatable: it is computed with PID_PLACEHOLDER as
+program id and with symbolic ports ("$port:<endpoint>"), which are bound to
+the real program id and dev_ports when the program is installed. The program
+id is the only part of a plan that depends on it: flow and pkt ids are
+numbered per plan and every engine entry also matches on the program id.
+
+It is only used if it was planned against the ISA of the running engine, by
+the lowering and planner code of the running controller (`planner`, a
+fingerprint of their sources: a controller whose rules or placement changed
+since the program was compiled does not install the stale plan); otherwise
+the controller lowers and plans the StageRun graphs as usual.
+
+Target layout:
+{
+    "format": int,
+    "isa": str,                   # ISA file the plan was computed for
+    "isa_checksum": str,          # sha256 of the canonical ISA json
+    "planner": str,               # planner_fingerprint() of the compiler
+    "hash_units": {hash: unit},   # engine hash unit each hash was lowered to
+    "graphs": [{"graph_id", "keys", "default_action", "nodes": [...], "edges": [...]}],
+    "wp_reserved": {stage: 1}
+}
+"""
+
+from __future__ import annotations
+import functools
+import hashlib
+from typing import Any, Callable, Dict, List
+
+import lib.tofino.constants as engine_constants
+from .types import MicroGraph, MicroNode, MicroEdge, MicroInstruction, MicroEffect
+from .micro_instruction import MicroInstructionParser
+from .planner import Planner, PlanningResult, PlannerStats
+from .isa_index import isa_checksum
+from . import isa_index, lowering_rules, micro_instruction, placement_costs, planner, types
+
+TARGET_FORMAT_VERSION = 3
+PID_PLACEHOLDER = 0
+PORT_PREFIX = "$port:"
+
+
+class TargetError(Exception):
+    pass
+
+
+def symbolic_port(endpoint: str) -> str:
+    return f"{PORT_PREFIX}{endpoint}"
+
+
+# code that decides the micro-graphs and placements of a plan
+_PLANNER_MODULES = (engine_constants, types, lowering_rules, micro_instruction, isa_index, placement_costs, planner)
+
+
+@functools.lru_cache(maxsize=None)
+def planner_fingerprint() -> str:
+    """sha256 of the sources of the lowering and planner modules."""
+    digest = hashlib.sha256()
+    for module in _PLANNER_MODULES:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def stage_run_graphs(compiled_app: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    StageRun graphs in the layout expected by MicroInstructionParser.to_micro,
+    from either the legacy "graphs" list or the exported "handlers".
+    """
+    if compiled_app.get("graphs"):
+        return compiled_app["graphs"]
+
+    return [
+        {
+            "graph_id": h["id"],
+            "keys": h.get("keys", []),
+            "default_action": h.get("default_action"),
+            "nodes": [n for nodes in (h.get("labels") or {}).values() for n in nodes],
+            "edges": h.get("edges", []),
+        }
+        for h in compiled_app.get("handlers", [])
+    ]
+
+
+# ============================================================
+# Serialization
+# ============================================================
+
+def _node_to_dict(n: MicroNode) -> Dict[str, Any]:
+    eff = n.effect
+    return {
+        "id": n.id,
+        "instr": n.instr.name,
+        "kwargs": n.instr.kwargs,
+        "alternative": n.instr.alternative,
+        "used_alternative": n.instr.used_alternative,
+        "selected_op": getattr(n, "selected_op", None),
+        "effect": {
+            "reads": sorted(eff.reads),
+            "writes": sorted(eff.writes),
+            "uses": sorted(eff.uses),
+        } if eff is not None else None,
+        "graph_id": n.graph_id,
+        "parent_node_id": n.parent_node_id,
+        "allocated_stage": n.allocated_stage,
+        "allocated_table": n.allocated_table,
+        "allocated_flow": n.allocated_flow,
+        "flow_id": n.flow_id,
+    }
+
+
+def _edge_to_dict(e: MicroEdge) -> Dict[str, Any]:
+    out = {"src": e.src, "dst": e.dst, "dep": e.dep}
+    label = getattr(e, "label", None)
+    if label:
+        out["label"] = label
+    return out
+
+
+def graph_to_dict(g: MicroGraph) -> Dict[str, Any]:
+    return {
+        "graph_id": g.graph_id,
+        "keys": g.keys,
+        "default_action": g.default_action,
+        "nodes": [_node_to_dict(n) for n in g.nodes.values()],
+        "edges": [_edge_to_dict(e) for e in g.edges],
+    }
+
+
+def plan_to_dict(plan: PlanningResult) -> Dict[str, Any]:
+    """Relocatable plan section of a target (graphs + write phases)."""
+    wp_reserved = plan.stats.wp_reserved if plan.stats else {}
+    return {
+        "graphs": [graph_to_dict(g) for g in plan.graphs],
+        "wp_reserved": {str(stage): v for stage, v in sorted(wp_reserved.items())},
+    }
+
+
+def _node_from_dict(d: Dict[str, Any]) -> MicroNode:
+    eff = d.get("effect")
+    node = MicroNode(
+        id=d["id"],
+        instr=MicroInstruction(
+            name=d["instr"],
+            kwargs=d["kwargs"],
+            alternative=d.get("alternative"),
+            used_alternative=d.get("used_alternative", False),
+        ),
+        effect=MicroEffect(
+            reads=set(eff["reads"]),
+            writes=set(eff["writes"]),
+            uses=set(eff["uses"]),
+        ) if eff is not None else None,
+        graph_id=d["graph_id"],
+        parent_node_id=d.get("parent_node_id"),
+        allocated_stage=d.get("allocated_stage"),
+        allocated_table=d.get("allocated_table"),
+        allocated_flow=d.get("allocated_flow"),
+        flow_id=d.get("flow_id"),
+    )
+    if d.get("selected_op") is not None:
+        node.selected_op = d["selected_op"]
+    return node
+
+
+def _edge_from_dict(d: Dict[str, Any]) -> MicroEdge:
+    edge = MicroEdge(src=d["src"], dst=d["dst"], dep=d["dep"])
+    if "label" in d:
+        edge.label = d["label"]
+    return edge
+
+
+def graph_from_dict(gd: Dict[str, Any]) -> MicroGraph:
+    g = MicroGraph(graph_id=gd["graph_id"], keys=gd["keys"], default_action=gd["default_action"])
+    for nd in gd["nodes"]:
+        node = _node_from_dict(nd)
+        g.nodes[node.id] = node
+    g.edges = [_edge_from_dict(e) for e in gd["edges"]]
+    return g
+
+
+# ============================================================
+# Compile time
+# ============================================================
+
+def build_target(compiled_app: Dict[str, Any], isa: Dict[str, Any], isa_name: str,
+                 hash_units: Dict[str, int] | None = None) -> Dict[str, Any]:
+    """
+    Lowers and plans the handlers of a compiled program (single program view)
+    against `isa`, without a manifest or a running engine. `hash_units` maps
+    hash names to engine hash units (the program's own assignment by default).
+    """
+    from .hash_units import program_hash_units     # (hash_units imports this module)
+
+    graphs = stage_run_graphs(compiled_app)
+
+    try:
+        if hash_units is None:
+            hash_units = program_hash_units(compiled_app).of("")
+        mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=symbolic_port, hash_units=hash_units)
+        micro_graphs = mip.to_micro(graphs)
+        plan = Planner(isa=isa).plan(micro_graphs, pid=PID_PLACEHOLDER)
+    except Exception as e:
+        raise TargetError(f"Could not plan '{compiled_app.get('program')}' for {isa_name}: {e!r}") from e
+
+    return {
+        "format": TARGET_FORMAT_VERSION,
+        "isa": isa_name,
+        "isa_checksum": isa_checksum(isa),
+        "planner": planner_fingerprint(),
+        "hash_units": hash_units,
+        **plan_to_dict(plan),
+    }
+
+
+# ============================================================
+# Install time
+# ============================================================
+
+def target_matches(target: Dict[str, Any] | None, isa: Dict[str, Any],
+                   hash_units: Dict[str, int] | None = None) -> bool:
+    """
+    Whether the embedded plan was computed for `isa` by this controller's
+    lowering and planner (and, when given, lowered to the `hash_units` the
+    program is installed with).
+    """
+    return bool(target) \
+        and target.get("format") == TARGET_FORMAT_VERSION \
+        and target.get("isa_checksum") == isa_checksum(isa) \
+        and target.get("planner") == planner_fingerprint() \
+        and (hash_units is None or target.get("hash_units") == hash_units) \
+        and "graphs" in target
+
+
+def _relocate(value: Any, pid: int, resolve_port: Callable[[str], Any]) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: pid if k == "program_id" else _relocate(v, pid, resolve_port)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_relocate(v, pid, resolve_port) for v in value]
+    if isinstance(value, str) and value.startswith(PORT_PREFIX):
+        return resolve_port(value[len(PORT_PREFIX):])
+    return value
+
+
+def memo_ports(resolve_port: Callable[[str], Any]) -> Callable[[str], Any]:
+    """`resolve_port` resolving every endpoint once."""
+    ports: Dict[str, Any] = {}
+
+    def port_of(endpoint: str) -> Any:
+        if endpoint not in ports:
+            ports[endpoint] = resolve_port(endpoint)
+        return ports[endpoint]
+
+    return port_of
+
+
+def load_target_plan(target: Dict[str, Any], pid: int, resolve_port: Callable[[str], Any]) -> PlanningResult:
+    """
+    Rebuilds the PlanningResult of an embedded target, bound to `pid` and to
+    the dev_ports returned by `resolve_port` (endpoint name -> dev_port).
+    """
+    port_of = memo_ports(resolve_port)
+    graphs = [graph_from_dict(_relocate(gd, pid, port_of)) for gd in target["graphs"]]
+
+    stats = PlannerStats()
+    stats.wp_reserved = {int(stage): v for stage, v in target.get("wp_reserved", {}).items()}
+    stats.strategy = "target"
+    return PlanningResult(graphs, stats)
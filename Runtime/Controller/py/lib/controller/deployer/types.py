@@ -5,6 +5,7 @@ from typing import Dict, List, Optional, Literal, Any
 
 # Other Imports
 import re
+import sys
 import logging
 
 # StageRun Imports
@@ -16,6 +17,10 @@ from lib.controller.constants import *
 
 DepKind = Literal["DATA", "CONTROL", "CHOICE", "PHASE"]  # PHASE = write phase barrier
 
+# Micro nodes/edges are created by the thousand per program: no per-instance
+# __dict__ where the interpreter supports slotted dataclasses
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 class MicroInstructionError(Exception):
     pass
 
@@ -47,7 +52,7 @@ class MicroInstruction:
         return f"MicroInstruction({self.name} {args})"
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class MicroNode:
     # node id
     id: int
@@ -66,22 +71,99 @@ class MicroNode:
     allocated_table: Optional[int] = None
     allocated_flow: Optional[int] = None  # 1 or 2
     flow_id: Optional[int] = None         
+    selected_op: Optional[str] = None     # op of the candidates that was placed
 
-@dataclass
+@dataclass(**_SLOTS)
 class MicroEdge:
     src: int
     dst: int
     dep: DepKind              # DATA, CONTROL, CHOICE, PHASE
-    # label: Optional[str] = None  # e.g., "true", "else", "alt0", "alt1"
+    label: Optional[str] = None  # e.g., "true", "else", "alt0", "alt1"
 
 
-@dataclass
 class MicroGraph:
-    graph_id: str
-    nodes: Dict[int, MicroNode] = field(default_factory=dict)
-    edges: List[MicroEdge] = field(default_factory=list)
-    keys: Dict | None = None
-    default_action: Dict | None = None
+    """
+    Micro nodes and edges of one handler, with the edges also indexed by
+    endpoint (out/in edge lists per node) and the DATA in-degree of every
+    node, kept up to date by add_edge/retarget_edge: successors,
+    predecessors and Kahn's ordering never scan the whole edge list.
+
+    `edges` keeps the insertion order (serialization, topological ties).
+    Edges must be changed through the graph (add_edge, retarget_edge, or
+    assigning a new `edges` list, which rebuilds the index), not in place.
+    """
+
+    __slots__ = ("graph_id", "nodes", "keys", "default_action", "_edges", "_out", "_in", "_data_indeg")
+
+    def __init__(
+        self,
+        graph_id: str,
+        nodes: Dict[int, MicroNode] | None = None,
+        edges: List[MicroEdge] | None = None,
+        keys: Dict | None = None,
+        default_action: Dict | None = None,
+    ):
+        self.graph_id = graph_id
+        self.nodes: Dict[int, MicroNode] = nodes if nodes is not None else {}
+        self.keys = keys
+        self.default_action = default_action
+        self.edges = edges if edges is not None else []
+
+    def __repr__(self):
+        return f"MicroGraph({self.graph_id!r}, {len(self.nodes)} nodes, {len(self._edges)} edges)"
+
+    # ------------------------------------------------------------
+    # Edges and adjacency
+    # ------------------------------------------------------------
+
+    @property
+    def edges(self) -> List[MicroEdge]:
+        return self._edges
+
+    @edges.setter
+    def edges(self, edges: List[MicroEdge]):
+        self._edges: List[MicroEdge] = []
+        self._out: Dict[int, List[MicroEdge]] = {}
+        self._in: Dict[int, List[MicroEdge]] = {}
+        self._data_indeg: Dict[int, int] = {}
+        for e in edges:
+            self.add_edge(e)
+
+    def add_node(self, node: MicroNode) -> MicroNode:
+        self.nodes[node.id] = node
+        return node
+
+    def add_edge(self, edge: MicroEdge) -> MicroEdge:
+        self._edges.append(edge)
+        self._out.setdefault(edge.src, []).append(edge)
+        self._in.setdefault(edge.dst, []).append(edge)
+        if edge.dep == "DATA":
+            self._data_indeg[edge.dst] = self._data_indeg.get(edge.dst, 0) + 1
+        return edge
+
+    def retarget_edge(self, edge: MicroEdge, dst: int) -> None:
+        """Points `edge` to `dst` (keeps its place in the source's out edges)."""
+        self._in[edge.dst].remove(edge)
+        if edge.dep == "DATA":
+            self._data_indeg[edge.dst] -= 1
+            self._data_indeg[dst] = self._data_indeg.get(dst, 0) + 1
+        edge.dst = dst
+        self._in.setdefault(dst, []).append(edge)
+
+    def out_edges(self, nid: int) -> List[MicroEdge]:
+        return self._out.get(nid, [])
+
+    def in_edges(self, nid: int) -> List[MicroEdge]:
+        return self._in.get(nid, [])
+
+    def successors(self, nid: int, dep: str | None = "DATA") -> List[int]:
+        return [e.dst for e in self._out.get(nid, ()) if dep is None or e.dep == dep]
+
+    def predecessors(self, nid: int, dep: str | None = "DATA") -> List[int]:
+        return [e.src for e in self._in.get(nid, ()) if dep is None or e.dep == dep]
+
+    def data_indegree(self, nid: int) -> int:
+        return self._data_indeg.get(nid, 0)
 
 
     def debug_print(self, show_effects: bool = True, filepath: str = "MicroGraphs.log"):
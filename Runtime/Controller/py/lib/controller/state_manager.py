@@ -11,6 +11,7 @@ from lib.utils.status import *
 from lib.engine.engine_controller import EngineController
 # from lib.utils.manifest_parser import parse_manifest
 from lib.utils.utils import parse_json, Timer
+from lib.controller.artifact_cache import artifact_cache
 
 logger = logging.getLogger(__name__)
 timer = Timer()
@@ -106,8 +107,9 @@ def save_running_engine():
         json.dump(running_engine, f, indent=2)
 
 def get_engine_ISA(engine_key):
+    """Engine ISA (parsed once per ISA file version, shared: read-only)."""
     global engines
-    return parse_json(engines[engine_key]['isa_path'])
+    return artifact_cache.engine_isa(engines[engine_key]['isa_path'])
 
 def get_engine_recirc_ports(engine_key):
     global engines
@@ -183,6 +185,7 @@ def set_running_engine(engine_key, log_path):
             "log": log_path,
             "program_ids": {},
             "free_pids": [],
+            "hash_units": {},
     }
     save_running_engine()
 
@@ -193,6 +196,7 @@ def reset_running_engine():
             "log": "",
             "program_ids": {},
             "free_pids": [],
+            "hash_units": {},
     }
     save_running_engine()
 
@@ -336,11 +340,88 @@ def allocate_pid():
 
     return int(pid)
 
+def next_pid():
+    """Pid the next allocate_pid() returns, without reserving it (dry runs)."""
+    free_pids = running_engine[RUNNING_ENGINE].get("free_pids") or []
+    if free_pids:
+        return int(free_pids[0])
+
+    used_ids = set(map(int, running_engine[RUNNING_ENGINE]["program_ids"].keys()))
+    pid = 1
+    while pid in used_ids:
+        pid += 1
+    return pid
+
 def set_pid(pid, app_key):
     global running_engine
     running_engine[RUNNING_ENGINE]["program_ids"][str(pid)] = app_key
     save_running_engine()
 
+    ####### Hash Units Management #######
+
+def get_hash_units() -> dict:
+    """Engine hash units configured for the installed programs: {unit: engine hash fields}."""
+    hash_units = running_engine[RUNNING_ENGINE].get("hash_units") or {}
+    return {int(unit): list(entry["fields"]) for unit, entry in hash_units.items()}
+
+def add_hash_units(pid, units: dict):
+    """Registers the hash units ({unit: engine hash fields}) program `pid` is lowered to."""
+    global running_engine
+    hash_units = running_engine[RUNNING_ENGINE].setdefault("hash_units", {})
+    for unit, fields in units.items():
+        entry = hash_units.setdefault(str(unit), {"fields": list(fields), "pids": []})
+        if int(pid) not in entry["pids"]:
+            entry["pids"].append(int(pid))
+    save_running_engine()
+
+def release_hash_units(pid):
+    """Frees the hash units no installed program uses once `pid` is removed."""
+    global running_engine
+    hash_units = running_engine[RUNNING_ENGINE].get("hash_units") or {}
+    for unit in list(hash_units):
+        pids = hash_units[unit]["pids"]
+        if int(pid) in pids:
+            pids.remove(int(pid))
+        if not pids:
+            del hash_units[unit]
+
+    ####### Epochs Management #######
+
+def set_epochs(app_key, epoch_entries: dict):
+    """
+        Registers the table entries of each epoch of a multi-epoch app
+        ({epoch: entries}, in install order, see Installer.install_epochs).
+        The first epoch is the active one.
+    """
+    global apps
+    apps[app_key]["epochs"] = epoch_entries
+    apps[app_key]["active_epoch"] = next(iter(epoch_entries), None)
+    save_apps()
+
+def get_epochs(app_key) -> dict:
+    return apps[app_key].get("epochs") or {}
+
+def get_active_epoch(app_key):
+    return apps[app_key].get("active_epoch")
+
+def switch_epoch(app_key, epoch):
+    """
+        Switches an installed multi-epoch app to another of its epochs by
+        replacing the entries of the active epoch with those of `epoch`
+        (the handlers shared by every epoch stay installed).
+    """
+    global apps
+    epochs = get_epochs(app_key)
+
+    connect_tofino()
+    timer.start()
+    engine_controller.switch_entries(app_key, epochs[get_active_epoch(app_key)], epochs[epoch])
+    timer.finish()
+    timer.calc(f"Time for Switching {app_key} to epoch {epoch}")
+
+    apps[app_key]["active_epoch"] = epoch
+    save_apps()
+
 def remove_program_id(app_key, *, force=False, program_id=None):
     """
         For removing a program:
@@ -352,13 +433,19 @@ def remove_program_id(app_key, *, force=False, program_id=None):
     
     program = None
     pid = None
-    
+
+    # Multi-epoch apps: the entries of their epochs go with the pid
+    if app_key in apps:
+        apps[app_key].pop("epochs", None)
+        apps[app_key].pop("active_epoch", None)
+
     # 1. Update Controllers Stage about apps
     for pid in running_engine[RUNNING_ENGINE]["program_ids"]:
         program = running_engine[RUNNING_ENGINE]["program_ids"][pid]
         if app_key == program:
             del running_engine[RUNNING_ENGINE]["program_ids"][pid]
             running_engine[RUNNING_ENGINE].setdefault("free_pids", []).append(pid)
+            release_hash_units(pid)
             break
     for category in port_sets:
         if app_key in port_sets[category]["programs"]:
@@ -377,6 +464,8 @@ def remove_program_id(app_key, *, force=False, program_id=None):
 
     elif force and program_id:
         logger.debug(f"[!] Forcefully removing app {app_key}")
+        release_hash_units(program_id)
+        save_running_engine()
         connect_tofino()
         engine_controller.remove_program(int(program_id))
 
@@ -388,6 +477,7 @@ def clear_program_ids():
     global running_engine
     running_engine[RUNNING_ENGINE]["program_ids"] = {}
     running_engine[RUNNING_ENGINE]["free_pids"] = []
+    running_engine[RUNNING_ENGINE]["hash_units"] = {}
     save_running_engine()
 
 def clear_apps():
@@ -474,7 +564,12 @@ def install_port_cat(category):
     }
     """
     # port_cfg {'49/-': {'speed': 100, 'loopback': False}}
-    for front_port in port_sets[category]['ports']:
+    # dev_ports are read again once, after the whole category is installed
+    with tofino_controller.runtime.dev_ports.batch():
+        _install_ports(port_sets[category]['ports'])
+
+def _install_ports(ports):
+    for front_port in ports:
             match = re.search(r"(\d+)/", front_port)
             if match:
                 p_num = match.group(1)
@@ -484,7 +579,7 @@ def install_port_cat(category):
                 print("ERROR")
                 
             # print("front_port", front_port)
-            port = port_sets[category]['ports'][front_port]
+            port = ports[front_port]
 
             speed = PORT_SPEED_BF[port['speed']]
             loopback = PORT_LOOPBACK_BF[port['loopback']]
@@ -111,6 +111,7 @@ class EngineController():
         self.p1_table   = P1Table(self.runtime, "") 
         self.p2_table   = P2Table(self.runtime, "")
         self.spec_table = Speculative(self.runtime, "")
+        self.multi_table = MultiInstructionLastStage(self.runtime, "")
 
 
     def _init_configs_(self):
@@ -269,6 +270,23 @@ class EngineController():
         
         print(f"[✓] Program switched to {app_key} with pid {pid}")
 
+    def add_entries(self, entries):
+        """Adds table entries recorded by an EntryRecorder ([table, key_list, data_list, annotation])."""
+        for table_name, key_list, data_list, annotation in entries:
+            self.runtime.__entry_add__(table_name, key_list, data_list, annotation)
+
+    def switch_entries(self, app_key, removed, added):
+        """
+        Switches an installed program between sets of its table entries
+        (e.g. epochs of the same image): `removed` is deleted, then `added`
+        is added; the program id, ports and registers are left untouched.
+        """
+        for table_name, key_list, _, annotation in reversed(removed):
+            self.runtime.__entry_del__(table_name, key_list, annotation)
+        self.add_entries(added)
+
+        print(f"[✓] Program {app_key} switched ({len(removed)} entries removed, {len(added)} added)")
+
     def clear_state(self):
         regs = [
             # Flow 1
@@ -536,7 +536,9 @@ class MultiInstructionLastStage(BaseTable):
     def __init__(self, runtime, location):
         self.runtime = runtime
         self.table_name = f"{location}.multi_instruction_speculative_t"
-    
+
+    def _set_location_(self, location):
+        self.table_name = f"{location}.multi_instruction_speculative_t"
      
     def initialize_pad_ni(self, program_id=1,  ni=INSTRUCTION_FINISH, pkt_id=[DISABLED, DISABLED], cm=[DISABLED, DISABLED], cval=[DISABLED, DISABLED], cm_2 = [DISABLED, DISABLED], cval_2 = [DISABLED, DISABLED], 
                           instr_id=INSTRUCTION_FINISH, mode=DISABLED, value=DISABLED, num_bytes=DISABLED):
@@ -7,11 +7,15 @@ import os
 try:
     import bfrt_grpc.client as gc
 except:
-    python_v = '{}.{}'.format(sys.version_info.major, sys.version_info.minor)
-    sde_install = os.environ['SDE_INSTALL']
-    tofino_libs = '{}/lib/python{}/site-packages/tofino'.format(sde_install, python_v)
-    sys.path.append(tofino_libs)
-    import bfrt_grpc.client as gc
+    try:
+        python_v = '{}.{}'.format(sys.version_info.major, sys.version_info.minor)
+        sde_install = os.environ['SDE_INSTALL']
+        tofino_libs = '{}/lib/python{}/site-packages/tofino'.format(sde_install, python_v)
+        sys.path.append(tofino_libs)
+        import bfrt_grpc.client as gc
+    except (KeyError, ImportError):
+        # No SDE: see lib/tofino/runtime.py
+        gc = None
         
 class HashMechanism(BaseTable):
 
@@ -84,9 +84,7 @@ class PortHDL(BaseTable):
         super().__init__(runtime, "$PORT_HDL_INFO")
            
     def get_dev_port(self, front_port, lane):
-        keys = PortHDLKeys(front_port, lane)
-        resp = self.get_entry(keys, False)
-        return resp["$DEV_PORT"]
+        return self.runtime.dev_ports.lookup(front_port, lane)
         
         
 
@@ -110,4 +108,5 @@ class PortMechanism(BaseTable):
                 "$LOOPBACK_MODE": loopback,
             }
         }
-        self.add_entry(keys, action)
\ No newline at end of file
+        self.add_entry(keys, action)
+        self.runtime.dev_ports.invalidate()
\ No newline at end of file
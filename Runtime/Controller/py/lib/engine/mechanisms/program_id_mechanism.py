@@ -67,6 +67,21 @@ class PortMetadataMechanism(BaseTable):
         }
         self.add_entry(keys, action)
 
+    def set_program_id(self, ig_port=0, hash_constant=0, program_id=1):
+        """Rewrites the program_id of an already installed port entry in place."""
+        keys = PortMetadataKeys(ig_port)
+        action = BaseAction("")
+        action.action_params = {
+            "action_name": "",
+            "params": {
+                "field1": int(hash_constant),
+                "field2": 0,
+                "field3": 0,
+                "program_id": int(program_id),
+            }
+        }
+        self.modify_entry(keys, action)
+
     def clear_data(self):
         self.clear_table()
 
@@ -0,0 +1,133 @@
+"""
+Dev Port Cache
+--------------
+
+Front-panel port (+ lane) -> dev_port mapping of $PORT_HDL_INFO, read in one
+bulk entry_get when the connection is set up instead of one gRPC lookup per
+port reference (FWD/CLONE/port keys while lowering, port installation,
+program switching).
+
+Port changes ($PORT add/delete/clear) invalidate the cache; it is read again,
+in bulk, on the next lookup. Inside `batch()` invalidations are deferred to
+the end of the batch, so installing a set of ports reads the table once.
+A port missing from the bulk read is looked up on its own. If the bulk read
+fails (e.g. the driver cannot read the whole table), ports are looked up one
+by one from then on, each once until the next invalidation.
+
+Lowering does not need the connection: `snapshot()` returns a plain mapping
+and `dev_port_of(mapping, front_port, lane)` is a pure lookup on it.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Dict, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PORT_HDL_TABLE = "$PORT_HDL_INFO"
+
+DevPortMap = Mapping[Tuple[int, int], int]      # (front_port, lane) -> dev_port
+
+
+def dev_port_of(dev_ports: DevPortMap, front_port: int, lane: int = 0) -> int:
+    """Pure lookup of a front-panel port in a snapshot of the cache."""
+    try:
+        return dev_ports[(int(front_port), int(lane))]
+    except KeyError:
+        raise KeyError(f"Front port {front_port}/{lane} is not in {PORT_HDL_TABLE}") from None
+
+
+def _key_value(key_dict, name):
+    field = key_dict[name]
+    return field["value"] if isinstance(field, dict) else field
+
+
+class DevPortCache:
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.ports: Dict[Tuple[int, int], int] = {}
+        self.loaded = False
+        self.bulk = True                # False once the bulk read failed
+        self._batch_depth = 0
+        self._stale = False
+
+        # gRPC reads issued by the cache
+        self.bulk_reads = 0
+        self.point_reads = 0
+        self.hits = 0
+
+    def load(self):
+        """Reads the whole $PORT_HDL_INFO table in one entry_get (per-port lookups if it fails)."""
+        self.loaded = True
+        self._stale = False
+        self.ports = {}
+        if not self.bulk:
+            return
+        ports = {}
+        try:
+            for data, key in self.runtime.__entry_get_all__(PORT_HDL_TABLE, False):
+                if not key:
+                    continue
+                key_dict = key.to_dict()
+                front_port = _key_value(key_dict, "$CONN_ID")
+                lane = _key_value(key_dict, "$CHNL_ID")
+                ports[(int(front_port), int(lane))] = data.to_dict()["$DEV_PORT"]
+        except Exception as e:
+            logger.warning(f"Bulk read of {PORT_HDL_TABLE} failed, looking up ports one by one: {e!r}")
+            self.bulk = False
+            return
+        self.bulk_reads += 1
+        self.ports = ports
+
+    def lookup(self, front_port, lane=0):
+        if not self.loaded:
+            self.load()
+        key = (int(front_port), int(lane))
+        if key in self.ports:
+            self.hits += 1
+            return self.ports[key]
+
+        # Not in the bulk read (e.g. a port created after it): single lookup
+        resp = self.runtime.__entry_get__(
+            PORT_HDL_TABLE,
+            [["$CONN_ID", key[0], "exact"], ["$CHNL_ID", key[1], "exact"]],
+            False,
+        )
+        self.point_reads += 1
+        self.ports[key] = resp["$DEV_PORT"]
+        return self.ports[key]
+
+    def snapshot(self) -> Optional[DevPortMap]:
+        """
+        Copy of the mapping (loaded if needed), for dev_port_of(); None if the
+        bulk read failed, ports are then resolved with lookup().
+        """
+        if not self.loaded:
+            self.load()
+        return dict(self.ports) if self.bulk else None
+
+    def invalidate(self):
+        """Called on port add/delete: the next lookup reads the table again."""
+        if self._batch_depth:
+            self._stale = True
+        else:
+            self.loaded = False
+
+    @contextmanager
+    def batch(self):
+        """Defers invalidations of the port changes made inside to the end of the batch."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._stale:
+                self.loaded = False
+
+    def stats(self):
+        return {
+            "entries": len(self.ports),
+            "bulk_reads": self.bulk_reads,
+            "point_reads": self.point_reads,
+            "hits": self.hits,
+        }
@@ -84,9 +84,7 @@ class PortHDL(BaseTable):
         super().__init__(runtime, "$PORT_HDL_INFO")
            
     def get_dev_port(self, front_port, lane):
-        keys = PortHDLKeys(front_port, lane)
-        resp = self.get_entry(keys, False)
-        return resp["$DEV_PORT"]
+        return self.runtime.dev_ports.lookup(front_port, lane)
         
         
 
@@ -111,11 +109,16 @@ class PortMechanism(BaseTable):
             }
         }
         self.add_entry(keys, action)
+        self.runtime.dev_ports.invalidate()
 
     def clear_ports(self):
-        return self.clear_table()
+        self.clear_table()
+        self.runtime.dev_ports.invalidate()
+
+    def remove_port(self, front_port=0, lane=0):
+        dev_port = self.port_hdl.get_dev_port(front_port, lane)
+        self.delete_entry(PortKeys(dev_port))
+        self.runtime.dev_ports.invalidate()
 
-    def remove_port(self):
-        pass
     def modify_port(self):
         pass
\ No newline at end of file
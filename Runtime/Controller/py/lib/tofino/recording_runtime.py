@@ -0,0 +1,225 @@
+"""
+Recording Runtime
+-----------------
+
+In-memory stand-in for bfrt_runtime, used by dry-run deploys: table
+writes and reads are applied to per-table dicts and recorded in order
+instead of being sent over gRPC, so the whole lowering -> planning ->
+install path runs without a switch (or an SDE).
+
+Entries are keyed by their match fields, as on the device: adding an entry
+that exists, or modifying/deleting one that does not, raises like the
+driver does. Reads return objects with the to_dict() layout of bfrt_grpc
+(keys as {field: {"value": ..., "mask": ...}}, data with "action_name").
+
+$PORT_HDL_INFO is seeded with a synthetic front-panel -> dev_port map
+(dev_port = 4 * (front_port - 1) + lane).
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from lib.tofino.runtime import bfrt_runtime
+from lib.tofino.dev_ports import DevPortCache, PORT_HDL_TABLE
+
+FRONT_PORTS = 64
+LANES = 4
+
+EntryKey = Tuple[Tuple[Any, ...], ...]
+
+
+@dataclass
+class TableOp:
+    op: str                     # add, mod, del, set_default, reset, clear, get, get_all
+    table: str
+    key: Dict[str, Any] = field(default_factory=dict)
+    action: Optional[str] = None
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"op": self.op, "table": self.table}
+        if self.key:
+            out["key"] = self.key
+        if self.action is not None:
+            out["action"] = self.action
+        if self.params:
+            out["params"] = self.params
+        return out
+
+
+class _Dict:
+    def __init__(self, fields):
+        self.fields = fields
+
+    def to_dict(self):
+        return self.fields
+
+
+def _entry_key(key_list) -> EntryKey:
+    return tuple(tuple(_hashable(v) for v in key) for key in key_list)
+
+
+def _hashable(v):
+    return tuple(v) if isinstance(v, list) else v
+
+
+def _key_dict(key_list) -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for key in key_list:
+        name, match = key[0], key[-1]
+        if match == "ternary":
+            out[name] = {"value": key[1], "mask": key[2]}
+        elif match == "range":
+            out[name] = {"low": key[1], "high": key[2]}
+        elif match == "lpm":
+            out[name] = {"value": key[1], "prefix_len": key[2]}
+        else:
+            out[name] = {"value": key[1]}
+    return out
+
+
+def _data(data_list) -> Tuple[Optional[str], Dict[str, Any]]:
+    params = {name: value for name, value in data_list[0]}
+    return (data_list[1] or None), params
+
+
+class _RecordingTable:
+    """bfrt_info.table_get() result for the mechanisms that use bfrt_grpc tables directly."""
+
+    def __init__(self, runtime, table_name):
+        self.runtime = runtime
+        self.table_name = table_name
+
+    def entry_del(self, target, keys=None):
+        self.runtime._record(TableOp("clear" if not keys else "del", self.table_name))
+        if not keys:
+            self.runtime.tables.pop(self.table_name, None)
+
+    def make_data(self, data_field_list_in, action_name=None):
+        return (data_field_list_in, action_name)
+
+    def default_entry_set(self, target, data):
+        self.runtime._record(TableOp("set_default", self.table_name, action=data[1]))
+
+
+class _RecordingBfrtInfo:
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def table_get(self, table_name):
+        return _RecordingTable(self.runtime, table_name)
+
+
+class RecordingRuntime(bfrt_runtime):
+
+    def __init__(self, front_ports: int = FRONT_PORTS, lanes: int = LANES):
+        self.table = None
+        self.register = None
+        self.target = None
+        self.bfrt_info = _RecordingBfrtInfo(self)
+
+        # table name -> {entry key: (key dict, action, params)}
+        self.tables: Dict[str, Dict[EntryKey, Tuple[Dict[str, Any], Optional[str], Dict[str, Any]]]] = {}
+        self.defaults: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        self.ops: List[TableOp] = []
+        self.recording = True
+
+        hdl = self.tables.setdefault(PORT_HDL_TABLE, {})
+        for front_port in range(1, front_ports + 1):
+            for lane in range(lanes):
+                key_list = [["$CONN_ID", front_port, "exact"], ["$CHNL_ID", lane, "exact"]]
+                hdl[_entry_key(key_list)] = (_key_dict(key_list), None, {"$DEV_PORT": 4 * (front_port - 1) + lane})
+
+        self.dev_ports = DevPortCache(self)
+        self.dev_ports.load()
+
+    def _record(self, op: TableOp):
+        if self.recording:
+            self.ops.append(op)
+
+    def clear_ops(self):
+        self.ops = []
+
+    # ------------------------------------------------------------
+    # bfrt_runtime table interface
+    # ------------------------------------------------------------
+
+    def __entry_add__(self, table_name, key_list, data_list, annotation=None):
+        entries = self.tables.setdefault(table_name, {})
+        key = _entry_key(key_list)
+        if key in entries:
+            raise RuntimeError(f"{table_name}: entry already exists {_key_dict(key_list)}")
+        action, params = _data(data_list)
+        entries[key] = (_key_dict(key_list), action, params)
+        self._record(TableOp("add", table_name, _key_dict(key_list), action, params))
+
+    def __entry_mod__(self, table_name, key_list, data_list, annotation=None):
+        entries = self.tables.setdefault(table_name, {})
+        key = _entry_key(key_list)
+        if key not in entries:
+            raise RuntimeError(f"{table_name}: no entry to modify {_key_dict(key_list)}")
+        action, params = _data(data_list)
+        entries[key] = (_key_dict(key_list), action, params)
+        self._record(TableOp("mod", table_name, _key_dict(key_list), action, params))
+
+    def __entry_del__(self, table_name, key_list, annotation=None):
+        entries = self.tables.setdefault(table_name, {})
+        key = _entry_key(key_list)
+        if key not in entries:
+            raise RuntimeError(f"{table_name}: no entry to delete {_key_dict(key_list)}")
+        del entries[key]
+        self._record(TableOp("del", table_name, _key_dict(key_list)))
+
+    def __entry_set_default__(self, table_name, data_list, annotation=None):
+        action, params = _data(data_list)
+        self.defaults[table_name] = (action, params)
+        self._record(TableOp("set_default", table_name, action=action, params=params))
+
+    def __entry_reset__(self, table_name):
+        self.defaults.pop(table_name, None)
+        self._record(TableOp("reset", table_name))
+
+    def __table_clear__(self, table_name):
+        self.tables.pop(table_name, None)
+        self._record(TableOp("clear", table_name))
+
+    def __entry_get__(self, table_name, key_list, from_hw):
+        self._record(TableOp("get", table_name, _key_dict(key_list)))
+        entry = self.tables.get(table_name, {}).get(_entry_key(key_list))
+        if entry is None:
+            raise RuntimeError(f"{table_name}: no entry {_key_dict(key_list)}")
+        _, action, params = entry
+        return {**params, "action_name": action} if action else dict(params)
+
+    def __entry_get_all__(self, table_name, from_hw):
+        self._record(TableOp("get_all", table_name))
+        return [
+            (_Dict({**params, "action_name": action} if action else dict(params)), _Dict(key_dict))
+            for key_dict, action, params in list(self.tables.get(table_name, {}).values())
+        ]
+
+    # ------------------------------------------------------------
+
+    def entry_counts(self) -> Dict[str, int]:
+        """Entries per table (the seeded $PORT_HDL_INFO excluded)."""
+        return {
+            name: len(entries)
+            for name, entries in sorted(self.tables.items())
+            if entries and name != PORT_HDL_TABLE
+        }
+
+
+class EntryRecorder(RecordingRuntime):
+    """
+    Recording runtime that also keeps the arguments of every entry added to
+    it ([table, key_list, data_list, annotation]), so they can be added to
+    and deleted from another runtime later (EngineController.add_entries).
+    """
+
+    def __init__(self, front_ports: int = FRONT_PORTS, lanes: int = LANES):
+        super().__init__(front_ports, lanes)
+        self.entries: List[list] = []
+
+    def __entry_add__(self, table_name, key_list, data_list, annotation=None):
+        super().__entry_add__(table_name, key_list, data_list, annotation)
+        self.entries.append([table_name, key_list, data_list, annotation])
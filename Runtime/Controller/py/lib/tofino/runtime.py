@@ -1,15 +1,22 @@
 # -*- coding:UTF-8 -*-
 import traceback
 import sys
+import os
 
 try:
     import bfrt_grpc.client as gc
 except:
-    python_v = '{}.{}'.format(sys.version_info.major, sys.version_info.minor)
-    sde_install = os.environ['SDE_INSTALL']
-    tofino_libs = '{}/lib/python{}/site-packages/tofino'.format(sde_install, python_v)
-    sys.path.append(tofino_libs)
-    import bfrt_grpc.client as gc
+    try:
+        python_v = '{}.{}'.format(sys.version_info.major, sys.version_info.minor)
+        sde_install = os.environ['SDE_INSTALL']
+        tofino_libs = '{}/lib/python{}/site-packages/tofino'.format(sde_install, python_v)
+        sys.path.append(tofino_libs)
+        import bfrt_grpc.client as gc
+    except (KeyError, ImportError):
+        # No SDE on this machine: only the recording runtime (dry-run deploys) can be used
+        gc = None
+
+from lib.tofino.dev_ports import DevPortCache
 
 class bfrt_runtime():
     '''
@@ -54,6 +61,10 @@ class bfrt_runtime():
 
         self.target = gc.Target(device_id=0, pipe_id=0xffff)
 
+        # front-panel -> dev_port, read in bulk now and again after port changes
+        self.dev_ports = DevPortCache(self)
+        self.dev_ports.load()
+
     def __entry_add__(self, table_name, key_list, data_list, annotation=None):
         '''
         add a table entry
@@ -101,6 +112,45 @@ class bfrt_runtime():
         else:
             self.table.entry_add(self.target, [self.table.make_key(match)], [self.table.make_data(action, data_list[1])])
 
+    def __entry_mod__(self, table_name, key_list, data_list, annotation=None):
+        '''
+        modify the action data of an existing table entry (same arguments as __entry_add__)
+        '''
+        self.table = self.bfrt_info.table_get(table_name)
+
+        if annotation:
+            for ann in annotation:
+                self.table.info.key_field_annotation_add(ann[0], ann[1])
+        match = []
+
+        for key in key_list:
+            if key[-1] == "exact":
+                match.append(gc.KeyTuple(key[0], key[1]))
+            if key[-1] == "ternary":
+                match.append(gc.KeyTuple(key[0], key[1], key[2]))
+            if key[-1] == "range":
+                match.append(gc.KeyTuple(key[0], low=key[1], high=key[2]))
+            if key[-1] == "lpm":
+                match.append(gc.KeyTuple(key[0], key[1], prefix_len=key[2]))
+
+        action = []
+
+        if len(data_list[0]) != 0:
+            for data in data_list[0]:
+                field_name = data[0]
+                value = data[1]
+                if isinstance(value, bool):
+                    action.append(gc.DataTuple(field_name, bool_val=value))
+                elif isinstance(value, str):
+                    action.append(gc.DataTuple(field_name, str_val=value))
+                else:
+                    action.append(gc.DataTuple(field_name, value))
+
+        if data_list[1] == "":
+            self.table.entry_mod(self.target, [self.table.make_key(match)], [self.table.make_data(action)])
+        else:
+            self.table.entry_mod(self.target, [self.table.make_key(match)], [self.table.make_data(action, data_list[1])])
+
     def __entry_del__(self, table_name, key_list, annotation=None):
         '''
         delete a table entry
@@ -189,19 +239,11 @@ class bfrt_runtime():
         # data_dict = next(resp)[0].to_dict()
         # return data_dict
 
-    def get_dev_port(self, front_panel_port, lane):        
-        
-        port_hdl_info_table = self.bfrt_info.table_get("$PORT_HDL_INFO")
-        
-        # convert front-panel port to dev port
-        resp = port_hdl_info_table.entry_get(
-            self.target,
-            [port_hdl_info_table.make_key([gc.KeyTuple('$CONN_ID', front_panel_port),
-                                           gc.KeyTuple('$CHNL_ID', lane)])], {"from_hw": False})
-
-        dev_port = next(resp)[0].to_dict()["$DEV_PORT"]
-
-        return dev_port
+    def get_dev_port(self, front_panel_port, lane):
+        '''
+        convert a front-panel port to its dev port ($PORT_HDL_INFO, cached)
+        '''
+        return self.dev_ports.lookup(front_panel_port, lane)
 
 
     # def reg_read(self, reg_name, index):
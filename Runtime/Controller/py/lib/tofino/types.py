@@ -69,6 +69,19 @@ class BaseTable:
         # Add the entry
         self.runtime.__entry_add__(self.table_name, key_list, [action_params_list, action_name], keys.annotations)
 
+    def modify_entry(self, keys: BaseTableKeys, action:BaseAction):
+        """
+        Modify the action data of an existing entry (no delete/re-add).
+        :param keys: An instance of a subclass of BaseTableKeys.
+        :param action_params: A dictionary returned by an action method.
+        """
+        key_list = keys.to_key_list()
+
+        action_name, params = self.__verify__action__(action)
+        action_params_list = [[name, value] for name, value in params.items()]
+
+        self.runtime.__entry_mod__(self.table_name, key_list, [action_params_list, action_name], keys.annotations)
+
     def delete_entry(self, keys: BaseTableKeys):
         """
         Delete an entry from a table.
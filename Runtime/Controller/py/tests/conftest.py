@@ -0,0 +1,41 @@
+import contextlib
+import copy
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[4]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+from lib.utils.utils import parse_json
+from lib.controller.deployer.hash_units import program_hash_units
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.target import stage_run_graphs
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+PROGRAMS = ROOT_DIR / "Compiler" / "Programs"
+
+
+@pytest.fixture(scope="session")
+def isa():
+    return parse_json(ISA_PATH)
+
+
+def compile_program(path):
+    """Payload of a .srun program, as the compiler exports it."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _build_payload(parse_stagerun_program(path.read_text()), path.stem)
+
+
+def lower(payload, isa):
+    """Micro graphs of a payload, on its own hash units and every endpoint on port 1."""
+    mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=lambda endpoint: 1,
+                                 hash_units=program_hash_units(payload).of(""))
+    return mip.to_micro(stage_run_graphs(copy.deepcopy(payload)))
@@ -0,0 +1,40 @@
+"""
+Static cost estimate (--estimate) of the example programs against the
+Planner's plan.
+"""
+
+import contextlib
+import io
+
+import pytest
+
+from conftest import PROGRAMS, compile_program, lower
+from Core.stagerun_graph import cost_model
+from lib.controller.deployer.planner import Planner
+
+
+def _plan(compiled_app, isa):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Planner(isa=isa).plan(lower(compiled_app, isa), pid=1)
+
+
+@pytest.mark.parametrize("path", ["PortKnocker/portknocker.srun", "Statefulfirewall/stateful_fw.srun",
+                                  "SmartCookie/smartcookie.srun"])
+def test_estimate_is_the_plan(isa, path):
+    compiled_app = compile_program(PROGRAMS / path)
+    plan = _plan(compiled_app, isa)
+    with contextlib.redirect_stdout(io.StringIO()):
+        est = cost_model.estimate_cost(compiled_app, isa).to_dict()
+
+    assert not est["lower_bound"]
+    assert est["recirculations"] == plan.stats.recirculations > 0
+    assert est["write_phases"] == sorted(plan.stats.wp_reserved)
+
+
+def test_static_model_is_a_lower_bound(isa, monkeypatch):
+    compiled_app = compile_program(PROGRAMS / "PortKnocker" / "portknocker.srun")
+    monkeypatch.setattr(cost_model, "_controller", lambda: None)
+    est = cost_model.estimate_cost(compiled_app, isa).to_dict()
+
+    assert est["lower_bound"]
+    assert est["recirculations"] <= _plan(compiled_app, isa).stats.recirculations
@@ -0,0 +1,143 @@
+"""
+Planning of a program with an embedded target (--target) at install time,
+installs next to the hash units of the programs already installed, and
+installs/switches of multi-epoch apps.
+"""
+
+import contextlib
+import io
+
+import pytest
+
+from conftest import ISA_PATH, PROGRAMS, compile_program, lower
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.epochs import build_multi_epoch_payload
+import lib.controller.state_manager as sm
+from lib.engine.engine_controller import EngineController
+from lib.tofino.recording_runtime import RecordingRuntime
+from lib.controller.deployer.deployer import deploy_program, plan_program
+from lib.controller.deployer.dry_run import WRITE_OPS, dry_run_program
+from lib.controller.deployer.hash_units import program_hash_units
+from lib.controller.deployer.planner import Planner
+from lib.controller.deployer.strategies import strategy_for
+from lib.controller.deployer.target import build_target, load_target_plan, plan_to_dict
+
+PROGRAM = PROGRAMS / "PortKnocker" / "portknocker.srun"
+
+
+@pytest.fixture(scope="module")
+def targeted(isa):
+    payload = compile_program(PROGRAM)
+    with contextlib.redirect_stdout(io.StringIO()):
+        payload["target"] = build_target(payload, isa, ISA_PATH.name)
+    return payload
+
+
+def _strategy(compiled_app, isa, **kwargs):
+    kwargs.setdefault("hash_units", program_hash_units(compiled_app).of(""))
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = plan_program(compiled_app, isa, 7, lambda endpoint: 1, debug_logs=False, **kwargs)
+    return plan.stats.strategy
+
+
+def test_embedded_target_when_no_strategy_is_named(isa, targeted):
+    assert strategy_for({"program": {}}) is None
+    assert _strategy(targeted, isa) == "target"
+
+
+@pytest.mark.parametrize("planner", ["greedy", "list", "bnb:50"])
+def test_named_strategy_plans_despite_the_target(isa, targeted, planner):
+    strategy = strategy_for({"program": {"planner": planner}})
+    assert _strategy(targeted, isa, strategy=strategy).startswith(strategy.name)
+
+
+def test_target_lowered_to_other_hash_units_is_not_used(isa, targeted):
+    (name, unit), = targeted["target"]["hash_units"].items()
+    assert _strategy(targeted, isa, hash_units={name: unit}) == "target"
+    assert _strategy(targeted, isa, hash_units={name: 3 - unit}) == "greedy"
+
+
+@pytest.mark.parametrize("stale", [{"format": 2}, {"planner": "0" * 64}])
+def test_target_of_another_format_or_planner_is_not_used(isa, targeted, stale):
+    compiled_app = {**targeted, "target": {**targeted["target"], **stale}}
+    assert _strategy(compiled_app, isa) == "greedy"
+
+
+def test_loaded_target_is_the_plan_of_its_program_id(isa, targeted):
+    with contextlib.redirect_stdout(io.StringIO()):
+        planned = Planner(isa=isa).plan(lower(targeted, isa), pid=7)
+    loaded = load_target_plan(targeted["target"], 7, lambda endpoint: 1)
+    assert plan_to_dict(loaded) == plan_to_dict(planned)
+
+
+def _manifest(compiled_app):
+    """One front port per endpoint of the program."""
+    resources = compiled_app["resources"]
+    endpoints = list(resources["ingress_ports"]) + list(resources["egress_ports"])
+    return {"program": {"Endpoints": {ep: {"port": f"{i + 1}/-"} for i, ep in enumerate(endpoints)}}}
+
+
+@pytest.fixture
+def engine(isa, monkeypatch, tmp_path):
+    """Running engine of the state manager on the recording runtime."""
+    monkeypatch.chdir(tmp_path)     # deploy logs
+    runtime = RecordingRuntime()
+    monkeypatch.setattr(sm, "running_engine", {sm.RUNNING_ENGINE: {"program_ids": {}, "free_pids": []}})
+    monkeypatch.setattr(sm, "save_running_engine", lambda: None)
+    monkeypatch.setattr(sm, "connect_tofino", lambda: None)
+    monkeypatch.setattr(sm, "get_running_engine_key", lambda: "engine")
+    monkeypatch.setattr(sm, "get_engine_ISA", lambda engine_key: isa)
+    monkeypatch.setattr(sm, "engine_controller", EngineController(runtime))
+    return runtime
+
+
+def _deploy(name, pid):
+    compiled_app = compile_program(PROGRAMS / name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return deploy_program(compiled_app, _manifest(compiled_app), compiled_app["program"], "engine", pid,
+                              pretty_print=False)
+
+
+def test_install_is_lowered_to_the_units_left_by_installed_programs(engine):
+    # portknocker's index hash (ipv4_src) on hash_1: mew's 5-tuple cannot share it
+    sm.add_hash_units(1, {1: ["ipv4_src_addr"]})
+    engine.clear_ops()
+
+    assert _deploy("Mew/mew.srun", 2)[0]
+    configured = {op.table for op in engine.ops if "initblock.hash_" in op.table}
+    assert configured == {"SwitchIngress.initblock.hash_2.configure"}
+    assert {op.action for op in engine.ops if "hash_" in (op.action or "")} == {"set_index_hash_2_w_global_var_pkt_size"}
+    assert sm.get_hash_units()[1] == ["ipv4_src_addr"]
+
+    # stateful_fw needs hash_1 and hash_2 for two other field lists
+    engine.clear_ops()
+    installed, message = _deploy("Statefulfirewall/stateful_fw.srun", 3)
+    assert not installed and "taken" in message
+    assert not [op for op in engine.ops if "initblock.hash_" in op.table]
+
+
+def test_multi_epoch_app_installs_shared_handlers_once(isa, engine, monkeypatch):
+    # epoch b only changes allow_flow (same prefilter keys, other action data)
+    path = PROGRAMS / "Statefulfirewall" / "stateful_fw.srun"
+    source = path.read_text()
+    variants = [("a", source), ("b", source.replace(".mset bf[flow], 1", ".mset bf[flow], 2"))]
+    with contextlib.redirect_stdout(io.StringIO()):
+        payload = build_multi_epoch_payload([(e, parse_stagerun_program(s)) for e, s in variants], "stateful_fw")
+    monkeypatch.setattr(sm, "apps", {"stateful_fw": {}})
+    monkeypatch.setattr(sm, "save_apps", lambda: None)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        installed, message = deploy_program(payload, _manifest(payload), "stateful_fw", "engine", 1, pretty_print=False)
+        sm.engine_controller._final_configs_(1)
+        single = dry_run_program(compile_program(path), _manifest(payload), isa)
+    assert installed, message
+    epochs = sm.get_epochs("stateful_fw")
+    assert list(epochs) == ["a", "b"] and sm.get_active_epoch("stateful_fw") == "a"
+    assert sum(engine.entry_counts().values()) == sum(single.entries.values())
+
+    engine.clear_ops()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sm.switch_epoch("stateful_fw", "b")
+    assert [op.op for op in engine.ops if op.op in WRITE_OPS] == ["del"] * len(epochs["a"]) + ["add"] * len(epochs["b"])
+    assert 0 < len(epochs["a"]) < sum(engine.entry_counts().values())
+    assert sm.get_active_epoch("stateful_fw") == "b"
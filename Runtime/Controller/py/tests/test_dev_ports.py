@@ -0,0 +1,51 @@
+"""
+Front-panel -> dev_port cache of the runtime connection.
+"""
+
+from lib.engine.mechanisms.port_mechanism import PortMechanism
+from lib.tofino.recording_runtime import RecordingRuntime
+
+
+def _reads(runtime):
+    return [op.op for op in runtime.ops if op.op in ("get", "get_all")]
+
+
+def test_bulk_read_at_setup_and_again_after_port_changes():
+    runtime = RecordingRuntime()
+    assert runtime.dev_ports.loaded and _reads(runtime) == ["get_all"]
+    runtime.clear_ops()
+
+    dev_port = runtime.get_dev_port(2, 0)
+    assert _reads(runtime) == []
+    PortMechanism(runtime).add_port(front_port=3)
+    assert not runtime.dev_ports.loaded
+    assert runtime.get_dev_port(2, 0) == dev_port
+    assert _reads(runtime) == ["get_all"]
+
+
+def test_port_changes_in_a_batch_read_the_table_once():
+    runtime = RecordingRuntime()
+    runtime.clear_ops()
+    mechanism = PortMechanism(runtime)
+    with runtime.dev_ports.batch():
+        for front_port in (1, 2, 3):
+            mechanism.add_port(front_port=front_port)
+        assert runtime.dev_ports.loaded
+    assert not runtime.dev_ports.loaded
+
+    runtime.dev_ports.snapshot()
+    assert _reads(runtime) == ["get_all"]
+
+
+def test_ports_are_looked_up_one_by_one_if_the_bulk_read_fails():
+    runtime = RecordingRuntime()
+
+    def no_bulk_read(table_name, from_hw):
+        raise RuntimeError("entry_get of the whole table is not supported")
+
+    runtime.__entry_get_all__ = no_bulk_read
+    runtime.clear_ops()
+    runtime.dev_ports.invalidate()
+    assert runtime.dev_ports.snapshot() is None
+    assert [runtime.get_dev_port(port, 0) for port in (1, 2, 1)] == [0, 4, 0]
+    assert _reads(runtime) == ["get", "get"]
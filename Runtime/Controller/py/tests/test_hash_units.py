@@ -0,0 +1,101 @@
+"""
+Hash unit assignment of programs installed together, and the units their
+micro instructions are lowered to.
+"""
+
+import contextlib
+import io
+
+import pytest
+
+from conftest import PROGRAMS, compile_program
+import lib.controller.state_manager as sm
+from lib.controller.deployer.co_planner import CoApp, CoPlanError, CoPlanner
+from lib.controller.deployer.hash_units import HashUnitError, program_hash_units
+
+
+def _hash_units_used(plan):
+    """Engine hash units named by the placed micro instructions."""
+    return {
+        int(part.split("_")[0])
+        for g in plan.graphs for n in g.nodes.values()
+        for part in n.instr.name.split("hash_")[1:]
+    }
+
+
+class _HashUnit:
+    def __init__(self, configured, unit):
+        self.configured, self.unit = configured, unit
+
+    def set_hash_mechanism(self, keys):
+        self.configured[self.unit] = keys
+
+
+class _Engine:
+    """hash_mechanism of an EngineController, recording the field list set on each unit."""
+
+    def __init__(self):
+        self.configured = {}
+        self.hash_mechanism = [_HashUnit(self.configured, unit) for unit in (1, 2, 3)]
+
+
+def test_joint_plan_lowers_to_the_shared_assignment(isa):
+    smartcookie = compile_program(PROGRAMS / "SmartCookie" / "smartcookie.srun")
+    portknocker = compile_program(PROGRAMS / "PortKnocker" / "portknocker.srun")
+    # on its own, each program takes hash_1
+    assert set(program_hash_units(smartcookie).of("").values()) == {1}
+    assert set(program_hash_units(portknocker).of("").values()) == {1}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        co_plan = CoPlanner(isa=isa).plan([
+            CoApp("smartcookie", smartcookie, 1, lambda endpoint: 1),
+            CoApp("portknocker", portknocker, 2, lambda endpoint: 1),
+        ])
+
+    units = co_plan.hash_units
+    assert len(units.units) == 2
+    for key in ("smartcookie", "portknocker"):
+        assert co_plan.resources[key].hash_units == units.of(key)
+        assert _hash_units_used(co_plan.plans[key]) == set(units.of(key).values())
+
+
+def test_joint_plan_rejects_more_hashes_than_units(isa):
+    apps = [
+        CoApp(path.stem, compile_program(path), pid, lambda endpoint: 1)
+        for pid, path in enumerate([
+            PROGRAMS / "PortKnocker" / "portknocker.srun",
+            PROGRAMS / "Statefulfirewall" / "stateful_fw.srun",
+        ], start=1)
+    ]
+    with pytest.raises(CoPlanError, match="hash units"):
+        CoPlanner(isa=isa).plan(apps)
+
+
+def test_installed_units_are_kept_and_matching_ones_reused():
+    smartcookie = program_hash_units(compile_program(PROGRAMS / "SmartCookie" / "smartcookie.srun"))
+    stateful_fw = program_hash_units(compile_program(PROGRAMS / "Statefulfirewall" / "stateful_fw.srun"),
+                                     installed=smartcookie.units)
+    # the 4-tuple flow reuses smartcookie's unit, the inverse flow takes a free one
+    assert stateful_fw.of("") == {"flow": 1, "inverseFlow": 2}
+
+    engine = _Engine()
+    stateful_fw.configure(engine)
+    assert list(engine.configured) == [2]
+
+
+def test_install_is_rejected_when_the_units_are_taken():
+    portknocker = program_hash_units(compile_program(PROGRAMS / "PortKnocker" / "portknocker.srun"))
+    with pytest.raises(HashUnitError, match="taken"):
+        program_hash_units(compile_program(PROGRAMS / "Statefulfirewall" / "stateful_fw.srun"), installed=portknocker.units)
+
+
+def test_units_are_held_until_their_last_program_is_removed(monkeypatch):
+    monkeypatch.setattr(sm, "running_engine", {sm.RUNNING_ENGINE: {"program_ids": {}, "free_pids": []}})
+    monkeypatch.setattr(sm, "save_running_engine", lambda: None)
+
+    sm.add_hash_units(1, {1: ["ipv4_src_addr"]})
+    sm.add_hash_units(2, {1: ["ipv4_src_addr"], 2: ["ipv4_dst_addr"]})
+    sm.release_hash_units(1)
+    assert sm.get_hash_units() == {1: ["ipv4_src_addr"], 2: ["ipv4_dst_addr"]}
+    sm.release_hash_units(2)
+    assert sm.get_hash_units() == {}
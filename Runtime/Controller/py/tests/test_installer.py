@@ -0,0 +1,50 @@
+"""
+Placed micro instructions of the example programs against the engine tables
+the Installer puts them on.
+"""
+
+import contextlib
+import copy
+import inspect
+import io
+
+import pytest
+
+from conftest import PROGRAMS, compile_program, lower
+from lib.controller.deployer.lowering_rules import PLANNER_OPS, engine_table_class, install_call, lowering_registry
+from lib.controller.deployer.strategies import planner_strategy
+from lib.controller.deployer.target import stage_run_graphs
+
+SOURCES = sorted(PROGRAMS.glob("*/*.srun"))
+
+
+def _lower(path, isa):
+    """Micro graphs of an example program; skipped if the engine cannot run it."""
+    try:
+        payload = compile_program(path)
+    except Exception as e:
+        pytest.skip(f"does not compile: {e}")
+    unsupported = sorted({
+        n["op"] for g in stage_run_graphs(payload) for n in g.get("nodes", [])
+        if getattr(lowering_registry.spec.get(n["op"]), "unsupported", None)
+    })
+    if unsupported:
+        pytest.skip(f"uses ops the engine cannot execute: {', '.join(unsupported)}")
+    return lower(payload, isa)
+
+
+@pytest.mark.parametrize("strategy", ["greedy", "list", "dual"])
+@pytest.mark.parametrize("path", SOURCES, ids=lambda p: p.stem)
+def test_placed_nodes_install_on_their_table(isa, path, strategy):
+    micro = _lower(path, isa)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = planner_strategy(strategy).plan(isa, copy.deepcopy(micro), 1)
+
+    for g in plan.graphs:
+        for node in g.nodes.values():
+            table_cls = engine_table_class(node.allocated_table or "")
+            if table_cls is None or node.instr.name in PLANNER_OPS:
+                continue    # recirculation, write-phase and (not installed yet) decide nodes
+            op = node.selected_op or node.instr.name
+            method, kwargs = install_call(table_cls, op, node.instr.name, {**node.instr.kwargs, "ni": node.flow_id})
+            inspect.signature(getattr(table_cls, method)).bind(None, **kwargs)
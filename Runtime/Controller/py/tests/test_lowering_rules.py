@@ -0,0 +1,47 @@
+"""
+Lowering rules against the engine tables and the StageRunEngine ISA.
+"""
+
+import pytest
+
+from lib.controller.deployer.lowering_rules import (
+    MicroInstructionError,
+    check_conformance,
+    engine_table_class,
+    engine_table_ops,
+    install_call,
+)
+
+
+def test_conformance(isa):
+    assert check_conformance(isa=isa, table_ops=engine_table_ops()) == []
+
+
+def test_install_call_adapts_kwargs_to_the_placed_form():
+    p1 = engine_table_class("instructions_p1")
+    spec = engine_table_class("instructions_speculative")
+    kwargs = {"mode": 1, "program_id": 1, "ni": 2, "instr_id": 2}
+
+    # P1 entries do not chain flows: instr_id is left out
+    assert install_call(p1, "set_index_hash_1_w_global_var_pkt_size", "set_index_hash_1_w_global_var_pkt_size", kwargs) == (
+        "set_index_hash_1_w_global_var_pkt_size", {"mode": 1, "program_id": 1, "ni": 2},
+    )
+    # speculative form of a P1 micro instruction
+    assert install_call(spec, "speculative_fetch_hash_1", "fetch_hash_1", {"header_to_var": 1}) == (
+        "speculative_fetch_hash_1", {"header_to_var": 1},
+    )
+    with pytest.raises(MicroInstructionError):
+        install_call(spec, "fetch_hash_1", "fetch_hash_1", {})
+    with pytest.raises(MicroInstructionError):
+        install_call(p1, "fetch_hash_1", "fetch_hash_1", {"port": 1})
+
+
+def test_install_call_maps_isa_names_to_table_methods():
+    p2 = engine_table_class("instructions_p2")
+    last = engine_table_class("multi_instr_speculative")
+
+    assert install_call(p2, "fwd", "fwd_ni", {"port": 4, "instr_id": 3}) == ("fwd_ni", {"port": 4, "instr_id": 3})
+    # the last stage fwd cannot be disabled: a JMP only jumps there
+    assert install_call(last, "fwd", "fwd_ni", {"enabled": 0, "program_id": 1, "instr_id": 3}) == (
+        "exec_instr", {"program_id": 1, "instr_id": 3},
+    )
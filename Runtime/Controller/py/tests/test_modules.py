@@ -0,0 +1,47 @@
+"""
+Precompiled module cache (.srunm) of the compiler.
+"""
+
+import contextlib
+import io
+import json
+import shutil
+
+from conftest import PROGRAMS
+from Compiler.py.modules import ModuleCache, load_module
+
+PROGRAM = PROGRAMS / "SmartCookie" / "smartcookie.srun"
+
+
+def _load(path, cache_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_module(path, ModuleCache(cache_dir))
+
+
+def test_module_is_stored_as_json_and_reused(tmp_path):
+    path = tmp_path / "mod.srun"
+    shutil.copy(PROGRAM, path)
+    module, cached = _load(path, tmp_path / "cache")
+    assert not cached
+
+    (cache_file,) = (tmp_path / "cache").glob("*.srunm")
+    assert json.loads(cache_file.read_text())["key"] == module.key
+    assert _load(path, tmp_path / "cache") == (module, True)
+
+
+def test_bad_or_foreign_files_are_misses(tmp_path):
+    path = tmp_path / "mod.srun"
+    shutil.copy(PROGRAM, path)
+    module, _ = _load(path, tmp_path / "cache")
+    (cache_file,) = (tmp_path / "cache").glob("*.srunm")
+    data = json.loads(cache_file.read_text())
+
+    cache_file.write_text("{not json")
+    assert _load(path, tmp_path / "cache") == (module, False)
+
+    cache_file.write_text(json.dumps({**data, "compiler": "0" * 64}))
+    assert not _load(path, tmp_path / "cache")[1]
+
+    data["program"]["__node__"] = "os.system"
+    cache_file.write_text(json.dumps(data))
+    assert not _load(path, tmp_path / "cache")[1]
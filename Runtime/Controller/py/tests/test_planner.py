@@ -0,0 +1,28 @@
+"""
+Write-phase stages the Planner picks for the write→read hazards of a plan.
+"""
+
+from lib.controller.deployer.planner import FINAL_WP_STAGE, Planner
+from lib.controller.deployer.types import MicroEffect
+
+
+def _placed(*nodes):
+    """(pass, stage, effect) in (stage, node id) order, from (stage, reads, writes)."""
+    return [(1, stage, MicroEffect(reads=set(reads), writes=set(writes))) for stage, reads, writes in sorted(nodes)]
+
+
+def test_hazards_share_one_write_phase(isa):
+    placed = _placed((3, "", "x"), (4, "", "y"), (6, "x", ""), (7, "y", ""))
+    assert Planner(isa)._write_phase_stages(placed) == [5]
+
+
+def test_hazard_reaching_the_last_stage_uses_the_final_write_phase(isa):
+    placed = _placed((3, "", "x"), (FINAL_WP_STAGE, "x", ""))
+    assert Planner(isa)._write_phase_stages(placed) == [FINAL_WP_STAGE]
+
+
+def test_coalescing_never_recirculates_more_than_one_write_phase(isa):
+    # two disjoint windows, every stage taken: two write phases would
+    # recirculate two nodes, one after the last write only one
+    placed = _placed((3, "", "x"), (4, "", ""), (5, "x", ""), (7, "", "y"), (8, "", ""), (9, "y", ""))
+    assert Planner(isa)._write_phase_stages(placed) == [8]
@@ -0,0 +1,91 @@
+"""
+Budgets, ties and the process pool of the planner strategies.
+"""
+
+import contextlib
+import copy
+import io
+import os
+import time
+
+import pytest
+
+from conftest import PROGRAMS, compile_program, lower
+from lib.controller.deployer import strategies
+from lib.controller.deployer.planner import Planner
+from lib.controller.deployer.strategies import (
+    GreedyStrategy,
+    ListSchedulingStrategy,
+    PlannerStrategy,
+    PortfolioStrategy,
+    _PlacementSearch,
+    planner_strategy,
+)
+
+PROGRAM = PROGRAMS / "SmartCookie" / "smartcookie.srun"
+
+
+@pytest.fixture(scope="module")
+def micro(isa):
+    return lower(compile_program(PROGRAM), isa)
+
+
+class _Slow(PlannerStrategy):
+    """Candidate running past the portfolio's budget."""
+    name = "slow"
+
+    def plan(self, isa, micro_graphs, pid):
+        time.sleep(1)
+        return GreedyStrategy().plan(isa, micro_graphs, pid)
+
+
+class _Crash(PlannerStrategy):
+    """Candidate killing its pool worker."""
+    name = "crash"
+
+    def plan(self, isa, micro_graphs, pid):
+        os._exit(1)
+
+
+class _ListAsDual(ListSchedulingStrategy):
+    name = "dual"
+
+
+def _plan(strategy, isa, micro):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return strategy.plan(isa, copy.deepcopy(micro), 1)
+
+
+def test_search_stops_after_its_expansions(isa, micro):
+    search = _PlacementSearch(Planner(isa), copy.deepcopy(micro))
+    _, _, _, done = search.search(10, None, expansions=100)
+    assert not done and search.expansions == 100
+
+
+def test_bnb_with_expansions_plans_the_same_every_run(isa, micro):
+    strategy = planner_strategy({"strategy": "bnb", "expansions": 500})
+    plans = [_plan(strategy, isa, micro) for _ in range(2)]
+    placements = [
+        sorted((g.graph_id, n.id, n.allocated_stage, n.allocated_flow) for g in p.graphs for n in g.nodes.values())
+        for p in plans
+    ]
+    assert placements[0] == placements[1]
+
+
+def test_portfolio_ties_go_by_strategy(isa, micro):
+    # the list plan under the dual name, first: the same score, but list goes before dual
+    result = _plan(PortfolioStrategy(candidates=[_ListAsDual(), "list"], workers=1), isa, micro)
+    rows = result.stats.portfolio
+    assert rows[0]["score"] == next(r["score"] for r in rows if r["strategy"] == "dual")
+    assert rows[0]["strategy"] == "list"
+
+
+def test_portfolio_waits_for_every_candidate(isa, micro):
+    result = _plan(PortfolioStrategy(budget_ms=100, candidates=["list", _Slow()], workers=2), isa, micro)
+    assert {r["strategy"]: r.get("error") for r in result.stats.portfolio}["slow"] is None
+
+
+def test_portfolio_recycles_a_broken_pool(isa, micro):
+    result = _plan(PortfolioStrategy(candidates=["list", _Crash()], workers=2), isa, micro)
+    assert "BrokenProcessPool" in {r["strategy"]: r.get("error") for r in result.stats.portfolio}["crash"]
+    assert 2 not in strategies._POOLS
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Binary IR Benchmark
+-------------------
+Builds a program with many handlers, writes it as JSON and as binary IR, and
+compares file size, full load time (json.load, and the checksum-verified
+loads: importer for JSON, decoding every handler for binary IR) and the time
+to open the artifact and touch a single handler.
+
+Usage: python3 bench_binary_ir.py [--handlers 2000] [--instrs 40] [--runs 5]
+"""
+
+from __future__ import annotations
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload, _write_payload
+from Core.stagerun_graph.binary_ir import BinaryIR, write_binary_ir
+from Core.stagerun_graph.importer import load_stage_run_graphs
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 16) -> str:
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 4
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .sum {v(0)}, {v(3)}, {v(5)}")
+            elif kind == 2:
+                lines.append(f"    .mget r[h], {v(1)}")
+            else:
+                lines.append(f"    .mset r[h], {v(2)}")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def best_of(runs: int, fn):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def load_json(path: Path):
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def touch_one(path: Path):
+    with BinaryIR(path) as ir:
+        return ir["handlers"][len(ir["handlers"]) // 2]["id"]
+
+
+def load_all(path: Path):
+    with BinaryIR(path) as ir:
+        return ir.to_payload()
+
+
+def run(handlers: int, instrs: int, runs: int) -> None:
+    payload = _build_payload(parse_stagerun_program(build_source(handlers, instrs)), "bench")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, bin_path = Path(tmp) / "app.json", Path(tmp) / "app.out"
+        checksum = _write_payload(payload, json_path)
+        assert write_binary_ir(payload, bin_path) == checksum
+
+        t_json, ref = best_of(runs, lambda: load_json(json_path))
+        t_verified, _ = best_of(runs, lambda: load_stage_run_graphs(json_path))
+        t_all, full = best_of(runs, lambda: load_all(bin_path))
+        t_one, _ = best_of(runs, lambda: touch_one(bin_path))
+        assert full == ref, "binary IR does not round-trip"
+
+        j_size, b_size = json_path.stat().st_size, bin_path.stat().st_size
+        print(f"handlers={handlers} instrs/handler={instrs} runs={runs} (best of)")
+        print(f"  size      json {j_size / 1024:9.1f} KiB   bin {b_size / 1024:9.1f} KiB  ({j_size / b_size:.2f}x smaller)")
+        print(f"  json.load      {t_json * 1e3:9.1f} ms    (checksum not verified)")
+        print(f"  load all  json {t_verified * 1e3:9.1f} ms    bin {t_all * 1e3:9.1f} ms  (checksum verified)")
+        print(f"  open + 1 handler          bin {t_one * 1e3:9.3f} ms  ({t_json / max(t_one, 1e-9):.0f}x vs json.load)")
+        print(f"checksum: {checksum} (same for both formats)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun binary IR benchmark")
+    ap.add_argument("--handlers", type=int, default=2000)
+    ap.add_argument("--instrs", type=int, default=40)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    run(args.handlers, args.instrs, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Branch-and-Bound Benchmark
+--------------------------
+Runs the bnb planner search (deployer/strategies.py) on the synthetic
+workload of Tools/Paper/compare_bnb_vs_pipeline.py (calc_idx -> read_bf ->
+cmp -> write_bf -> wp on the shared register bf), scaled to several
+programs/handlers and repeats of the chain, lowered to engine ops:
+
+    calc_idx  ALU        set_index_hash_1_w_const_val (speculative form as alternative)
+    read_bf   REG_READ   reg_old_value
+    cmp       ALU        arith_between_vars_v1_v2 (sum as alternative)
+    write_bf  REG_WRITE  reg_new_value
+    wp        WRITE_PHASE  (inserted by the Planner's write-phase pass)
+
+Compares the search without lower bound nor transposition table (previous
+behaviour: cut only when the recirculations so far reach the best plan)
+with the current one, from the greedy plan as incumbent and under the same
+budget. Reports time, expanded decisions, best recirculations and whether
+the search finished (proved the plan optimal) within the budget; both
+must agree on the optimum whenever both finish.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_bnb.py [--graphs 1 2 3] [--repeats 2 3 4] [--budget-ms 2000]
+"""
+
+from __future__ import annotations
+import io
+import sys
+import copy
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+PAPER_DIR = ROOT_DIR / "Tools" / "Paper"
+for p in (ROOT_DIR, CONTROLLER_DIR, PAPER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from compare_bnb_vs_pipeline import demo_build_micrograph_for_bnb
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.types import MicroEdge, MicroNode, MicroInstruction, MicroEffect, MicroGraph
+from lib.controller.deployer.planner import Planner
+from lib.controller.deployer.strategies import _PlacementSearch
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+
+ENGINE_OPS = {
+    "calc_idx": ("set_index_hash_1_w_const_val", "speculative_set_index_hash_1_w_const_val"),
+    "read_bf": ("reg_old_value", None),
+    "cmp": ("arith_between_vars_v1_v2", "sum"),
+    "write_bf": ("reg_new_value", None),
+}
+
+
+class PlainSearch(_PlacementSearch):
+    """Previous search: no lower bound, no transposition table."""
+
+    def _bound(self, gi, cur, ready):
+        return 0
+
+    def _memo(self, state, recircs):
+        return True
+
+
+def register(resource: str) -> str:
+    # "reg:bf[five_t]" -> "bf"
+    return resource.split(":", 1)[-1].split("[", 1)[0]
+
+
+def build_graphs(graphs: int, repeats: int):
+    """`graphs` handlers, each with `repeats` copies of the paper chain."""
+    demo = demo_build_micrograph_for_bnb()
+    chain = [nid for nid in demo.topo() if nid in ENGINE_OPS]
+    result = []
+    for g in range(graphs):
+        mg = MicroGraph(graph_id=f"h{g}")
+        prev = None
+        for r in range(repeats):
+            for nid in chain:
+                node = demo.nodes[nid]
+                name, alternative = ENGINE_OPS[nid]
+                mid = len(mg.nodes)
+                mg.add_node(MicroNode(
+                    id=mid,
+                    instr=MicroInstruction(name=name, kwargs={}, alternative=alternative),
+                    effect=MicroEffect(reads={register(x) for x in node.reads},
+                                       writes={register(x) for x in node.writes}),
+                    graph_id=mg.graph_id,
+                ))
+                if prev is not None:
+                    mg.add_edge(MicroEdge(src=prev, dst=mid, dep="DATA"))
+                prev = mid
+        result.append(mg)
+    return result
+
+
+def run(search_cls, isa, graphs, incumbent: int, budget_ms: float):
+    search = search_cls(Planner(isa=isa), graphs)
+    t0 = time.perf_counter()
+    _, _, best, done = search.search(incumbent, t0 + budget_ms / 1e3)
+    return time.perf_counter() - t0, search.expansions, best, done
+
+
+def main():
+    ap = argparse.ArgumentParser(description="bnb planner search: plain vs bounded + transposition table")
+    ap.add_argument("--graphs", type=int, nargs="+", default=[1, 2, 3], help="Handlers per program")
+    ap.add_argument("--repeats", type=int, nargs="+", default=[2, 3, 4], help="Copies of the chain per handler")
+    ap.add_argument("--budget-ms", type=float, default=2000.0)
+    args = ap.parse_args()
+
+    isa = parse_json(ISA_PATH)
+    print(f"{'graphs':>6} {'repeats':>7} {'nodes':>6} {'greedy':>6} {'plain_ms':>9} {'plain_exp':>10} {'plain':>6}"
+          f" {'bnb_ms':>9} {'bnb_exp':>10} {'bnb':>6}  same")
+    all_same = True
+    for graphs in args.graphs:
+        for repeats in args.repeats:
+            micro = build_graphs(graphs, repeats)
+            with contextlib.redirect_stdout(io.StringIO()):
+                greedy = Planner(isa=isa).plan(copy.deepcopy(micro), pid=1).stats.recirculations
+            rows = {}
+            for name, cls in (("plain", PlainSearch), ("bnb", _PlacementSearch)):
+                rows[name] = run(cls, isa, micro, greedy, args.budget_ms)
+
+            (t_p, x_p, b_p, d_p), (t_b, x_b, b_b, d_b) = rows["plain"], rows["bnb"]
+            same = b_p == b_b if d_p and d_b else None
+            # a finished bounded search is optimal: never worse than the plain one
+            all_same &= same is not False and (not d_b or b_b <= b_p)
+            mark = lambda best, done: f"{best}{'' if done else '*'}"
+            print(f"{graphs:6} {repeats:7} {sum(len(g.nodes) for g in micro):6} {greedy:6}"
+                  f" {t_p * 1e3:9.1f} {x_p:10} {mark(b_p, d_p):>6}"
+                  f" {t_b * 1e3:9.1f} {x_b:10} {mark(b_b, d_b):>6}  {'-' if same is None else same}")
+    print("* budget exhausted before the search finished")
+    sys.exit(0 if all_same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Dev Port Lookup Benchmark
+-------------------------
+Counts the gRPC calls of a full install of the sample apps, with one
+$PORT_HDL_INFO lookup per port reference (previous path) vs. the dev_port
+cache of the runtime (lib/tofino/dev_ports.py: one bulk read at connection
+setup, read again in bulk after the ports of a category are installed, pure
+lookups while lowering).
+
+Each app is installed on a fresh connection, as on the first run of an app:
+- connection setup;
+- port installation (add_port for every endpoint of the app);
+- lowering (MicroInstructionParser, one port lookup per FWD/CLONE/port key);
+- run_program (dev_port of every ingress port -> $PORT_METADATA).
+
+The gRPC layer is a counting stub (entry_get/add/mod/del on a fake
+$PORT_HDL_INFO); both paths must resolve the same dev_ports.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_dev_ports.py [program.srun ...]
+"""
+
+from __future__ import annotations
+import sys
+import argparse
+from collections import Counter
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+
+from lib.tofino.runtime import bfrt_runtime
+from lib.tofino.dev_ports import DevPortCache, dev_port_of
+from lib.engine.mechanisms.port_mechanism import PortMechanism
+from lib.engine.mechanisms.program_id_mechanism import PortMetadataMechanism
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.hash_units import program_hash_units
+from lib.controller.deployer.target import stage_run_graphs
+
+PROGRAMS_DIR = ROOT_DIR / "Compiler" / "Programs"
+FRONT_PORTS = 64
+LANES = 4
+
+
+class _Field:
+    def __init__(self, fields):
+        self.fields = fields
+
+    def to_dict(self):
+        return self.fields
+
+
+class CountingRuntime(bfrt_runtime):
+    """bfrt_runtime on a fake device: every table read/write is one gRPC call."""
+
+    def __init__(self, cached: bool):
+        self.calls = Counter()
+        self.port_hdl = {(fp, lane): 4 * (fp - 1) + lane for fp in range(1, FRONT_PORTS + 1) for lane in range(LANES)}
+        self.dev_ports = DevPortCache(self) if cached else UncachedDevPorts(self)
+        if cached:
+            self.dev_ports.load()
+
+    def __entry_add__(self, table_name, key_list, data_list, annotation=None):
+        self.calls["entry_add"] += 1
+
+    def __entry_mod__(self, table_name, key_list, data_list, annotation=None):
+        self.calls["entry_mod"] += 1
+
+    def __entry_del__(self, table_name, key_list, annotation=None):
+        self.calls["entry_del"] += 1
+
+    def __table_clear__(self, table_name):
+        self.calls["entry_get"] += 1
+
+    def __entry_get__(self, table_name, key_list, from_hw):
+        self.calls["entry_get"] += 1
+        keys = {k[0]: k[1] for k in key_list}
+        return {"$DEV_PORT": self.port_hdl[(keys["$CONN_ID"], keys["$CHNL_ID"])]}
+
+    def __entry_get_all__(self, table_name, from_hw):
+        self.calls["entry_get"] += 1
+        return [
+            (_Field({"$DEV_PORT": dev_port}), _Field({"$CONN_ID": {"value": fp}, "$CHNL_ID": {"value": lane}}))
+            for (fp, lane), dev_port in self.port_hdl.items()
+        ]
+
+
+class UncachedDevPorts(DevPortCache):
+    """Previous behaviour: one $PORT_HDL_INFO entry_get per lookup."""
+
+    def load(self):
+        pass
+
+    def lookup(self, front_port, lane=0):
+        self.point_reads += 1
+        return self.runtime.__entry_get__(
+            "$PORT_HDL_INFO", [["$CONN_ID", front_port, "exact"], ["$CHNL_ID", lane, "exact"]], False
+        )["$DEV_PORT"]
+
+    def snapshot(self):
+        raise NotImplementedError
+
+
+def install(payload, isa, cached: bool):
+    """gRPC calls and resolved dev_ports of a first install of `payload`."""
+    rt = CountingRuntime(cached)
+    resources = payload["resources"]
+    endpoints = list(resources["ingress_ports"]) + list(resources["egress_ports"])
+    front_of = {ep: 1 + i for i, ep in enumerate(endpoints)}
+    for queue in resources.get("queues", {}):
+        front_of.setdefault(queue, 1 + len(front_of))
+
+    # install_port_cat
+    port_mechanism = PortMechanism(rt)
+    with rt.dev_ports.batch():
+        for ep in endpoints:
+            port_mechanism.add_port(front_port=front_of[ep])
+
+    # lowering
+    if cached:
+        dev_ports = rt.dev_ports.snapshot()
+        resolve = lambda ep: dev_port_of(dev_ports, front_of[ep], 0)
+    else:
+        resolve = lambda ep: rt.get_dev_port(front_of[ep], 0)
+    micro = MicroInstructionParser(isa=isa, manifest={}, port_resolver=resolve,
+                                   hash_units=program_hash_units(payload).of("")).to_micro(stage_run_graphs(payload))
+    ports = sorted({v for g in micro for n in g.nodes.values()
+                    for k, v in n.instr.kwargs.items() if "port" in k and isinstance(v, int)})
+
+    # run_program
+    port_metadata = PortMetadataMechanism(rt)
+    for ep in resources["ingress_ports"]:
+        port_metadata.add_data(ig_port=rt.get_dev_port(front_of[ep], 0), program_id=1)
+
+    return rt.calls, ports
+
+
+def main():
+    ap = argparse.ArgumentParser(description="gRPC calls of a full install, with and without the dev_port cache")
+    ap.add_argument("programs", nargs="*", help="StageRun sources (default: Compiler/Programs/*/*.srun)")
+    args = ap.parse_args()
+    paths = [Path(p) for p in args.programs] or sorted(PROGRAMS_DIR.glob("*/*.srun"))
+
+    from lib.utils.utils import parse_json
+    isa = parse_json(ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json")
+
+    print(f"{'app':24} {'entry_get before':>16} {'after':>6}   {'gRPC calls before':>17} {'after':>6}")
+    total_before = total_after = 0
+    for path in paths:
+        try:
+            payload = _build_payload(parse_stagerun_program(path.read_text()), path.stem)
+            before, ports_before = install(payload, isa, cached=False)
+            after, ports_after = install(payload, isa, cached=True)
+        except Exception as e:
+            print(f"{path.stem:24} skipped: {str(e).splitlines()[0]}")
+            continue
+        assert ports_before == ports_after, f"{path.stem}: dev_ports differ"
+        n_before, n_after = sum(before.values()), sum(after.values())
+        total_before += n_before
+        total_after += n_after
+        print(f"{path.stem:24} {before['entry_get']:16} {after['entry_get']:6}   {n_before:17} {n_after:6}")
+    print(f"{'total':24} {'':16} {'':6}   {total_before:17} {total_after:6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Dry-run Deploy
+--------------
+Runs the deploy path of StageRun programs (lowering -> planning -> install ->
+final configs) on the recording runtime (lib/controller/deployer/dry_run.py),
+without a switch or a running controller, and prints per program:
+- table operations (by kind) and reads;
+- entries per table (-v);
+- recirculations and write-phase stages;
+- time per phase.
+
+Programs are StageRun sources (.srun, compiled here) or compiled JSON. Without
+--manifest, every endpoint (ports and queues) gets its own front port.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_dry_run.py [program.srun|program.json ...] [--manifest m.yaml] [--planner bnb:500] [-v] [--json out.json]
+"""
+
+from __future__ import annotations
+import sys
+import json
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+from Core.stagerun_graph.importer import load_stage_run_graphs
+
+from lib.utils.utils import parse_json
+from lib.utils.manifest_parser import parse_manifest
+from lib.controller.deployer.dry_run import dry_run_program
+
+PROGRAMS_DIR = ROOT_DIR / "Compiler" / "Programs"
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+
+
+def load_program(path: Path):
+    if path.suffix == ".json":
+        return load_stage_run_graphs(path)
+    return _build_payload(parse_stagerun_program(path.read_text()), path.stem)
+
+
+def synthetic_manifest(compiled_app):
+    resources = compiled_app.get("resources", {})
+    endpoints = list(resources.get("ingress_ports", [])) + list(resources.get("egress_ports", []))
+    endpoints += [q for q in resources.get("queues", {}) if q not in endpoints]
+    ports = {f"{i + 1}/-": {"speed": 100, "loopback": False} for i in range(len(endpoints))}
+    return {
+        "switch": {"ports": ports},
+        "program": {"Endpoints": {ep: {"port": f"{i + 1}/-"} for i, ep in enumerate(endpoints)}},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dry-run deploys on the recording runtime")
+    ap.add_argument("programs", nargs="*", help="StageRun sources or compiled JSON (default: Compiler/Programs/*/*.srun)")
+    ap.add_argument("--manifest", default=None, help="App manifest (default: one front port per endpoint)")
+    ap.add_argument("--pid", type=int, default=1)
+    ap.add_argument("--planner", default=None, help="Planner strategy: greedy, list, dual, bnb[:<budget_ms>] or portfolio[:<budget_ms>] (default: the manifest's)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Print the full report of every program")
+    ap.add_argument("--json", dest="json_out", default=None, help="Write the reports to this file")
+    args = ap.parse_args()
+    paths = [Path(p) for p in args.programs] or sorted(PROGRAMS_DIR.glob("*/*.srun"))
+
+    isa = parse_json(ISA_PATH)
+    manifest = parse_manifest(args.manifest) if args.manifest else None
+
+    print(f"{'app':24} {'ops':>5} {'reads':>6} {'entries':>8} {'recirc':>7} {'wp stages':>10}"
+          f" {'lower':>8} {'plan':>8} {'install':>8} {'final':>8}   (ms)")
+    reports = {}
+    for path in paths:
+        try:
+            compiled_app = load_program(path)
+        except Exception as e:
+            print(f"{path.stem:24} skipped: {str(e).splitlines()[0]}")
+            continue
+
+        report = dry_run_program(compiled_app, manifest or synthetic_manifest(compiled_app), isa, args.pid, planner=args.planner)
+        reports[path.stem] = report.to_dict()
+
+        t = report.timings_ms
+        wp = sorted({s for w in report.write_phases for s in w["stages"]})
+        print(f"{path.stem:24} {len(report.ops):5} {report.reads:6} {sum(report.entries.values()):8}"
+              f" {len(report.recirculations):7} {','.join(map(str, wp)):>10}"
+              f" {t.get('lower', t.get('bind_target', 0)):8.2f} {t.get('plan', 0):8.2f}"
+              f" {t.get('install', 0):8.2f} {t.get('finalize', 0):8.2f}")
+        if report.error:
+            print(f"{'':24} ✗ {report.error.splitlines()[0][:160]}")
+        if args.verbose:
+            print(report.format())
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"reports written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Edge Expansion Benchmark
+------------------------
+Lowers and plans generated handlers whose instructions expand into several
+micro-ops (header fetch + op, register index + access), with every node
+depending on the `window` previous ones (as exports without transitive
+reduction), and compares the StageRun -> micro edge expansion:
+- cross product: every micro-op of the source to every micro-op of the
+  destination (previous lowering);
+- linear: micro-ops of a node chained, exit of the source to the entry of
+  the destination (MicroInstructionParser._lower_edges).
+Reports micro edge counts, lowering and planning time, and checks that both
+expansions give the same topological order and placement.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_edge_expansion.py [--handlers 20] [--instrs 60] [--window 8] [--runs 3]
+"""
+
+from __future__ import annotations
+import io
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.types import MicroEdge
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.planner import Planner
+from lib.controller.deployer.target import stage_run_graphs
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+HASH_UNITS = {"h": 1}    # build_source declares a single hash
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 6) -> str:
+    """Few variables, so most instructions depend on the previous ones."""
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 4
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .mget r[h], {v(1)}")
+            elif kind == 2:
+                lines.append(f"    .mset r[h], {v(0)}")
+            else:
+                lines.append(f"    .sum {v(0)}, {v(1)}, {v(2)}")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def add_window_edges(graphs, window: int):
+    """Node i also depends on nodes i-1..i-window of its handler."""
+    for g in graphs:
+        ids = [n["id"] for n in g["nodes"]]
+        edges = {(e["src"], e["dst"]) for e in g["edges"]}
+        for i, dst in enumerate(ids):
+            for src in ids[max(0, i - window):i]:
+                if (src, dst) not in edges:
+                    g["edges"].append({"src": src, "dst": dst, "dep": "DATA"})
+    return graphs
+
+
+class CrossProductParser(MicroInstructionParser):
+    """Previous edge expansion: cross product of both expansions."""
+
+    def _lower_edges(self, edges, expand_map):
+        out = []
+        for e in edges:
+            for src_id in expand_map.get(e["src"], []):
+                for dst_id in expand_map.get(e["dst"], []):
+                    out.append(MicroEdge(src=src_id, dst=dst_id, dep=e.get("dep", "DATA")))
+        return out
+
+
+def lower_and_plan(parser_cls, graphs, isa):
+    mip = parser_cls(isa=isa, manifest={}, port_resolver=lambda endpoint: 1, hash_units=HASH_UNITS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        micro = mip.to_micro(graphs)
+        t1 = time.perf_counter()
+        n_edges = sum(len(g.edges) for g in micro)
+        planner = Planner(isa=isa)
+        orders = [[n.id for n in planner._topo_sort(g)] for g in micro]
+        t2 = time.perf_counter()
+        result = planner.plan(micro, pid=1)
+        t3 = time.perf_counter()
+    placement = [
+        sorted((n.id, n.allocated_stage, n.allocated_table, n.flow_id) for n in g.nodes.values())
+        for g in result.graphs
+    ]
+    return (t1 - t0, t3 - t2), n_edges, orders, placement
+
+
+def run(handlers: int, instrs: int, window: int, runs: int) -> int:
+    isa = parse_json(ISA_PATH)
+    graphs = stage_run_graphs(_build_payload(parse_stagerun_program(build_source(handlers, instrs)), "bench"))
+    graphs = add_window_edges(graphs, window)
+    srun_edges = sum(len(g["edges"]) for g in graphs)
+
+    rows = {}
+    for name, cls in (("cross", CrossProductParser), ("linear", MicroInstructionParser)):
+        best_lower = best_plan = float("inf")
+        for _ in range(runs):
+            (lower_t, plan_t), n_edges, orders, placement = lower_and_plan(cls, graphs, isa)
+            best_lower, best_plan = min(best_lower, lower_t), min(best_plan, plan_t)
+        rows[name] = (n_edges, best_lower, best_plan, orders, placement)
+
+    print(f"handlers={handlers} instrs/handler={instrs} window={window} srun_edges={srun_edges} runs={runs} (best of)")
+    print(f"{'expansion':<10}{'micro_edges':>13}{'lower_ms':>11}{'plan_ms':>11}")
+    for name, (n_edges, lower_t, plan_t, _, _) in rows.items():
+        print(f"{name:<10}{n_edges:>13}{lower_t * 1e3:>11.2f}{plan_t * 1e3:>11.2f}")
+
+    cross, linear = rows["cross"], rows["linear"]
+    print(f"edges: {cross[0] / max(linear[0], 1):.2f}x fewer, planning speedup: {cross[2] / max(linear[2], 1e-9):.2f}x")
+    same_order, same_plan = cross[3] == linear[3], cross[4] == linear[4]
+    print(f"same topological order: {same_order}, same placement: {same_plan}")
+    return 0 if same_order and same_plan else 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun -> micro edge expansion benchmark")
+    ap.add_argument("--handlers", type=int, default=20)
+    ap.add_argument("--instrs", type=int, default=60)
+    ap.add_argument("--window", type=int, default=8)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    sys.exit(run(args.handlers, args.instrs, args.window, args.runs))
+
+
+if __name__ == "__main__":
+    main()
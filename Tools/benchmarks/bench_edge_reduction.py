@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Edge Reduction Benchmark
+------------------------
+Builds a synthetic handler whose IF nodes read a sliding window of variables
+written by the previous IFs (so most DATA edges are implied by the chain),
+then compares edge counts and the controller lowering/planning time with
+and without the transitive reduction.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_edge_reduction.py [--nodes 300] [--window 8] [--runs 3]
+"""
+
+from __future__ import annotations
+import sys
+import time
+import argparse
+import contextlib
+import io
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Core.ast_nodes import IfNode, ConditionBlock, BooleanExpression, CopyHeaderToVarInstr, TypedRef
+from Core.stagerun_graph.graph_builder import StageRunGraphBuilder
+from Core.stagerun_graph.transitive_reduction import transitive_reduction
+from Core.stagerun_graph.exporter import _serialize_graph
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.planner import Planner
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+
+
+def build_window_chain(n: int, window: int) -> list:
+    """IF_i: cond over w_{i-1}..w_{i-window}, body writes w_i."""
+    instrs = []
+    for i in range(n):
+        cond = None
+        for j in range(max(0, i - window), i):
+            cmp = BooleanExpression(left=TypedRef(f"w{j}", "var_ref"), op="EQ", right=j)
+            cond = cmp if cond is None else BooleanExpression(left=cond, op="&&", right=cmp)
+        if cond is None:
+            cond = BooleanExpression(left=TypedRef("seed", "var_ref"), op="EQ", right=0)
+        body = [CopyHeaderToVarInstr(header="IPV4.TTL", var=f"w{i}")]
+        instrs.append(IfNode(branches=[ConditionBlock(condition=cond, body=body)]))
+    return instrs
+
+
+def lower_and_plan(graph_dict: dict, isa: dict) -> tuple[float, float, int]:
+    mip = MicroInstructionParser(isa=isa, manifest={})
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        micro_graphs = mip.to_micro([graph_dict])
+        t1 = time.perf_counter()
+        Planner(isa=isa).plan(micro_graphs, pid=1)
+        t2 = time.perf_counter()
+    micro_edges = sum(len(mg.edges) for mg in micro_graphs)
+    return t1 - t0, t2 - t1, micro_edges
+
+
+def run(n: int, window: int, runs: int) -> None:
+    isa = parse_json(ISA_PATH)
+    instrs = build_window_chain(n, window)
+
+    rows = []
+    for reduced in (False, True):
+        best_lower = best_plan = float("inf")
+        for _ in range(runs):
+            g = StageRunGraphBuilder(graph_id="bench").build([], None, instrs)
+            stats = transitive_reduction(g) if reduced else None
+            edges = len(g.edges)
+            lower_t, plan_t, micro_edges = lower_and_plan(_serialize_graph(g), isa)
+            best_lower = min(best_lower, lower_t)
+            best_plan = min(best_plan, plan_t)
+        rows.append((reduced, edges, micro_edges, best_lower, best_plan, stats))
+
+    print(f"nodes={n} window={window} runs={runs} (best of)")
+    print(f"{'mode':<10}{'srun_edges':>12}{'micro_edges':>13}{'lower_ms':>11}{'plan_ms':>11}")
+    for reduced, edges, micro_edges, lower_t, plan_t, _ in rows:
+        mode = "reduced" if reduced else "full"
+        print(f"{mode:<10}{edges:>12}{micro_edges:>13}{lower_t*1e3:>11.2f}{plan_t*1e3:>11.2f}")
+    stats = rows[1][5]
+    if stats:
+        print(f"reduction: {stats.to_dict()}")
+    full, red = rows
+    if red[4] > 0:
+        print(f"planning speedup: {full[4] / red[4]:.2f}x, lowering speedup: {full[3] / max(red[3], 1e-9):.2f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun edge reduction benchmark")
+    ap.add_argument("--nodes", type=int, default=300)
+    ap.add_argument("--window", type=int, default=8)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    run(args.nodes, args.window, args.runs)
+
+
+if __name__ == "__main__":
+    main()
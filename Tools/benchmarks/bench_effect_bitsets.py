@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Effect Bitset Benchmark
+-----------------------
+Builds a synthetic handler (HTOVAR / SUM / IF mix over a pool of variables)
+and times:
+  - graph building (effect extraction + interning + edge linking)
+  - an all-pairs hazard check (RAW/WAR/WAW/resource) using the string sets
+    vs. the interned int bitsets of StageRunEffect.
+
+Usage: python3 bench_effect_bitsets.py [--instrs 3000] [--vars 64] [--runs 3]
+"""
+
+from __future__ import annotations
+import sys
+import time
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from Core.ast_nodes import (
+    IfNode, ConditionBlock, BooleanExpression, TypedRef,
+    CopyHeaderToVarInstr, SumInstr, HeaderAssignInstr, FwdInstr,
+)
+from Core.stagerun_graph.graph_builder import StageRunGraphBuilder
+
+
+def build_instrs(n: int, nvars: int) -> list:
+    instrs = []
+    for i in range(n):
+        v = lambda k: f"v{(i + k) % nvars}"
+        kind = i % 4
+        if kind == 0:
+            instrs.append(CopyHeaderToVarInstr(header="IPV4.TTL", var=v(0)))
+        elif kind == 1:
+            instrs.append(SumInstr(lvar=v(1), rvar=v(7), resvar=v(3)))
+        elif kind == 2:
+            cond = BooleanExpression(left=TypedRef(v(0), "var_ref"), op="EQ", right=1)
+            body = [HeaderAssignInstr(header="IPV4.SRC", value=1), SumInstr(lvar=v(2), rvar=v(5), resvar=v(9))]
+            instrs.append(IfNode(branches=[ConditionBlock(condition=cond, body=body)]))
+        else:
+            instrs.append(FwdInstr(port=i % 8))
+    return instrs
+
+
+def hazards_strings(effects: list) -> int:
+    count = 0
+    for i, a in enumerate(effects):
+        for b in effects[i + 1:]:
+            if (a.writes & (b.reads | b.writes)) or (a.reads & b.writes) or (a.uses & b.uses):
+                count += 1
+    return count
+
+
+def conflicts_with(earlier, later) -> bool:
+    """RAW / WAR / WAW / shared-resource hazard between two bound StageRunEffects (same table)."""
+    return bool(
+        (earlier.write_mask & (later.read_mask | later.write_mask))
+        | (earlier.read_mask & later.write_mask)
+        | (earlier.use_mask & later.use_mask)
+    )
+
+
+def hazards_bitsets(effects: list) -> int:
+    # Same test as conflicts_with, inlined to time the AND itself
+    masks = [(e.read_mask, e.write_mask, e.use_mask) for e in effects]
+    count = 0
+    for i, (ar, aw, au) in enumerate(masks):
+        for br, bw, bu in masks[i + 1:]:
+            if (aw & (br | bw)) | (ar & bw) | (au & bu):
+                count += 1
+    return count
+
+
+def best_of(runs: int, fn):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run(n: int, nvars: int, runs: int) -> None:
+    instrs = build_instrs(n, nvars)
+    build_t, g = best_of(runs, lambda: StageRunGraphBuilder(graph_id="bench").build([], None, instrs))
+    effects = [g.nodes[nid].effect for nid in sorted(g.nodes)]
+
+    pairs = min(len(effects), 1500)
+    sub = effects[:pairs]
+    str_t, str_hits = best_of(runs, lambda: hazards_strings(sub))
+    bit_t, bit_hits = best_of(runs, lambda: hazards_bitsets(sub))
+    assert str_hits == bit_hits, (str_hits, bit_hits)
+    assert bit_hits == sum(conflicts_with(a, b) for i, a in enumerate(sub) for b in sub[i + 1:])
+
+    print(f"instrs={n} vars={nvars} symbols={len(g.symbols)} edges={len(g.edges)} runs={runs} (best of)")
+    print(f"build: {build_t*1e3:.2f} ms")
+    print(f"all-pairs hazards over {pairs} nodes ({str_hits} conflicting pairs):")
+    print(f"  string sets: {str_t*1e3:9.2f} ms")
+    print(f"  bitsets:     {bit_t*1e3:9.2f} ms  ({str_t / max(bit_t, 1e-9):.2f}x)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun effect bitset benchmark")
+    ap.add_argument("--instrs", type=int, default=3000)
+    ap.add_argument("--vars", type=int, default=64)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    run(args.instrs, args.vars, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Exporter Benchmark
+------------------
+Compares, on a generated program with many handlers:
+- instruction serialization with dataclasses.asdict vs. the cached per-class
+  field extractors of the exporter;
+- writing the payload with two json.dumps (flat checksum, then output) vs.
+  the single-pass streaming writer with Merkle checksum (time and
+  tracemalloc peak).
+Both paths must write the same payload.
+
+Usage: python3 bench_export.py [--handlers 1000] [--instrs 60] [--runs 3]
+"""
+
+from __future__ import annotations
+import sys
+import json
+import time
+import hashlib
+import argparse
+import dataclasses
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload, _write_payload, _serialize_instr, _instructions_dict
+from Core.stagerun_graph.merkle import merkle_tree
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 16) -> str:
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 5
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .sum {v(0)}, {v(3)}, {v(5)}")
+            elif kind == 2:
+                lines.append(f"    .mget r[h], {v(1)}")
+            elif kind == 3:
+                lines.append(f"    .mset r[h], {v(2)}")
+            else:
+                lines.append(f"    .br.cond {v(4)} == 1, L_OUT")
+        lines.append("  L_OUT:")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def asdict_instr(instr):
+    """Previous exporter path (dataclasses.asdict)."""
+    try:
+        op = _instructions_dict[type(instr).__name__].value
+        args = dataclasses.asdict(instr)
+    except Exception:
+        op, args = None, None
+    return {"op": op, "args": args or {}}
+
+
+def write_two_dumps(payload, path: Path) -> str:
+    """Previous writer: dumps for the checksum, dumps again for the output."""
+    checksum = hashlib.sha256(json.dumps(payload, indent=2).encode("utf-8")).hexdigest()
+    path.write_bytes(json.dumps({"checksum": checksum, **payload}, indent=2).encode("utf-8"))
+    return checksum
+
+
+def best_of(runs: int, fn):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def measure(runs: int, fn):
+    """Best time of `runs` untraced runs + peak memory of one traced run."""
+    best, result = best_of(runs, fn)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run(handlers: int, instrs: int, runs: int) -> None:
+    program = parse_stagerun_program(build_source(handlers, instrs))
+    all_instrs = [i for h in program.handlers for b in h.body.blocks for i in b.instructions]
+    payload = _build_payload(program, "bench")
+
+    t_old, ref = best_of(runs, lambda: [asdict_instr(i) for i in all_instrs])
+    t_new, out = best_of(runs, lambda: [_serialize_instr(i) for i in all_instrs])
+    assert json.dumps(out) == json.dumps(ref), "instruction serialization differs"
+
+    print(f"handlers={handlers} instrs/handler={instrs} runs={runs} (best of)")
+    print(f"  serialize {len(all_instrs)} instrs   asdict {t_old * 1e3:8.1f} ms   extractors {t_new * 1e3:8.1f} ms "
+          f"({t_old / max(t_new, 1e-9):.2f}x)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = Path(tmp) / "old.json", Path(tmp) / "new.json"
+        t_old, peak_old, sum_old = measure(runs, lambda: write_two_dumps(payload, old_path))
+        t_new, peak_new, sum_new = measure(runs, lambda: _write_payload(payload, new_path))
+        old_out, new_out = json.loads(old_path.read_bytes()), json.loads(new_path.read_bytes())
+        assert old_out.pop("checksum") == sum_old and new_out.pop("checksum") == sum_new
+        assert new_out.pop("merkle") == merkle_tree(payload).to_dict() and old_out == new_out, "written output differs"
+
+        size = new_path.stat().st_size
+        print(f"  write {size / 1024:.0f} KiB       two dumps {t_old * 1e3:8.1f} ms   streaming  {t_new * 1e3:8.1f} ms "
+              f"({t_old / max(t_new, 1e-9):.2f}x)")
+        print(f"  peak memory (write)    two dumps {peak_old / 1024:8.0f} KiB  streaming  {peak_new / 1024:8.0f} KiB")
+        print(f"checksum: {sum_new} (Merkle root; same payload for both writers)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun exporter benchmark")
+    ap.add_argument("--handlers", type=int, default=1000)
+    ap.add_argument("--instrs", type=int, default=60)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    run(args.handlers, args.instrs, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+ISA Index Benchmark
+-------------------
+Plans generated handlers of growing size with the planner's slot lookup as
+a walk of isa["pipeline"] (stages -> flows -> tables -> op lists, previous
+_find_slot) and with the inverted index (deployer/isa_index.py: op -> slot
+bitmap, lowest free bit from the current stage).
+
+Reports planning time per size and per node, the time of the slot lookups
+alone (every candidate list of the run, from every stage), and checks that
+both give the same placement.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_isa_index.py [--sizes 250 1000 4000] [--handlers 4] [--runs 3]
+"""
+
+from __future__ import annotations
+import io
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.planner import Planner
+from lib.controller.deployer.target import stage_run_graphs
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+HASH_UNITS = {"h": 1}    # build_source declares a single hash
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 6) -> str:
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 5
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .mget r[h], {v(1)}")
+            elif kind == 2:
+                lines.append(f"    .mset r[h], {v(0)}")
+            elif kind == 3:
+                lines.append(f"    .sum {v(0)}, {v(1)}, {v(2)}")
+            else:
+                lines.append(f"    .fwd pOut")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+class ScanPlanner(Planner):
+    """Previous slot lookup: walk of the ISA pipeline for every node."""
+
+    def _find_slot(self, candidate_ops, current_stage):
+        for stage_name, flows in self.isa["pipeline"].items():
+            s_idx = int(stage_name.lstrip("s"))
+            if s_idx < current_stage:
+                continue
+            for flow_name, flow_data in flows.items():
+                for table_name, instr_list in flow_data.items():
+                    if isinstance(instr_list, list) and any(cand in instr_list for cand in candidate_ops):
+                        return s_idx, flow_name, table_name
+        return None
+
+
+class RecordingPlanner(Planner):
+    """Index planner that keeps the lookups it issues, to time them alone."""
+
+    queries = []
+
+    def _find_slot(self, candidate_ops, current_stage):
+        RecordingPlanner.queries.append((list(candidate_ops), current_stage))
+        return super()._find_slot(candidate_ops, current_stage)
+
+
+def lower(isa, handlers: int, instrs: int):
+    graphs = stage_run_graphs(_build_payload(parse_stagerun_program(build_source(handlers, instrs)), "bench"))
+    mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=lambda endpoint: 1, hash_units=HASH_UNITS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return lambda: mip.to_micro(graphs)
+
+
+def plan(planner_cls, isa, make_graphs):
+    micro = make_graphs()
+    nodes = sum(len(g.nodes) for g in micro)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = planner_cls(isa=isa).plan(micro, pid=1)
+        elapsed = time.perf_counter() - t0
+    placement = [
+        sorted((n.id, n.allocated_stage, n.allocated_flow, n.allocated_table, n.flow_id) for n in g.nodes.values())
+        for g in result.graphs
+    ]
+    return elapsed, nodes, placement
+
+
+def time_lookups(planner, queries, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for ops, stage in queries:
+            planner._find_slot(ops, stage)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Planner slot lookup: ISA walk vs inverted index")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[250, 1000, 4000], help="Instructions per handler")
+    ap.add_argument("--handlers", type=int, default=4)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    isa = parse_json(ISA_PATH)
+    print(f"{'instrs':>7} {'nodes':>7} {'scan_ms':>9} {'index_ms':>9} {'scan_us/n':>10} {'index_us/n':>11}"
+          f" {'lookups':>8} {'scan_lk_ms':>11} {'index_lk_ms':>12}  same")
+    all_same = True
+    for size in args.sizes:
+        make_graphs = lower(isa, args.handlers, size)
+        times = {}
+        placements = {}
+        for name, cls in (("scan", ScanPlanner), ("index", Planner)):
+            best = float("inf")
+            for _ in range(args.runs):
+                elapsed, nodes, placement = plan(cls, isa, make_graphs)
+                best = min(best, elapsed)
+            times[name], placements[name] = best, placement
+
+        RecordingPlanner.queries = []
+        plan(RecordingPlanner, isa, make_graphs)
+        queries = RecordingPlanner.queries
+        scan_lk = time_lookups(ScanPlanner(isa=isa), queries)
+        index_lk = time_lookups(Planner(isa=isa), queries)
+
+        same = placements["scan"] == placements["index"]
+        all_same &= same
+        print(f"{size:7} {nodes:7} {times['scan'] * 1e3:9.1f} {times['index'] * 1e3:9.1f}"
+              f" {times['scan'] / nodes * 1e6:10.2f} {times['index'] / nodes * 1e6:11.2f}"
+              f" {len(queries):8} {scan_lk * 1e3:11.2f} {index_lk * 1e3:12.2f}  {same}")
+    sys.exit(0 if all_same else 1)
+
+
+if __name__ == "__main__":
+    main()
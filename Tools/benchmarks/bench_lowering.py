@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Lowering Benchmark
+------------------
+Checks the lowering rules of the controller (deployer/lowering_rules.py)
+and times the StageRun -> micro lowering of a generated program:
+- conformance: every StageRun op has a rule, and sample instances of every
+  rule lower into micro instructions the engine tables can install and the
+  ISA pipeline can place (exit status 1 on any problem);
+- optionally, lowers every given compiled program (JSON or binary IR);
+- lowering time and throughput on a program with many handlers, with the
+  rules compiled once (registry) vs. interpreted from the spec on every
+  instruction.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_lowering.py [--handlers 500] [--instrs 40] [--runs 3] [compiled ...]
+"""
+
+from __future__ import annotations
+import sys
+import time
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+from Core.stagerun_graph.importer import load_stage_run_graphs
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.hash_units import program_hash_units
+from lib.controller.deployer.lowering_rules import LoweringRegistry, check_conformance, engine_table_ops, _compile_rule
+from lib.controller.deployer.target import stage_run_graphs
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 16) -> str:
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 6
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .sum {v(0)}, {v(3)}, {v(5)}")
+            elif kind == 2:
+                lines.append(f"    .mget r[h], {v(1)}")
+            elif kind == 3:
+                lines.append(f"    .mset r[h], {v(2)}")
+            elif kind == 4:
+                lines.append(f"    .sub {v(1)}, {v(2)}, {v(4)}")
+            else:
+                lines.append(f"    .br.cond {v(4)} == 1, L_OUT")
+        lines.append("  L_OUT:")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+class InterpretedRegistry(LoweringRegistry):
+    """Same rules, compiled from the spec on every instruction."""
+
+    def lower(self, op, args, compiler_effect, env):
+        return _compile_rule(op, self.spec[op])(args or {}, compiler_effect, env)
+
+
+def best_of(runs: int, fn):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def lower(payload, isa, rules=None):
+    return MicroInstructionParser(isa=isa, manifest={}, port_resolver=lambda endpoint: 1, rules=rules,
+                                  hash_units=program_hash_units(payload).of("")).to_micro(stage_run_graphs(payload))
+
+
+def run(handlers: int, instrs: int, runs: int, compiled: list[str]) -> int:
+    isa = parse_json(ISA_PATH)
+
+    problems = check_conformance(isa=isa, table_ops=engine_table_ops())
+    print(f"conformance: {len(problems)} problem(s)")
+    for p in problems:
+        print(f"  ✗ {p}")
+
+    failed = 0
+    for path in compiled:
+        try:
+            micro = lower(load_stage_run_graphs(path), isa)
+            print(f"  ✓ {path}: {sum(len(g.nodes) for g in micro)} micro nodes")
+        except Exception as e:
+            failed += 1
+            print(f"  ✗ {path}: {e}")
+
+    payload = _build_payload(parse_stagerun_program(build_source(handlers, instrs)), "bench")
+    n_nodes = sum(len(g["nodes"]) for g in stage_run_graphs(payload))
+    t_int, _ = best_of(runs, lambda: lower(payload, isa, InterpretedRegistry()))
+    t_reg, micro = best_of(runs, lambda: lower(payload, isa))
+    n_micro = sum(len(g.nodes) for g in micro)
+
+    print(f"handlers={handlers} instrs/handler={instrs} runs={runs} (best of)")
+    print(f"  lower {n_nodes} nodes -> {n_micro} micro nodes   interpreted {t_int * 1e3:8.1f} ms   "
+          f"registry {t_reg * 1e3:8.1f} ms ({t_int / max(t_reg, 1e-9):.2f}x, {n_nodes / max(t_reg, 1e-9):,.0f} nodes/s)")
+    return 1 if problems or failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun lowering conformance and benchmark")
+    ap.add_argument("compiled", nargs="*", help="compiled programs to lower (JSON or binary IR)")
+    ap.add_argument("--handlers", type=int, default=500)
+    ap.add_argument("--instrs", type=int, default=40)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    sys.exit(run(args.handlers, args.instrs, args.runs, args.compiled))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Micro Graph Benchmark
+---------------------
+Plans generated handlers from ~1k to 20k+ micro-nodes and compares the
+planner on the edge list alone (previous behaviour: every predecessor /
+successor query and every recirculation scans all edges, Kahn's ordering
+with `not in` list checks) with the adjacency-indexed MicroGraph
+(deployer/types.py: out/in edges per node and DATA in-degrees kept up to
+date on insertion).
+
+Reports planning time and time per micro-node for each size: the indexed
+graph should stay flat per node, the edge list grows with the graph.
+Also checks that both give the same placement.
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_micro_graph.py [--nodes 1000 5000 10000 20000] [--handlers 4] [--runs 1]
+"""
+
+from __future__ import annotations
+import io
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.types import MicroEdge, MicroNode, MicroInstruction, MicroEffect
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.planner import Planner
+from lib.controller.deployer.target import stage_run_graphs
+
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+HASH_UNITS = {"h": 1}    # build_source declares a single hash
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 6) -> str:
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 4
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .mget r[h], {v(1)}")
+            elif kind == 2:
+                lines.append(f"    .mset r[h], {v(0)}")
+            else:
+                lines.append(f"    .sum {v(0)}, {v(1)}, {v(2)}")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+class EdgeListPlanner(Planner):
+    """Previous graph queries: scans of g.edges (the index is not used)."""
+
+    def _topo_sort(self, g):
+        indeg = {nid: 0 for nid in g.nodes}
+        adj = {nid: [] for nid in g.nodes}
+        for e in g.edges:
+            if e.dep == "DATA" and e.src in g.nodes and e.dst in g.nodes:
+                adj[e.src].append(e.dst)
+                indeg[e.dst] += 1
+
+        Q = [nid for nid, d in indeg.items() if d == 0]
+        ordered_ids = []
+        while Q:
+            nid = Q.pop(0)
+            ordered_ids.append(nid)
+            parent = g.nodes[nid].parent_node_id
+            for nxt in adj[nid]:
+                indeg[nxt] -= 1
+                if indeg[nxt] == 0:
+                    if parent is not None and g.nodes[nxt].parent_node_id == parent:
+                        Q.insert(0, nxt)
+                    else:
+                        Q.append(nxt)
+        for nid in g.nodes:
+            if nid not in ordered_ids:
+                ordered_ids.append(nid)
+        return [g.nodes[nid] for nid in ordered_ids]
+
+    def _insert_recirc_before(self, g, node, pid, prev_flow_id):
+        rec_id = self._new_internal_id(g.graph_id)
+        new_flow_id = self._new_flow_id()
+        rec_node = MicroNode(
+            id=rec_id,
+            instr=MicroInstruction(name="pos_filter_recirc_same_pipe",
+                                   kwargs={"program_id": pid, "next_flow_id": new_flow_id}),
+            graph_id=g.graph_id,
+            allocated_table="recirculation_t",
+            flow_id=prev_flow_id,
+            effect=MicroEffect(),
+        )
+        g.nodes[rec_id] = rec_node
+        for e in g.edges:
+            if e.dst == node.id:
+                e.dst = rec_id
+        g.edges.append(MicroEdge(src=rec_id, dst=node.id, dep="DATA"))
+        return new_flow_id
+
+    def _propagate_flow_id_forward(self, g, start_node, new_flow_id):
+        visited = set()
+        stack = [start_node.id]
+        while stack:
+            nid = stack.pop()
+            if nid in visited:
+                continue
+            visited.add(nid)
+            g.nodes[nid].flow_id = new_flow_id
+            for e in g.edges:
+                if e.src == nid and e.dep == "DATA":
+                    stack.append(e.dst)
+
+
+def run_once(planner_cls, isa, graphs):
+    mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=lambda endpoint: 1, hash_units=HASH_UNITS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        micro = mip.to_micro(graphs)
+        nodes = sum(len(g.nodes) for g in micro)
+        t0 = time.perf_counter()
+        result = planner_cls(isa=isa).plan(micro, pid=1)
+        elapsed = time.perf_counter() - t0
+    placement = [
+        sorted((n.id, n.allocated_stage, n.allocated_flow, n.allocated_table, n.flow_id) for n in g.nodes.values())
+        for g in result.graphs
+    ]
+    return elapsed, nodes, placement
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Planner on edge lists vs adjacency-indexed MicroGraph")
+    ap.add_argument("--nodes", type=int, nargs="+", default=[1000, 5000, 10000, 20000], help="Approximate micro-nodes")
+    ap.add_argument("--handlers", type=int, default=4)
+    ap.add_argument("--runs", type=int, default=1)
+    args = ap.parse_args()
+
+    isa = parse_json(ISA_PATH)
+    print(f"{'micro_nodes':>12} {'edge_list_ms':>13} {'indexed_ms':>11} {'list_us/node':>13} {'indexed_us/node':>16} {'speedup':>8}  same")
+    all_same = True
+    for target in args.nodes:
+        # ~1.8 micro-nodes per instruction (micro-ops + recirculations) over all handlers
+        instrs = max(1, round(target / (1.8 * args.handlers)))
+        graphs = stage_run_graphs(_build_payload(parse_stagerun_program(build_source(args.handlers, instrs)), "bench"))
+
+        rows = {}
+        for name, cls in (("list", EdgeListPlanner), ("indexed", Planner)):
+            best = float("inf")
+            for _ in range(args.runs):
+                elapsed, nodes, placement = run_once(cls, isa, graphs)
+                best = min(best, elapsed)
+            rows[name] = (best, nodes, placement)
+
+        (t_list, nodes, p_list), (t_idx, _, p_idx) = rows["list"], rows["indexed"]
+        same = p_list == p_idx
+        all_same &= same
+        print(f"{nodes:12} {t_list * 1e3:13.1f} {t_idx * 1e3:11.1f} {t_list / nodes * 1e6:13.2f}"
+              f" {t_idx / nodes * 1e6:16.2f} {t_list / t_idx:7.1f}x  {same}")
+    sys.exit(0 if all_same else 1)
+
+
+if __name__ == "__main__":
+    main()
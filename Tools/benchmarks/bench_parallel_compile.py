@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Parallel Compilation Benchmark
+------------------------------
+Generates a program with many independent handlers (header/var copies, sums,
+memory ops and a conditional branch over shared declarations), then times
+semantic validation + graph building/serialization with 1..N worker
+processes and checks that every run produces the same bytes and checksum.
+
+Usage: python3 bench_parallel_compile.py [--handlers 400] [--instrs 60] [--max-jobs 8] [--runs 3]
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from Compiler.py.parser import parse_stagerun_program
+from Compiler.py.semantic import semantic_check
+from Core.stagerun_graph.exporter import _build_payload, _compute_checksum_bytes
+
+
+def build_source(handlers: int, instrs: int, nvars: int = 16) -> str:
+    lines = ["pin pIn", "pout pOut", "hash h {IPV4.SRC, IPV4.DST}", "reg r"]
+    lines += [f"var v{i}" for i in range(nvars)]
+    for h in range(handlers):
+        lines += [f"handler h{h}", "  key PKT.PORT == pIn", "  default FWD pOut", "  begin:"]
+        for i in range(instrs):
+            v = lambda k: f"$v{(h + i + k) % nvars}"
+            kind = i % 5
+            if kind == 0:
+                lines.append(f"    .hcopy IPV4.TTL, {v(0)}")
+            elif kind == 1:
+                lines.append(f"    .sum {v(0)}, {v(3)}, {v(5)}")
+            elif kind == 2:
+                lines.append(f"    .mget r[h], {v(1)}")
+            elif kind == 3:
+                lines.append(f"    .mset r[h], {v(2)}")
+            else:
+                lines.append(f"    .copy {v(4)}, IPV4.ID")
+        lines.append(f"    .br.cond {v(5)} == 1, L_OUT")
+        lines.append("  L_OUT:")
+        lines.append("    .fwd pOut")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def compile_once(source: str, jobs: int) -> bytes:
+    program = parse_stagerun_program(source)
+    semantic_check(program, "bench", jobs=jobs)
+    payload = _build_payload(program, "bench", jobs=jobs)
+    return json.dumps(payload, indent=2, sort_keys=False).encode("utf-8")
+
+
+def best_of(runs: int, fn):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run(handlers: int, instrs: int, max_jobs: int, runs: int) -> None:
+    source = build_source(handlers, instrs)
+
+    # parsing is sequential and the same for every run: time it apart
+    parse_t, _ = best_of(runs, lambda: parse_stagerun_program(source))
+
+    jobs_list = [1]
+    while jobs_list[-1] * 2 <= max_jobs:
+        jobs_list.append(jobs_list[-1] * 2)
+    if jobs_list[-1] != max_jobs:
+        jobs_list.append(max_jobs)
+
+    print(f"handlers={handlers} instrs/handler={instrs} cpus={os.cpu_count()} runs={runs} (best of)")
+    print(f"parse: {parse_t*1e3:.1f} ms")
+
+    reference = None
+    base_t = None
+    for jobs in jobs_list:
+        t, out = best_of(runs, lambda: compile_once(source, jobs))
+        t -= parse_t
+        if reference is None:
+            reference, base_t = out, t
+        assert out == reference, f"output differs with --jobs {jobs}"
+        print(f"  jobs={jobs:<3} {t*1e3:9.1f} ms  ({base_t / max(t, 1e-9):.2f}x)")
+    print(f"checksum: {_compute_checksum_bytes(reference)} ({len(reference)} bytes, identical for all runs)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="StageRun parallel compilation benchmark")
+    ap.add_argument("--handlers", type=int, default=400)
+    ap.add_argument("--instrs", type=int, default=60)
+    ap.add_argument("--max-jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    run(args.handlers, args.instrs, args.max_jobs, args.runs)
+
+
+if __name__ == "__main__":
+    main()
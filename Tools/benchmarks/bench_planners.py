@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Planner Strategies Benchmark
+----------------------------
+Plans every StageRun program (default: Compiler/Programs/*/*.srun) with the
+greedy planner and with other planner strategies (deployer/strategies.py)
+and reports, per program and in total, the recirculations and pipeline
+stages of every plan, the change against greedy and the planning time.
+
+Strategies fall back to the greedy plan when they do worse, so none may
+report more recirculations than greedy (exit status 1 if one does).
+
+Requires the controller environment (bfrt_grpc importable).
+
+Usage: python3 bench_planners.py [program.srun ...] [--strategies list bnb:200]
+"""
+
+from __future__ import annotations
+import io
+import sys
+import copy
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+CONTROLLER_DIR = ROOT_DIR / "Runtime" / "Controller" / "py"
+for p in (ROOT_DIR, CONTROLLER_DIR):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from Compiler.py.parser import parse_stagerun_program
+from Core.stagerun_graph.exporter import _build_payload
+
+from lib.utils.utils import parse_json
+from lib.controller.deployer.micro_instruction import MicroInstructionParser
+from lib.controller.deployer.hash_units import program_hash_units
+from lib.controller.deployer.strategies import planner_strategy
+from lib.controller.deployer.target import stage_run_graphs
+
+PROGRAMS_DIR = ROOT_DIR / "Compiler" / "Programs"
+ISA_PATH = ROOT_DIR / "Runtime" / "Engine" / "StageRunEngine_v2.01_ISA.json"
+
+
+def lower(isa, path: Path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        payload = _build_payload(parse_stagerun_program(path.read_text()), path.stem)
+        mip = MicroInstructionParser(isa=isa, manifest={}, port_resolver=lambda endpoint: 1,
+                                     hash_units=program_hash_units(payload).of(""))
+        return mip.to_micro(stage_run_graphs(payload))
+
+
+def plan(isa, spec, micro):
+    strategy = planner_strategy(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = strategy.plan(isa, copy.deepcopy(micro), 1)
+        elapsed = time.perf_counter() - t0
+    return result.stats, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recirculations and stages per planner strategy")
+    ap.add_argument("programs", nargs="*", help="StageRun sources (default: Compiler/Programs/*/*.srun)")
+    ap.add_argument("--strategies", nargs="+", default=["list"], help="Strategies compared with greedy")
+    args = ap.parse_args()
+    paths = [Path(p) for p in args.programs] or sorted(PROGRAMS_DIR.glob("*/*.srun"))
+
+    isa = parse_json(ISA_PATH)
+    specs = ["greedy"] + [s for s in args.strategies if s != "greedy"]
+    header = f"{'program':24} {'nodes':>5}"
+    for spec in specs:
+        header += f" {spec + ' rc/st':>16} {'ms':>7}"
+    print(header)
+
+    totals = {spec: [0, 0] for spec in specs}
+    all_ok = True
+    for path in paths:
+        try:
+            micro = lower(isa, path)
+        except Exception as e:
+            print(f"{path.stem:24}   ✗ {e!r}"[:120])
+            continue
+        row = f"{path.stem:24} {sum(len(g.nodes) for g in micro):5}"
+        base = None
+        for spec in specs:
+            stats, elapsed = plan(isa, spec, micro)
+            totals[spec][0] += stats.recirculations
+            totals[spec][1] += stats.stages_used
+            cell = f"{stats.recirculations}/{stats.stages_used}"
+            if base is None:
+                base = stats
+            else:
+                all_ok &= stats.recirculations <= base.recirculations
+                cell += f" ({stats.recirculations - base.recirculations:+d}/{stats.stages_used - base.stages_used:+d})"
+            row += f" {cell:>16} {elapsed * 1e3:7.1f}"
+        print(row)
+
+    row = f"{'total':24} {'':5}"
+    for spec in specs:
+        rc, st = totals[spec]
+        row += f" {f'{rc}/{st}':>16} {'':7}"
+    print(row)
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == "__main__":
+    main()